@@ -0,0 +1,252 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class PooledAgent:
+    """A session's agent plus the bookkeeping the pool needs for eviction"""
+
+    def __init__(self, key: tuple, agent: Any):
+        self.key = key
+        self.agent = agent
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.in_use = True
+        self.uses = 0
+
+
+class AgentPool:
+    """Pool of per-session agents keyed by (role, CodeInterpreterSession.session_id).
+
+    ``factories`` build a fresh agent for a role ("generator", "executor");
+    they share the one cached model, so an agent is only its conversation,
+    tools and system prompt and is cheap to create. Each session gets its own
+    agents, so conversations don't mix and requests for different sessions
+    run in parallel, while requests for the same session and role wait in
+    turn - a Strands agent refuses concurrent invocations. Agents idle for
+    ``idle_ttl`` seconds are dropped, and when ``max_agents`` are live the
+    least recently used idle one is evicted to make room; the session's next
+    request starts a fresh conversation. Requests without a session get a
+    throwaway agent that is never pooled.
+    """
+
+    def __init__(self,
+                 factories: Dict[str, Callable[[], Any]],
+                 max_agents: int = 64,
+                 idle_ttl: float = 900,
+                 acquire_timeout: float = 120):
+        self.factories = factories
+        self.max_agents = max_agents
+        self.idle_ttl = idle_ttl
+        self.acquire_timeout = acquire_timeout
+
+        self._entries: "OrderedDict[tuple, PooledAgent]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "ephemeral": 0,
+            "waits": 0,
+            "evictions_ttl": 0,
+            "evictions_lru": 0,
+            "evictions_error": 0,
+            "wait_seconds": 0.0
+        }
+
+    @contextmanager
+    def lease(self, session_id: Optional[str], role: str):
+        """Hand out ``session_id``'s agent for ``role``, creating one if needed.
+
+        If the block raises, the agent's conversation may end on an unanswered
+        message that the model would reject next time, so the agent is
+        discarded rather than returned.
+        """
+        if session_id is None:
+            with self._cond:
+                self._stats["ephemeral"] += 1
+            yield self.factories[role]()
+            return
+
+        entry = self._acquire((role, session_id))
+        try:
+            yield entry.agent
+        except Exception:
+            self._discard(entry, "evictions_error")
+            raise
+        except BaseException:
+            self._release(entry)
+            raise
+        else:
+            self._release(entry)
+
+    def _acquire(self, key: tuple) -> PooledAgent:
+        started = time.time()
+        deadline = started + self.acquire_timeout
+        waited = False
+
+        with self._cond:
+            self._evict_expired_locked()
+            while True:
+                entry = self._entries.get(key)
+                if entry is not None and not entry.in_use:
+                    entry.in_use = True
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    self._stats["wait_seconds"] += time.time() - started
+                    return entry
+
+                if entry is None and (len(self._entries) < self.max_agents or self._evict_lru_locked()):
+                    # Reserve the slot, then build the agent outside the lock
+                    entry = PooledAgent(key, None)
+                    self._entries[key] = entry
+                    self._stats["misses"] += 1
+                    self._stats["wait_seconds"] += time.time() - started
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No {key[0]} agent available for session {key[1]} "
+                        f"after {self.acquire_timeout}s ({len(self._entries)}/{self.max_agents} live)"
+                    )
+                if not waited:
+                    waited = True
+                    self._stats["waits"] += 1
+                self._cond.wait(remaining)
+
+        try:
+            entry.agent = self.factories[key[0]]()
+        except Exception:
+            with self._cond:
+                self._entries.pop(key, None)
+                self._cond.notify_all()
+            raise
+        print(f"🤖 Created {key[0]} agent for session {key[1]} ({len(self._entries)}/{self.max_agents} live)")
+        return entry
+
+    def _release(self, entry: PooledAgent):
+        with self._cond:
+            entry.in_use = False
+            entry.uses += 1
+            entry.last_used = time.time()
+            self._cond.notify_all()
+
+    def _discard(self, entry: PooledAgent, reason: str):
+        with self._cond:
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            self._stats[reason] += 1
+            self._cond.notify_all()
+
+    def _evict_expired_locked(self):
+        now = time.time()
+        expired = [key for key, entry in self._entries.items()
+                   if not entry.in_use and now - entry.last_used > self.idle_ttl]
+        for key in expired:
+            del self._entries[key]
+            self._stats["evictions_ttl"] += 1
+
+    def _evict_lru_locked(self) -> bool:
+        for key, entry in self._entries.items():
+            if not entry.in_use:
+                del self._entries[key]
+                self._stats["evictions_lru"] += 1
+                return True
+        return False
+
+    def evict(self, session_id: str) -> int:
+        """Forget every idle agent of ``session_id``; returns how many were dropped"""
+        with self._cond:
+            keys = [key for key, entry in self._entries.items() if key[1] == session_id and not entry.in_use]
+            for key in keys:
+                del self._entries[key]
+            self._cond.notify_all()
+        return len(keys)
+
+    def evict_idle(self):
+        """Evict every agent that has been idle longer than ``idle_ttl``"""
+        with self._cond:
+            self._evict_expired_locked()
+            self._cond.notify_all()
+
+    def start_reaper(self, interval: float = 60):
+        """Run evict_idle periodically on a daemon thread"""
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while not self._stop_reaper.wait(interval):
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=reap, name="agent-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def close_all(self):
+        self._stop_reaper.set()
+        with self._cond:
+            self._entries.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["active"] = len(self._entries)
+            stats["in_use"] = sum(1 for entry in self._entries.values() if entry.in_use)
+            stats["sessions"] = len({key[1] for key in self._entries})
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_agents"] = self.max_agents
+        stats["idle_ttl"] = self.idle_ttl
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["avg_wait_ms"] = round(1000 * stats.pop("wait_seconds") / lookups, 2) if lookups else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    # Offline benchmark with a fake agent that sleeps like a model call: one shared agent (requests serialized,
+    # as the global agents forced) against per-session pooled agents
+    from concurrent.futures import ThreadPoolExecutor
+
+    class FakeAgent:
+        def __init__(self):
+            self.messages = []
+            self._busy = threading.Lock()
+
+        def __call__(self, prompt):
+            if not self._busy.acquire(blocking=False):
+                raise RuntimeError("Agent is already processing a request")
+            try:
+                time.sleep(0.05)
+                self.messages.append({"role": "user", "content": [{"text": prompt}]})
+                return f"answer to {prompt}"
+            finally:
+                self._busy.release()
+
+    sessions = [f"session-{i}" for i in range(16)]
+    requests = [sessions[i % len(sessions)] for i in range(96)]
+
+    shared, shared_lock = FakeAgent(), threading.Lock()
+
+    def run_shared(session_id):
+        with shared_lock:
+            return shared(session_id)
+
+    pool = AgentPool({"generator": FakeAgent}, max_agents=32, idle_ttl=60)
+
+    def run_pooled(session_id):
+        with pool.lease(session_id, "generator") as agent:
+            return agent(session_id)
+
+    print("\n📊 AgentPool benchmark (fake agent, 50ms per call, 96 requests over 16 sessions, 8 workers)")
+    for name, run in (("shared agent", run_shared), ("agent pool", run_pooled)):
+        started = time.time()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(run, requests))
+        print(f"   {name}: {time.time() - started:.2f}s")
+    print(f"   shared conversation: {len(shared.messages)} messages")
+    for key, value in pool.stats().items():
+        print(f"   {key}: {value}")
@@ -0,0 +1,453 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from ColumnarConverter import columnar_filename
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+CHART_TYPES = ("bar", "barh", "hist", "pie", "line", "scatter")
+TRANSFORMS = ("length", "first_char", "digits", "counts")
+# Transforms of a value's text, which need the column exactly as written in the CSV (leading zeros, no ".0")
+TEXT_TRANSFORMS = ("length", "first_char", "digits")
+
+
+class ChartSpec:
+    """A chart to render, described declaratively.
+
+    The data comes either from the dataset - a ``column``, or ``x`` and ``y``
+    columns - or inline as ``labels`` and ``values``. A column can go through
+    a ``transform`` first: its string ``length``, ``first_char``, the number
+    in it (``digits``) or how often each value occurs (``counts``). Bar, barh and pie charts of a single column
+    plot its value counts, limited to the ``top`` most common values and to
+    values occurring at least ``min_count`` times.
+    """
+
+    FIELDS = ("name", "type", "title", "column", "x", "y", "transform", "labels", "values", "top", "min_count",
+              "bins", "kde", "color", "xlabel", "ylabel", "rotate_labels", "dpi", "figsize")
+
+    def __init__(self, name: str, type: str, title: str = "", column: Optional[str] = None,
+                 x: Optional[str] = None, y: Optional[str] = None, transform: Optional[str] = None,
+                 labels: Optional[List[Any]] = None, values: Optional[List[float]] = None,
+                 top: Optional[int] = None, min_count: int = 1, bins: Any = "auto", kde: bool = False,
+                 color: Optional[str] = None, xlabel: str = "", ylabel: str = "", rotate_labels: int = 0,
+                 dpi: int = 150, figsize: List[float] = (10, 6)):
+        if type not in CHART_TYPES:
+            raise ValueError(f"Unknown chart type '{type}' (supported: {', '.join(CHART_TYPES)})")
+        if transform is not None and transform not in TRANSFORMS:
+            raise ValueError(f"Unknown transform '{transform}' (supported: {', '.join(TRANSFORMS)})")
+        if values is None and column is None and (x is None or y is None):
+            raise ValueError(f"Chart '{name}' needs a column, x and y columns, or inline values")
+        self.name = name
+        self.type = type
+        self.title = title
+        self.column = column
+        self.x = x
+        self.y = y
+        self.transform = transform
+        self.labels = labels
+        self.values = values
+        self.top = top
+        self.min_count = min_count
+        self.bins = bins
+        self.kde = kde
+        self.color = color
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.rotate_labels = rotate_labels
+        self.dpi = dpi
+        self.figsize = list(figsize)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChartSpec":
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown chart spec fields: {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def columns(self) -> List[str]:
+        """Dataset columns the chart reads"""
+        if self.values is not None:
+            return []
+        return [self.column] if self.column is not None else [self.x, self.y]
+
+    def text_columns(self) -> List[str]:
+        """Dataset columns the chart reads as text"""
+        return [self.column] if self.column is not None and self.transform in TEXT_TRANSFORMS else []
+
+
+# Datasets each render worker keeps open, least recently used first
+MAX_OPEN_DATASETS = 4
+
+# Per-process state of the render workers: the memory-mapped datasets they've opened, by (path, mtime)
+_datasets: "OrderedDict[Tuple[str, int], Any]" = OrderedDict()
+
+
+def _init_worker():
+    os.environ["MPLBACKEND"] = "Agg"
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def load_columns(dataset_path: str, columns: List[str]):
+    """The columns as a DataFrame, from a dataset opened once per process"""
+    key = (dataset_path, os.stat(dataset_path).st_mtime_ns)
+    table = _datasets.get(key)
+    if table is None:
+        # Close the maps of datasets deleted or rewritten since they were opened
+        for stale in [cached for cached in _datasets if not os.path.exists(cached[0]) or cached[0] == dataset_path]:
+            del _datasets[stale]
+        if dataset_path.endswith(".pkl"):
+            import pandas as pd
+            table = pd.read_pickle(dataset_path)
+        else:
+            # Memory-mapped, so every worker reads the same page-cache pages instead of its own copy
+            table = pa_ipc.open_file(pa.memory_map(dataset_path)).read_all()
+        _datasets[key] = table
+        while len(_datasets) > MAX_OPEN_DATASETS:
+            _datasets.popitem(last=False)
+    else:
+        _datasets.move_to_end(key)
+    if hasattr(table, "select"):
+        return table.select(columns).to_pandas()
+    return table[columns]
+
+
+def _series(spec: Dict[str, Any], frame):
+    import pandas as pd
+    series = frame[spec["column"]]
+    transform = spec["transform"]
+    if transform == "length":
+        series = series.astype(str).str.len()
+    elif transform == "first_char":
+        series = series.astype(str).str[0]
+    elif transform == "digits":
+        series = pd.to_numeric(series.astype(str).str.replace(r"\D", "", regex=True), errors="coerce").dropna()
+    elif transform == "counts":
+        series = series.value_counts().reset_index(drop=True)
+    return series
+
+
+def _counts(spec: Dict[str, Any], series):
+    counts = series.value_counts()
+    if spec["min_count"] > 1:
+        counts = counts[counts >= spec["min_count"]]
+    if spec["top"]:
+        counts = counts.head(spec["top"])
+    if spec["transform"] in ("length", "first_char"):
+        counts = counts.sort_index()
+    return [str(label) for label in counts.index], counts.values
+
+
+def render_chart(spec: Dict[str, Any], dataset_path: Optional[str]) -> Dict[str, Any]:
+    """Render one chart spec to RGB PNG bytes with the Agg canvas (no pyplot state, nothing written to disk)"""
+    started = time.time()
+    try:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        from PIL import Image
+
+        figure = Figure(figsize=spec["figsize"], dpi=spec["dpi"])
+        canvas = FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        chart_type = spec["type"]
+        if spec["values"] is not None:
+            labels, values, frame = [str(label) for label in spec["labels"] or range(len(spec["values"]))], spec["values"], None
+        else:
+            frame = load_columns(dataset_path, list(dict.fromkeys(ChartSpec.from_dict(spec).columns())))
+            labels = values = None
+
+        if chart_type == "hist":
+            import seaborn as sns
+            data = values if frame is None else _series(spec, frame)
+            bins = spec["bins"]
+            if bins == "integer":
+                bins = range(int(min(data)), int(max(data)) + 2)
+            sns.histplot(data, kde=spec["kde"], bins=bins, color=spec["color"], ax=ax)
+        elif chart_type in ("line", "scatter") and frame is not None and spec["x"] is not None:
+            plot = ax.plot if chart_type == "line" else ax.scatter
+            plot(frame[spec["x"]], frame[spec["y"]], color=spec["color"])
+        else:
+            if frame is not None:
+                if spec["x"] is not None:
+                    labels, values = [str(label) for label in frame[spec["x"]]], frame[spec["y"]].values
+                else:
+                    labels, values = _counts(spec, _series(spec, frame))
+            if chart_type == "pie":
+                ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
+                ax.axis("equal")
+            elif chart_type == "barh":
+                ax.barh(labels, values, color=spec["color"])
+            elif chart_type == "bar":
+                ax.bar(labels, values, color=spec["color"])
+            else:
+                plot = ax.plot if chart_type == "line" else ax.scatter
+                plot(labels, values, color=spec["color"])
+
+        ax.set_title(spec["title"])
+        if chart_type != "pie":
+            ax.set_xlabel(spec["xlabel"])
+            ax.set_ylabel(spec["ylabel"])
+        if spec["rotate_labels"]:
+            ax.tick_params(axis="x", labelrotation=spec["rotate_labels"])
+        figure.tight_layout()
+        canvas.draw()
+        # Charts have an opaque background; an RGB PNG embeds in PDFs without splitting out an alpha channel
+        buffer = io.BytesIO()
+        Image.frombuffer("RGBA", canvas.get_width_height(), canvas.buffer_rgba(), "raw", "RGBA", 0, 1) \
+            .convert("RGB").save(buffer, format="png")
+        return {"name": spec["name"], "png": buffer.getvalue(), "error": None, "seconds": time.time() - started,
+                "pid": os.getpid()}
+    except Exception as e:
+        return {"name": spec["name"], "png": None, "error": f"{type(e).__name__}: {e}",
+                "seconds": time.time() - started, "pid": os.getpid()}
+
+
+class ChartRenderer:
+    """Renders declarative chart specs to PNG bytes in a pool of worker processes.
+
+    Charts render in parallel, one per worker, with matplotlib's Agg canvas
+    and return their PNG bytes, so slide and PDF builders can embed them
+    without writing images to disk. The dataset is written once as an
+    uncompressed Arrow IPC file (or the upload's Feather copy is used as is),
+    which the workers memory-map and share through the page cache instead of
+    each parsing the CSV. Without pyarrow the dataset is pickled and each
+    worker loads it once. ``workers=0`` renders in the calling process.
+
+    Workers are forked from the server so they don't re-import the server
+    module. Forking a process that already runs threads can leave locks held
+    in the children, so the server calls ``start()`` at startup before its
+    own threads start. A ``root`` created here is removed by ``close()``.
+
+    At most ``max_shared`` dataset files are kept in ``root``, least recently
+    used first out; ``forget()`` removes those of a deleted dataset. Workers
+    keep ``MAX_OPEN_DATASETS`` open and close the maps of deleted files the
+    next time they load one.
+    """
+
+    def __init__(self, workers: Optional[int] = None, root: Optional[str] = None, max_shared: int = 16):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.owns_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix="chart_renderer_")
+        self.max_shared = max_shared
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        # source key -> (dataset file the workers open, CSV it was read from or None for a DataFrame)
+        self._shared: "OrderedDict[str, Tuple[str, Optional[str]]]" = OrderedDict()
+        self._stats = {"batches": 0, "charts": 0, "failed": 0, "datasets_shared": 0, "datasets_dropped": 0,
+                       "render_seconds": 0.0, "wall_seconds": 0.0}
+        os.makedirs(self.root, exist_ok=True)
+
+    def pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context(method))
+            return self._pool
+
+    def start(self):
+        """Fork every worker now; with the fork start method the first task starts the whole pool"""
+        if self.workers:
+            self.pool().submit(os.getpid).result()
+            print(f"🎨 Chart renderer started {self.workers} worker(s)")
+
+    def share_dataset(self, source, text_columns: List[str] = ()) -> str:
+        """Path of a dataset file the workers can open for ``source`` (a CSV path, Feather path or DataFrame).
+
+        ``text_columns`` are read from a CSV as strings rather than with
+        inferred types, so their values keep exactly what the file holds; the
+        upload's Feather copy is only used when there are none.
+        """
+        text_columns = sorted(set(text_columns))
+        origin = None
+        if isinstance(source, str):
+            if source.endswith(".feather") and pa is not None:
+                return source
+            columnar = columnar_filename(source)
+            if (pa is not None and not text_columns and os.path.exists(columnar)
+                    and os.path.getmtime(columnar) >= os.path.getmtime(source)):
+                return columnar
+            origin = os.path.abspath(source)
+            stat = os.stat(source)
+            key = f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}:{','.join(text_columns)}"
+        else:
+            import pandas as pd
+            digest = hashlib.sha256(pd.util.hash_pandas_object(source, index=False).values.tobytes())
+            digest.update(repr(list(source.columns)).encode())
+            key = f"frame:{digest.hexdigest()}"
+
+        with self._lock:
+            shared = self._shared.get(key)
+            if shared is not None:
+                self._shared.move_to_end(key)
+        if shared is not None and os.path.exists(shared[0]):
+            return shared[0]
+
+        started = time.time()
+        name = hashlib.sha256(key.encode()).hexdigest()[:16]
+        if pa is not None:
+            path = os.path.join(self.root, name + ".arrow")
+            if isinstance(source, str):
+                options = pa_csv.ConvertOptions(column_types={column: pa.string() for column in text_columns},
+                                                strings_can_be_null=True)
+                table = pa_csv.read_csv(source, convert_options=options)
+            else:
+                table = pa.Table.from_pandas(source, preserve_index=False)
+            with pa_ipc.new_file(path, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            import pandas as pd
+            path = os.path.join(self.root, name + ".pkl")
+            frame = pd.read_csv(source, dtype={column: str for column in text_columns}) if isinstance(source, str) else source
+            frame.to_pickle(path)
+        with self._lock:
+            self._shared[key] = (path, origin)
+            self._stats["datasets_shared"] += 1
+            dropped = [self._shared.popitem(last=False)[1] for _ in range(len(self._shared) - self.max_shared)]
+        self._remove(dropped)
+        print(f"🗂️  Shared dataset for chart rendering as {os.path.basename(path)} in {time.time() - started:.2f}s")
+        return path
+
+    def forget(self, path: str):
+        """Remove the shared copies of the CSV at ``path``, or of every CSV under it when it is a directory"""
+        path = os.path.abspath(path)
+        with self._lock:
+            keys = [key for key, (_, origin) in self._shared.items()
+                    if origin is not None and (origin == path or origin.startswith(path + os.sep))]
+            dropped = [self._shared.pop(key) for key in keys]
+        self._remove(dropped)
+
+    def _remove(self, dropped: List[Tuple[str, Optional[str]]]):
+        for path, _ in dropped:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if dropped:
+            with self._lock:
+                self._stats["datasets_dropped"] += len(dropped)
+
+    def render(self, specs: List[Any], dataset=None) -> List[Dict[str, Any]]:
+        """Render the specs (ChartSpec or dicts); returns ``{"name", "png", "error", "seconds"}`` per chart, in order"""
+        started = time.time()
+        specs = [spec if isinstance(spec, ChartSpec) else ChartSpec.from_dict(spec) for spec in specs]
+        text_columns = [column for spec in specs for column in spec.text_columns()]
+        dataset_path = self.share_dataset(dataset, text_columns) if dataset is not None else None
+        payloads = [spec.to_dict() for spec in specs]
+        if self.workers and len(payloads) > 1:
+            pool = self.pool()
+            futures = [pool.submit(render_chart, payload, dataset_path) for payload in payloads]
+            results = [future.result() for future in futures]
+        else:
+            results = [render_chart(payload, dataset_path) for payload in payloads]
+
+        failed = [result for result in results if result["error"]]
+        for result in failed:
+            print(f"⚠️  Chart '{result['name']}' failed: {result['error']}")
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["charts"] += len(results)
+            self._stats["failed"] += len(failed)
+            self._stats["render_seconds"] += sum(result["seconds"] for result in results)
+            self._stats["wall_seconds"] += time.time() - started
+        return results
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        if self.owns_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["datasets_kept"] = len(self._shared)
+        stats["render_seconds"] = round(stats["render_seconds"], 3)
+        stats["wall_seconds"] = round(stats["wall_seconds"], 3)
+        stats["workers"] = self.workers
+        stats["shared_format"] = "arrow" if pa is not None else "pickle"
+        return stats
+
+
+# The six figures a.py renders, as specs over its aws_id.csv (columns aws_id, account_id)
+REPORT_CHARTS = [
+    {"name": "aws_ids_with_multiple_accounts", "type": "bar", "column": "aws_id", "min_count": 2, "top": 10,
+     "title": "Top 10 AWS IDs with Multiple Accounts", "xlabel": "AWS ID", "ylabel": "Number of Accounts",
+     "color": "skyblue", "rotate_labels": 90, "figsize": [12, 6]},
+    {"name": "account_id_length_distribution", "type": "hist", "column": "account_id", "transform": "length",
+     "bins": "integer", "kde": True, "title": "Distribution of Account ID Length",
+     "xlabel": "Length of Account ID", "ylabel": "Frequency"},
+    {"name": "aws_id_number_distribution", "type": "hist", "column": "aws_id", "transform": "digits", "bins": 30,
+     "kde": True, "title": "Distribution of AWS ID Numerical Values", "xlabel": "AWS ID Number",
+     "ylabel": "Frequency", "figsize": [12, 6]},
+    {"name": "unique_vs_duplicate_aws_ids", "type": "pie", "labels": ["Unique AWS IDs", "Duplicate AWS IDs"],
+     "values": [1, 1], "title": "Proportion of Unique vs Duplicate AWS IDs"},
+    {"name": "accounts_per_aws_id", "type": "hist", "column": "aws_id", "transform": "counts", "bins": "integer",
+     "kde": True, "title": "Number of Accounts per AWS ID", "xlabel": "Number of Accounts",
+     "ylabel": "Count of AWS IDs"},
+    {"name": "account_id_first_digit", "type": "bar", "column": "account_id", "transform": "first_char",
+     "title": "First Digit Distribution of Account IDs", "xlabel": "First Digit", "ylabel": "Frequency"},
+]
+
+
+if __name__ == "__main__":
+    # Benchmark: a.py's six charts at 300 dpi, rendered in-process one after another (as a.py does)
+    # and in the pool with 1..N workers
+    import sys
+    import numpy as np
+    import pandas as pd
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    rng = np.random.default_rng(7)
+    aws_ids = pd.Series(rng.integers(10000, 99999, rows)).map("AWS{}S".format)
+    frame = pd.DataFrame({"aws_id": aws_ids, "account_id": rng.integers(10 ** 9, 10 ** 12, rows)})
+    with tempfile.TemporaryDirectory(prefix="chart_bench_") as directory:
+        csv_path = os.path.join(directory, "aws_id.csv")
+        frame.to_csv(csv_path, index=False)
+
+        unique = frame["aws_id"].nunique()
+        specs = [dict(spec, dpi=300) for spec in REPORT_CHARTS]
+        specs[3]["values"] = [unique, rows - unique]
+
+        print(f"\n📊 ChartRenderer benchmark: {len(specs)} charts at 300 dpi over {rows:,} rows, "
+              f"{os.cpu_count()} CPUs")
+        renderer = ChartRenderer(workers=0, root=directory)
+        warm_up = [dict(spec, dpi=30) for spec in specs]
+        renderer.render(warm_up, csv_path)  # imports, font cache and the shared dataset
+        started = time.time()
+        results = renderer.render(specs, csv_path)
+        baseline = time.time() - started
+        print(f"   {'in-process, sequential':<24} {baseline:6.2f} s  "
+              f"({sum(len(result['png']) for result in results) / 1e6:.1f} MB of PNG)")
+
+        for workers in range(1, max_workers + 1):
+            renderer = ChartRenderer(workers=workers, root=directory)
+            renderer.render(warm_up * workers, csv_path)  # start every worker and map the dataset in each
+            started = time.time()
+            results = renderer.render(specs, csv_path)
+            elapsed = time.time() - started
+            errors = [result["error"] for result in results if result["error"]]
+            print(f"   {f'pool, {workers} worker(s)':<24} {elapsed:6.2f} s  speedup x{baseline / elapsed:.2f}"
+                  f"{'  errors: ' + '; '.join(errors) if errors else ''}")
+            renderer.close()
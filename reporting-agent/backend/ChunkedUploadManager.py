@@ -0,0 +1,383 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+UPLOAD_OPEN = "open"
+UPLOAD_COMPLETE = "complete"
+
+# append_stream() hands blocks to a thread in batches of about this size
+WRITE_BATCH_BYTES = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Base class for chunked upload failures; ``status_code`` is the HTTP status to answer with"""
+    status_code = 400
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadOffsetMismatch(UploadError):
+    """A chunk didn't start where the previous one ended - the client should resume from ``expected_offset``"""
+    status_code = 409
+
+    def __init__(self, expected_offset: int, received_offset: int, message: Optional[str] = None):
+        super().__init__(message or f"Chunk starts at byte {received_offset} but the upload is at byte {expected_offset}")
+        self.expected_offset = expected_offset
+
+
+class ChunkedUpload:
+    """One in-progress upload: a spool file plus digest, size and line count computed as bytes arrive"""
+
+    def __init__(self, session_id: str, filename: str, path: str, total_size: Optional[int]):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.filename = filename
+        self.path = path
+        self.total_size = total_size
+        self.offset = 0
+        self.lines = 0
+        self.last_byte = b""
+        self.sha256 = hashlib.sha256()
+        self.status = UPLOAD_OPEN
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.lock = threading.Lock()
+        self.stream_lock = asyncio.Lock()  # held by append_stream() for the whole chunk
+        self.shared_offset = 0  # offset last published to the shared backend
+
+    @property
+    def rows(self) -> int:
+        """Data rows, assuming one header line and one record per line"""
+        lines = self.lines + (1 if self.last_byte not in (b"", b"\n") else 0)
+        return max(0, lines - 1)
+
+    def to_record(self) -> Dict[str, Any]:
+        """What another worker needs to continue the upload"""
+        return {
+            "id": self.id,
+            "session_id": self.session_id,
+            "filename": self.filename,
+            "path": self.path,
+            "total_size": self.total_size,
+            "offset": self.offset,
+            "lines": self.lines,
+            "last_byte": self.last_byte.hex(),
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "ChunkedUpload":
+        upload = cls(record["session_id"], record["filename"], record["path"], record["total_size"])
+        upload.id = record["id"]
+        upload.offset = upload.shared_offset = record["offset"]
+        upload.lines = record["lines"]
+        upload.last_byte = bytes.fromhex(record["last_byte"])
+        upload.created_at = record["created_at"]
+        upload.updated_at = record["updated_at"]
+        upload.sha256 = None  # the running digest can't be shared; complete() hashes the file instead
+        return upload
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upload_id": self.id,
+            "session_id": self.session_id,
+            "filename": self.filename,
+            "status": self.status,
+            "offset": self.offset,
+            "total_size": self.total_size,
+            "rows": self.rows,
+            "sha256": self.sha256.hexdigest() if self.status == UPLOAD_COMPLETE and self.sha256 else None,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at
+        }
+
+
+class ChunkedUploadManager:
+    """Resumable uploads streamed straight to per-session spool files.
+
+    The client opens an upload, sends the file in sequential chunks (each must
+    start at the current offset, so after a dropped connection it asks for the
+    status and resumes from there) and completes it. Nothing but the current
+    chunk is held in memory; the sha256, size and row count are accumulated as
+    the bytes are written. Completed files stay in ``spool_dir/<session_id>/``
+    and the session keeps only a reference to them.
+
+    With a shared ``backend`` (SessionBackend) each open upload's state is
+    published after every chunk, so chunks, status polls and completion can
+    land on any worker that sees the same ``spool_dir`` (one host, or a shared
+    volume across replicas).
+    """
+
+    def __init__(self, spool_dir: str, max_upload_bytes: int = 1024 * 1024 * 1024, upload_ttl: float = 3600,
+                 backend=None):
+        self.spool_dir = os.path.abspath(spool_dir)
+        self.max_upload_bytes = max_upload_bytes
+        self.upload_ttl = upload_ttl
+        self.backend = backend
+        os.makedirs(spool_dir, exist_ok=True)
+        self._uploads: Dict[str, ChunkedUpload] = {}
+        self._lock = threading.Lock()
+        self._stats = {"started": 0, "completed": 0, "aborted": 0, "expired": 0, "bytes_received": 0}
+
+    def session_dir(self, session_id: str) -> str:
+        # Session ids come from clients; keep them from escaping the spool directory
+        return os.path.join(self.spool_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', session_id))
+
+    def create(self, session_id: str, filename: str, total_size: Optional[int] = None) -> ChunkedUpload:
+        if total_size is not None and total_size > self.max_upload_bytes:
+            raise UploadTooLarge(f"File is {total_size} bytes; the limit is {self.max_upload_bytes}")
+        directory = self.session_dir(session_id)
+        os.makedirs(directory, exist_ok=True)
+        upload = ChunkedUpload(session_id, os.path.basename(filename), "", total_size)
+        upload.path = os.path.join(directory, f"{upload.id}.part")
+        open(upload.path, "wb").close()
+        with self._lock:
+            self._uploads[upload.id] = upload
+            self._stats["started"] += 1
+        self._share(upload)
+        return upload
+
+    def get(self, upload_id: str) -> ChunkedUpload:
+        upload = self._uploads.get(upload_id)
+        if self.backend is not None:
+            upload = self._get_shared(upload_id, upload)
+        if upload is None:
+            raise UploadNotFound(f"Upload {upload_id} not found or expired")
+        return upload
+
+    def _get_shared(self, upload_id: str, upload: Optional[ChunkedUpload]) -> Optional[ChunkedUpload]:
+        """The upload as last published by any worker, replacing a local copy another worker has moved on"""
+        record = self.backend.get_record("upload", upload_id)
+        if record is None:
+            if upload is not None and upload.status == UPLOAD_OPEN:
+                # Completed, aborted or expired by another worker
+                with self._lock:
+                    self._uploads.pop(upload_id, None)
+            return None
+        record = json.loads(record)
+        if upload is not None and record["offset"] == upload.shared_offset:
+            return upload
+        if not os.path.exists(record["path"]):
+            raise UploadNotFound(f"Upload {upload_id} is spooled on another host")
+        shared = ChunkedUpload.from_record(record)
+        with self._lock:
+            self._uploads[upload_id] = shared
+        return shared
+
+    def _share(self, upload: ChunkedUpload):
+        if self.backend is None:
+            return
+        try:
+            self.backend.put_record("upload", upload.id, json.dumps(upload.to_record()).encode(), self.upload_ttl)
+            upload.shared_offset = upload.offset
+        except Exception as e:
+            print(f"⚠️  Failed to share upload {upload.id}: {e}")
+
+    def _unshare(self, upload_ids):
+        if self.backend is None:
+            return
+        for upload_id in upload_ids:
+            try:
+                self.backend.delete_record("upload", upload_id)
+            except Exception as e:
+                print(f"⚠️  Failed to unshare upload {upload_id}: {e}")
+
+    def append(self, upload_id: str, offset: int, chunks: Iterable[bytes]) -> ChunkedUpload:
+        """Write one chunk (given as an iterable of byte blocks) starting at ``offset``"""
+        upload = self.get(upload_id)
+        with upload.lock:
+            if upload.status != UPLOAD_OPEN:
+                raise UploadError(f"Upload {upload_id} is already {upload.status}")
+            if offset != upload.offset:
+                raise UploadOffsetMismatch(upload.offset, offset)
+            with open(upload.path, "r+b") as f:
+                f.seek(upload.offset)
+                try:
+                    for block in chunks:
+                        self._write_block(upload, f, block)
+                finally:
+                    # Keep the file consistent with the digest if the chunk was cut short
+                    f.truncate(upload.offset)
+            upload.updated_at = time.time()
+            self._share(upload)
+        return upload
+
+    async def append_stream(self, upload_id: str, offset: int, stream) -> ChunkedUpload:
+        """Like append(), for an async byte stream such as ``request.stream()``.
+
+        The file is written from a worker thread in batches, so the event loop
+        only waits for the stream.
+        """
+        upload = await asyncio.to_thread(self.get, upload_id)
+        async with upload.stream_lock:
+            with upload.lock:
+                if upload.status != UPLOAD_OPEN:
+                    raise UploadError(f"Upload {upload_id} is already {upload.status}")
+                if offset != upload.offset:
+                    raise UploadOffsetMismatch(upload.offset, offset)
+            f = await asyncio.to_thread(open, upload.path, "r+b")
+            batch = []
+            try:
+                await asyncio.to_thread(f.seek, offset)
+                async for block in stream:
+                    batch.append(block)
+                    if sum(map(len, batch)) >= WRITE_BATCH_BYTES:
+                        blocks, batch = batch, []
+                        await asyncio.to_thread(self._write_blocks, upload, f, blocks)
+            finally:
+                try:
+                    if batch:
+                        # Also what arrived before a dropped connection, so the client can resume after it
+                        await asyncio.to_thread(self._write_blocks, upload, f, batch)
+                finally:
+                    await asyncio.to_thread(self._close_part, upload, f)
+        return upload
+
+    def _write_blocks(self, upload: ChunkedUpload, f, blocks):
+        with upload.lock:
+            for block in blocks:
+                self._write_block(upload, f, block)
+
+    def _close_part(self, upload: ChunkedUpload, f):
+        with upload.lock:
+            try:
+                # Keep the file consistent with the digest if the chunk was cut short
+                f.truncate(upload.offset)
+            finally:
+                f.close()
+            upload.updated_at = time.time()
+            self._share(upload)
+
+    def _write_block(self, upload: ChunkedUpload, f, block: bytes):
+        if not block:
+            return
+        limit = upload.total_size if upload.total_size is not None else self.max_upload_bytes
+        if upload.offset + len(block) > limit:
+            raise UploadTooLarge(f"Upload exceeds its {limit} byte limit")
+        f.write(block)
+        if upload.sha256 is not None:
+            upload.sha256.update(block)
+        upload.lines += block.count(b"\n")
+        upload.last_byte = block[-1:]
+        upload.offset += len(block)
+        self._stats["bytes_received"] += len(block)
+
+    def complete(self, upload_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Finish an upload and return the file reference to keep in the session"""
+        upload = self.get(upload_id)
+        if upload.stream_lock.locked():
+            raise UploadError(f"Upload {upload_id} is still receiving a chunk")
+        with upload.lock:
+            if upload.total_size is not None and upload.offset != upload.total_size:
+                raise UploadOffsetMismatch(upload.offset, upload.total_size,
+                                           f"Upload is incomplete: {upload.offset} of {upload.total_size} bytes received")
+            digest = upload.sha256.hexdigest() if upload.sha256 is not None else self._file_digest(upload.path)
+            if sha256 and sha256.lower() != digest:
+                raise UploadError(f"sha256 mismatch: client sent {sha256}, server computed {digest}")
+            final_path = upload.path[:-len(".part")] + ".csv"
+            os.replace(upload.path, final_path)
+            upload.path = final_path
+            upload.status = UPLOAD_COMPLETE
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+            self._stats["completed"] += 1
+        self._unshare([upload_id])
+        return {
+            "filename": upload.filename,
+            "path": upload.path,
+            "size": upload.offset,
+            "sha256": digest,
+            "rows": upload.rows,
+            "upload_id": upload.id
+        }
+
+    def store_bytes(self, session_id: str, filename: str, data: bytes) -> Dict[str, Any]:
+        """One-shot upload of content already in memory (the legacy JSON endpoint)"""
+        upload = self.create(session_id, filename, len(data))
+        self.append(upload.id, 0, [data])
+        return self.complete(upload.id)
+
+    def abort(self, upload_id: str) -> bool:
+        try:
+            self.get(upload_id)  # may be open on another worker
+        except UploadNotFound:
+            return False
+        with self._lock:
+            upload = self._uploads.pop(upload_id, None)
+            if upload is None:
+                return False
+            self._stats["aborted"] += 1
+        self._unshare([upload_id])
+        self._remove(upload.path)
+        return True
+
+    def expire(self) -> int:
+        """Drop open uploads that have not received data for ``upload_ttl`` seconds"""
+        cutoff = time.time() - self.upload_ttl
+        with self._lock:
+            stale = [upload for upload in self._uploads.values() if upload.updated_at < cutoff]
+            for upload in stale:
+                del self._uploads[upload.id]
+            self._stats["expired"] += len(stale)
+        self._unshare([upload.id for upload in stale])
+        for upload in stale:
+            self._remove(upload.path)
+        return len(stale)
+
+    def delete_file(self, file_ref: Optional[Dict[str, Any]]):
+        """Remove a completed upload's spool file, e.g. when its CSV is cleared from the session"""
+        if file_ref and file_ref.get("path", "").startswith(os.path.abspath(self.spool_dir)):
+            self._remove(file_ref["path"])
+
+    def delete_session(self, session_id: str):
+        """Session store delete listener: abort the session's open uploads and remove its spool directory"""
+        with self._lock:
+            aborted = [upload for upload in self._uploads.values() if upload.session_id == session_id]
+            for upload in aborted:
+                del self._uploads[upload.id]
+            self._stats["aborted"] += len(aborted)
+        self._unshare([upload.id for upload in aborted])
+        if self.backend is not None:
+            # Uploads of the session opened on other workers
+            records = [json.loads(record) for record in self.backend.list_records("upload")]
+            self._unshare([record["id"] for record in records if record["session_id"] == session_id])
+        shutil.rmtree(self.session_dir(session_id), ignore_errors=True)
+
+    @staticmethod
+    def _file_digest(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha256.update(block)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_uploads"] = len(self._uploads)
+        stats["spool_dir"] = self.spool_dir
+        stats["max_upload_bytes"] = self.max_upload_bytes
+        stats["shared"] = self.backend is not None
+        return stats
+
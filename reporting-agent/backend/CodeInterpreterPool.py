@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+
+class PooledInterpreter:
+    """A warm interpreter client plus the bookkeeping the pool needs for eviction"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.client = None
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.in_use = True
+        self.uses = 0
+
+
+class CodeInterpreterPool:
+    """Pool of warm code-interpreter sessions keyed by CodeInterpreterSession.session_id.
+
+    Each application session gets its own interpreter so variables and uploaded
+    files survive between executions. Idle interpreters are stopped after
+    ``idle_ttl`` seconds, and when ``max_sessions`` is reached the least recently
+    used idle interpreter is evicted to make room. An interpreter is leased to one
+    execution at a time; concurrent executions for the same session wait in turn.
+    """
+
+    def __init__(self,
+                 factory: Callable[[], Any],
+                 closer: Optional[Callable[[Any], None]] = None,
+                 max_sessions: int = 20,
+                 idle_ttl: float = 600,
+                 acquire_timeout: float = 120):
+        self.factory = factory
+        self.closer = closer or (lambda client: client.stop())
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.acquire_timeout = acquire_timeout
+        self.evict_listeners = []
+
+        self._entries: "OrderedDict[str, PooledInterpreter]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions_ttl": 0,
+            "evictions_lru": 0,
+            "evictions_error": 0,
+            "cold_start_seconds": 0.0,
+            "warm_acquire_seconds": 0.0
+        }
+
+    @contextmanager
+    def lease(self, session_id: str):
+        """Hand out the warm interpreter for ``session_id``, starting one if needed.
+
+        If the block raises, the interpreter is assumed to be broken (expired
+        session, dropped connection) and is discarded rather than returned.
+        """
+        entry = self._acquire(session_id)
+        try:
+            yield entry.client
+        except Exception:
+            self._discard(entry, "evictions_error")
+            raise
+        except BaseException:
+            # Closed generator or cancelled caller - the interpreter itself is still usable
+            self._release(entry)
+            raise
+        else:
+            self._release(entry)
+
+    def _acquire(self, session_id: str) -> PooledInterpreter:
+        started = time.time()
+        deadline = started + self.acquire_timeout
+
+        with self._cond:
+            self._evict_expired_locked()
+            while True:
+                entry = self._entries.get(session_id)
+                if entry is not None and not entry.in_use:
+                    entry.in_use = True
+                    self._entries.move_to_end(session_id)
+                    self._stats["hits"] += 1
+                    self._stats["warm_acquire_seconds"] += time.time() - started
+                    return entry
+
+                if entry is None and (len(self._entries) < self.max_sessions or self._evict_lru_locked()):
+                    entry = PooledInterpreter(session_id)
+                    self._entries[session_id] = entry
+                    self._stats["misses"] += 1
+                    break
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        f"No code interpreter available for session {session_id} "
+                        f"after {self.acquire_timeout}s ({len(self._entries)}/{self.max_sessions} in use)"
+                    )
+                self._cond.wait(remaining)
+
+        # Start the interpreter outside the lock - this is the slow network call
+        try:
+            entry.client = self.factory()
+        except Exception:
+            with self._cond:
+                self._entries.pop(session_id, None)
+                self._cond.notify_all()
+            raise
+
+        entry.created_at = time.time()
+        with self._cond:
+            self._stats["cold_start_seconds"] += entry.created_at - started
+        print(f"🧊 Started interpreter for session {session_id} in {entry.created_at - started:.2f}s")
+        return entry
+
+    def _release(self, entry: PooledInterpreter):
+        with self._cond:
+            entry.in_use = False
+            entry.uses += 1
+            entry.last_used = time.time()
+            self._cond.notify_all()
+
+    def _discard(self, entry: PooledInterpreter, reason: str):
+        with self._cond:
+            if self._entries.get(entry.key) is entry:
+                del self._entries[entry.key]
+            self._stats[reason] += 1
+            self._cond.notify_all()
+        self._close(entry)
+
+    def _evict_expired_locked(self):
+        now = time.time()
+        expired = [entry for entry in self._entries.values()
+                   if not entry.in_use and now - entry.last_used > self.idle_ttl]
+        for entry in expired:
+            del self._entries[entry.key]
+            self._stats["evictions_ttl"] += 1
+            self._close_later(entry)
+
+    def _evict_lru_locked(self) -> bool:
+        for key, entry in self._entries.items():
+            if not entry.in_use:
+                del self._entries[key]
+                self._stats["evictions_lru"] += 1
+                self._close_later(entry)
+                return True
+        return False
+
+    def _close_later(self, entry: PooledInterpreter):
+        # Stopping a remote session is a network call; keep it off the lock holder's path
+        threading.Thread(target=self._close, args=(entry,), daemon=True).start()
+
+    def _close(self, entry: PooledInterpreter):
+        for listener in self.evict_listeners:
+            try:
+                listener(entry.key, entry.client)
+            except Exception as e:
+                print(f"⚠️  Interpreter evict listener failed: {e}")
+        if entry.client is None:
+            return
+        try:
+            self.closer(entry.client)
+            print(f"🗑️ Stopped interpreter for session {entry.key} after {entry.uses} uses")
+        except Exception as e:
+            print(f"⚠️  Failed to stop interpreter for session {entry.key}: {e}")
+
+    def evict(self, session_id: str) -> bool:
+        """Stop and forget the interpreter for ``session_id`` if it is idle"""
+        with self._cond:
+            entry = self._entries.get(session_id)
+            if entry is None or entry.in_use:
+                return False
+            del self._entries[session_id]
+            self._cond.notify_all()
+        self._close(entry)
+        return True
+
+    def evict_idle(self):
+        """Evict every interpreter that has been idle longer than ``idle_ttl``"""
+        with self._cond:
+            self._evict_expired_locked()
+            self._cond.notify_all()
+
+    def start_reaper(self, interval: float = 60):
+        """Run evict_idle periodically on a daemon thread"""
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while not self._stop_reaper.wait(interval):
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=reap, name="interpreter-pool-reaper", daemon=True)
+        self._reaper.start()
+
+    def close_all(self):
+        """Stop every pooled interpreter, e.g. on application shutdown"""
+        self._stop_reaper.set()
+        with self._cond:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._cond.notify_all()
+        for entry in entries:
+            self._close(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["active"] = len(self._entries)
+            stats["in_use"] = sum(1 for entry in self._entries.values() if entry.in_use)
+        lookups = stats["hits"] + stats["misses"]
+        stats["max_sessions"] = self.max_sessions
+        stats["idle_ttl"] = self.idle_ttl
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["avg_cold_start_ms"] = round(1000 * stats.pop("cold_start_seconds") / stats["misses"], 2) if stats["misses"] else 0.0
+        stats["avg_warm_acquire_ms"] = round(1000 * stats.pop("warm_acquire_seconds") / stats["hits"], 2) if stats["hits"] else 0.0
+        return stats
+
+
+if __name__ == "__main__":
+    # Offline pool benchmark against the fake interpreter: hit rate, eviction and warm-vs-cold latency
+    import random
+    from FakeCodeInterpreter import FakeCodeInterpreter
+
+    def fake_factory():
+        client = FakeCodeInterpreter(start_latency=0.05)
+        client.start()
+        return client
+
+    pool = CodeInterpreterPool(fake_factory, max_sessions=8, idle_ttl=0.5)
+    sessions = [f"session-{i}" for i in range(12)]
+    random.seed(7)
+
+    def run(session_id):
+        started = time.time()
+        with pool.lease(session_id) as client:
+            client.invoke("executeCode", {"code": "x = globals().get('x', 0) + 1", "language": "python"})
+        return time.time() - started
+
+    cold, warm = [], []
+    for i in range(200):
+        # Skewed access pattern: a few hot sessions, a long tail of cold ones
+        session_id = sessions[min(int(random.expovariate(0.5)), len(sessions) - 1)]
+        before = pool.stats()["misses"]
+        elapsed = run(session_id)
+        (cold if pool.stats()["misses"] > before else warm).append(elapsed)
+
+    threads = [threading.Thread(target=run, args=(s,)) for s in sessions for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    time.sleep(0.6)
+    pool.evict_idle()
+
+    print("\n📊 CodeInterpreterPool benchmark (fake interpreter, 50ms start)")
+    print(f"   cold executions: {len(cold)}  avg {1000 * sum(cold) / max(len(cold), 1):.1f} ms")
+    print(f"   warm executions: {len(warm)}  avg {1000 * sum(warm) / max(len(warm), 1):.1f} ms")
+    for key, value in pool.stats().items():
+        print(f"   {key}: {value}")
+    pool.close_all()
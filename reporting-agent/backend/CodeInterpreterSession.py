@@ -0,0 +1,76 @@
+from typing import Any, Dict
+
+from DatasetCatalog import DatasetCatalog
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate payload bytes held by a JSON-like value (strings dominate; no copies made)"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(str(key)) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(item) for item in value)
+    return 8
+
+
+class CodeInterpreterSession:
+    """State of one application session: history, results and the uploaded datasets"""
+
+    # History lists trimmed oldest-first when a session exceeds its byte budget
+    TRIMMABLE = ("execution_results", "code_history", "conversation_history")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.conversation_history = []
+        self.code_history = []
+        self.execution_results = []
+        self.interactive_sessions = {}  # Track interactive execution sessions
+        self.datasets = DatasetCatalog()  # Uploaded CSV files, by id, filename and content hash
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "conversation_history": self.conversation_history,
+            "code_history": self.code_history,
+            "execution_results": self.execution_results,
+            "interactive_sessions": self.interactive_sessions,
+            "datasets": self.datasets.to_list()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CodeInterpreterSession":
+        session = cls(data["session_id"])
+        session.conversation_history = data.get("conversation_history", [])
+        session.code_history = data.get("code_history", [])
+        session.execution_results = data.get("execution_results", [])
+        session.interactive_sessions = data.get("interactive_sessions", {})
+        if "datasets" in data:
+            session.datasets = DatasetCatalog.from_list(data["datasets"])
+        else:
+            session.datasets = DatasetCatalog.from_legacy(data.get("uploaded_csv"))
+        return session
+
+    def estimate_bytes(self) -> int:
+        return estimate_size(self.to_dict())
+
+    def trim_to(self, max_bytes: int) -> int:
+        """Drop the oldest history entries until the session fits ``max_bytes``; returns entries dropped.
+
+        The newest entry of each history list is always kept, so a session whose
+        datasets alone exceed the budget keeps its latest turn instead of losing
+        its whole history.
+        """
+        size = self.estimate_bytes()
+        sizes = {name: estimate_size(getattr(self, name)) for name in self.TRIMMABLE}
+        dropped = 0
+        while size > max_bytes:
+            # Trim whichever history list currently holds the most bytes
+            name = max((name for name in self.TRIMMABLE if len(getattr(self, name)) > 1), key=sizes.get, default=None)
+            if name is None:
+                break
+            removed = estimate_size(getattr(self, name).pop(0))
+            sizes[name] -= removed
+            size -= removed
+            dropped += 1
+        return dropped
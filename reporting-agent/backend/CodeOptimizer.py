@@ -0,0 +1,394 @@
+import ast
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+# Speedup of the vectorized form over the row-wise idiom on 1M rows (pandas 3, pyarrow-backed strings;
+# see the benchmark below). Object-dtype string columns gain less from the .str rewrites.
+SPEEDUPS = {
+    "apply_str": 20,
+    "apply_len": 20,
+    "apply_arithmetic": 100,
+    "iterrows": 1000,
+    "apply_axis1": 50,
+    "repeated_read": 2,
+    "append_in_loop": 100,
+}
+
+# One line per idiom for the generator prompt, so it stops emitting what we keep rewriting
+HINTS = {
+    "apply_str": "use the .str accessor (df['c'].str[:3], df['c'].str.lower()) instead of apply(lambda x: x[:3]) or apply(lambda x: x.lower())",
+    "apply_len": "use df['c'].str.len() instead of apply(len)",
+    "apply_arithmetic": "use column arithmetic (df['c'] * 2) instead of apply(lambda x: x * 2)",
+    "iterrows": "never loop with iterrows(); use vectorized column expressions, groupby or merge",
+    "apply_axis1": "avoid apply(..., axis=1); combine columns with vectorized expressions or np.where",
+    "repeated_read": "read each file once and reuse the DataFrame (call .copy() before modifying it)",
+    "append_in_loop": "don't grow a DataFrame inside a loop; collect rows in a list and build the DataFrame once",
+}
+
+# str methods and the positional argument counts at which their pandas .str equivalents behave the same element by
+# element - the signatures part ways after that (str.split's maxsplit is keyword-only n, str.startswith's start is na)
+STR_METHODS = {
+    **{method: {0} for method in ("upper", "lower", "title", "capitalize", "casefold", "swapcase", "isdigit", "isalpha",
+                                  "isalnum", "isnumeric", "isdecimal", "isspace", "islower", "isupper", "istitle")},
+    "strip": {0, 1}, "lstrip": {0, 1}, "rstrip": {0, 1},
+    "startswith": {1}, "endswith": {1},
+    "replace": {2},
+    "split": {0, 1}, "rsplit": {0, 1},
+    "zfill": {1}, "center": {1, 2}, "ljust": {1, 2}, "rjust": {1, 2},
+    "find": {1, 2, 3}, "rfind": {1, 2, 3},
+}
+# Operators that raise on some constant operands in Python but return inf/nan or wrap in numpy
+DIVISION = (ast.Div, ast.FloorDiv, ast.Mod)
+ARITHMETIC = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.FloorDiv: "//", ast.Mod: "%", ast.Pow: "**"}
+# Subscripting these gives group-wise objects, whose apply receives whole groups rather than elements
+GROUPING = {"groupby", "rolling", "expanding", "ewm", "resample"}
+READERS = {"read_csv", "read_excel", "read_json", "read_parquet", "read_feather", "read_table"}
+
+
+class Rewrite:
+    def __init__(self, node: ast.AST, start: int, end: int, text: str, pattern: str):
+        self.node = node
+        self.start = start
+        self.end = end
+        self.text = text
+        self.pattern = pattern
+
+
+class CodeScanner(ast.NodeVisitor):
+    """Finds row-wise pandas idioms in one piece of code; rewrites are byte ranges of the source"""
+
+    def __init__(self, source: bytes):
+        self.source = source
+        self.line_starts = [0]
+        for line in source.splitlines(keepends=True):
+            self.line_starts.append(self.line_starts[-1] + len(line))
+        self.rewrites: List[Rewrite] = []
+        self.warnings: List[Dict[str, Any]] = []
+        self.reads: Dict[str, int] = {}
+        self.loop_depth = 0
+
+    def offsets(self, node: ast.AST) -> Tuple[int, int]:
+        return (self.line_starts[node.lineno - 1] + node.col_offset,
+                self.line_starts[node.end_lineno - 1] + node.end_col_offset)
+
+    def text(self, node: ast.AST) -> str:
+        """Source of ``node`` with the rewrites already found inside it applied"""
+        start, end = self.offsets(node)
+        inner = sorted((rewrite for rewrite in self.rewrites if start <= rewrite.start and rewrite.end <= end),
+                       key=lambda rewrite: rewrite.start)
+        parts, position = [], start
+        for rewrite in inner:
+            parts.append(self.source[position:rewrite.start])
+            parts.append(rewrite.text.encode("utf-8"))
+            position = rewrite.end
+        parts.append(self.source[position:end])
+        return b"".join(parts).decode("utf-8")
+
+    def warn(self, node: ast.AST, pattern: str, message: str):
+        self.warnings.append({"line": node.lineno, "pattern": pattern, "message": message,
+                              "estimated_speedup": SPEEDUPS[pattern]})
+
+    def visit_For(self, node):
+        self.visit(node.iter)
+        self.loop_depth += 1
+        for child in node.body + node.orelse:
+            self.visit(child)
+        self.loop_depth -= 1
+
+    visit_AsyncFor = visit_For
+
+    def visit_While(self, node):
+        self.loop_depth += 1
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    def visit_Assign(self, node):
+        self.generic_visit(node)
+        if self.loop_depth and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            value = node.value
+            if isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute):
+                grows = (value.func.attr == "append" and isinstance(value.func.value, ast.Name)
+                         and value.func.value.id == name)
+                grows = grows or (value.func.attr == "concat" and value.args and isinstance(value.args[0], (ast.List, ast.Tuple))
+                                  and any(isinstance(item, ast.Name) and item.id == name for item in value.args[0].elts))
+                if grows:
+                    self.warn(node, "append_in_loop", f"'{name}' is copied on every loop iteration "
+                                                      "(quadratic); collect rows in a list and build it once")
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.func, ast.Attribute):
+            return
+        method = node.func.attr
+        if method == "iterrows":
+            self.warn(node, "iterrows", "iterrows() builds a Series per row; use vectorized column expressions")
+        elif method in READERS:
+            key = ast.dump(ast.Tuple(elts=node.args, ctx=ast.Load())) + ast.dump(ast.List(elts=[
+                ast.Tuple(elts=[ast.Constant(keyword.arg), keyword.value], ctx=ast.Load()) for keyword in node.keywords], ctx=ast.Load()))
+            if key in self.reads:
+                self.warn(node, "repeated_read", f"{method}({self.text(node.args[0]) if node.args else ''}) reads the same "
+                                                 f"file again (first read on line {self.reads[key]}); reuse that DataFrame")
+            else:
+                self.reads[key] = node.lineno
+        elif method in ("apply", "map"):
+            if any(keyword.arg == "axis" and isinstance(keyword.value, ast.Constant) and keyword.value.value in (1, "columns")
+                   for keyword in node.keywords):
+                self.warn(node, "apply_axis1", "apply(axis=1) calls Python once per row; combine columns with vectorized expressions")
+                return
+            if len(node.args) == 1 and not node.keywords and self.series_like(node.func.value):
+                self.rewrite_apply(node, node.func.value, node.args[0])
+
+    @staticmethod
+    def series_like(node: ast.AST) -> bool:
+        """Receivers we can be sure are a Series: df['col'], and conversions or str methods applied to one"""
+        if isinstance(node, ast.Subscript):
+            grouped = any(isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute) and child.func.attr in GROUPING
+                          for child in ast.walk(node.value))
+            return isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str) and not grouped
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            receiver = node.func.value
+            if isinstance(receiver, ast.Attribute) and receiver.attr == "str":
+                receiver = receiver.value
+            return node.func.attr in ("astype", "apply", "map", *STR_METHODS) and CodeScanner.series_like(receiver)
+        return False
+
+    def rewrite_apply(self, node: ast.Call, receiver: ast.AST, function: ast.AST):
+        if isinstance(function, ast.Name) and function.id == "len":
+            suffix, pattern = ".str.len()", "apply_len"
+        elif isinstance(function, ast.Lambda) and len(function.args.args) == 1 and not (
+                function.args.vararg or function.args.kwarg or function.args.kwonlyargs or function.args.defaults):
+            argument = function.args.args[0].arg
+            body = function.body
+            if isinstance(body, ast.BinOp) and type(body.op) in ARITHMETIC:
+                left, right = self.vectorize(body.left, argument), self.vectorize(body.right, argument)
+                constant_left, constant_right = self.constant(body.left, argument), self.constant(body.right, argument)
+                if left is not None and constant_right and self.safe_arithmetic(body.op, True, body.right):
+                    text = f"({self.text(receiver)}{left[0]} {ARITHMETIC[type(body.op)]} {self.text(body.right)})"
+                elif right is not None and constant_left and self.safe_arithmetic(body.op, False, body.left):
+                    text = f"({self.text(body.left)} {ARITHMETIC[type(body.op)]} {self.text(receiver)}{right[0]})"
+                else:
+                    return
+                self.replace(node, text, "apply_arithmetic")
+                return
+            vectorized = self.vectorize(body, argument)
+            if not vectorized or not vectorized[0]:
+                return
+            suffix, pattern = vectorized
+        else:
+            return
+        self.replace(node, self.text(receiver) + suffix, pattern)
+
+    def vectorize(self, node: ast.AST, argument: str) -> Optional[Tuple[str, str]]:
+        """(accessor suffix, pattern) computing ``node`` for a whole Series, where ``argument`` is one element"""
+        if isinstance(node, ast.Name) and node.id == argument:
+            return "", "apply_str"
+        if isinstance(node, ast.Subscript):
+            inner = self.vectorize(node.value, argument)
+            if inner is not None and self.constant(node.slice, argument):
+                return f"{inner[0]}.str[{self.text(node.slice)}]", "apply_str"
+        # Keyword names differ between str methods and their .str versions (count vs n), so only positional calls
+        if isinstance(node, ast.Call) and not node.keywords:
+            if isinstance(node.func, ast.Name) and node.func.id == "len" and len(node.args) == 1:
+                inner = self.vectorize(node.args[0], argument)
+                if inner is not None:
+                    return f"{inner[0]}.str.len()", "apply_len"
+            elif isinstance(node.func, ast.Attribute) and len(node.args) in STR_METHODS.get(node.func.attr, ()) \
+                    and all(self.constant(arg, argument) for arg in node.args) and self.same_str_call(node):
+                inner = self.vectorize(node.func.value, argument)
+                if inner is not None:
+                    arguments = [self.text(arg) for arg in node.args]
+                    if node.func.attr == "replace":
+                        # .str.replace matched regexes by default before pandas 2
+                        arguments.append("regex=False")
+                    return f"{inner[0]}.str.{node.func.attr}({', '.join(arguments)})", "apply_str"
+        return None
+
+    @staticmethod
+    def same_str_call(node: ast.Call) -> bool:
+        """Whether the allowed-arity call also takes arguments the .str method treats the same way"""
+        method, args = node.func.attr, node.args
+        literals = [arg.value if isinstance(arg, ast.Constant) else None for arg in args]
+        if method in ("startswith", "endswith", "replace", "rsplit") or (method in ("strip", "lstrip", "rstrip") and args):
+            return all(isinstance(value, str) for value in literals)
+        if method == "split" and args:
+            # .str.split reads a separator longer than one character as a regex
+            return isinstance(literals[0], str) and len(literals[0]) == 1
+        if method in ("zfill", "center", "ljust", "rjust"):
+            return isinstance(literals[0], int) and all(isinstance(value, str) and len(value) == 1 for value in literals[1:])
+        if method in ("find", "rfind"):
+            return isinstance(literals[0], str) and all(isinstance(value, int) for value in literals[1:])
+        return True
+
+    @staticmethod
+    def safe_arithmetic(op: ast.operator, element_left: bool, operand: ast.AST) -> bool:
+        """Whether ``element op constant`` (or ``constant op element``) vectorizes without changing what happens,
+        i.e. no division by zero or negative integer power that Python raises on and numpy doesn't"""
+        value = operand.value if isinstance(operand, ast.Constant) else None
+        if isinstance(operand, ast.UnaryOp) and isinstance(operand.op, ast.USub) and isinstance(operand.operand, ast.Constant):
+            value = -operand.operand.value if isinstance(operand.operand.value, (int, float)) else None
+        if isinstance(op, DIVISION) or isinstance(op, ast.Pow):
+            if not element_left or isinstance(value, bool) or not isinstance(value, (int, float)):
+                return False
+            return value != 0 if isinstance(op, DIVISION) else value >= 0
+        return True
+
+    @staticmethod
+    def constant(node: ast.AST, argument: str) -> bool:
+        """Whether ``node`` is a literal expression, so it can't depend on the lambda's ``argument``"""
+        return all(isinstance(child, (ast.Constant, ast.Slice, ast.Tuple, ast.UnaryOp, ast.unaryop, ast.expr_context))
+                   for child in ast.walk(node))
+
+    def replace(self, node: ast.AST, text: str, pattern: str):
+        start, end = self.offsets(node)
+        # A rewrite of an enclosing call already includes the ones inside it
+        self.rewrites = [rewrite for rewrite in self.rewrites if not (start <= rewrite.start and rewrite.end <= end)]
+        self.rewrites.append(Rewrite(node, start, end, text, pattern))
+
+
+class CodeOptimizer:
+    """Static pass over code about to run that finds row-wise pandas idioms.
+
+    ``Series.apply``/``map`` with ``len`` or a simple lambda (slicing,
+    indexing, str methods, arithmetic with constants) is rewritten into the
+    vectorized ``.str`` accessor or column arithmetic, when the receiver is
+    clearly a Series (``df['col']``). ``iterrows``, ``apply(axis=1)``,
+    reading the same file twice and growing a DataFrame inside a loop are
+    flagged but left alone, since rewriting them needs the surrounding logic.
+    With ``rewrite=False`` rewrites are only reported. Every finding is
+    counted so ``prompt_hints`` can steer the generator away from the idioms
+    it keeps emitting.
+    """
+
+    def __init__(self, rewrite: bool = True, max_hints: int = 4):
+        self.rewrite = rewrite
+        self.max_hints = max_hints
+        self.patterns = Counter()
+        self._lock = threading.Lock()
+        self._stats = {"analyzed": 0, "rewritten": 0, "rewrites": 0, "warnings": 0, "syntax_errors": 0}
+
+    def analyze(self, code: str) -> Dict[str, Any]:
+        """Returns {code, rewrites, warnings, estimated_speedup}; ``code`` is the rewritten code when rewriting is on"""
+        report = {"code": code, "rewritten": False, "rewrites": [], "warnings": [], "estimated_speedup": 1}
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            with self._lock:
+                self._stats["syntax_errors"] += 1
+            return report
+
+        source = code.encode("utf-8")
+        scanner = CodeScanner(source)
+        scanner.visit(tree)
+        rewrites = sorted(scanner.rewrites, key=lambda rewrite: rewrite.start)
+        for rewrite in rewrites:
+            report["rewrites"].append({
+                "line": rewrite.node.lineno,
+                "pattern": rewrite.pattern,
+                "original": source[rewrite.start:rewrite.end].decode("utf-8"),
+                "replacement": rewrite.text,
+                "estimated_speedup": SPEEDUPS[rewrite.pattern]
+            })
+        report["warnings"] = sorted(scanner.warnings, key=lambda warning: warning["line"])
+
+        if self.rewrite and rewrites:
+            parts, position = [], 0
+            for rewrite in rewrites:
+                parts += [source[position:rewrite.start], rewrite.text.encode("utf-8")]
+                position = rewrite.end
+            rewritten = (b"".join(parts) + source[position:]).decode("utf-8")
+            try:
+                ast.parse(rewritten)
+                report["code"], report["rewritten"] = rewritten, True
+            except SyntaxError:
+                with self._lock:
+                    self._stats["syntax_errors"] += 1
+
+        findings = report["rewrites"] + report["warnings"]
+        report["estimated_speedup"] = max((finding["estimated_speedup"] for finding in findings), default=1)
+        with self._lock:
+            self._stats["analyzed"] += 1
+            self._stats["rewritten"] += report["rewritten"]
+            self._stats["rewrites"] += len(report["rewrites"])
+            self._stats["warnings"] += len(report["warnings"])
+            self.patterns.update(finding["pattern"] for finding in findings)
+        return report
+
+    @staticmethod
+    def summary(report: Dict[str, Any]) -> str:
+        """One line for logs and responses"""
+        findings = report["rewrites"] + report["warnings"]
+        if not findings:
+            return "no row-wise pandas idioms found"
+        parts = []
+        if report["rewrites"]:
+            parts.append(f"{'rewrote' if report['rewritten'] else 'found'} {len(report['rewrites'])} row-wise idiom(s)")
+        if report["warnings"]:
+            parts.append(f"flagged {len(report['warnings'])} for a manual rewrite")
+        lines = sorted({finding["line"] for finding in findings})
+        return f"{', '.join(parts)} (lines {', '.join(map(str, lines))}); up to ~{report['estimated_speedup']}x faster"
+
+    def prompt_hints(self) -> str:
+        """Guidance for the generator about the idioms found most often in code it produced"""
+        with self._lock:
+            common = [pattern for pattern, _ in self.patterns.most_common(self.max_hints)]
+        if not common:
+            return ""
+        return "For performance on large data:\n" + "\n".join(f"- {HINTS[pattern]}" for pattern in common)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["patterns"] = dict(self.patterns)
+        stats["rewrite"] = self.rewrite
+        return stats
+
+
+if __name__ == "__main__":
+    # Benchmark: measure each rewrite's speedup on 1M rows, then optimize a.py
+    import os
+    import time
+
+    import numpy as np
+    import pandas as pd
+
+    rows = 1_000_000
+    rng = np.random.default_rng(3)
+    ids = pd.Series(np.char.add(np.char.add("AWS", rng.integers(10 ** 8, 10 ** 9, rows).astype(str)), "S"))
+    numbers = pd.Series(rng.integers(0, 1000, rows))
+
+    def best(function, repeat: int = 3) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    print(f"\n⚡ CodeOptimizer benchmark ({rows:,} rows, pandas {pd.__version__}, string dtype {ids.dtype})")
+    print(f"   {'idiom':<44} {'row-wise':>9} {'vectorized':>11} {'speedup':>8}")
+    optimizer = CodeOptimizer()
+    for code in ("ids.apply(lambda x: x[:3])", "ids.apply(lambda x: x[-1])", "ids.apply(len)",
+                 "ids.apply(lambda x: x.lower().startswith('aws1'))", "numbers.apply(lambda x: x * 2)"):
+        rewritten = optimizer.analyze(code.replace("ids.", "df['ids'].").replace("numbers.", "df['numbers']."))["code"]
+        rewritten = rewritten.replace("df['ids']", "ids").replace("df['numbers']", "numbers")
+        slow, fast = best(lambda: eval(code)), best(lambda: eval(rewritten))
+        print(f"   {code:<44} {slow * 1000:7.0f}ms {fast * 1000:9.0f}ms {slow / fast:7.0f}x  -> {rewritten}")
+
+    frame = pd.DataFrame({"a": numbers[:100_000], "b": numbers[:100_000]})
+    slow = best(lambda: [row["a"] + row["b"] for _, row in frame.iterrows()], 1)
+    fast = best(lambda: frame["a"] + frame["b"])
+    print(f"   {'iterrows() over 100k rows':<44} {slow * 1000:7.0f}ms {fast * 1000:9.1f}ms {slow / fast:7.0f}x")
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "a.py")
+    with open(path) as f:
+        source = f.read()
+    started = time.perf_counter()
+    report = optimizer.analyze(source)
+    print(f"\n   a.py: {CodeOptimizer.summary(report)} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    for finding in report["rewrites"]:
+        print(f"     line {finding['line']}: {finding['original']}  ->  {finding['replacement']}")
+    for finding in report["warnings"]:
+        print(f"     line {finding['line']}: {finding['message']}")
+    print(f"\n   Prompt hints:\n{optimizer.prompt_hints()}")
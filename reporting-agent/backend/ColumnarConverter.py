@@ -0,0 +1,194 @@
+import hashlib
+import os
+import time
+from typing import Any, Dict, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+COLUMNAR_SUFFIX = ".feather"
+# An integer written with a leading zero is an identifier or code; as a number it would lose the zeros
+LEADING_ZERO = r"^[+-]?0[0-9]"
+
+
+def columnar_filename(csv_filename: str) -> str:
+    """Name of the columnar copy next to the CSV in the sandbox, e.g. sales.csv -> sales.feather"""
+    return os.path.splitext(csv_filename)[0] + COLUMNAR_SUFFIX
+
+
+class LeadingZeros(Exception):
+    def __init__(self, column: str):
+        super().__init__(f"column '{column}' has values with leading zeros")
+        self.column = column
+
+
+class ColumnarConverter:
+    """Converts uploaded CSVs once into uncompressed Feather v2 (Arrow IPC) files.
+
+    The CSV is streamed through pyarrow's block reader and written batch by
+    batch, so memory stays bounded. Column types come from the dataset profile
+    of the whole file, so a column that looks numeric in its first block can't
+    break the conversion later on. Integer columns are parsed as text first:
+    one with leading zeros anywhere is kept as text, one with blanks becomes
+    float64 as ``pd.read_csv`` reads it, so the copy never holds a value the
+    CSV doesn't. A malformed row fails the conversion and sessions keep
+    using the CSV rather than a copy with rows missing. The output is uncompressed, which lets
+    ``pyarrow.feather.read_table(path, memory_map=True)`` map it rather than
+    parse it. pyarrow is optional: without it ``available`` is False and
+    sessions keep using the CSV.
+    """
+
+    def __init__(self, block_size: int = 16 * 1024 * 1024):
+        self.block_size = block_size
+        self.available = pa is not None
+        self._stats = {"converted": 0, "failed": 0, "csv_bytes": 0, "columnar_bytes": 0, "convert_seconds": 0.0}
+        if not self.available:
+            print("⚠️  pyarrow not installed - uploaded CSVs won't get a columnar copy")
+
+    def schema_types(self, profile: Dict[str, Any], text_columns=()) -> Dict[str, Any]:
+        """Arrow column types for the dtypes the profiler inferred"""
+        types = {}
+        for column in profile["columns"]:
+            dtype = column["dtype"]
+            if column["name"] in text_columns:
+                types[column["name"]] = pa.string()
+            elif dtype == "int":
+                types[column["name"]] = pa.float64() if column["nulls"] else pa.int64()
+            elif dtype == "float":
+                types[column["name"]] = pa.float64()
+            elif dtype == "bool":
+                types[column["name"]] = pa.bool_()
+            elif dtype == "datetime":
+                has_offset = str(column.get("min", "")).endswith(("Z", "+00:00")) or "+" in str(column.get("min", ""))[10:]
+                types[column["name"]] = pa.timestamp("ns", tz="UTC" if has_offset else None)
+            else:
+                types[column["name"]] = pa.string()
+        return types
+
+    def convert(self, csv_path: str, profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Write ``<csv>.feather`` next to the CSV; returns its file reference, or None if conversion failed"""
+        if not self.available:
+            return None
+        started = time.time()
+        target = os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+        text_columns = set()
+        try:
+            while True:
+                try:
+                    self._write(csv_path, target, profile, text_columns)
+                    break
+                except LeadingZeros as e:
+                    # Rare, and the schema is fixed once writing starts - redo the file with the column as text
+                    print(f"🧱 Keeping {e.column} of {os.path.basename(csv_path)} as text: it has leading zeros")
+                    text_columns.add(e.column)
+        except (pa.ArrowException, OSError, ValueError) as e:
+            self._stats["failed"] += 1
+            print(f"⚠️  Columnar conversion of {csv_path} failed: {e}")
+            if os.path.exists(target):
+                os.remove(target)
+            return None
+
+        digest = hashlib.sha256()
+        with open(target, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        elapsed = time.time() - started
+        size = os.path.getsize(target)
+        self._stats["converted"] += 1
+        self._stats["csv_bytes"] += os.path.getsize(csv_path)
+        self._stats["columnar_bytes"] += size
+        self._stats["convert_seconds"] += elapsed
+        print(f"🧱 Converted {os.path.basename(csv_path)} to Feather in {elapsed:.2f}s ({size} bytes)")
+        return {
+            "filename": columnar_filename(profile["filename"]),
+            "path": target,
+            "size": size,
+            "sha256": digest.hexdigest(),
+            "format": "feather",
+            "binary": True
+        }
+
+    def _write(self, csv_path: str, target: str, profile: Dict[str, Any], text_columns: set):
+        types = self.schema_types(profile, text_columns)
+        # Integer columns are read as text and cast per batch once they are known to hold no leading zeros
+        numeric = {column["name"]: types[column["name"]] for column in profile["columns"]
+                   if column["dtype"] == "int" and column["name"] not in text_columns}
+        reader = pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=self.block_size),
+            parse_options=pa_csv.ParseOptions(delimiter=profile["delimiter"]),
+            convert_options=pa_csv.ConvertOptions(column_types={**types, **{name: pa.string() for name in numeric}},
+                                                  strings_can_be_null=True)
+        )
+        schema = pa.schema([field.with_type(numeric.get(field.name, field.type)) for field in reader.schema])
+        with pa_ipc.new_file(target, schema) as writer:
+            for batch in reader:
+                arrays = []
+                for field, array in zip(batch.schema, batch.columns):
+                    if field.name in numeric:
+                        if pc.any(pc.match_substring_regex(array, LEADING_ZERO)).as_py():
+                            raise LeadingZeros(field.name)
+                        array = pc.cast(array, numeric[field.name])
+                    arrays.append(array)
+                writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["available"] = self.available
+        stats["convert_seconds"] = round(stats["convert_seconds"], 3)
+        return stats
+
+
+if __name__ == "__main__":
+    # Benchmark: loading a dataset from CSV vs the Feather copy (read, and memory-mapped)
+    import sys
+    import tempfile
+    import pandas as pd
+    import pyarrow.feather as feather
+    from DatasetProfiler import DatasetProfiler
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    directory = tempfile.mkdtemp(prefix="columnar_bench_")
+    csv_path = os.path.join(directory, "orders.csv")
+    rows = size_mb * 1024 * 1024 // 72
+    print(f"\n📊 ColumnarConverter benchmark: {size_mb} MB CSV, ~{rows:,} rows")
+    import numpy as np
+    rng = np.random.default_rng(3)
+    frame = pd.DataFrame({
+        "order_id": np.arange(rows),
+        "order_date": pd.to_datetime("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, rows), unit="D"),
+        "region": rng.choice(["North", "South", "East", "West"], rows),
+        "quantity": rng.integers(1, 50, rows),
+        "unit_price": rng.uniform(1, 500, rows).round(2),
+        "customer": pd.Series(rng.integers(1, 200000, rows)).map("user{}@example.com".format)
+    })
+    frame.to_csv(csv_path, index=False)
+    del frame
+
+    file_info = {"filename": "orders.csv", "path": csv_path, "size": os.path.getsize(csv_path), "sha256": "bench"}
+    started = time.time()
+    profile = DatasetProfiler().profile_file(file_info)
+    profile_seconds = time.time() - started
+    converter = ColumnarConverter()
+    started = time.time()
+    columnar = converter.convert(csv_path, profile)
+    convert_seconds = time.time() - started
+
+    def timed(label, load):
+        started = time.time()
+        result = load()
+        print(f"   {label:<48} {time.time() - started:>7.2f} s  ({len(result):,} rows)")
+
+    print(f"   one-off at upload: profile {profile_seconds:.1f} s, convert {convert_seconds:.1f} s, "
+          f"{file_info['size'] / 1e6:.0f} MB CSV -> {columnar['size'] / 1e6:.0f} MB Feather")
+    timed("pd.read_csv(csv)", lambda: pd.read_csv(csv_path))
+    timed("pd.read_feather(feather)", lambda: pd.read_feather(columnar["path"]))
+    timed("feather.read_table(memory_map=True)", lambda: feather.read_table(columnar["path"], memory_map=True))
+    timed("feather.read_table(memory_map=True).to_pandas()",
+          lambda: feather.read_table(columnar["path"], memory_map=True).to_pandas())
+    print(f"   {converter.stats()}")
@@ -70,44 +70,6 @@ class CoreAgentRuntime:
         
         return final_answer
 
-    def process_event(self, event):
-        result = event.get("result", {})
-                    
-        if result.get("isError", False):
-            error_content = result.get("content", [{}])
-            error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-            print(f"❌ Direct execution error: {error_text}")
-            return f"Error: {error_text}", []
-                    
-        # Extract structured content
-        structured_content = result.get("structuredContent", {})
-        stdout = structured_content.get("stdout", "")
-        stderr = structured_content.get("stderr", "")
-                    
-        if stdout:
-            output_parts.append(stdout)
-            full_stdout += stdout
-            print(f"📤 Direct stdout captured: {len(stdout)} characters")
-        if stderr:
-            output_parts.append(f"Errors: {stderr}")
-            print(f"⚠️  Direct stderr: {stderr}")
-            
-        # Combine output
-        final_output = "\n".join(output_parts) if output_parts else "Code executed successfully"
-                
-        # Extract images directly from full stdout
-        images = extract_image_data(full_stdout)
-                
-        # Clean the output for display (remove image binary but keep analysis text)
-        display_output = clean_output_for_display(final_output)
-                
-        print(f"✅ Direct execution completed:")
-        print(f"   Output length: {len(final_output)} :: {final_output}")
-        print(f"   Display output length: {len(display_output)}:: {display_output}")
-        print(f"   Images extracted: {len(images)}")
-                
-        return display_output, images
-
     def test(self):
         print("test.....Begin")
         print("=============================================================")
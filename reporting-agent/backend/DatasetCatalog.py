@@ -0,0 +1,148 @@
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Code that picks its files at run time, so which datasets it reads can't be told from its text
+DYNAMIC_FILE_ACCESS = re.compile(
+    r"\b(os\.listdir|os\.scandir|os\.walk|glob\.glob|glob\.iglob|iterdir|rglob)\b|\.glob\(|"
+    r"\b(read_csv|read_feather|read_parquet|read_table|read_excel|open)\(\s*[^'\"\s)]")
+
+
+class DatasetCatalog:
+    """The datasets uploaded to one session, indexed by id, filename and content hash.
+
+    Each entry is the upload's file reference (``filename``, ``sha256``,
+    ``size``, ``rows`` and ``path`` or inline ``content``) plus an ``id``, a
+    ``timestamp`` and, once prepared, its ``profile`` and ``columnar`` copy.
+    Entries are plain dicts so they serialize with the session. Uploading a
+    filename that is already in the catalog replaces that entry; any other
+    upload adds one, so a session can hold the several files a report joins.
+    """
+
+    def __init__(self, entries: Optional[List[Dict[str, Any]]] = None):
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._by_name: Dict[str, str] = {}
+        self._by_hash: Dict[str, str] = {}
+        for entry in entries or []:
+            self._index(entry)
+
+    def _index(self, entry: Dict[str, Any]):
+        self._entries[entry["id"]] = entry
+        self._by_name[entry["filename"]] = entry["id"]
+        if entry.get("sha256"):
+            self._by_hash[entry["sha256"]] = entry["id"]
+
+    def _unindex(self, entry: Dict[str, Any]):
+        self._entries.pop(entry["id"], None)
+        if self._by_name.get(entry["filename"]) == entry["id"]:
+            del self._by_name[entry["filename"]]
+        if entry.get("sha256") and self._by_hash.get(entry["sha256"]) == entry["id"]:
+            del self._by_hash[entry["sha256"]]
+            # Another file with the same content stays findable by hash
+            for other in self._entries.values():
+                if other.get("sha256") == entry["sha256"]:
+                    self._by_hash[entry["sha256"]] = other["id"]
+                    break
+
+    def add(self, file_ref: Dict[str, Any]) -> tuple:
+        """Catalog a completed upload; returns (entry, the entry it replaced or None)"""
+        replaced = self.by_name(file_ref["filename"])
+        if replaced is not None:
+            self._unindex(replaced)
+        entry = {**file_ref, "id": uuid.uuid4().hex[:12], "timestamp": time.time()}
+        self._index(entry)
+        return entry, replaced
+
+    def remove(self, key: str) -> Optional[Dict[str, Any]]:
+        """Drop the entry with this id, filename or hash; returns it, or None if there was none"""
+        entry = self.find(key)
+        if entry is not None:
+            self._unindex(entry)
+        return entry
+
+    def clear(self) -> List[Dict[str, Any]]:
+        entries = self.entries()
+        self.__init__()
+        return entries
+
+    def get(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(dataset_id)
+
+    def by_name(self, filename: str) -> Optional[Dict[str, Any]]:
+        dataset_id = self._by_name.get(filename)
+        return self._entries[dataset_id] if dataset_id else None
+
+    def by_hash(self, sha256: str) -> Optional[Dict[str, Any]]:
+        dataset_id = self._by_hash.get(sha256.lower())
+        return self._entries[dataset_id] if dataset_id else None
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entry by id, filename or sha256"""
+        return self.get(key) or self.by_name(key) or self.by_hash(key)
+
+    def contains(self, entry: Dict[str, Any]) -> bool:
+        """Whether ``entry`` is still cataloged, i.e. not removed or replaced by a newer upload"""
+        return self._entries.get(entry["id"]) is entry
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """All entries, oldest upload first"""
+        return list(self._entries.values())
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        return next(reversed(self._entries.values()), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def sandbox_names(entry: Dict[str, Any]) -> List[str]:
+        names = [entry["filename"]]
+        if entry.get("columnar"):
+            names.append(entry["columnar"]["filename"])
+        return names
+
+    def referenced(self, code: str) -> List[Dict[str, Any]]:
+        """Entries ``code`` reads: those whose file names appear in it, or all of them when it picks files at run time"""
+        found = [entry for entry in self._entries.values()
+                 if any(name in code for name in self.sandbox_names(entry))]
+        if len(found) < len(self._entries) and DYNAMIC_FILE_ACCESS.search(code):
+            return self.entries()
+        return found
+
+    def describe(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Catalog metadata of an entry for API responses - no file content or server paths"""
+        profile = entry.get("profile")
+        return {
+            "id": entry["id"],
+            "filename": entry["filename"],
+            "sha256": entry.get("sha256"),
+            "size": entry.get("size", len(entry.get("content", ""))),
+            "rows": profile["rows"] if profile else entry.get("rows"),
+            "columns": [(column["name"], column["dtype"]) for column in profile["columns"]] if profile else None,
+            "columnar": entry["columnar"]["filename"] if entry.get("columnar") else None,
+            "storage": "spool" if "path" in entry else "inline",
+            "timestamp": entry.get("timestamp")
+        }
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return self.entries()
+
+    @classmethod
+    def from_list(cls, entries: List[Dict[str, Any]]) -> "DatasetCatalog":
+        return cls(entries)
+
+    @classmethod
+    def from_legacy(cls, uploaded_csv: Optional[Dict[str, Any]]) -> "DatasetCatalog":
+        """Catalog for a session saved before catalogs, which held at most one ``uploaded_csv``"""
+        if not uploaded_csv:
+            return cls()
+        return cls([{**uploaded_csv, "id": uuid.uuid4().hex[:12]}])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "datasets": len(self._entries),
+            "bytes": sum(entry.get("size", 0) for entry in self._entries.values()),
+            "profiled": sum(1 for entry in self._entries.values() if entry.get("profile"))
+        }
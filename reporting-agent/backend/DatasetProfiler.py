@@ -0,0 +1,322 @@
+import csv
+import io
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+from SandboxFileSync import file_digest
+
+KIND_ORDER = {"bool": 0, "int": 1, "float": 2}
+ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:?\d{2})?$")
+
+
+class ColumnProfile:
+    """Running statistics for one column, merged chunk by chunk"""
+
+    def __init__(self, name: str, sketch_size: int, max_values: int, max_samples: int):
+        self.name = name
+        self.kind = None  # bool, int, float, datetime or string; None while every value seen is null
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.max_length = 0
+        self.samples: List[str] = []
+        self.values = set()  # every distinct value while there are at most max_values of them
+        self.sketch = np.empty(0, dtype=np.uint64)  # k smallest distinct value hashes
+        self.sketch_size = sketch_size
+        self.max_values = max_values
+        self.max_samples = max_samples
+
+    def update(self, series: pd.Series):
+        self.nulls += int(series.isna().sum())
+        raw = series.dropna()
+        if raw.empty:
+            return
+        kind, values = self._classify(raw)
+        self._merge_kind(kind)
+
+        if self.kind in KIND_ORDER or self.kind == "datetime":
+            low, high = values.min(), values.max()
+            self.min = low if self.min is None else min(self.min, low)
+            self.max = high if self.max is None else max(self.max, high)
+        else:
+            lengths = values.str.len() if pd.api.types.is_string_dtype(values) else values.astype(str).str.len()
+            self.max_length = max(self.max_length, int(lengths.max()))
+
+        hashes = np.unique(pd.util.hash_pandas_object(values, index=False).to_numpy())
+        self.sketch = np.union1d(self.sketch, hashes[:self.sketch_size])[:self.sketch_size]
+
+        if self.values is not None:
+            # Converting only the uniques to text keeps this cheap; columns with many values stop tracking at once
+            uniques = raw.unique()
+            self.values.update(str(value) for value in uniques[:self.max_values + 1])
+            if len(uniques) > self.max_values or len(self.values) > self.max_values:
+                self.values = None
+        if len(self.samples) < self.max_samples:
+            for value in raw.head(1000).unique():
+                if str(value) not in self.samples and len(self.samples) < self.max_samples:
+                    self.samples.append(str(value))
+
+    def _classify(self, values: pd.Series):
+        """Kind of one chunk's non-null values, plus the values converted to that kind"""
+        if self.kind == "string":
+            return "string", values
+        inferred = pd.api.types.infer_dtype(values, skipna=True)
+        if inferred == "boolean":
+            return "bool", values.astype(bool)
+        if inferred == "integer":
+            return "int", values.astype("int64")
+        if inferred in ("floating", "mixed-integer-float", "decimal"):
+            values = values.astype("float64")
+            # pandas reads an int column with blanks as float
+            return ("int" if np.all(np.mod(values.to_numpy(), 1) == 0) else "float"), values
+        if inferred in ("datetime64", "datetime", "date"):
+            return "datetime", pd.to_datetime(values)
+        if inferred == "string" and self.kind in (None, "datetime") and values.head(20).str.match(ISO_DATE).all():
+            try:
+                parsed = pd.to_datetime(values, errors="coerce", format="ISO8601")
+            except (ValueError, TypeError):
+                parsed = None  # e.g. mixed UTC offsets
+            if parsed is not None and parsed.notna().all():
+                return "datetime", parsed
+        return "string", values
+
+    def _merge_kind(self, kind: str):
+        if self.kind is None or self.kind == kind:
+            self.kind = kind
+            return
+        if self.kind in KIND_ORDER and kind in KIND_ORDER:
+            self.kind = max(self.kind, kind, key=KIND_ORDER.get)
+            return
+        # Incompatible chunks, e.g. numbers then text - it's a string column after all
+        self.kind = "string"
+        self.min = self.max = None
+
+    def distinct(self):
+        """Exact distinct count while the sketch isn't full, else a k-minimum-values estimate"""
+        if len(self.sketch) < self.sketch_size:
+            return len(self.sketch), False
+        kth = float(self.sketch[-1]) / 2.0 ** 64
+        return int((self.sketch_size - 1) / kth), True
+
+    def to_dict(self) -> Dict[str, Any]:
+        distinct, approximate = self.distinct()
+        profile = {
+            "name": self.name,
+            "dtype": self.kind or "empty",
+            "nulls": self.nulls,
+            "distinct": distinct,
+            "distinct_approximate": approximate,
+            "samples": self.samples
+        }
+        if self.min is not None:
+            profile["min"] = _plain(self.min)
+            profile["max"] = _plain(self.max)
+        if self.kind == "string":
+            profile["max_length"] = self.max_length
+        if self.values is not None and self.kind in ("string", "bool"):
+            profile["values"] = sorted(self.values)
+        return profile
+
+
+def _plain(value):
+    """JSON-friendly scalar from a numpy/pandas value"""
+    if isinstance(value, pd.Timestamp):
+        return value.date().isoformat() if value == value.normalize() and value.tz is None else value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class DatasetProfiler:
+    """Compact schema summaries of uploaded CSVs, computed once per file content.
+
+    The file is read in chunks of ``chunk_rows`` rows, so memory stays bounded
+    whatever its size. Each column gets its inferred dtype, null count, distinct
+    count (exact up to ``sketch_size``, estimated above), min/max, string
+    length and sample values. Profiles are cached by the file's sha256, and
+    concurrent requests for the same file wait for a single run.
+    """
+
+    def __init__(self, chunk_rows: int = 200_000, max_cached: int = 64,
+                 sketch_size: int = 1024, max_values: int = 20, max_samples: int = 5):
+        self.chunk_rows = chunk_rows
+        self.max_cached = max_cached
+        self.sketch_size = sketch_size
+        self.max_values = max_values
+        self.max_samples = max_samples
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stats = {"profiled": 0, "cache_hits": 0, "bytes_profiled": 0, "profile_seconds": 0.0}
+
+    def profile(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Profile a session file (``path`` or inline ``content``), reusing the cached result for the same content"""
+        key = file_digest(file_info)
+        while True:
+            with self._lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self._stats["cache_hits"] += 1
+                    return {**cached, "filename": file_info["filename"]}
+                waiting = self._inflight.get(key)
+                if waiting is None:
+                    done = self._inflight[key] = threading.Event()
+                    break
+            waiting.wait()
+
+        try:
+            profile = self.profile_file(file_info)
+            profile["sha256"] = key
+            with self._lock:
+                self._cache[key] = profile
+                while len(self._cache) > self.max_cached:
+                    self._cache.popitem(last=False)
+            return profile
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            done.set()
+
+    def profile_file(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Read the whole file chunk by chunk and build its profile (no caching)"""
+        started = time.time()
+        source = file_info["path"] if "path" in file_info else io.StringIO(file_info["content"])
+        delimiter = self.sniff_delimiter(file_info)
+
+        columns: List[ColumnProfile] = []
+        rows = 0
+        reader = pd.read_csv(source, sep=delimiter, chunksize=self.chunk_rows, on_bad_lines="skip",
+                             encoding_errors="replace", low_memory=False)
+        for chunk in reader:
+            if not columns:
+                columns = [ColumnProfile(str(name), self.sketch_size, self.max_values, self.max_samples)
+                           for name in chunk.columns]
+            rows += len(chunk)
+            for column, name in zip(columns, chunk.columns):
+                column.update(chunk[name])
+
+        size = file_info.get("size") or (len(file_info["content"]) if "content" in file_info else 0)
+        elapsed = time.time() - started
+        with self._lock:
+            self._stats["profiled"] += 1
+            self._stats["bytes_profiled"] += size
+            self._stats["profile_seconds"] += elapsed
+        print(f"🔬 Profiled {file_info['filename']}: {rows} rows x {len(columns)} columns in {elapsed:.2f}s")
+        return {
+            "filename": file_info["filename"],
+            "rows": rows,
+            "delimiter": delimiter,
+            "bytes": size,
+            "columns": [column.to_dict() for column in columns],
+            "profile_seconds": round(elapsed, 3)
+        }
+
+    @staticmethod
+    def sniff_delimiter(file_info: Dict[str, Any]) -> str:
+        if "content" in file_info:
+            sample = file_info["content"][:65536]
+        else:
+            with open(file_info["path"], "r", encoding="utf-8", errors="replace") as f:
+                sample = f.read(65536)
+        try:
+            return csv.Sniffer().sniff(sample.rsplit("\n", 1)[0], delimiters=",;\t|").delimiter
+        except csv.Error:
+            return ","
+
+    @staticmethod
+    def to_prompt(profile: Dict[str, Any]) -> str:
+        """Schema summary for the code generation prompt - one line per column"""
+        delimiter = {",": "comma", ";": "semicolon", "\t": "tab", "|": "pipe"}.get(profile["delimiter"], repr(profile["delimiter"]))
+        lines = [f"Dataset '{profile['filename']}': {profile['rows']:,} rows x {len(profile['columns'])} columns, "
+                 f"{delimiter}-delimited."
+                 + ("" if profile["delimiter"] == "," else f" Read it with sep={profile['delimiter']!r}."),
+                 "Columns (name: dtype; nulls; distinct; range or values; examples):"]
+        for column in profile["columns"]:
+            parts = [f"- {column['name']}: {column['dtype']}"]
+            if column["nulls"]:
+                parts.append(f"{column['nulls']:,} nulls")
+            parts.append(f"{'~' if column['distinct_approximate'] else ''}{column['distinct']:,} distinct")
+            if "values" in column:
+                parts.append("values " + ", ".join(column["values"]))
+            else:
+                if "min" in column:
+                    parts.append(f"{column['min']} to {column['max']}")
+                elif column["samples"]:
+                    parts.append("e.g. " + ", ".join(sample[:40] for sample in column["samples"][:3]))
+            lines.append("; ".join(parts))
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["cached_profiles"] = len(self._cache)
+            stats["in_progress"] = len(self._inflight)
+        stats["profile_seconds"] = round(stats["profile_seconds"], 3)
+        return stats
+
+
+if __name__ == "__main__":
+    # Benchmark: profile time vs file size, and prompt size vs the old 1000-character raw preview
+    import os
+    import random
+    import sys
+    import tempfile
+
+    sizes_mb = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else "1,10,100,1000").split(",")]
+    random.seed(11)
+    regions = ["North", "South", "East", "West"]
+    products = [f"SKU-{i:05d}" for i in range(5000)]
+
+    def write_csv(path: str, target_bytes: int):
+        with open(path, "w") as f:
+            f.write("order_id,order_date,region,product,quantity,unit_price,discount,customer_email,returned\n")
+            written, order_id = 0, 0
+            while written < target_bytes:
+                block = []
+                for _ in range(10000):
+                    order_id += 1
+                    block.append(f"{order_id},2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d},"
+                                 f"{random.choice(regions)},{random.choice(products)},{random.randint(1, 50)},"
+                                 f"{random.uniform(1, 500):.2f},{'' if random.random() < 0.3 else round(random.random() / 4, 2)},"
+                                 f"user{random.randint(1, 200000)}@example.com,{random.random() < 0.05}\n")
+                text = "".join(block)
+                f.write(text)
+                written += len(text)
+
+    def tokens(text: str) -> int:
+        return len(text) // 4  # ~4 characters per token for English and CSV text
+
+    profiler = DatasetProfiler()
+    directory = tempfile.mkdtemp(prefix="profiler_bench_")
+    print(f"\n📊 DatasetProfiler benchmark (chunk_rows={profiler.chunk_rows})")
+    print(f"   {'size':>8} {'rows':>11} {'seconds':>8} {'MB/s':>7} {'cached ms':>10}")
+    for size_mb in sizes_mb:
+        path = os.path.join(directory, f"orders_{size_mb}mb.csv")
+        write_csv(path, size_mb * 1024 * 1024)
+        file_info = {"filename": "orders.csv", "path": path, "size": os.path.getsize(path)}
+        file_info["sha256"] = f"bench-{size_mb}"
+        started = time.time()
+        profile = profiler.profile(file_info)
+        elapsed = time.time() - started
+        started = time.time()
+        profiler.profile(file_info)
+        cached_ms = 1000 * (time.time() - started)
+        print(f"   {size_mb:>6}MB {profile['rows']:>11,} {elapsed:>8.2f} {size_mb / elapsed:>7.1f} {cached_ms:>10.3f}")
+        os.remove(path)
+
+    summary = DatasetProfiler.to_prompt(profile)
+    write_csv(path, 64 * 1024)
+    with open(path) as f:
+        preview = f.read(1000)
+    os.remove(path)
+    print(f"\n   Prompt context: raw 1000-char preview ≈ {tokens(preview)} tokens "
+          f"({preview.count(chr(10))} rows, no dtypes or ranges); profile summary ≈ {tokens(summary)} tokens")
+    print(f"   Profile summary:\n{summary}")
+    print(f"   {profiler.stats()}")
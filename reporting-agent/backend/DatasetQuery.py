@@ -0,0 +1,578 @@
+"""Out-of-core queries over session datasets, for generated analysis code.
+
+Copied into the sandbox next to the datasets, so generated code can import it
+instead of loading a whole CSV with ``pd.read_csv``::
+
+    from DatasetQuery import Scan, Count, NUnique, ValueCounts
+
+    scan = Scan('aws_id.csv', columns=['aws_id', 'account_id'], dtype={'account_id': str})
+    stats = scan.aggregate(rows=Count(), unique_ids=NUnique('aws_id'),
+                           per_id=ValueCounts('aws_id'),
+                           prefixes=ValueCounts(lambda df: df['aws_id'].str[:3]))
+    repeated = stats['per_id'][stats['per_id'] > 1]
+    rows = scan.where(lambda df: df['aws_id'].isin(repeated.index)).collect()
+
+A ``Scan`` streams the file in record batches - memory-mapped Feather/Arrow,
+Parquet, or CSV through pyarrow's streaming reader (pandas chunks without
+pyarrow). Only the requested columns are read, ``where`` filters run on each
+batch before anything is kept, and aggregates are merged batch by batch, so
+memory grows with the number of groups rather than the number of rows. Keys
+may be a column name or a function of the batch DataFrame, which replaces
+row-wise ``apply(lambda ...)`` with vectorized per-batch expressions. All
+aggregates passed to one ``aggregate`` call share a single pass over the file.
+
+When DuckDB is installed, ``sql`` runs SQL directly over the files instead
+(``sql("SELECT aws_id, count(*) FROM 'aws_id.csv' GROUP BY 1")``).
+"""
+import os
+import pickle
+import shutil
+import tempfile
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+try:
+    import pyarrow.parquet as pa_parquet
+except ImportError:
+    pa_parquet = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+ENGINE = "duckdb" if duckdb is not None else "arrow" if pa is not None else "pandas"
+
+Key = Union[str, Callable[[pd.DataFrame], pd.Series]]
+
+# Partial results are merged once they hold this many rows and more than the last merge kept,
+# so merging stays linear in the file size even when nearly every key is distinct
+MERGE_ROWS = 2_000_000
+
+# Keyed aggregates with more groups than this spill hash-partitioned partial results to SPILL_DIR
+# and merge one partition at a time, so memory stays bounded however many distinct keys there are
+MAX_GROUPS = 4_000_000
+SPILL_PARTITIONS = 32
+SPILL_DIR = None  # the system temporary directory
+
+
+def key_values(chunk: pd.DataFrame, key: Key) -> pd.Series:
+    return key(chunk) if callable(key) else chunk[key]
+
+
+def key_name(key: Key) -> Optional[str]:
+    if isinstance(key, str):
+        return key
+    name = getattr(key, "__name__", None)
+    return None if name == "<lambda>" else name
+
+
+class Aggregate:
+    """A result built up one batch at a time"""
+
+    def update(self, chunk: pd.DataFrame):
+        raise NotImplementedError
+
+    def result(self):
+        raise NotImplementedError
+
+
+class Count(Aggregate):
+    """Number of rows (or non-null values of ``column``)"""
+
+    def __init__(self, column: Optional[Key] = None):
+        self.column = column
+        self.total = 0
+
+    def update(self, chunk: pd.DataFrame):
+        self.total += len(chunk) if self.column is None else int(key_values(chunk, self.column).count())
+
+    def result(self) -> int:
+        return self.total
+
+
+class Sum(Aggregate):
+    def __init__(self, column: Key):
+        self.column = column
+        self.total = 0
+
+    def update(self, chunk: pd.DataFrame):
+        self.total += key_values(chunk, self.column).sum()
+
+    def result(self):
+        return self.total
+
+
+class Min(Aggregate):
+    def __init__(self, column: Key):
+        self.column = column
+        self.value = None
+
+    def update(self, chunk: pd.DataFrame):
+        value = key_values(chunk, self.column).min()
+        if pd.notna(value):
+            self.value = value if self.value is None else min(self.value, value)
+
+    def result(self):
+        return self.value
+
+
+class Max(Min):
+    def update(self, chunk: pd.DataFrame):
+        value = key_values(chunk, self.column).max()
+        if pd.notna(value):
+            self.value = value if self.value is None else max(self.value, value)
+
+
+class Mean(Aggregate):
+    def __init__(self, column: Key):
+        self.column = column
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, chunk: pd.DataFrame):
+        values = key_values(chunk, self.column)
+        self.total += values.sum()
+        self.count += int(values.count())
+
+    def result(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+
+class SpillPartitions:
+    """Partial results written to disk, split by key hash so each partition can be merged on its own"""
+
+    def __init__(self, partitions: int = SPILL_PARTITIONS, directory: Optional[str] = SPILL_DIR):
+        self.directory = tempfile.mkdtemp(prefix="dataset_query_", dir=directory)
+        self.files = [open(os.path.join(self.directory, f"{index}.pkl"), "wb") for index in range(partitions)]
+
+    def write(self, part, hashes: np.ndarray):
+        buckets = hashes % np.uint64(len(self.files))
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(len(self.files) + 1))
+        for index, f in enumerate(self.files):
+            if bounds[index + 1] > bounds[index]:
+                pickle.dump(part.iloc[order[bounds[index]:bounds[index + 1]]], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def partitions(self) -> Iterator[Iterator[Any]]:
+        for f in self.files:
+            f.close()
+        for f in self.files:
+            yield self._read(f.name)
+
+    @staticmethod
+    def _read(path: str) -> Iterator[Any]:
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    yield pickle.load(f)
+                except EOFError:
+                    break
+        os.remove(path)
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class KeyedAggregate(Aggregate):
+    """An aggregate whose partial results are keyed, merged in memory until they outgrow MAX_GROUPS, then spilled"""
+
+    def __init__(self):
+        self.parts = []
+        self.pending = self.merged = 0
+        self.spill: Optional[SpillPartitions] = None
+
+    def combine(self, parts: list):
+        """One partial result from several"""
+        raise NotImplementedError
+
+    def empty(self):
+        raise NotImplementedError
+
+    def finish(self, merged):
+        raise NotImplementedError
+
+    def hashes(self, part) -> np.ndarray:
+        return pd.util.hash_array(np.asarray(part.index), categorize=False)
+
+    def add_part(self, part):
+        """Keep a per-batch partial result, merging the kept ones when they grow large"""
+        if self.spill is not None:
+            self.spill.write(part, self.hashes(part))
+            return
+        self.parts.append(part)
+        self.pending += len(part)
+        if self.pending > max(MERGE_ROWS, 2 * self.merged):
+            self.merge()
+            if self.merged > MAX_GROUPS:
+                self.spill = SpillPartitions()
+                self.spill.write(self.parts[0], self.hashes(self.parts[0]))
+                self.parts, self.pending, self.merged = [], 0, 0
+
+    def merge(self):
+        if len(self.parts) > 1:
+            self.parts = [self.combine(self.parts)]
+        self.pending = self.merged = len(self.parts[0]) if self.parts else 0
+        return self.parts[0] if self.parts else self.empty()
+
+    def merged_partitions(self) -> Iterator[Any]:
+        """Each spilled partition merged on its own, bounded the same way as in-memory merging"""
+        for parts in self.spill.partitions():
+            self.parts, self.pending, self.merged = [], 0, 0
+            for part in parts:
+                self.parts.append(part)
+                self.pending += len(part)
+                if self.pending > max(MERGE_ROWS, 2 * self.merged):
+                    self.merge()
+            yield self.merge()
+        self.parts = []
+
+    def finish_partitions(self, partitions: Iterator[Any]):
+        """Result from merged partitions; their keys don't overlap"""
+        return self.finish(pd.concat(list(partitions)))
+
+    def result(self):
+        if self.spill is None:
+            return self.finish(self.merge())
+        try:
+            return self.finish_partitions(self.merged_partitions())
+        finally:
+            self.spill.close()
+            self.spill = None
+
+
+class ValueCounts(KeyedAggregate):
+    """Like ``Series.value_counts()`` over the whole file: counts per distinct key, largest first"""
+
+    def __init__(self, key: Key, dropna: bool = True):
+        super().__init__()
+        self.key = key
+        self.dropna = dropna
+
+    def update(self, chunk: pd.DataFrame):
+        self.add_part(key_values(chunk, self.key).value_counts(dropna=self.dropna, sort=False))
+
+    def combine(self, parts: List[pd.Series]) -> pd.Series:
+        return pd.concat(parts).groupby(level=0, sort=False, dropna=self.dropna).sum()
+
+    def empty(self) -> pd.Series:
+        return pd.Series(dtype="int64")
+
+    def finish(self, merged: pd.Series) -> pd.Series:
+        counts = merged.sort_values(ascending=False, kind="stable").astype("int64")
+        counts.name = "count"
+        counts.index.name = key_name(self.key)
+        return counts
+
+
+class NUnique(KeyedAggregate):
+    """Number of distinct non-null keys"""
+
+    def __init__(self, key: Key):
+        super().__init__()
+        self.key = key
+
+    def update(self, chunk: pd.DataFrame):
+        self.add_part(key_values(chunk, self.key).dropna().drop_duplicates())
+
+    def hashes(self, part: pd.Series) -> np.ndarray:
+        return pd.util.hash_array(np.asarray(part), categorize=False)
+
+    def combine(self, parts: List[pd.Series]) -> pd.Series:
+        return pd.concat(parts, ignore_index=True).drop_duplicates()
+
+    def empty(self) -> pd.Series:
+        return pd.Series(dtype=object)
+
+    def finish(self, merged: pd.Series) -> int:
+        return len(merged)
+
+    def finish_partitions(self, partitions: Iterator[pd.Series]) -> int:
+        return sum(len(partition) for partition in partitions)
+
+
+# How per-batch partial aggregates combine into the final value
+COMBINE = {"sum": "sum", "count": "sum", "size": "sum", "min": "min", "max": "max"}
+
+
+class GroupBy(KeyedAggregate):
+    """``df.groupby(keys).agg(aggregations)`` over the whole file.
+
+    ``aggregations`` maps columns to one of sum, count, size, min, max or
+    mean; mean is kept as a sum and a count until the end.
+    """
+
+    def __init__(self, keys: Union[Key, List[Key]], aggregations: Dict[str, str]):
+        super().__init__()
+        self.keys = keys if isinstance(keys, list) else [keys]
+        unsupported = {func for func in aggregations.values() if func not in COMBINE and func != "mean"}
+        if unsupported:
+            raise ValueError(f"Unsupported aggregations: {', '.join(sorted(unsupported))} "
+                             f"(use {', '.join(sorted(COMBINE))} or mean)")
+        self.aggregations = aggregations
+        self.partial = {}
+        for column, func in aggregations.items():
+            if func == "mean":
+                self.partial[f"{column}__sum"] = (column, "sum")
+                self.partial[f"{column}__count"] = (column, "count")
+            else:
+                self.partial[f"{column}__{func}"] = (column, func)
+
+    def update(self, chunk: pd.DataFrame):
+        keys = [key_values(chunk, key).rename(key_name(key)) for key in self.keys]
+        grouped = chunk.groupby(keys, sort=False)
+        self.add_part(pd.DataFrame({name: grouped[column].agg(func) for name, (column, func) in self.partial.items()}))
+
+    def hashes(self, part: pd.DataFrame) -> np.ndarray:
+        if isinstance(part.index, pd.MultiIndex):
+            return pd.util.hash_pandas_object(part.index.to_frame(index=False), index=False).to_numpy()
+        return super().hashes(part)
+
+    def combine(self, parts: List[pd.DataFrame]) -> pd.DataFrame:
+        merged = pd.concat(parts)
+        return merged.groupby(level=list(range(merged.index.nlevels)), sort=False).agg(
+            {name: COMBINE[func] for name, (_, func) in self.partial.items()})
+
+    def empty(self) -> pd.DataFrame:
+        return pd.DataFrame(columns=list(self.partial))
+
+    def finish(self, merged: pd.DataFrame) -> pd.DataFrame:
+        result = pd.DataFrame(index=merged.index)
+        for column, func in self.aggregations.items():
+            if func == "mean":
+                result[column] = merged[f"{column}__sum"] / merged[f"{column}__count"]
+            else:
+                result[column] = merged[f"{column}__{func}"]
+        return result.sort_index()
+
+
+class Scan:
+    """A dataset file read in batches, with column projection and per-batch filters"""
+
+    def __init__(self, path: str, columns: Optional[List[str]] = None, dtype: Optional[Dict[str, Any]] = None,
+                 batch_rows: int = 1_000_000, sep: str = ",", prefer_columnar: bool = True):
+        self.path = path
+        self.columns = columns
+        self.dtype = dtype or {}
+        self.batch_rows = batch_rows
+        self.sep = sep
+        self.filters: List[Callable[[pd.DataFrame], pd.Series]] = []
+        # The Feather copy's types were inferred at upload; columns the caller types are parsed from the CSV instead
+        self.source = self._columnar_copy(path) if prefer_columnar and not self.dtype else path
+
+    @staticmethod
+    def _columnar_copy(path: str) -> str:
+        """The Feather copy the server made of a CSV, when it exists and is up to date"""
+        if pa is None or not path.lower().endswith(".csv"):
+            return path
+        feather = os.path.splitext(path)[0] + ".feather"
+        try:
+            if os.path.getmtime(feather) >= os.path.getmtime(path):
+                return feather
+        except OSError:
+            pass
+        return path
+
+    def where(self, predicate: Callable[[pd.DataFrame], pd.Series]) -> "Scan":
+        """A scan of the rows where ``predicate(batch)`` is True; the original scan is unchanged"""
+        scan = Scan.__new__(Scan)
+        scan.__dict__.update(self.__dict__)
+        scan.filters = self.filters + [predicate]
+        return scan
+
+    def isin(self, column: str, values) -> "Scan":
+        values = pd.Index(values)
+        return self.where(lambda chunk: chunk[column].isin(values))
+
+    def _arrow_batches(self) -> Iterator["pa.RecordBatch"]:
+        lower = self.source.lower()
+        if lower.endswith((".feather", ".arrow", ".ipc")):
+            with pa.memory_map(self.source) as source:
+                reader = pa_ipc.open_file(source)
+                for index in range(reader.num_record_batches):
+                    batch = reader.get_batch(index)
+                    yield batch.select(self.columns) if self.columns else batch
+        elif lower.endswith(".parquet") and pa_parquet is not None:
+            yield from pa_parquet.ParquetFile(self.source).iter_batches(batch_size=self.batch_rows, columns=self.columns)
+        else:
+            types = {column: pa.string() if value in (str, "str", "string", object) else pa.from_numpy_dtype(np.dtype(value))
+                     for column, value in self.dtype.items()}
+            yield from pa_csv.open_csv(
+                self.source,
+                read_options=pa_csv.ReadOptions(block_size=16 * 1024 * 1024),
+                parse_options=pa_csv.ParseOptions(delimiter=self.sep),
+                convert_options=pa_csv.ConvertOptions(include_columns=self.columns, column_types=types,
+                                                      strings_can_be_null=True))
+
+    def batches(self) -> Iterator[pd.DataFrame]:
+        """The filtered file as pandas DataFrames of at most a batch each"""
+        if pa is not None:
+            frames = (batch.to_pandas() for batch in self._arrow_batches())
+        else:
+            frames = pd.read_csv(self.source, usecols=self.columns, dtype=self.dtype or None,
+                                 sep=self.sep, chunksize=self.batch_rows)
+        for frame in frames:
+            for column, value in self.dtype.items():
+                if value in (str, "str", "string") and column in frame and frame[column].dtype != object:
+                    frame[column] = frame[column].astype(str)  # a Feather copy typed it as a number
+            for predicate in self.filters:
+                frame = frame[predicate(frame)]
+            yield frame
+
+    def aggregate(self, **aggregates: Aggregate) -> Dict[str, Any]:
+        """Compute every named aggregate in one pass over the file"""
+        try:
+            for frame in self.batches():
+                for aggregate in aggregates.values():
+                    aggregate.update(frame)
+        except BaseException:
+            for aggregate in aggregates.values():
+                if getattr(aggregate, "spill", None) is not None:
+                    aggregate.spill.close()
+            raise
+        return {name: aggregate.result() for name, aggregate in aggregates.items()}
+
+    def count(self) -> int:
+        return self.aggregate(result=Count())["result"]
+
+    def value_counts(self, key: Key) -> pd.Series:
+        return self.aggregate(result=ValueCounts(key))["result"]
+
+    def nunique(self, key: Key) -> int:
+        return self.aggregate(result=NUnique(key))["result"]
+
+    def group_by(self, keys: Union[Key, List[Key]], aggregations: Dict[str, str]) -> pd.DataFrame:
+        return self.aggregate(result=GroupBy(keys, aggregations))["result"]
+
+    def collect(self, limit: Optional[int] = None) -> pd.DataFrame:
+        """The matching rows as one DataFrame - only use after ``where`` has narrowed them down"""
+        frames, rows = [], 0
+        for frame in self.batches():
+            frames.append(frame)
+            rows += len(frame)
+            if limit is not None and rows >= limit:
+                break
+        result = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=self.columns)
+        return result.head(limit) if limit is not None else result
+
+
+def sql(query: str, memory_limit: Optional[str] = None) -> pd.DataFrame:
+    """Run SQL over dataset files with DuckDB, which streams and spills to disk; files are referenced by name in quotes"""
+    if duckdb is None:
+        raise ImportError("duckdb is not installed - use Scan(...).aggregate(...) instead")
+    connection = duckdb.connect()
+    try:
+        if memory_limit:
+            connection.execute(f"SET memory_limit = '{memory_limit}'")
+        return connection.execute(query).df()
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    # Benchmark: a.py's statistics over a synthetic aws_id.csv - loading it whole with pandas vs one Scan pass,
+    # each in a child process that is killed, like a sandbox out of memory, once its resident set passes the limit
+    import subprocess
+    import sys
+    import time
+
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    limit_mb = int(sys.argv[2]) if len(sys.argv) > 2 else 4096
+    path = os.path.join(sys.argv[3] if len(sys.argv) > 3 else tempfile.gettempdir(), f"aws_id_{size_mb}mb.csv")
+
+    def write_csv(path: str, target_bytes: int):
+        # ~20M AWS IDs shared by ~30M account IDs, so most IDs repeat and value_counts has many groups
+        rng = np.random.default_rng(7)
+        with open(path, "w") as f:
+            f.write("aws_id,account_id\n")
+            written = 0
+            while written < target_bytes:
+                aws_ids = np.char.add(np.char.add("AWS", rng.integers(10 ** 8, 10 ** 8 + 20_000_000, 500_000).astype(str)), "S")
+                accounts = rng.integers(10 ** 11, 10 ** 11 + 30_000_000, 500_000).astype(str)
+                block = "\n".join(np.char.add(np.char.add(aws_ids, ","), accounts)) + "\n"
+                f.write(block)
+                written += len(block)
+
+    if not os.path.exists(path) or os.path.getsize(path) < size_mb * 1024 * 1024:
+        started = time.time()
+        write_csv(path, size_mb * 1024 * 1024)
+        print(f"📝 Wrote {path} ({os.path.getsize(path) / 1024 ** 3:.2f} GB) in {time.time() - started:.0f}s")
+
+    prelude = """
+import resource, time
+started = time.time()
+"""
+    report = """
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+print(f"{time.time() - started:6.1f}s  peak RSS {peak:6.0f} MB  {unique_aws_ids:,} AWS IDs, {unique_accounts:,} accounts, "
+      f"{repeated:,} repeated IDs, first digits {len(digits)}")
+"""
+    # The a.py approach: read the whole file, then value_counts / apply(lambda) / isin over it
+    pandas_code = prelude + f"""
+import pandas as pd
+df = pd.read_csv({path!r})
+counts = df['aws_id'].value_counts()
+multi = df[df['aws_id'].isin(counts[counts > 1].index)].sort_values('aws_id')
+prefixes = df['aws_id'].apply(lambda x: x[:3]).value_counts()
+suffixes = df['aws_id'].apply(lambda x: x[-1]).value_counts()
+lengths = df['account_id'].astype(str).apply(len).value_counts()
+digits = df['account_id'].astype(str).str[0].value_counts()
+unique_aws_ids, unique_accounts, repeated = df['aws_id'].nunique(), df['account_id'].nunique(), int((counts > 1).sum())
+""" + report
+    scan_code = prelude + f"""
+from DatasetQuery import Scan, NUnique, ValueCounts
+scan = Scan({path!r}, columns=['aws_id', 'account_id'], dtype={{'account_id': str}})
+stats = scan.aggregate(
+    counts=ValueCounts('aws_id'),
+    unique_accounts=NUnique('account_id'),
+    prefixes=ValueCounts(lambda df: df['aws_id'].str[:3]),
+    suffixes=ValueCounts(lambda df: df['aws_id'].str[-1]),
+    lengths=ValueCounts(lambda df: df['account_id'].str.len()),
+    digits=ValueCounts(lambda df: df['account_id'].str[0]),
+)
+counts, digits = stats['counts'], stats['digits']
+top = counts.index[:10]
+multi = scan.where(lambda df: df['aws_id'].isin(top)).collect().sort_values('aws_id')
+unique_aws_ids, unique_accounts, repeated = len(counts), stats['unique_accounts'], int((counts > 1).sum())
+""" + report
+
+    print(f"\n🔎 DatasetQuery benchmark: a.py statistics over {os.path.getsize(path) / 1024 ** 3:.2f} GB, "
+          f"{limit_mb} MB memory limit (engine {ENGINE})")
+
+    def resident_mb(pid: int) -> float:
+        try:
+            with open(f"/proc/{pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+        except OSError:
+            return 0.0
+
+    for label, code in (("pandas read_csv", pandas_code), ("Scan.aggregate", scan_code)):
+        started = time.time()
+        child = subprocess.Popen([sys.executable, "-c", code], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        peak_mb = 0.0
+        while child.poll() is None and peak_mb <= limit_mb:
+            peak_mb = max(peak_mb, resident_mb(child.pid))
+            time.sleep(0.1)
+        if child.poll() is None:
+            child.kill()
+            child.wait()
+            print(f"   {label:<16} killed after {time.time() - started:.1f}s - resident set passed {limit_mb} MB")
+            continue
+        stdout, stderr = child.communicate()
+        if child.returncode == 0:
+            print(f"   {label:<16} {stdout.strip()}")
+        else:
+            lines = stderr.strip().splitlines()
+            print(f"   {label:<16} failed after {time.time() - started:.1f}s - {lines[-1] if lines else f'exit code {child.returncode}'}")
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from CodeInterpreterSession import estimate_size
+
+# Code whose output can differ between runs with the same inputs
+NONDETERMINISTIC_PATTERNS = [
+    (re.compile(r"#\s*no-cache\b", re.IGNORECASE), "marked '# no-cache'"),
+    (re.compile(r"\b(random|secrets|uuid)\b"), "uses random values"),
+    (re.compile(r"\b(time\.time|time\.perf_counter|time\.monotonic|datetime\.(date)?(time\.)?(now|today|utcnow)|date\.today|pd\.Timestamp\.now)\b"),
+     "depends on the current time"),
+    (re.compile(r"\b(requests|urllib|httpx|socket|boto3)\b"), "uses the network"),
+    (re.compile(r"\bos\.(urandom|getpid|environ)\b"), "depends on the process environment"),
+    (re.compile(r"\b(np\.random|numpy\.random)\b"), "uses random values"),
+    (re.compile(r"\.sample\(|\bshuffle\("), "samples randomly"),
+]
+
+
+class CachedExecution:
+    def __init__(self, session_id: str, result: Dict[str, Any]):
+        self.session_id = session_id
+        self.result = result
+        self.bytes = estimate_size(result)
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class ExecutionCache:
+    """Opt-in memoization of execution results.
+
+    Results are keyed by the session, the clean code, the interactive inputs
+    and the content hashes of the session files, so the same code over the
+    same data returns the stored output without touching the sandbox. Results
+    are never shared between sessions, since code can read interpreter state
+    and files the key doesn't see. Code that looks
+    nondeterministic (random numbers, the clock, the network, or an explicit
+    ``# no-cache`` comment) is never cached. Entries are evicted LRU past
+    ``max_entries`` or ``max_bytes`` and expire after ``ttl`` seconds.
+
+    Only use this for code that doesn't depend on variables left in the
+    sandbox by earlier executions; the cache can't see interpreter state.
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl: float = 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CachedExecution]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "uncacheable": 0, "evictions": 0,
+                       "expired": 0, "invalidated": 0, "stale": 0}
+
+    @staticmethod
+    def key(session_id: str, clean_code: str, inputs: Optional[List[str]], file_hashes: List[str]) -> str:
+        material = json.dumps({"session": session_id, "code": clean_code, "inputs": inputs or [], "files": sorted(file_hashes)})
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def uncacheable_reason(self, clean_code: str) -> Optional[str]:
+        """Why this code's output shouldn't be reused, or None if it looks deterministic"""
+        for pattern, reason in NONDETERMINISTIC_PATTERNS:
+            if pattern.search(clean_code):
+                with self._lock:
+                    self._stats["uncacheable"] += 1
+                return reason
+        return None
+
+    def get(self, key: str, is_valid: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Optional[Dict[str, Any]]:
+        """The stored result, or None; ``is_valid`` can reject results whose images are gone"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry.created_at > self.ttl:
+                self._remove_locked(key)
+                self._stats["expired"] += 1
+                entry = None
+            if entry is not None and is_valid is not None and not is_valid(entry.result):
+                self._remove_locked(key)
+                self._stats["stale"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            entry.hits += 1
+            self._stats["hits"] += 1
+            return entry.result
+
+    def put(self, key: str, session_id: str, result: Dict[str, Any]):
+        entry = CachedExecution(session_id, result)
+        if entry.bytes > self.max_bytes:
+            return
+        with self._lock:
+            self._remove_locked(key)
+            self._entries[key] = entry
+            self._bytes += entry.bytes
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove_locked(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate_session(self, session_id: str) -> int:
+        """Drop every result produced by a session, e.g. when its CSV is cleared"""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry.session_id == session_id]
+            for key in keys:
+                self._remove_locked(key)
+            self._stats["invalidated"] += len(keys)
+        return len(keys)
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["max_bytes"] = self.max_bytes
+        stats["ttl"] = self.ttl
+        return stats
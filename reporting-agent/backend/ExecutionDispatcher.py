@@ -0,0 +1,136 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class DispatcherBusy(Exception):
+    """Raised when an endpoint's queue is full and the call is rejected"""
+
+
+class EndpointLane:
+    """Concurrency limit and counters for one endpoint"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.semaphore = None  # created lazily inside the running event loop
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+
+
+class ExecutionDispatcher:
+    """Runs blocking agent and sandbox calls on a bounded thread pool.
+
+    The Strands agents, the code interpreter client and boto3 are synchronous,
+    so calling them from an ``async def`` endpoint blocks the event loop for the
+    whole execution. ``await dispatcher.run("execute", fn, ...)`` moves the call
+    to a worker thread instead, while a per-endpoint semaphore caps how many
+    calls of each kind run at once and a queue limit sheds load with
+    DispatcherBusy rather than queueing forever.
+    """
+
+    def __init__(self,
+                 max_workers: int = 32,
+                 limits: Optional[Dict[str, int]] = None,
+                 max_queue: int = 100):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dispatch")
+        self.default_limit = max_workers
+        self._lanes: Dict[str, EndpointLane] = {}
+        for name, limit in (limits or {}).items():
+            self._lanes[name] = EndpointLane(name, limit)
+        self._lock = threading.Lock()
+
+    def _lane(self, endpoint: str) -> EndpointLane:
+        with self._lock:
+            lane = self._lanes.get(endpoint)
+            if lane is None:
+                lane = self._lanes[endpoint] = EndpointLane(endpoint, self.default_limit)
+            return lane
+
+    async def run(self, endpoint: str, func: Callable, *args, **kwargs) -> Any:
+        """Run ``func(*args, **kwargs)`` on the pool under ``endpoint``'s concurrency limit"""
+        lane = self._lane(endpoint)
+        if lane.semaphore is None:
+            lane.semaphore = asyncio.Semaphore(lane.limit)
+
+        if lane.queued >= self.max_queue:
+            lane.rejected += 1
+            raise DispatcherBusy(f"Too many queued '{endpoint}' requests ({lane.queued}), try again shortly")
+
+        queued_at = time.time()
+        lane.queued += 1
+        lane.max_queue_depth = max(lane.max_queue_depth, lane.queued)
+        try:
+            await lane.semaphore.acquire()
+        finally:
+            lane.queued -= 1
+
+        started = time.time()
+        lane.total_wait += started - queued_at
+        lane.running += 1
+        loop = asyncio.get_running_loop()
+
+        def finish():
+            lane.running -= 1
+            lane.total_run += time.time() - started
+            lane.semaphore.release()
+
+        # Copy context so contextvars such as the current session id follow the call into the worker
+        context = contextvars.copy_context()
+        future = self.executor.submit(functools.partial(context.run, func, *args, **kwargs))
+        try:
+            result = await asyncio.wrap_future(future)
+            lane.completed += 1
+            return result
+        except asyncio.CancelledError:
+            lane.cancelled += 1
+            raise
+        except Exception:
+            lane.failed += 1
+            raise
+        finally:
+            if future.done():
+                finish()
+            else:
+                # A cancelled caller can't stop a running thread; the lane stays taken until the thread is done
+                future.add_done_callback(lambda _: loop.call_soon_threadsafe(finish))
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for name, lane in list(self._lanes.items()):
+            finished = lane.completed + lane.failed
+            endpoints[name] = {
+                "limit": lane.limit,
+                "queued": lane.queued,
+                "running": lane.running,
+                "completed": lane.completed,
+                "failed": lane.failed,
+                "cancelled": lane.cancelled,
+                "rejected": lane.rejected,
+                "max_queue_depth": lane.max_queue_depth,
+                "avg_wait_ms": round(1000 * lane.total_wait / finished, 2) if finished else 0.0,
+                "avg_run_ms": round(1000 * lane.total_run / finished, 2) if finished else 0.0
+            }
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": sum(lane.queued for lane in self._lanes.values()),
+            "in_flight": sum(lane.running for lane in self._lanes.values()),
+            "endpoints": endpoints
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,77 @@
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text and code (~4 characters per token)"""
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def agent_token_usage(agent_result: Any) -> Optional[int]:
+    """Total tokens a Strands agent invocation reported, or None if the result carries no usage"""
+    try:
+        usage = agent_result.metrics.accumulated_usage
+        return int(usage["totalTokens"]) or None
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class ExecutionMetrics:
+    """Latency and LLM token accounting per execution mode.
+
+    ``direct`` runs go straight to the interpreter, ``agent`` runs go through
+    the executor agent for AI commentary. A direct run saves the tokens the
+    agent would have spent: the average of recently observed agent runs when
+    there are any, otherwise an estimate from the prompt and output sizes.
+    The agent calls the model twice (once to call the tool, once to comment
+    on its result), so the system prompt and code are counted twice and the
+    output is counted going in and coming back out.
+    """
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._modes: Dict[str, Dict[str, Any]] = {}
+        self._agent_tokens = deque(maxlen=window)
+        self._tokens_saved = 0
+
+    def estimate_agent_tokens(self, system_prompt: str, prompt: str, output: str) -> int:
+        with self._lock:
+            if self._agent_tokens:
+                return sum(self._agent_tokens) // len(self._agent_tokens)
+        return 2 * estimate_tokens(system_prompt + prompt) + 2 * estimate_tokens(output)
+
+    def record(self, mode: str, latency: float, llm_calls: int = 0, tokens_used: int = 0,
+               tokens_saved: int = 0) -> Dict[str, Any]:
+        """Count one execution; returns the per-request metrics for the response"""
+        with self._lock:
+            stats = self._modes.setdefault(mode, {"count": 0, "latency_seconds": 0.0, "tokens_used": 0})
+            stats["count"] += 1
+            stats["latency_seconds"] += latency
+            stats["tokens_used"] += tokens_used
+            if mode == "agent" and tokens_used:
+                self._agent_tokens.append(tokens_used)
+            self._tokens_saved += tokens_saved
+            agent = self._modes.get("agent")
+            agent_latency = agent["latency_seconds"] / agent["count"] if agent else None
+
+        metrics = {
+            "mode": mode,
+            "latency_ms": round(latency * 1000, 1),
+            "llm_calls": llm_calls,
+            "tokens_used": tokens_used,
+            "tokens_saved_estimate": tokens_saved
+        }
+        if mode == "direct" and agent_latency is not None:
+            metrics["latency_saved_ms"] = round((agent_latency - latency) * 1000, 1)
+        return metrics
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            modes = {mode: dict(stats) for mode, stats in self._modes.items()}
+            tokens_saved = self._tokens_saved
+        for stats in modes.values():
+            stats["avg_latency_ms"] = round(stats.pop("latency_seconds") / stats["count"] * 1000, 1)
+        return {"modes": modes, "tokens_saved_estimate": tokens_saved}
@@ -0,0 +1,343 @@
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from ImageDataScanner import ImageDataScanner
+from SandboxFileSync import PACKED_ENCODING, MissingSandboxFiles, file_content, file_digest, pack_content
+
+
+class ExecutionChunk:
+    """One piece of streamed execution output - the same shape whichever engine produced it"""
+
+    __slots__ = ("stdout", "stderr", "error", "missing_files")
+
+    def __init__(self, stdout: str = "", stderr: str = "", error: Optional[str] = None,
+                 missing_files: Optional[List[str]] = None):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.error = error
+        self.missing_files = missing_files
+
+    @classmethod
+    def from_event(cls, event: Dict[str, Any]) -> "ExecutionChunk":
+        """Parse a code-interpreter stream event (``{"result": {...}}``)"""
+        result = event.get("result", {})
+        if result.get("isError", False):
+            content = result.get("content") or [{}]
+            return cls(error=content[0].get("text", "Unknown error"), missing_files=result.get("missingFiles"))
+        structured_content = result.get("structuredContent", {})
+        return cls(stdout=structured_content.get("stdout", ""), stderr=structured_content.get("stderr", ""))
+
+    def to_event(self) -> Dict[str, Any]:
+        """The code-interpreter stream event for this chunk, as the runtime sends it over the wire"""
+        if self.error is not None:
+            result = {"isError": True, "content": [{"type": "text", "text": self.error}]}
+            if self.missing_files:
+                result["missingFiles"] = self.missing_files
+            return {"result": result}
+        return {"result": {"isError": False, "content": [{"type": "text", "text": self.stdout}],
+                           "structuredContent": {"stdout": self.stdout, "stderr": self.stderr}}}
+
+
+class ExecutionRequest:
+    def __init__(self, code: str, session_id: str = "default", files: Optional[List[Dict[str, Any]]] = None):
+        self.code = code
+        self.session_id = session_id
+        self.files = files or []
+
+
+class ExecutionResult:
+    """Output of one execution, assembled from chunks as they stream in.
+
+    Stdout goes through an ImageDataScanner, so ``images`` holds the charts and
+    ``display_text()`` the text around them. ``raw_output()`` keeps stdout with
+    the IMAGE_DATA lines for callers that hand it to a model.
+    """
+
+    def __init__(self, engine: str):
+        self.engine = engine
+        self.error: Optional[str] = None
+        self.stderr = ""
+        self.duration = 0.0
+        self._scanner = ImageDataScanner()
+        self._raw: List[str] = []
+
+    @property
+    def images(self):
+        return self._scanner.images
+
+    def add(self, chunk: ExecutionChunk) -> list:
+        """Take in a chunk; returns the text pieces and images that completed in it"""
+        if chunk.error is not None:
+            self.error = chunk.error
+            return []
+        pieces = self._scanner.feed(chunk.stdout) if chunk.stdout else []
+        if chunk.stdout:
+            self._raw.append(chunk.stdout)
+        if chunk.stderr:
+            self.stderr += chunk.stderr
+            self._scanner.feed_text(f"Errors: {chunk.stderr}")
+            self._raw.append(f"Errors: {chunk.stderr}")
+        return pieces
+
+    def finish(self) -> list:
+        return self._scanner.finish()
+
+    def display_text(self) -> str:
+        if self.error is not None:
+            return f"Error: {self.error}"
+        return self._scanner.display_text() or "Code executed successfully"
+
+    def raw_output(self) -> str:
+        if self.error is not None:
+            return f"Error: {self.error}"
+        return "\n".join(self._raw)
+
+
+class ExecutionEngine:
+    """Runs code somewhere and streams ExecutionChunks back.
+
+    ``stream`` raises only for infrastructure failures (the sandbox couldn't be
+    reached or started); errors in the user's code arrive as chunks.
+    """
+
+    name = "engine"
+
+    def stream(self, request: ExecutionRequest) -> Iterator[ExecutionChunk]:
+        raise NotImplementedError
+
+    def close(self):
+        """Release what the engine holds (worker processes etc.) at shutdown"""
+
+    def forget(self, session_id: str):
+        """Release what the engine holds for a session that was deleted or expired"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+
+class InterpreterEngine(ExecutionEngine):
+    """AgentCore CodeInterpreter sessions leased from a CodeInterpreterPool (or the offline fake)"""
+
+    name = "interpreter"
+
+    def __init__(self, get_pool: Callable[[], Any], file_sync):
+        self.get_pool = get_pool
+        self.file_sync = file_sync
+
+    def stream(self, request: ExecutionRequest) -> Iterator[ExecutionChunk]:
+        with self.get_pool().lease(request.session_id) as code_client:
+            try:
+                upload_error = self.file_sync.sync(request.session_id, code_client, request.files)
+            except MissingSandboxFiles as e:
+                yield ExecutionChunk(error=str(e), missing_files=e.filenames)
+                return
+            if upload_error:
+                yield ExecutionChunk(error=f"File upload failed: {upload_error}")
+                return
+
+            response = code_client.invoke("executeCode", {
+                "code": request.code,
+                "language": "python",
+                "clearContext": False
+            })
+            for event in response["stream"]:
+                yield ExecutionChunk.from_event(event)
+
+
+def iter_runtime_stream_events(runtime_response) -> Iterator[Dict[str, Any]]:
+    """Yield interpreter stream events from an invoke_agent_runtime response as they arrive
+
+    A streaming runtime answers with server-sent events, one interpreter event per
+    ``data:`` line. Older deployments return the whole stream as one JSON document.
+    """
+    streaming_body = runtime_response['response']
+    if 'text/event-stream' in runtime_response.get('contentType', ''):
+        for line in streaming_body.iter_lines():
+            if line.startswith(b"data: "):
+                yield json.loads(line[len(b"data: "):])
+        return
+
+    json_string = streaming_body.read().decode('utf-8')
+    response = json.loads(json_string)
+    if isinstance(response, str):
+        response = json.loads(response)
+    yield from response["stream"]
+
+
+class RuntimeEngine(ExecutionEngine):
+    """The deployed AgentCore runtime (agent_core_runtime.py), which runs code in its own interpreter pool.
+
+    Files the runtime already received for a session go by name and sha256
+    only; when its interpreter was restarted it answers ``missingFiles`` and
+    the request is sent again with content. Binary files, and files too large
+    or not UTF-8, travel gzip-compressed in base64 like SandboxFileSync sends
+    them to an interpreter, and keep their ``binary`` flag.
+    """
+
+    name = "runtime"
+
+    def __init__(self, client_factory: Callable[[], Any], runtime_arn: str, file_sync):
+        self.client_factory = client_factory
+        self.runtime_arn = runtime_arn
+        self.file_sync = file_sync
+
+    def session_files(self, files: List[Dict[str, Any]], session_id: str, resend: bool = False) -> List[Dict[str, Any]]:
+        """session_files for the runtime payload - files already sent for this session go by name and sha256 only"""
+        if resend:
+            self.file_sync.invalidate(session_id)
+        pending = {file_info['filename'] for file_info in self.file_sync.pending(session_id, None, files)}
+        payload_files = []
+        for file_info in files:
+            entry = {'filename': file_info['filename'], 'sha256': file_digest(file_info)}
+            if file_info['filename'] in pending:
+                entry.update(self.encoded_content(file_info))
+            payload_files.append(entry)
+        return payload_files
+
+    def encoded_content(self, file_info: Dict[str, Any]) -> Dict[str, Any]:
+        data = file_content(file_info)
+        if not file_info.get('binary') and len(data) < self.file_sync.compress_threshold:
+            try:
+                return {'content': data.decode('utf-8')}
+            except UnicodeDecodeError:
+                pass
+        return {'content': pack_content(data), 'encoding': PACKED_ENCODING, 'binary': bool(file_info.get('binary'))}
+
+    def stream(self, request: ExecutionRequest, resend_files: bool = False) -> Iterator[ExecutionChunk]:
+        payload = json.dumps({
+            "request_type": "execute_python_code",
+            "code": request.code,
+            "session_files": self.session_files(request.files, request.session_id, resend_files),
+            "session_id": request.session_id,
+            "stream": True
+        }).encode()
+        response = self.client_factory().invoke_agent_runtime(agentRuntimeArn=self.runtime_arn, payload=payload)
+
+        for event in iter_runtime_stream_events(response):
+            chunk = ExecutionChunk.from_event(event)
+            if chunk.missing_files and not resend_files:
+                # The runtime's interpreter was restarted since the files were sent - send them again
+                print(f"📁 Runtime is missing {chunk.missing_files} - resending with content")
+                yield from self.stream(request, resend_files=True)
+                return
+            yield chunk
+        self.file_sync.mark_sent(request.session_id, request.files)
+
+
+class ExecutionUnavailable(Exception):
+    """No configured engine could run the request"""
+
+
+class EngineHealth:
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.last_error: Optional[str] = None
+        self.seconds = 0.0
+
+
+class ExecutionScheduler:
+    """Picks the execution engine for each request from configuration and health.
+
+    Engines are tried in ``order``. An engine that fails ``failure_threshold``
+    times in a row (infrastructure failures, not errors in user code) is
+    skipped for ``cooldown`` seconds and requests fall through to the next one;
+    when every engine is cooling down they are tried anyway. A request can ask
+    for a specific configured engine. Once an engine has streamed output the
+    request isn't retried elsewhere, since the code may already have run.
+    """
+
+    def __init__(self, engines: List[ExecutionEngine], failure_threshold: int = 3, cooldown: float = 30):
+        if not engines:
+            raise ValueError("ExecutionScheduler needs at least one engine")
+        self.engines: Dict[str, ExecutionEngine] = {engine.name: engine for engine in engines}
+        self.order = [engine.name for engine in engines]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._health = {name: EngineHealth() for name in self.order}
+        self._lock = threading.Lock()
+
+    def candidates(self, engine: Optional[str] = None) -> List[str]:
+        if engine:
+            if engine not in self.engines:
+                raise ValueError(f"Unknown execution engine '{engine}' (configured: {', '.join(self.order)})")
+            return [engine]
+        now = time.time()
+        with self._lock:
+            healthy = [name for name in self.order if self._health[name].unhealthy_until <= now]
+        return healthy + [name for name in self.order if name not in healthy]
+
+    def execute(self, request: ExecutionRequest, on_output: Optional[Callable[[list, str], None]] = None,
+                engine: Optional[str] = None) -> ExecutionResult:
+        """Run the request, calling ``on_output(pieces, stderr)`` as output arrives"""
+        errors = []
+        for name in self.candidates(engine):
+            result = ExecutionResult(name)
+            started = time.time()
+            streamed = False
+            try:
+                for chunk in self.engines[name].stream(request):
+                    streamed = True
+                    pieces = result.add(chunk)
+                    if on_output:
+                        on_output(pieces, chunk.stderr)
+                pieces = result.finish()
+                if on_output:
+                    on_output(pieces, "")
+            except Exception as e:
+                self._record(name, time.time() - started, e)
+                print(f"❌ Execution engine '{name}' failed: {e}")
+                if streamed:
+                    result.error = f"Execution failed: {e}"
+                    return result
+                errors.append(f"{name}: {e}")
+                continue
+            result.duration = time.time() - started
+            self._record(name, result.duration)
+            return result
+        raise ExecutionUnavailable("; ".join(errors))
+
+    def _record(self, name: str, seconds: float, error: Optional[Exception] = None):
+        with self._lock:
+            health = self._health[name]
+            health.runs += 1
+            health.seconds += seconds
+            if error is None:
+                health.consecutive_failures = 0
+                health.unhealthy_until = 0.0
+                return
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.last_error = str(error)
+            if health.consecutive_failures >= self.failure_threshold:
+                health.unhealthy_until = time.time() + self.cooldown
+
+    def forget(self, session_id: str):
+        for engine in self.engines.values():
+            engine.forget(session_id)
+
+    def close(self):
+        for engine in self.engines.values():
+            engine.close()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        engines = {}
+        with self._lock:
+            for name in self.order:
+                health = self._health[name]
+                engines[name] = {
+                    "healthy": health.unhealthy_until <= now,
+                    "runs": health.runs,
+                    "failures": health.failures,
+                    "consecutive_failures": health.consecutive_failures,
+                    "avg_seconds": round(health.seconds / health.runs, 3) if health.runs else 0.0,
+                    "last_error": health.last_error,
+                    **self.engines[name].stats()
+                }
+        return {"order": self.order, "failure_threshold": self.failure_threshold,
+                "cooldown": self.cooldown, "engines": engines}
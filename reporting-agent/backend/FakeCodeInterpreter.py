@@ -0,0 +1,96 @@
+import io
+import os
+import time
+import uuid
+import tempfile
+import threading
+import traceback
+import contextlib
+
+
+class FakeCodeInterpreter:
+    """Offline stand-in for the AgentCore CodeInterpreter client.
+
+    Speaks the same invoke()/stream protocol as the real client so pools,
+    executors and benchmarks can run without AWS. Code runs in-process in a
+    persistent namespace, which mirrors the sandbox keeping state between calls.
+    Redirecting stdout and changing directory affect the whole process, so
+    executions are serialized across all fake interpreters.
+    """
+
+    _exec_lock = threading.Lock()
+
+    def __init__(self, start_latency: float = 0.0, invoke_latency: float = 0.0):
+        self.start_latency = start_latency
+        self.invoke_latency = invoke_latency
+        self.session_id = None
+        self.workdir = None
+        self.namespace = {}
+        self.invocations = 0
+
+    def start(self, **kwargs) -> str:
+        time.sleep(self.start_latency)
+        self.session_id = f"fake-{uuid.uuid4().hex[:12]}"
+        self.workdir = tempfile.mkdtemp(prefix="fake_interpreter_")
+        self.namespace = {"__name__": "__main__"}
+        return self.session_id
+
+    def stop(self) -> bool:
+        self.session_id = None
+        return True
+
+    def invoke(self, method: str, params: dict = None) -> dict:
+        if not self.session_id:
+            self.start()
+        self.invocations += 1
+        time.sleep(self.invoke_latency)
+        params = params or {}
+
+        if method == "writeFiles":
+            return self._write_files(params.get("content", []))
+        if method == "executeCode":
+            if params.get("clearContext"):
+                self.namespace = {"__name__": "__main__"}
+            return self._execute(params.get("code", ""))
+        return self._result(f"Unsupported method: {method}", is_error=True)
+
+    def _write_files(self, files: list) -> dict:
+        written = []
+        for file_info in files:
+            path = os.path.join(self.workdir, file_info["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if "blob" in file_info:
+                blob = file_info["blob"]
+                with open(path, "wb") as f:
+                    f.write(blob if isinstance(blob, bytes) else blob.encode("utf-8"))
+            else:
+                with open(path, "w") as f:
+                    f.write(file_info.get("text", ""))
+            written.append(file_info["path"])
+        return self._result(f"Wrote {len(written)} files: {', '.join(written)}")
+
+    def _execute(self, code: str) -> dict:
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with self._exec_lock:
+            cwd = os.getcwd()
+            try:
+                os.chdir(self.workdir)
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    exec(compile(code, "<sandbox>", "exec"), self.namespace)
+            except Exception:
+                stderr.write(traceback.format_exc())
+            finally:
+                os.chdir(cwd)
+        return self._result(stdout.getvalue(), stdout=stdout.getvalue(), stderr=stderr.getvalue())
+
+    def _result(self, text: str, stdout: str = "", stderr: str = "", is_error: bool = False) -> dict:
+        return {
+            "sessionId": self.session_id,
+            "stream": [{
+                "result": {
+                    "isError": is_error,
+                    "content": [{"type": "text", "text": text}],
+                    "structuredContent": {"stdout": stdout, "stderr": stderr}
+                }
+            }]
+        }
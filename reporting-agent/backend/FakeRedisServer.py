@@ -0,0 +1,178 @@
+import fnmatch
+import socketserver
+import threading
+import time
+
+
+class FakeRedisServer:
+    """In-process stand-in for Redis, speaking enough RESP2 for RedisSessionBackend.
+
+    Supports PING, AUTH, SELECT, GET/SET (with EX/PX), MGET, DEL, EXISTS,
+    EXPIRE, TTL, HSET/HGET/HMGET, HINCRBY, SCAN and MULTI/EXEC on one shared keyspace, so multi-worker session
+    sharing can be exercised without a real Redis.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.data = {}
+        self.expires = {}
+        self.commands = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                queued = None
+                while True:
+                    try:
+                        command = fake._read_command(self.rfile)
+                    except (ConnectionError, ValueError):
+                        return
+                    if command is None:
+                        return
+                    name = command[0].upper()
+                    if name == b"MULTI":
+                        queued = []
+                        self.wfile.write(b"+OK\r\n")
+                    elif name == b"EXEC" and queued is not None:
+                        with fake._lock:
+                            replies = [fake._dispatch(queued_command) for queued_command in queued]
+                        queued = None
+                        self.wfile.write(b"*%d\r\n%s" % (len(replies), b"".join(replies)))
+                    elif queued is not None:
+                        queued.append(command)
+                        self.wfile.write(b"+QUEUED\r\n")
+                    else:
+                        with fake._lock:
+                            self.wfile.write(fake._dispatch(command))
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self._server = Server((host, port), Handler)
+        self.host, self.port = self._server.server_address
+        self.url = f"redis://{self.host}:{self.port}/0"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-redis", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def _read_command(rfile):
+        line = rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.strip().split()  # inline command, e.g. from redis-cli
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(rfile.readline()[1:])
+            args.append(rfile.read(length + 2)[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if not isinstance(value, bytes):
+            value = str(value).encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _array(self, values) -> bytes:
+        return b"*%d\r\n%s" % (len(values), b"".join(self._bulk(value) for value in values))
+
+    def _live(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _dispatch(self, command) -> bytes:
+        self.commands += 1
+        name, args = command[0].upper().decode(), command[1:]
+        try:
+            if name in ("PING",):
+                return b"+PONG\r\n"
+            if name in ("AUTH", "SELECT"):
+                return b"+OK\r\n"
+            if name == "GET":
+                value = self._live(args[0])
+                return self._bulk(value if isinstance(value, bytes) else None)
+            if name == "SET":
+                self.data[args[0]] = args[1]
+                self.expires.pop(args[0], None)
+                for option, value in zip(args[2::2], args[3::2]):
+                    if option.upper() in (b"EX", b"PX"):
+                        self.expires[args[0]] = time.time() + int(value) / (1000 if option.upper() == b"PX" else 1)
+                return b"+OK\r\n"
+            if name == "MGET":
+                values = [self._live(key) for key in args]
+                return self._array([value if isinstance(value, bytes) else None for value in values])
+            if name == "EXISTS":
+                return b":%d\r\n" % sum(self._live(key) is not None for key in args)
+            if name == "DEL":
+                removed = 0
+                for key in args:
+                    if self._live(key) is not None:
+                        del self.data[key]
+                        self.expires.pop(key, None)
+                        removed += 1
+                return b":%d\r\n" % removed
+            if name == "EXPIRE":
+                if self._live(args[0]) is None:
+                    return b":0\r\n"
+                self.expires[args[0]] = time.time() + int(args[1])
+                return b":1\r\n"
+            if name == "TTL":
+                if self._live(args[0]) is None:
+                    return b":-2\r\n"
+                expires_at = self.expires.get(args[0])
+                return b":%d\r\n" % (int(expires_at - time.time()) if expires_at else -1)
+            if name == "HSET":
+                hash_value = self._live(args[0])
+                if hash_value is None:
+                    hash_value = self.data[args[0]] = {}
+                added = 0
+                for field, value in zip(args[1::2], args[2::2]):
+                    added += field not in hash_value
+                    hash_value[field] = value
+                return b":%d\r\n" % added
+            if name == "HGET":
+                return self._bulk((self._live(args[0]) or {}).get(args[1]))
+            if name == "HMGET":
+                hash_value = self._live(args[0]) or {}
+                return self._array([hash_value.get(field) for field in args[1:]])
+            if name == "HINCRBY":
+                hash_value = self._live(args[0])
+                if hash_value is None:
+                    hash_value = self.data[args[0]] = {}
+                value = int(hash_value.get(args[1], b"0")) + int(args[2])
+                hash_value[args[1]] = str(value).encode()
+                return b":%d\r\n" % value
+            if name == "SCAN":
+                pattern = "*"
+                for option, value in zip(args[1::2], args[2::2]):
+                    if option.upper() == b"MATCH":
+                        pattern = value.decode()
+                keys = [key for key in list(self.data) if self._live(key) is not None
+                        and fnmatch.fnmatchcase(key.decode(), pattern)]
+                return b"*2\r\n" + self._bulk(b"0") + self._array(keys)
+            return b"-ERR unknown command '%s'\r\n" % name.encode()
+        except (IndexError, ValueError) as e:
+            return b"-ERR %s\r\n" % str(e).encode()
+
+
+if __name__ == "__main__":
+    server = FakeRedisServer(port=6379).start()
+    print(f"🧪 Fake Redis listening on {server.url} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
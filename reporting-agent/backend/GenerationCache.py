@@ -0,0 +1,142 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what code the user wants"""
+    return re.sub(r"\s+", " ", prompt).strip().lower().rstrip(".!?")
+
+
+def schema_key(profile: Dict[str, Any]) -> str:
+    """Hash of what generated code depends on in a dataset: file name, delimiter, column names and dtypes"""
+    schema = {
+        "filename": profile["filename"],
+        "delimiter": profile["delimiter"],
+        "columns": [(column["name"], column["dtype"]) for column in profile["columns"]]
+    }
+    return hashlib.sha256(json.dumps(schema, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def trigram_vector(text: str) -> Counter:
+    padded = f"  {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def cosine(a: Counter, b: Counter) -> float:
+    if not a or not b:
+        return 0.0
+    dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+    return dot / (math.sqrt(sum(v * v for v in a.values())) * math.sqrt(sum(v * v for v in b.values())))
+
+
+class CachedGeneration:
+    def __init__(self, prompt: str, bucket: str, code: str):
+        self.prompt = prompt
+        self.bucket = bucket
+        self.code = code
+        self.vector = trigram_vector(prompt)
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class GenerationCache:
+    """LRU + TTL cache of generated code keyed by normalized prompt, dataset schema and model id.
+
+    The exact tier only matches prompts that normalize to the same text. When
+    ``similarity_threshold`` is set, a miss falls back to the most similar
+    cached prompt for the same schema and model (cosine similarity of
+    character trigrams), which catches rewordings like "plot sales by region"
+    vs "Plot the sales by region." but not true paraphrases.
+    """
+
+    def __init__(self, max_entries: int = 500, ttl: float = 24 * 3600, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CachedGeneration]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "similar_hits": 0, "misses": 0, "bypassed": 0, "stores": 0,
+                       "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def bucket(schema: str, model_id: str, mode: str = "session") -> str:
+        return f"{model_id}|{schema}|{mode}"
+
+    @staticmethod
+    def key(prompt: str, bucket: str) -> str:
+        return hashlib.sha256(f"{bucket}\0{normalize_prompt(prompt)}".encode()).hexdigest()
+
+    def get(self, prompt: str, bucket: str) -> Optional[Dict[str, Any]]:
+        """Cached code for the prompt as ``{"code", "match", "similarity"}``, or None"""
+        now = time.time()
+        key = self.key(prompt, bucket)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at > self.ttl:
+                del self._entries[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self._stats["hits"] += 1
+                return {"code": entry.code, "match": "exact", "similarity": 1.0}
+
+            if self.similarity_threshold > 0:
+                vector = trigram_vector(normalize_prompt(prompt))
+                best_key, best_score = None, 0.0
+                for candidate_key, candidate in self._entries.items():
+                    if candidate.bucket != bucket or now - candidate.created_at > self.ttl:
+                        continue
+                    score = cosine(vector, candidate.vector)
+                    if score > best_score:
+                        best_key, best_score = candidate_key, score
+                if best_key is not None and best_score >= self.similarity_threshold:
+                    entry = self._entries[best_key]
+                    self._entries.move_to_end(best_key)
+                    entry.hits += 1
+                    self._stats["similar_hits"] += 1
+                    return {"code": entry.code, "match": "similar", "similarity": round(best_score, 3)}
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, prompt: str, bucket: str, code: str):
+        if not code:
+            return
+        key = self.key(prompt, bucket)
+        with self._lock:
+            self._entries[key] = CachedGeneration(normalize_prompt(prompt), bucket, code)
+            self._entries.move_to_end(key)
+            self._stats["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def bypass(self):
+        """Count a request that opted out of the cache"""
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def clear(self) -> int:
+        with self._lock:
+            cleared = len(self._entries)
+            self._entries.clear()
+            return cleared
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["similar_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits"] + stats["similar_hits"]) / lookups, 3) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl"] = self.ttl
+        stats["similarity_threshold"] = self.similarity_threshold
+        return stats
@@ -0,0 +1,259 @@
+import base64
+import binascii
+import re
+from typing import Any, Dict, List, Optional, Union
+
+IMAGE_MARKER = "IMAGE_DATA:"
+CHART_ONLY_MESSAGE = "Code executed successfully - chart generated"
+
+# Shortest payload accepted as an image, in base64 characters (~750 bytes decoded)
+MIN_IMAGE_CHARS = 1000
+
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+)
+_WHITESPACE = re.compile(r'\s')
+
+
+class ScannedImage:
+    """An image payload cut out of interpreter stdout.
+
+    Keeps the base64 text it was printed as, which is what the JSON API sends,
+    and decodes it to bytes only when ``data`` is first read.
+    """
+
+    __slots__ = ("format", "b64", "_data")
+
+    def __init__(self, format: str, b64: str):
+        self.format = format
+        self.b64 = b64
+        self._data = None
+
+    @property
+    def data(self) -> bytes:
+        if self._data is None:
+            self._data = base64.b64decode(self.b64)
+        return self._data
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Legacy image dict returned by the execution endpoints"""
+        return {'format': self.format, 'data': self.b64, 'source': 'agentcore_stdout'}
+
+
+def sniff_image_format(b64: str) -> Optional[str]:
+    """Return 'png' or 'jpeg' by decoding only the first few bytes of a base64 payload"""
+    try:
+        header = base64.b64decode(b64[:16])
+    except (binascii.Error, ValueError):
+        return None
+    for signature, image_format in _SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    return None
+
+
+class ImageDataScanner:
+    """Single-pass scanner that splits interpreter stdout into text and IMAGE_DATA payloads.
+
+    Generated chart code prints ``IMAGE_DATA:<base64>`` on a line of its own.
+    ``feed()`` accepts stdout in arbitrary chunks (a marker or payload may be
+    split across stream events) and returns the text pieces and images that
+    completed in that chunk, so output can be forwarded while it arrives. Each
+    character is looked at once; payload fragments are joined once per image.
+    """
+
+    def __init__(self):
+        self.images: List[ScannedImage] = []
+        self.rejected = 0
+        self._segments: List[List[str]] = [[]]  # text between image markers
+        self._carry = ""  # possible partial marker at the end of the last chunk
+        self._payload: Optional[List[str]] = None  # set while inside an image payload
+
+    @classmethod
+    def scan(cls, text: str) -> "ImageDataScanner":
+        scanner = cls()
+        if text:
+            scanner.feed(text)
+        scanner.finish()
+        return scanner
+
+    def feed(self, chunk: str) -> List[Union[str, ScannedImage]]:
+        """Consume a stdout chunk; returns new text pieces and completed images in order"""
+        events = []
+        if not chunk:
+            return events
+        if self._carry:
+            chunk = self._carry + chunk
+            self._carry = ""
+
+        pos = 0
+        end = len(chunk)
+        while pos < end:
+            if self._payload is not None:
+                newline = chunk.find("\n", pos)
+                if newline == -1:
+                    self._payload.append(chunk[pos:])
+                    break
+                self._payload.append(chunk[pos:newline])
+                self._finish_payload(events)
+                pos = newline + 1
+                continue
+
+            marker = chunk.find(IMAGE_MARKER, pos)
+            if marker == -1:
+                keep = self._partial_marker_length(chunk)
+                self._add_text(chunk[pos:end - keep], events)
+                self._carry = chunk[end - keep:] if keep else ""
+                break
+
+            self._add_text(chunk[pos:marker], events)
+            self._segments.append([])
+            self._payload = []
+            pos = marker + len(IMAGE_MARKER)
+        return events
+
+    def feed_text(self, text: str):
+        """Append text that is never scanned for images (e.g. stderr) on its own line"""
+        self._add_text(("\n" if self._has_text() else "") + text, [])
+
+    def finish(self) -> List[Union[str, ScannedImage]]:
+        """Flush a trailing payload or partial marker at the end of the stream"""
+        events = []
+        if self._payload is not None:
+            self._finish_payload(events)
+        if self._carry:
+            self._add_text(self._carry, events)
+            self._carry = ""
+        return events
+
+    def image_dicts(self) -> List[Dict[str, Any]]:
+        return [image.to_dict() for image in self.images]
+
+    def display_text(self) -> str:
+        """Output text with image payloads removed, formatted like clean_output_for_display"""
+        if len(self._segments) == 1:
+            return "".join(self._segments[0])
+
+        cleaned_parts = []
+        for index, segment in enumerate(self._segments):
+            text = "".join(segment).strip()
+            if not text:
+                continue
+            if index > 0 and text.startswith(('iVBOR', '/9j/', 'data:')):
+                continue
+            cleaned_parts.append(text)
+        return '\n\n'.join(cleaned_parts) if cleaned_parts else CHART_ONLY_MESSAGE
+
+    def _add_text(self, text: str, events: list):
+        if text:
+            self._segments[-1].append(text)
+            events.append(text)
+
+    def _has_text(self) -> bool:
+        return any(self._segments[-1]) or len(self._segments) > 1
+
+    def _finish_payload(self, events: list):
+        payload = "".join(self._payload).strip()
+        self._payload = None
+        if _WHITESPACE.search(payload):
+            payload = "".join(payload.split())
+
+        image_format = sniff_image_format(payload) if len(payload) > MIN_IMAGE_CHARS else None
+        if image_format is None:
+            self.rejected += 1
+            return
+        image = ScannedImage(image_format, payload)
+        self.images.append(image)
+        events.append(image)
+
+    @staticmethod
+    def _partial_marker_length(chunk: str) -> int:
+        for length in range(min(len(IMAGE_MARKER) - 1, len(chunk)), 0, -1):
+            if chunk.endswith(IMAGE_MARKER[:length]):
+                return length
+        return 0
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: the old regex extractor + cleaner vs one scanner pass on synthetic 10-chart output
+    import os
+    import time
+
+    def legacy_extract_image_data(execution_result: str):
+        images = []
+        if 'IMAGE_DATA:' in execution_result:
+            pattern = r'IMAGE_DATA:([A-Za-z0-9+/=\n\r\s]+?)(?=\n[A-Za-z]|\nBase64|\n$|$)'
+            for match in re.findall(pattern, execution_result, re.MULTILINE | re.DOTALL):
+                clean_match = re.sub(r'[\s\n\r]', '', match)
+                if len(clean_match) > 1000:
+                    decoded = base64.b64decode(clean_match)
+                    if decoded.startswith(b'\x89PNG\r\n\x1a\n'):
+                        images.append({'format': 'png', 'data': clean_match, 'source': 'agentcore_stdout'})
+                    elif decoded.startswith(b'\xff\xd8\xff'):
+                        images.append({'format': 'jpeg', 'data': clean_match, 'source': 'agentcore_stdout'})
+        return images
+
+    def legacy_clean_output_for_display(output: str) -> str:
+        if 'IMAGE_DATA:' not in output:
+            return output
+        parts = output.split('IMAGE_DATA:')
+        cleaned_parts = [parts[0].strip()] if parts[0].strip() else []
+        for part in parts[1:]:
+            lines = part.split('\n', 1)
+            if len(lines) > 1:
+                remaining_text = lines[1].strip()
+                if remaining_text and not remaining_text.startswith(('iVBOR', '/9j/', 'data:')):
+                    cleaned_parts.append(remaining_text)
+        return '\n\n'.join(cleaned_parts) if cleaned_parts else CHART_ONLY_MESSAGE
+
+    def synthetic_output(charts: int, chart_bytes: int) -> str:
+        lines = []
+        for i in range(charts):
+            lines.append(f"Chart {i + 1}: revenue by region\nMean: {i * 3.5:.2f}, rows analysed: {1000 + i}")
+            png = b'\x89PNG\r\n\x1a\n' + os.urandom(chart_bytes)
+            lines.append("IMAGE_DATA:" + base64.b64encode(png).decode())
+        lines.append("Analysis complete")
+        return "\n".join(lines) + "\n"
+
+    def chunks(text: str, size: int):
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def best_of(func, repeat: int = 5) -> float:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    for chart_kb in (100, 400):
+        output = synthetic_output(10, chart_kb * 1024)
+        stream = chunks(output, 64 * 1024)
+
+        legacy_images = legacy_extract_image_data(output)
+        legacy_text = legacy_clean_output_for_display(output)
+        scanner = ImageDataScanner()
+        for chunk in stream:
+            scanner.feed(chunk)
+        scanner.finish()
+        assert scanner.image_dicts() == legacy_images
+        assert scanner.display_text() == legacy_text
+
+        def run_legacy():
+            full_stdout = "".join(stream)
+            legacy_extract_image_data(full_stdout)
+            legacy_clean_output_for_display(full_stdout)
+
+        def run_scanner():
+            scanner = ImageDataScanner()
+            for chunk in stream:
+                scanner.feed(chunk)
+            scanner.finish()
+            scanner.display_text()
+
+        legacy = best_of(run_legacy)
+        scanned = best_of(run_scanner)
+        print(f"\n📊 10 charts x {chart_kb} KB PNG ({len(output) / 1e6:.1f} MB stdout, {len(stream)} stream chunks)")
+        print(f"   legacy regex extract + clean : {1000 * legacy:8.2f} ms")
+        print(f"   ImageDataScanner single pass : {1000 * scanned:8.2f} ms  ({legacy / scanned:.1f}x)")
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+}
+
+
+class ImageStore:
+    """Content-addressed store for generated charts, capped at ``max_bytes``.
+
+    Images are keyed by the sha256 of their bytes, so the same chart rendered
+    twice is stored once and its URL never changes - browsers can cache it
+    forever. Entries are evicted least-recently-used once the cap is exceeded.
+    With ``directory`` set the bytes live on disk and only the index is kept
+    in memory; otherwise they are held in memory.
+
+    With a shared ``backend`` (SessionBackend) every new image is also written
+    there for ``record_ttl`` seconds, and an image this process doesn't hold is
+    fetched from it and cached, so any worker can serve any chart URL.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, directory: Optional[str] = None,
+                 backend=None, record_ttl: float = 7 * 24 * 3600):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.backend = backend
+        self.record_ttl = record_ttl
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[str, int, Optional[bytes]]]" = OrderedDict()  # hash -> (format, size, bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"puts": 0, "dedup_hits": 0, "gets": 0, "misses": 0, "evictions": 0, "shared_hits": 0}
+
+        if directory:
+            self._load_directory()
+
+    def put(self, data: bytes, image_format: str = 'png') -> str:
+        """Store image bytes and return their content hash"""
+        image_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            self._stats["puts"] += 1
+            if image_hash in self._entries:
+                self._entries.move_to_end(image_hash)
+                self._stats["dedup_hits"] += 1
+                return image_hash
+
+        if self.backend is not None:
+            try:
+                self.backend.put_record("image", image_hash, image_format.encode() + b"\0" + data, self.record_ttl)
+            except Exception as e:
+                print(f"⚠️  Failed to share image {image_hash[:12]}: {e}")
+        self._add(image_hash, data, image_format)
+        return image_hash
+
+    def _add(self, image_hash: str, data: bytes, image_format: str):
+        if self.directory:
+            path = self._path(image_hash, image_format)
+            tmp_path = f"{path}.tmp-{threading.get_ident()}"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            if image_hash not in self._entries:
+                self._entries[image_hash] = (image_format, len(data), None if self.directory else data)
+                self._bytes += len(data)
+                self._evict_locked()
+
+    def get(self, image_hash: str) -> Optional[Tuple[bytes, str]]:
+        """Return ``(bytes, format)`` for a stored image, or None if unknown or evicted"""
+        with self._lock:
+            self._stats["gets"] += 1
+            entry = self._entries.get(image_hash)
+            if entry is not None:
+                self._entries.move_to_end(image_hash)
+        if entry is None:
+            return self._get_shared(image_hash)
+        image_format, _, data = entry
+
+        if data is None:
+            try:
+                with open(self._path(image_hash, image_format), 'rb') as f:
+                    data = f.read()
+            except FileNotFoundError:
+                with self._lock:
+                    self._drop_locked(image_hash)
+                return self._get_shared(image_hash)
+        return data, image_format
+
+    def _get_shared(self, image_hash: str) -> Optional[Tuple[bytes, str]]:
+        """An image another worker stored, cached here; None (a miss) if no worker has it"""
+        record = None
+        if self.backend is not None:
+            try:
+                record = self.backend.get_record("image", image_hash)
+            except Exception as e:
+                print(f"⚠️  Failed to fetch shared image {image_hash[:12]}: {e}")
+        with self._lock:
+            self._stats["shared_hits" if record is not None else "misses"] += 1
+        if record is None:
+            return None
+        image_format, _, data = record.partition(b"\0")
+        image_format = image_format.decode()
+        self._add(image_hash, data, image_format)
+        return data, image_format
+
+    def touch(self, image_hash: str) -> bool:
+        """Mark an image as recently used without reading it; False if it's no longer stored"""
+        with self._lock:
+            if image_hash not in self._entries:
+                return False
+            self._entries.move_to_end(image_hash)
+            return True
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            image_hash = next(iter(self._entries))
+            self._drop_locked(image_hash)
+            self._stats["evictions"] += 1
+
+    def _drop_locked(self, image_hash: str):
+        entry = self._entries.pop(image_hash, None)
+        if entry is None:
+            return
+        image_format, size, _ = entry
+        self._bytes -= size
+        if self.directory:
+            try:
+                os.remove(self._path(image_hash, image_format))
+            except OSError:
+                pass
+
+    def _path(self, image_hash: str, image_format: str) -> str:
+        return os.path.join(self.directory, f"{image_hash}.{image_format}")
+
+    def _load_directory(self):
+        """Re-index images left on disk by a previous run, oldest first"""
+        files = []
+        for name in os.listdir(self.directory):
+            image_hash, _, image_format = name.partition('.')
+            if image_format in CONTENT_TYPES and len(image_hash) == 64:
+                path = os.path.join(self.directory, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, image_hash, image_format, stat.st_size))
+        for _, image_hash, image_format, size in sorted(files):
+            self._entries[image_hash] = (image_format, size, None)
+            self._bytes += size
+        self._evict_locked()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["images"] = len(self._entries)
+            stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        stats["backend"] = "disk" if self.directory else "memory"
+        stats["shared"] = self.backend is not None
+        return stats
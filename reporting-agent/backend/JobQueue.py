@@ -0,0 +1,283 @@
+import asyncio
+import heapq
+import itertools
+import json
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATES = (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED)
+
+
+class Job:
+    """A unit of background work (code execution or generation) and its outcome"""
+
+    def __init__(self, kind: str, session_id: str, payload: Dict[str, Any], priority: int, seq: int):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.session_id = session_id
+        self.payload = payload
+        self.priority = priority
+        self.seq = seq
+        self.status = JOB_QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+        self.cancel_requested = False
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        job = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "session_id": self.session_id,
+            "priority": self.priority,
+            "status": self.status,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if include_result:
+            job["result"] = self.result
+        return job
+
+
+class JobQueue:
+    """Priority job queue with per-session ordering and a bounded number of workers.
+
+    Jobs from different sessions are picked by priority (higher first), then by
+    submission order. Jobs of the same session always run one at a time in the
+    order they were submitted, because they share one interpreter and its state.
+    Finished jobs stay in the store for polling until ``max_retained`` is exceeded.
+
+    Jobs run in the process that accepted them. With a shared ``backend``
+    (SessionBackend) every state change is also published there for
+    ``record_ttl`` seconds, so any worker can answer a poll, list a session's
+    jobs or pass on a cancel request, which the owning worker picks up within
+    ``cancel_poll`` seconds.
+    """
+
+    def __init__(self, workers: int = 4, max_retained: int = 1000, backend=None,
+                 record_ttl: float = 24 * 3600, cancel_poll: float = 1.0):
+        self.workers = workers
+        self.max_retained = max_retained
+        self.backend = backend
+        self.record_ttl = record_ttl
+        self.cancel_poll = cancel_poll
+        self.handlers: Dict[str, Callable[[Job], Awaitable[Any]]] = {}
+        self.listeners: List[Callable[[Job], Awaitable[None]]] = []
+
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._session_queues: Dict[str, deque] = {}
+        self._busy_sessions = set()
+        self._ready = []  # heap of (-priority, seq, job) for session heads that may run now
+        self._seq = itertools.count()
+        self._cond = None
+        self._worker_tasks = []
+
+    def register(self, kind: str, handler: Callable[[Job], Awaitable[Any]]):
+        self.handlers[kind] = handler
+
+    def add_listener(self, listener: Callable[[Job], Awaitable[None]]):
+        """Register an async callback invoked on every job state change"""
+        self.listeners.append(listener)
+
+    async def start(self):
+        self._cond = asyncio.Condition()
+        self._worker_tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        if self.backend is not None:
+            self._worker_tasks.append(asyncio.create_task(self._watch_cancels()))
+        print(f"📬 Job queue started with {self.workers} workers")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    async def submit(self, kind: str, session_id: str, payload: Dict[str, Any], priority: int = 0) -> Job:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'. Expected one of: {', '.join(self.handlers)}")
+
+        job = Job(kind, session_id, payload, priority, next(self._seq))
+        async with self._cond:
+            self._jobs[job.id] = job
+            self._session_queues.setdefault(session_id, deque()).append(job)
+            self._schedule_session_locked(session_id)
+            self._trim_locked()
+            self._cond.notify()
+        await self._notify(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list_session(self, session_id: str) -> List[Job]:
+        return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    async def lookup(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """A job as a dict, whichever worker runs it"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        if self.backend is None:
+            return None
+        record = await asyncio.to_thread(self.backend.get_record, "job", job_id)
+        return json.loads(record) if record is not None else None
+
+    async def lookup_session(self, session_id: str) -> List[Dict[str, Any]]:
+        """A session's jobs as dicts without results, from every worker, oldest first"""
+        jobs = {job.id: job.to_dict(include_result=False) for job in self.list_session(session_id)}
+        if self.backend is not None:
+            for record in await asyncio.to_thread(self.backend.list_records, "job"):
+                job = json.loads(record)
+                if job["session_id"] == session_id and job["job_id"] not in jobs:
+                    job.pop("result", None)
+                    jobs[job["job_id"]] = job
+        return sorted(jobs.values(), key=lambda job: job["created_at"])
+
+    async def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job. Returns False if it already finished"""
+        job = self._jobs.get(job_id)
+        if job is None and self.backend is not None:
+            # Another worker runs it - leave a request for its cancel watcher
+            shared = await self.lookup(job_id)
+            if shared is None or shared["status"] in FINISHED_STATES:
+                return False
+            await asyncio.to_thread(self.backend.put_record, "job_cancel", job_id, b"1", self.record_ttl)
+            return True
+        if job is None or job.status in FINISHED_STATES:
+            return False
+
+        # Recorded first, so a worker that has picked the job but not started its task yet sees it
+        job.cancel_requested = True
+        if job.status == JOB_RUNNING:
+            # The worker marks the job cancelled and moves the session on
+            if job.task is not None:
+                job.task.cancel()
+            return True
+
+        async with self._cond:
+            job.status = JOB_CANCELLED
+            job.finished_at = time.time()
+            # Queued jobs stay in their session deque and are skipped when they reach the head
+            self._schedule_session_locked(job.session_id)
+            self._cond.notify()
+        await self._notify(job)
+        return True
+
+    def _schedule_session_locked(self, session_id: str):
+        """Push the session's next runnable job onto the ready heap, if the session is idle"""
+        if session_id in self._busy_sessions:
+            return
+        queue = self._session_queues.get(session_id)
+        while queue and queue[0].status == JOB_CANCELLED:
+            queue.popleft()
+        if not queue:
+            self._session_queues.pop(session_id, None)
+            return
+        head = queue[0]
+        # Mark busy as soon as the head is on the heap so later jobs can't overtake it
+        self._busy_sessions.add(session_id)
+        heapq.heappush(self._ready, (-head.priority, head.seq, head))
+
+    def _trim_locked(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED_STATES]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_retained)]:
+            del self._jobs[job_id]
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._cond:
+                while not self._ready:
+                    await self._cond.wait()
+                _, _, job = heapq.heappop(self._ready)
+                queue = self._session_queues.get(job.session_id)
+                if queue and queue[0] is job:
+                    queue.popleft()
+                if job.status == JOB_CANCELLED:
+                    self._busy_sessions.discard(job.session_id)
+                    self._schedule_session_locked(job.session_id)
+                    continue
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+
+            await self._notify(job)
+            try:
+                if job.cancel_requested:
+                    # Cancelled while the running notification was being sent
+                    job.status = JOB_CANCELLED
+                else:
+                    job.task = asyncio.create_task(self.handlers[job.kind](job))
+                    job.result = await job.task
+                    job.status = JOB_SUCCEEDED
+            except asyncio.CancelledError:
+                if job.task is None or not job.task.cancelled():
+                    raise  # the worker itself is being stopped
+                job.status = JOB_CANCELLED
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = getattr(e, "detail", None) or str(e)
+                print(f"❌ Job {job.id} ({job.kind}) failed: {job.error}")
+            finally:
+                job.finished_at = time.time()
+                job.task = None
+
+            async with self._cond:
+                self._busy_sessions.discard(job.session_id)
+                self._schedule_session_locked(job.session_id)
+                self._cond.notify()
+            await self._notify(job)
+
+    async def _watch_cancels(self):
+        """Cancel local jobs that another worker was asked to cancel"""
+        while True:
+            await asyncio.sleep(self.cancel_poll)
+            pending = [job.id for job in self._jobs.values() if job.status not in FINISHED_STATES]
+            for job_id in pending:
+                try:
+                    requested = await asyncio.to_thread(self.backend.delete_record, "job_cancel", job_id)
+                except Exception as e:
+                    print(f"⚠️  Job cancel check failed: {e}")
+                    break
+                if requested:
+                    print(f"🛑 Job {job_id} cancelled from another worker")
+                    await self.cancel(job_id)
+
+    async def _publish(self, job: Job):
+        record = json.dumps(job.to_dict(), default=str).encode()
+        try:
+            await asyncio.to_thread(self.backend.put_record, "job", job.id, record, self.record_ttl)
+        except Exception as e:
+            print(f"⚠️  Failed to publish job {job.id}: {e}")
+
+    async def _notify(self, job: Job):
+        if self.backend is not None:
+            await self._publish(job)
+        for listener in self.listeners:
+            try:
+                await listener(job)
+            except Exception as e:
+                print(f"⚠️  Job listener failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING) + FINISHED_STATES}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return {
+            "workers": self.workers,
+            "shared": self.backend is not None,
+            "ready": len(self._ready),
+            "sessions_waiting": len(self._session_queues),
+            "jobs": counts
+        }
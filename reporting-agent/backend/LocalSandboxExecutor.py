@@ -1,36 +1,433 @@
+import json
+import os
+import shutil
+import signal
+import socket
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.connection import Connection
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
-class LocalSandboxExecutor:
-    def __init__(self, clean_code, session_files):
-        self.clean_code = clean_code
-        self.session_files = session_files
-        self.path = "/Users/sugahlot/workplace/amazon-bedrock-agentcore/amazon-bedrock-agentcore-samples/02-use-cases/text-to-python-ide/"
-        # print(f"session files : {session_files}")
-        self.save_session_files()
+from Executor import ExecutionChunk, ExecutionEngine, ExecutionRequest
+from SandboxFileSync import file_content, file_digest
 
-    def save_session_files(self):
-        print(f"save_session_files")
-        if self.session_files:
-            print(f"📁 Saving {len(self.session_files)} files to Local sandbox...")
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "LocalSandboxWorker.py")
 
-            for file_info in self.session_files:
-                with open(file_info['filename'], "w") as file:
-                    file.write(file_info['content'])
-                    print(f"file saved {file}")
+# What generated report code imports; loaded once in the zygote and shared by every worker
+DEFAULT_PRELOAD = ["numpy", "pandas", "matplotlib", "matplotlib.pyplot", "seaborn", "pptx", "fpdf"]
 
 
-        with open("a.py", "w") as file:
-            file.write(self.clean_code)
-            print(f"py file saved {file}")
+class Zygote:
+    """A LocalSandboxWorker.py process that has imported the heavy libraries and forks workers on request.
 
+    Requests and replies are JSON lines over a Unix socket, one request at a
+    time; a new worker's end of its connection travels with the fork request
+    as a file descriptor. The zygote exits when the server closes its end.
+    """
 
-    def execute_code(self):
+    def __init__(self, preload: List[str], python: str = sys.executable):
+        self.preload = preload
+        self.control, child = socket.socketpair()
+        self.process = subprocess.Popen(
+            [python, WORKER_SCRIPT, str(child.fileno()), *preload], pass_fds=[child.fileno()],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, env={**os.environ, "MPLBACKEND": "Agg"},
+            start_new_session=True)
+        child.close()
+        self.replies = self.control.makefile("rb")
+        self.lock = threading.Lock()
+        self.ready = False
 
-        result = subprocess.run(["python", "a.py"], capture_output=True, text=True)
+    def alive(self) -> bool:
+        return self.process.poll() is None
 
-        print(result)
+    def _receive(self) -> Dict[str, Any]:
+        message = self.replies.readline()
+        if not message:
+            raise RuntimeError(f"Local zygote exited (exit code {self.process.poll()})")
+        return json.loads(message)
 
+    def wait_ready(self):
+        with self.lock:
+            if not self.ready:
+                self._receive()
+                self.ready = True
 
+    def fork(self, workdir: str, log_path: str, memory_mb: int) -> Tuple[int, Connection]:
+        self.wait_ready()
+        parent_end, child_end = socket.socketpair()
+        request = json.dumps({"op": "fork", "workdir": workdir, "log_path": log_path, "memory_mb": memory_mb})
+        with self.lock:
+            socket.send_fds(self.control, [request.encode() + b"\n"], [child_end.fileno()])
+            child_end.close()
+            pid = self._receive()["pid"]
+        return pid, Connection(parent_end.detach())
 
+    def reap(self, pid: int) -> Optional[int]:
+        """Wait for a killed or exited worker; returns its exit code if the zygote still knows it"""
+        try:
+            with self.lock:
+                self.control.sendall(json.dumps({"op": "reap", "pid": pid}).encode() + b"\n")
+                return self._receive()["exit_code"]
+        except (OSError, RuntimeError, ValueError):
+            return None
 
+    def close(self):
+        self.replies.close()
+        self.control.close()
+        try:
+            self.process.wait(5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
 
+
+class LocalWorker:
+    """A session's warm worker process plus the bookkeeping for reaping and recycling it"""
+
+    def __init__(self, session_id: str, zygote: Zygote, conn: Connection, pid: int, rss_mb: float):
+        self.session_id = session_id
+        self.zygote = zygote
+        self.conn = conn
+        self.pid = pid
+        self.lock = threading.Lock()
+        self.pending = 0  # requests about to lock the worker; it mustn't be reaped under them
+        self.files: Dict[str, str] = {}  # filename -> sha256 written to the working directory
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.runs = 0
+        self.base_rss_mb = rss_mb
+        self.rss_mb = rss_mb
+        self.exit_code: Optional[int] = None
+        self._killed = threading.Lock()
+
+    def exited(self) -> bool:
+        """Whether an idle worker is gone: it sends nothing between executions, so anything readable is its EOF"""
+        try:
+            return self.conn.closed or self.conn.poll()
+        except OSError:
+            return True
+
+    def alive(self) -> bool:
+        # A busy worker is checked by the execution reading its output
+        return not self.conn.closed and (self.lock.locked() or not self.exited())
+
+    def kill(self):
+        if not self._killed.acquire(blocking=False):
+            return
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        self.exit_code = self.zygote.reap(self.pid)
+        self.conn.close()
+
+
+class LocalSandboxExecutor(ExecutionEngine):
+    """Runs code on this machine in a warm worker process per session - no AWS needed.
+
+    Workers are forked from a zygote process that imports ``preload``
+    (pandas, numpy, matplotlib, ...) once, so a new session's worker starts
+    with the libraries already in memory, shared copy-on-write, instead of
+    spending seconds importing them. Each session gets its own working directory under
+    ``root`` and its own worker, which keeps variables between executions like
+    the AgentCore sandbox does.
+
+    Workers run with an address-space limit of ``memory_mb`` and
+    ``cpu_seconds`` of CPU per execution (rlimits; both raise inside the code
+    and leave the worker up). An execution that runs past ``timeout`` seconds
+    of wall-clock time kills the worker, so the session starts over with fresh
+    state. At most ``concurrency`` executions (default: one per CPU) run at a
+    time. A worker is replaced before its next execution once it has done
+    ``max_runs`` executions or its peak RSS grew ``max_memory_growth_mb`` past
+    where it started, which also resets the session's variables. Workers idle
+    for ``idle_ttl`` seconds, or the least recently used idle ones past
+    ``max_workers``, are stopped; busy workers never are. Open matplotlib
+    figures are returned as images.
+
+    This isolates sessions from each other, not the host from the code: the
+    worker runs as the server's user with its filesystem and network access.
+    """
+
+    name = "local"
+
+    def __init__(self, root: Optional[str] = None, timeout: float = 300, memory_mb: int = 2048,
+                 cpu_seconds: float = 120, max_workers: int = 8, idle_ttl: float = 600,
+                 preload: Optional[List[str]] = None, concurrency: int = 0, max_runs: int = 0,
+                 max_memory_growth_mb: float = 1024, python: str = sys.executable):
+        self.root = root or tempfile.mkdtemp(prefix="local_sandbox_")
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.cpu_seconds = cpu_seconds
+        self.max_workers = max_workers
+        self.idle_ttl = idle_ttl
+        self.preload = DEFAULT_PRELOAD if preload is None else list(preload)
+        self.concurrency = concurrency or os.cpu_count() or 1
+        self.max_runs = max_runs
+        self.max_memory_growth_mb = max_memory_growth_mb
+        self.python = python
+        self._zygote: Optional[Zygote] = None
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._workers: "OrderedDict[str, LocalWorker]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"executions": 0, "worker_starts": 0, "warm_hits": 0, "timeouts": 0, "crashes": 0,
+                       "reaped": 0, "recycled": 0, "zygote_starts": 0, "files_written": 0, "start_seconds": 0.0}
+        os.makedirs(self.root, exist_ok=True)
+
+    def workdir(self, session_id: str) -> str:
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+        path = os.path.join(self.root, safe_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def zygote(self) -> Zygote:
+        with self._lock:
+            if self._zygote is None or not self._zygote.alive():
+                if self._zygote is not None:
+                    print(f"⚠️  Local zygote exited (exit code {self._zygote.process.poll()}) - starting a new one")
+                self._zygote = Zygote(self.preload, self.python)
+                self._stats["zygote_starts"] += 1
+            return self._zygote
+
+    def warm_up(self):
+        """Start the zygote and wait for its imports now instead of on the first execution"""
+        self.zygote().wait_ready()
+
+    def _start_worker(self, session_id: str) -> LocalWorker:
+        started = time.time()
+        workdir = self.workdir(session_id)
+        zygote = self.zygote()
+        pid, conn = zygote.fork(workdir, os.path.join(workdir, ".worker.log"), self.memory_mb)
+        try:
+            message = conn.recv()
+        except EOFError:
+            conn.close()
+            raise RuntimeError(f"Local worker exited during startup (exit code {zygote.reap(pid)})")
+        elapsed = time.time() - started
+        with self._lock:
+            self._stats["worker_starts"] += 1
+            self._stats["start_seconds"] += elapsed
+        print(f"🐍 Started local worker {pid} for session {session_id} in {elapsed:.3f}s")
+        return LocalWorker(session_id, zygote, conn, pid, message.get("rss_mb", 0.0))
+
+    def _reap(self):
+        """Stop idle workers and, past max_workers, the least recently used ones"""
+        now = time.time()
+        stale = []
+        with self._lock:
+            for session_id, worker in list(self._workers.items()):
+                if worker.pending or worker.lock.locked():
+                    continue
+                if now - worker.last_used > self.idle_ttl or len(self._workers) - len(stale) > self.max_workers:
+                    stale.append(self._workers.pop(session_id))
+            self._stats["reaped"] += len(stale)
+        for worker in stale:
+            worker.kill()
+
+    def _worker(self, session_id: str) -> LocalWorker:
+        with self._lock:
+            worker = self._workers.get(session_id)
+            if worker is not None and worker.alive():
+                self._workers.move_to_end(session_id)
+                self._stats["warm_hits"] += 1
+                worker.pending += 1
+                return worker
+            self._workers.pop(session_id, None)
+        worker = self._start_worker(session_id)
+        with self._lock:
+            existing = self._workers.get(session_id)
+            if existing is not None and existing.alive():
+                # Another request for the session started one meanwhile
+                extra, worker = worker, existing
+            else:
+                extra = None
+                self._workers[session_id] = worker
+            worker.pending += 1
+        if extra is not None:
+            extra.kill()
+        self._reap()
+        return worker
+
+    def recycle_reason(self, worker: LocalWorker) -> Optional[str]:
+        """Why the worker should be replaced before its next execution, or None"""
+        if self.max_runs and worker.runs >= self.max_runs:
+            return f"after {worker.runs} executions"
+        if self.max_memory_growth_mb and worker.rss_mb - worker.base_rss_mb > self.max_memory_growth_mb:
+            return f"after growing to {worker.rss_mb:.0f} MB"
+        return None
+
+    def _lease(self, session_id: str) -> Tuple[LocalWorker, Optional[str]]:
+        """The session's worker locked for one execution, and why its previous worker was recycled if it was.
+
+        Re-checked after locking since the reaper may have stopped it meanwhile.
+        """
+        recycled = None
+        while True:
+            worker = self._worker(session_id)
+            worker.lock.acquire()
+            with self._lock:
+                worker.pending -= 1
+                current = self._workers.get(session_id) is worker
+            if current and not worker.exited():
+                recycled_now = self.recycle_reason(worker)
+                if recycled_now is None:
+                    return worker, recycled
+                recycled = recycled_now
+                with self._lock:
+                    self._stats["recycled"] += 1
+                print(f"♻️  Recycling local worker for session {session_id} {recycled}")
+                self._drop(worker)
+            worker.lock.release()
+
+    def _drop(self, worker: LocalWorker):
+        with self._lock:
+            if self._workers.get(worker.session_id) is worker:
+                del self._workers[worker.session_id]
+        worker.kill()
+
+    def save_session_files(self, worker: LocalWorker, files) -> str:
+        workdir = self.workdir(worker.session_id)
+        for file_info in files or []:
+            digest = file_digest(file_info)
+            if worker.files.get(file_info['filename']) == digest:
+                continue
+            with open(os.path.join(workdir, os.path.basename(file_info['filename'])), "wb") as f:
+                f.write(file_content(file_info))
+            worker.files[file_info['filename']] = digest
+            with self._lock:
+                self._stats["files_written"] += 1
+        return workdir
+
+    def stream(self, request: ExecutionRequest) -> Iterator[ExecutionChunk]:
+        with self._slots:
+            yield from self._stream(request)
+
+    def _stream(self, request: ExecutionRequest) -> Iterator[ExecutionChunk]:
+        worker, recycled = self._lease(request.session_id)
+        timed_out = threading.Event()
+        done = False
+        try:
+            if recycled:
+                yield ExecutionChunk(stderr=f"Local worker was recycled {recycled} - the session's variables were reset\n")
+            self.save_session_files(worker, request.files)
+            worker.runs += 1
+            with self._lock:
+                self._stats["executions"] += 1
+
+            def kill():
+                timed_out.set()
+                worker.kill()
+
+            timer = threading.Timer(self.timeout, kill)
+            timer.start()
+            try:
+                worker.conn.send({"code": request.code, "cpu_seconds": self.cpu_seconds})
+                while True:
+                    message = worker.conn.recv()
+                    if message.get("done"):
+                        worker.rss_mb = message.get("rss_mb", worker.rss_mb)
+                        done = True
+                        break
+                    yield ExecutionChunk(stdout=message.get("stdout", ""), stderr=message.get("stderr", ""))
+            except (EOFError, OSError):
+                pass  # the worker died or was killed; reported below
+            finally:
+                timer.cancel()
+        finally:
+            worker.last_used = time.time()
+            if not done:
+                self._drop(worker)
+            worker.lock.release()
+            self._reap()
+
+        if done:
+            return
+        if timed_out.is_set():
+            with self._lock:
+                self._stats["timeouts"] += 1
+            yield ExecutionChunk(error=f"Execution timed out after {self.timeout:g}s - the session's variables were reset")
+        else:
+            with self._lock:
+                self._stats["crashes"] += 1
+            yield ExecutionChunk(error=f"Local worker exited unexpectedly (exit code {worker.exit_code}) "
+                                       f"- the session's variables were reset")
+
+    def forget(self, session_id: str, client: Any = None):
+        """Stop a session's worker and delete its working directory"""
+        with self._lock:
+            worker = self._workers.pop(session_id, None)
+        if worker is not None:
+            worker.kill()
+        shutil.rmtree(self.workdir(session_id), ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers.values())
+            self._workers.clear()
+        for worker in workers:
+            worker.kill()
+        if self._zygote is not None:
+            self._zygote.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["workers"] = len(self._workers)
+        stats["avg_start_seconds"] = round(stats.pop("start_seconds") / stats["worker_starts"], 3) if stats["worker_starts"] else 0.0
+        stats.update(root=self.root, preload=self.preload, timeout=self.timeout,
+                     memory_mb=self.memory_mb, cpu_seconds=self.cpu_seconds, concurrency=self.concurrency,
+                     max_workers=self.max_workers, max_runs=self.max_runs,
+                     max_memory_growth_mb=self.max_memory_growth_mb)
+        return stats
+
+
+if __name__ == "__main__":
+    # Benchmark: time to first output of report-style code that imports the scientific stack.
+    # A fresh `python a.py` per execution (how code used to be run locally) against a worker
+    # forked from the warm zygote for a new session, and a warm worker for the same session.
+    import statistics
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    code = ("import pandas as pd\nimport numpy as np\nimport matplotlib.pyplot as plt\nimport seaborn as sns\n"
+            "from fpdf import FPDF\nfrom pptx import Presentation\nprint('first output', flush=True)\n")
+
+    def subprocess_first_output(directory: str) -> float:
+        script = os.path.join(directory, "a.py")
+        with open(script, "w") as f:
+            f.write(code)
+        started = time.time()
+        process = subprocess.Popen([sys.executable, script], cwd=directory, stdout=subprocess.PIPE, text=True,
+                                   env={**os.environ, "MPLBACKEND": "Agg"})
+        process.stdout.readline()
+        elapsed = time.time() - started
+        process.wait()
+        process.stdout.close()
+        return elapsed
+
+    def engine_first_output(engine: LocalSandboxExecutor, session_id: str) -> float:
+        started = time.time()
+        elapsed = None
+        for chunk in engine.stream(ExecutionRequest(code, session_id)):
+            if chunk.stdout and elapsed is None:
+                elapsed = time.time() - started
+        return elapsed
+
+    def report(label: str, samples: List[float]):
+        print(f"   {label:<36} p50={statistics.median(samples) * 1000:8.1f} ms  "
+              f"min={min(samples) * 1000:8.1f} ms  max={max(samples) * 1000:8.1f} ms")
+
+    directory = tempfile.mkdtemp(prefix="local_sandbox_bench_")
+    print(f"\n📊 Local execution: time to first output over {runs} runs ({os.cpu_count()} CPUs)")
+    report("new `python a.py` subprocess", [subprocess_first_output(directory) for _ in range(runs)])
+
+    engine = LocalSandboxExecutor(root=directory, max_workers=runs + 1)
+    started = time.time()
+    engine.warm_up()
+    print(f"   zygote start + preload (once):       {time.time() - started:.2f} s")
+    report("forked worker, new session", [engine_first_output(engine, f"bench-{i}") for i in range(runs)])
+    report("warm worker, same session", [engine_first_output(engine, "bench-0") for _ in range(runs)])
+    engine.close()
+    shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,227 @@
+"""Worker processes for LocalSandboxExecutor.
+
+Run as a script this is the zygote: it imports the scientific stack once and
+then forks a worker for every request on its control socket, so workers start
+with the libraries already loaded and share their memory copy-on-write. A
+worker (``serve``) runs one session's code in a persistent namespace. It
+receives requests (``{"code": ...}``) on a Connection and answers with
+``{"stdout": ...}`` / ``{"stderr": ...}`` messages while the code runs, then
+``{"done": true}``. File descriptors 0 and 1 point at /dev/null and 2 at the
+session's log, so output written below Python's sys.stdout doesn't get lost
+into the server's terminal.
+"""
+import base64
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+from multiprocessing.connection import Connection
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+IMAGE_MARKER = "IMAGE_DATA:"
+
+
+class CpuLimitExceeded(Exception):
+    pass
+
+
+class MessageStream(io.TextIOBase):
+    """sys.stdout / sys.stderr replacement that forwards whole lines as protocol messages"""
+
+    def __init__(self, send, kind: str, flush_at: int = 8192):
+        self.send = send
+        self.kind = kind
+        self.flush_at = flush_at
+        self.buffer_parts = []
+        self.buffered = 0
+        self.saw_image = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.kind == "stdout" and IMAGE_MARKER in text:
+            self.saw_image = True
+        self.buffer_parts.append(text)
+        self.buffered += len(text)
+        if "\n" in text or self.buffered >= self.flush_at:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer_parts:
+            self.send({self.kind: "".join(self.buffer_parts)})
+            self.buffer_parts = []
+            self.buffered = 0
+
+
+def set_cpu_limit(seconds: float):
+    """Allow ``seconds`` more CPU time from now; the limit is cumulative for the process, so move it each run"""
+    if resource is None or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    soft = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def on_cpu_limit(signum, frame):
+    raise CpuLimitExceeded("CPU time limit exceeded")
+
+
+def capture_figures(stdout: MessageStream):
+    """Print open matplotlib figures as IMAGE_DATA lines, unless the code printed its own images"""
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is None or not pyplot.get_fignums():
+        return
+    if not stdout.saw_image:
+        for number in pyplot.get_fignums():
+            buffer = io.BytesIO()
+            pyplot.figure(number).savefig(buffer, format="png", bbox_inches="tight")
+            stdout.write(f"\n{IMAGE_MARKER}{base64.b64encode(buffer.getvalue()).decode('ascii')}\n")
+    pyplot.close("all")
+
+
+def run(code: str, namespace: dict, stdout: MessageStream, stderr: MessageStream):
+    try:
+        exec(compile(code, "<sandbox>", "exec"), namespace)
+    except SystemExit:
+        pass
+    except BaseException as e:
+        # Drop this function's frame so the traceback starts in the user's code
+        tb = e.__traceback__.tb_next if e.__traceback__ else None
+        stderr.write("".join(traceback.format_exception(type(e), e, tb)))
+    try:
+        capture_figures(stdout)
+    except Exception as e:
+        stderr.write(f"Could not capture figures: {e}\n")
+
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def isolate(workdir: str, log_path: str, memory_mb: int):
+    """Own process group, working directory, stdio and memory limit for this worker"""
+    os.setsid()
+    os.chdir(workdir)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    os.dup2(log, 2)
+    sys.stdin = open(os.devnull)
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    os.environ["MPLBACKEND"] = "Agg"
+    if "matplotlib" in sys.modules:
+        sys.modules["matplotlib"].use("Agg")
+
+
+def serve(conn, workdir: str, log_path: str, memory_mb: int = 0):
+    isolate(workdir, log_path, memory_mb)
+    if hasattr(signal, "SIGXCPU"):
+        signal.signal(signal.SIGXCPU, on_cpu_limit)
+    conn.send({"ready": True, "pid": os.getpid(), "rss_mb": peak_rss_mb()})
+
+    namespace = {"__name__": "__main__"}
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        stdout, stderr = MessageStream(conn.send, "stdout"), MessageStream(conn.send, "stderr")
+        sys.stdout, sys.stderr = stdout, stderr
+        set_cpu_limit(request.get("cpu_seconds"))
+        try:
+            run(request["code"], namespace, stdout, stderr)
+        finally:
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+            stdout.flush()
+            stderr.flush()
+        conn.send({"done": True, "rss_mb": peak_rss_mb()})
+
+
+def reap(exit_codes: dict):
+    """Collect finished workers so they don't linger as zombies"""
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+        exit_codes[pid] = os.waitstatus_to_exitcode(status)
+
+
+def zygote(control_fd: int, preload: list):
+    """Import ``preload`` once, then fork a worker for each request on the control socket"""
+    for module in preload:
+        try:
+            importlib.import_module(module)
+        except Exception as e:
+            print(f"⚠️  Could not preload {module}: {e}", file=sys.stderr)
+    control = socket.socket(fileno=control_fd)
+    control.sendall(json.dumps({"ready": True, "pid": os.getpid()}).encode() + b"\n")
+
+    exit_codes = {}
+    buffer, fds = b"", []
+    while True:
+        while b"\n" not in buffer:
+            try:
+                data, received, _, _ = socket.recv_fds(control, 65536, 1)
+            except OSError:
+                return
+            if not data:
+                return  # the server closed its end
+            buffer += data
+            fds += received
+        message, buffer = buffer.split(b"\n", 1)
+        request = json.loads(message)
+        reap(exit_codes)
+        if request["op"] == "fork":
+            worker_fd = fds.pop(0)
+            pid = os.fork()
+            if pid == 0:
+                control.close()
+                code = 0
+                try:
+                    serve(Connection(worker_fd), request["workdir"], request["log_path"], request["memory_mb"])
+                except BaseException:
+                    traceback.print_exc()
+                    code = 1
+                finally:
+                    os._exit(code)
+            os.close(worker_fd)
+            reply = {"pid": pid}
+        else:
+            # The server killed the worker or saw it exit; wait for it to get the exit code
+            pid = request["pid"]
+            if pid not in exit_codes:
+                try:
+                    exit_codes[pid] = os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+                except ChildProcessError:
+                    pass
+            reply = {"exit_code": exit_codes.pop(pid, None)}
+        control.sendall(json.dumps(reply).encode() + b"\n")
+
+
+if __name__ == "__main__":
+    zygote(int(sys.argv[1]), sys.argv[2:])
@@ -0,0 +1,122 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict
+
+_CLOSE = object()
+
+
+class OutputStreamer:
+    """Forwards interpreter output from a worker thread to async senders as it arrives.
+
+    The execution runs on a dispatcher thread while the WebSocket lives on the
+    event loop. ``emit()`` hands each message to a bounded asyncio queue; when a
+    slow client lets the queue fill up, ``emit()`` blocks, which in turn stops the
+    worker from pulling more events off the interpreter stream. That caps what
+    the server buffers per execution at ``max_pending`` messages.
+    """
+
+    def __init__(self,
+                 send: Callable[[Dict[str, Any]], Awaitable[None]],
+                 loop: asyncio.AbstractEventLoop,
+                 session_id: str,
+                 max_pending: int = 32,
+                 emit_timeout: float = 30):
+        self.send = send
+        self.loop = loop
+        self.session_id = session_id
+        self.execution_id = str(uuid.uuid4())
+        self.emit_timeout = emit_timeout
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.closed = False
+
+        self.sent = 0
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+        self._task = None
+
+    def start(self):
+        """Start the sender task; call from the event loop"""
+        self._task = self.loop.create_task(self._run())
+        return self
+
+    def emit(self, message: Dict[str, Any]):
+        """Queue a message for the client, blocking while the client is behind"""
+        if self.closed:
+            return
+        message = {**message, "session_id": self.session_id, "execution_id": self.execution_id}
+
+        if self._on_loop_thread():
+            # Can't block the loop on itself; drop instead when the client is behind
+            try:
+                self.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+            return
+
+        started = time.time()
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(message), self.loop)
+        try:
+            future.result(self.emit_timeout)
+        except FutureTimeoutError:
+            # Client stalled for too long - stop streaming rather than stalling the execution
+            future.cancel()
+            self.dropped += 1
+            self.closed = True
+            print(f"⚠️  Output stream for session {self.session_id} stalled, streaming disabled")
+        finally:
+            self.blocked_seconds += time.time() - started
+
+    async def aclose(self):
+        """Flush queued messages, send stream_end and stop the sender task.
+
+        Waits at most ``emit_timeout`` for a stalled client; whatever it hasn't
+        taken by then is dropped so the request can finish.
+        """
+        if self._task is None:
+            return
+        end = None if self.closed else {"type": "stream_end", "session_id": self.session_id,
+                                         "execution_id": self.execution_id}
+        self.closed = True
+
+        async def flush():
+            if end is not None:
+                await self.queue.put(end)
+            await self.queue.put(_CLOSE)
+            await self._task
+
+        try:
+            await asyncio.wait_for(flush(), self.emit_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += self.queue.qsize() + 1
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            print(f"⚠️  Output stream for session {self.session_id} stalled on close, {self.queue.qsize()} messages dropped")
+        self._task = None
+
+    async def _run(self):
+        while True:
+            message = await self.queue.get()
+            if message is _CLOSE:
+                return
+            try:
+                await self.send(message)
+                self.sent += 1
+            except Exception as e:
+                self.dropped += 1
+                print(f"⚠️  Output stream send failed: {e}")
+
+    def _on_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "execution_id": self.execution_id,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "blocked_seconds": round(self.blocked_seconds, 3)
+        }
@@ -0,0 +1,304 @@
+import hashlib
+import re
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from ExecutionMetrics import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+SUMMARY_MARKER = "[conversation_summary]"
+STATIC_BLOCK = re.compile(r"\[(\w+):[0-9a-f]{8}\]\n.*?\n\[/\1\]", re.S)
+STATIC_REFERENCE = "(The {name} block given earlier in this conversation still applies unchanged.)"
+TRIM_NOTE = "... ({} more lines left out to fit the prompt budget)"
+REQUEST_LINE = re.compile(r"^User request: (.*)$", re.M)
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text`` computed locally - BPE when tiktoken and its vocabulary are available, else ~4 chars/token"""
+    global _encoding
+    if tiktoken is not None and _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text or "", disallowed_special=()))
+    return estimate_tokens(text)
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """All text a Strands message carries, including tool calls and tool results"""
+    parts = []
+    for block in message.get("content", []):
+        if "text" in block:
+            parts.append(block["text"])
+        elif "toolUse" in block:
+            parts.append(str(block["toolUse"].get("input", "")))
+        elif "toolResult" in block:
+            parts.extend(str(item.get("text", item.get("json", ""))) for item in block["toolResult"].get("content", []))
+    return "\n".join(parts)
+
+
+def conversation_digest(messages: List[Dict[str, Any]]) -> Optional[str]:
+    """Digest of the turns an agent has retained, or None for a fresh conversation"""
+    if not messages:
+        return None
+    text = "\0".join(f"{message.get('role')}:{message_text(message)}" for message in messages)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _clip(text: str, chars: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= chars else text[:chars - 1] + "…"
+
+
+class Prompt:
+    """One request's prompt as named sections, rendered within the token budget the builder leaves it.
+
+    Sections render in the order they were added. ``required`` sections (the
+    user's request, the code to run) are always sent whole; the others are
+    cut, lowest ``priority`` first, line by line from the end, when the
+    prompt doesn't fit. Static sections are blocks that repeat across
+    requests (instructions, dataset schemas): they are tagged with a content
+    hash, and when the agent's retained conversation already holds the same
+    block only a one-line reference to it is sent.
+    """
+
+    def __init__(self):
+        self.sections: List[Dict[str, Any]] = []
+        self.rendered: Optional[str] = None
+
+    def add(self, name: str, text: str, priority: int = 0, required: bool = False) -> "Prompt":
+        if text and text.strip():
+            self.sections.append({"name": name, "text": text.strip("\n"), "body": text.strip("\n"),
+                                  "priority": priority, "required": required, "static": False})
+        return self
+
+    def static(self, name: str, text: str, priority: int = 0) -> "Prompt":
+        if not text or not text.strip():
+            return self
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+        if any(section.get("digest") == digest for section in self.sections):
+            return self
+        body = text.strip("\n")
+        self.sections.append({"name": name, "text": f"[{name}:{digest}]\n{body}\n[/{name}]", "body": body,
+                              "priority": priority, "required": False, "static": True, "digest": digest})
+        return self
+
+    def text(self) -> str:
+        """The whole prompt, untrimmed"""
+        return "\n\n".join(section["text"] for section in self.sections)
+
+    def render(self, budget: int, history: str = "") -> tuple:
+        """Prompt text fitting ``budget`` tokens given the retained conversation ``history``; returns (text, report)"""
+        sections = []
+        deduped = []
+        for section in self.sections:
+            section = dict(section)
+            if section["static"] and f"[{section['name']}:{section['digest']}]" in history:
+                section["text"] = STATIC_REFERENCE.format(name=section["name"])
+                deduped.append(section["name"])
+            section["tokens"] = count_tokens(section["text"])
+            sections.append(section)
+
+        trimmed = {}
+        excess = sum(section["tokens"] for section in sections) - budget
+        for section in sorted((s for s in sections if not s["required"]), key=lambda s: s["priority"]):
+            if excess <= 0:
+                break
+            before = section["tokens"]
+            # A cut static block loses its tag, so a partial copy is never taken for the whole block later
+            lines = section["body"].splitlines() if before > excess else []
+            saved, total = 0, len(lines)
+            while lines and saved < excess + count_tokens(TRIM_NOTE.format(total)):
+                saved += count_tokens(lines.pop() + "\n")
+            # Per-line counts are approximate; drop more lines until the cut section really fits
+            def cut():
+                return "\n".join(lines + [TRIM_NOTE.format(total - len(lines))]) if lines else ""
+            while lines and before - count_tokens(cut()) < excess:
+                lines.pop()
+            section["text"] = cut()
+            section["tokens"] = count_tokens(section["text"])
+            trimmed[section["name"]] = before - section["tokens"]
+            excess -= trimmed[section["name"]]
+
+        self.rendered = "\n\n".join(section["text"] for section in sections if section["text"])
+        return self.rendered, {
+            "prompt_tokens": sum(section["tokens"] for section in sections),
+            "sections": {section["name"]: section["tokens"] for section in sections},
+            "static_deduped": deduped,
+            "trimmed_tokens": trimmed,
+            "over_budget": excess > 0
+        }
+
+
+class PromptBuilder:
+    """Assembles agent prompts within a per-request input token budget and keeps agent conversations compact.
+
+    Before each invocation the agent's retained conversation is cut to the
+    last ``history_turns`` turns; older turns are folded into a single
+    summary message of one line per turn (the request and the start of the
+    answer), so follow-ups keep their context without resending whole
+    earlier prompts, generated code and tool output. Text in the kept turns'
+    tool results is clipped to ``max_result_chars``. If the system prompt,
+    the history and the new prompt still don't fit ``budget`` tokens the kept
+    turns are summarized too, and then the prompt's optional sections are
+    trimmed. Input tokens are recorded per purpose (generate, analyze,
+    execute) for capacity planning: the local count of what was sent and,
+    when the model reports it, the provider's own count.
+    """
+
+    def __init__(self, budget: int = 8000, history_turns: int = 2, summary_lines: int = 12,
+                 summary_chars: int = 160, max_result_chars: int = 2000, window: int = 500):
+        self.budget = budget
+        self.history_turns = history_turns
+        self.summary_lines = summary_lines
+        self.summary_chars = summary_chars
+        self.max_result_chars = max_result_chars
+        self._lock = threading.Lock()
+        self._purposes: Dict[str, Dict[str, Any]] = {}
+        self._window = window
+
+    def compose(self) -> Prompt:
+        return Prompt()
+
+    @staticmethod
+    def _turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """Messages grouped by turn: a user message with text starts one, tool calls and results stay inside it"""
+        turns = []
+        for message in messages:
+            starts = message.get("role") == "user" and not any("toolResult" in block for block in message.get("content", []))
+            if starts or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _summarize(self, turn: List[Dict[str, Any]]) -> str:
+        request = STATIC_BLOCK.sub("", message_text(turn[0]))
+        asked = REQUEST_LINE.search(request)
+        request = asked.group(1) if asked else request
+        answers = [message_text(message) for message in turn[1:] if message.get("role") == "assistant"]
+        answer = next((text for text in reversed(answers) if text.strip()), "")
+        return f"- {_clip(request, self.summary_chars)} -> {_clip(answer, self.summary_chars) or '(no answer)'}"
+
+    def _clip_results(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        content = []
+        for block in message.get("content", []):
+            if "toolResult" in block:
+                result = dict(block["toolResult"])
+                result["content"] = [
+                    {**item, "text": item["text"][:self.max_result_chars] + "\n... (output truncated)"}
+                    if len(item.get("text", "")) > self.max_result_chars else item
+                    for item in result.get("content", [])]
+                block = {**block, "toolResult": result}
+            content.append(block)
+        return {**message, "content": content}
+
+    def compact(self, messages: List[Dict[str, Any]], keep: Optional[int] = None) -> tuple:
+        """Conversation with all but the last ``keep`` turns folded into a summary; returns (messages, turns folded)"""
+        keep = self.history_turns if keep is None else keep
+        turns = self._turns(messages)
+        summary = []
+        if turns and message_text(turns[0][0]).startswith(SUMMARY_MARKER):
+            summary = message_text(turns.pop(0)[0]).splitlines()[1:]
+        folded = turns[:max(len(turns) - keep, 0)]
+        kept = turns[len(folded):]
+        if not folded and not summary:
+            return [self._clip_results(message) for turn in kept for message in turn], 0
+
+        summary = (summary + [self._summarize(turn) for turn in folded])[-self.summary_lines:]
+        compacted = [
+            {"role": "user", "content": [{"text": "\n".join([SUMMARY_MARKER] + summary)}]},
+            {"role": "assistant", "content": [{"text": "Noted - I'll use these earlier requests as context."}]}
+        ]
+        compacted.extend(self._clip_results(message) for turn in kept for message in turn)
+        return compacted, len(folded)
+
+    def prepare(self, agent: Any, prompt: Prompt) -> tuple:
+        """Compact ``agent``'s conversation and render ``prompt`` into what's left of the budget; returns (text, report)"""
+        messages = list(getattr(agent, "messages", None) or [])
+        system_tokens = count_tokens(str(getattr(agent, "system_prompt", None) or ""))
+        prompt_tokens = count_tokens(prompt.text())
+
+        compacted, folded = self.compact(messages)
+        history_tokens = sum(count_tokens(message_text(message)) for message in compacted)
+        if compacted and system_tokens + history_tokens + prompt_tokens > self.budget:
+            compacted, folded = self.compact(messages, keep=0)
+            history_tokens = sum(count_tokens(message_text(message)) for message in compacted)
+        if hasattr(agent, "messages"):
+            agent.messages[:] = compacted
+
+        history = "\n".join(message_text(message) for message in compacted)
+        text, report = prompt.render(self.budget - system_tokens - history_tokens, history)
+        report.update({
+            "system_tokens": system_tokens,
+            "history_tokens": history_tokens,
+            "turns_compacted": folded,
+            "input_tokens": system_tokens + history_tokens + report["prompt_tokens"],
+            "budget": self.budget
+        })
+        return text, report
+
+    def invoke(self, agent: Any, prompt: Prompt, purpose: str) -> tuple:
+        """Call ``agent`` with ``prompt`` assembled within the budget; returns (agent result, prompt report)"""
+        text, report = self.prepare(agent, prompt)
+        result = agent(text)
+        report["reported_input_tokens"] = self.reported_input_tokens(result)
+        self.record(purpose, report)
+        return result, report
+
+    def record_turn(self, agent: Any, prompt: Prompt, answer: str):
+        """Add a turn answered without the model (e.g. from a cache) to ``agent``'s conversation, so follow-ups see it"""
+        text, _ = self.prepare(agent, prompt)
+        if hasattr(agent, "messages"):
+            agent.messages.append({"role": "user", "content": [{"text": text}]})
+            agent.messages.append({"role": "assistant", "content": [{"text": answer}]})
+
+    @staticmethod
+    def reported_input_tokens(agent_result: Any) -> Optional[int]:
+        """Input tokens the model reported for the latest invocation, across all of its model calls"""
+        try:
+            invocation = agent_result.metrics.latest_agent_invocation
+            usage = invocation.usage if invocation is not None else agent_result.metrics.accumulated_usage
+            return int(usage["inputTokens"]) or None
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return None
+
+    def record(self, purpose: str, report: Dict[str, Any]):
+        with self._lock:
+            stats = self._purposes.setdefault(purpose, {
+                "requests": 0, "input_tokens": 0, "reported_input_tokens": 0, "trimmed_tokens": 0,
+                "static_deduped": 0, "turns_compacted": 0, "over_budget": 0,
+                "recent": deque(maxlen=self._window)})
+            stats["requests"] += 1
+            stats["input_tokens"] += report["input_tokens"]
+            stats["reported_input_tokens"] += report.get("reported_input_tokens") or 0
+            stats["trimmed_tokens"] += sum(report["trimmed_tokens"].values())
+            stats["static_deduped"] += len(report["static_deduped"])
+            stats["turns_compacted"] += report["turns_compacted"]
+            stats["over_budget"] += int(report["over_budget"])
+            stats["recent"].append(report.get("reported_input_tokens") or report["input_tokens"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            purposes = {purpose: dict(stats, recent=sorted(stats["recent"])) for purpose, stats in self._purposes.items()}
+        for stats in purposes.values():
+            recent = stats.pop("recent")
+            stats["avg_input_tokens"] = round(stats["input_tokens"] / stats["requests"], 1)
+            stats["p95_input_tokens"] = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0
+        return {
+            "budget": self.budget,
+            "history_turns": self.history_turns,
+            "tokenizer": "tiktoken" if _encoding else "estimate",
+            "purposes": purposes
+        }
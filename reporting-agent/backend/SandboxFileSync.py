@@ -0,0 +1,193 @@
+import base64
+import gzip
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+UNPACK_CODE = """def _sandbox_sync_unpack(packed, target):
+    import base64, gzip, os
+    with open(packed) as f:
+        data = gzip.decompress(base64.b64decode(f.read()))
+    with open(target, "wb") as f:
+        f.write(data)
+    os.remove(packed)
+{calls}del _sandbox_sync_unpack
+"""
+
+
+# Inline ``content`` carrying this ``encoding`` is gzip-compressed bytes in base64, for binary or large files
+PACKED_ENCODING = "gzip+base64"
+
+
+def pack_content(data: bytes) -> str:
+    return base64.b64encode(gzip.compress(data, 6)).decode("ascii")
+
+
+def file_digest(file_info: Dict[str, Any]) -> str:
+    """sha256 of a session file - taken from the upload reference when the server already computed it"""
+    if file_info.get("sha256"):
+        return file_info["sha256"]
+    return hashlib.sha256(file_content(file_info)).hexdigest()
+
+
+def file_content(file_info: Dict[str, Any]) -> bytes:
+    """Bytes of a session file: inline ``content`` or the spooled file at ``path``"""
+    if "content" in file_info:
+        content = file_info["content"]
+        if file_info.get("encoding") == PACKED_ENCODING:
+            return gzip.decompress(base64.b64decode(content))
+        return content.encode("utf-8") if isinstance(content, str) else content
+    with open(file_info["path"], "rb") as f:
+        return f.read()
+
+
+class MissingSandboxFiles(Exception):
+    """Files were sent by reference only and the sandbox doesn't have them - resend with content"""
+
+    def __init__(self, filenames: List[str]):
+        super().__init__(f"Sandbox is missing files: {', '.join(filenames)}")
+        self.filenames = filenames
+
+
+class SandboxManifest:
+    """What one interpreter holds: sandbox path -> sha256 of the content written there"""
+
+    def __init__(self, client: Any):
+        self.client = client
+        self.files: Dict[str, str] = {}
+
+
+class SandboxFileSync:
+    """Upload-once file sync for code-interpreter sessions.
+
+    Remembers the content hash of every file written to each pooled interpreter
+    and only calls writeFiles for files that are new or changed. Files of at
+    least ``compress_threshold`` bytes, and every file flagged ``binary``, are
+    sent gzip-compressed and base64 encoded, then unpacked inside the sandbox.
+    Manifests are tied to the client object, so an interpreter restarted after
+    eviction starts empty; register ``forget`` as a pool evict listener to
+    release them.
+
+    Code that overwrites or deletes an uploaded file in the sandbox isn't
+    noticed; call ``invalidate`` if that matters.
+    """
+
+    def __init__(self, compress_threshold: int = 256 * 1024):
+        self.compress_threshold = compress_threshold
+        self._manifests: Dict[str, SandboxManifest] = {}
+        self._lock = threading.Lock()
+        self._stats = {"syncs": 0, "files_skipped": 0, "files_uploaded": 0, "files_compressed": 0,
+                       "bytes_skipped": 0, "bytes_uploaded": 0, "bytes_sent": 0, "resets": 0}
+
+    def _manifest(self, session_id: str, client: Any) -> SandboxManifest:
+        with self._lock:
+            manifest = self._manifests.get(session_id)
+            if manifest is None or manifest.client is not client:
+                if manifest is not None:
+                    self._stats["resets"] += 1
+                manifest = self._manifests[session_id] = SandboxManifest(client)
+            return manifest
+
+    def pending(self, session_id: str, client: Any, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The subset of ``files`` this interpreter doesn't already hold, each with its ``sha256`` filled in"""
+        manifest = self._manifest(session_id, client)
+        pending = []
+        for file_info in files or []:
+            digest = file_digest(file_info)
+            if manifest.files.get(file_info["filename"]) != digest:
+                pending.append({**file_info, "sha256": digest})
+            else:
+                with self._lock:
+                    self._stats["files_skipped"] += 1
+                    self._stats["bytes_skipped"] += file_info.get("size") or len(file_info.get("content", ""))
+        return pending
+
+    def sync(self, session_id: str, client: Any, files: List[Dict[str, Any]]) -> Optional[str]:
+        """Write new or changed files into the interpreter; returns the error text on failure, else None"""
+        with self._lock:
+            self._stats["syncs"] += 1
+        pending = self.pending(session_id, client, files)
+        if not pending:
+            if files:
+                print(f"📁 {len(files)} session files already in sandbox - upload skipped")
+            return None
+
+        missing = [file_info["filename"] for file_info in pending if "content" not in file_info and "path" not in file_info]
+        if missing:
+            raise MissingSandboxFiles(missing)
+
+        files_data, packed = [], []
+        for file_info in pending:
+            data = file_content(file_info)
+            if len(data) >= self.compress_threshold or file_info.get("binary"):
+                packed_path = f"{file_info['filename']}.gz.b64"
+                files_data.append({"path": packed_path, "text": pack_content(data)})
+                packed.append((packed_path, file_info["filename"]))
+            else:
+                files_data.append({"path": file_info["filename"], "text": data.decode("utf-8", errors="replace")})
+            with self._lock:
+                self._stats["bytes_uploaded"] += len(data)
+                self._stats["bytes_sent"] += len(files_data[-1]["text"])
+
+        print(f"📁 Uploading {len(pending)} of {len(files)} session files to sandbox ({len(packed)} compressed)...")
+        error = self._invoke(client, "writeFiles", {"content": files_data})
+        if error is None and packed:
+            calls = "".join(f"_sandbox_sync_unpack({packed_path!r}, {target!r})\n" for packed_path, target in packed)
+            error = self._invoke(client, "executeCode", {
+                "code": UNPACK_CODE.format(calls=calls),
+                "language": "python",
+                "clearContext": False
+            })
+        if error is not None:
+            # We no longer know what the sandbox holds for these paths
+            self.invalidate(session_id)
+            return error
+
+        manifest = self._manifest(session_id, client)
+        with self._lock:
+            for file_info in pending:
+                manifest.files[file_info["filename"]] = file_info["sha256"]
+            self._stats["files_uploaded"] += len(pending)
+            self._stats["files_compressed"] += len(packed)
+        return None
+
+    @staticmethod
+    def _invoke(client: Any, method: str, params: Dict[str, Any]) -> Optional[str]:
+        response = client.invoke(method, params)
+        for event in response["stream"]:
+            result = event.get("result", {})
+            error_content = result.get("content", [{}])
+            if result.get("isError", False):
+                error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
+                print(f"❌ File sync error ({method}): {error_text}")
+                return error_text
+            stderr = result.get("structuredContent", {}).get("stderr", "")
+            if method == "executeCode" and stderr:
+                print(f"❌ File unpack error: {stderr}")
+                return stderr
+        return None
+
+    def mark_sent(self, session_id: str, files: List[Dict[str, Any]]):
+        """Record files handed to a remote runtime, which keeps its own manifest per interpreter"""
+        manifest = self._manifest(session_id, None)
+        with self._lock:
+            for file_info in files or []:
+                manifest.files[file_info["filename"]] = file_digest(file_info)
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._manifests.pop(session_id, None)
+
+    def forget(self, session_id: str, client: Any = None):
+        """Pool evict listener: drop the manifest of an interpreter that was stopped"""
+        with self._lock:
+            manifest = self._manifests.get(session_id)
+            if manifest is not None and manifest.client is client:
+                del self._manifests[session_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["tracked_sessions"] = len(self._manifests)
+        stats["compress_threshold"] = self.compress_threshold
+        return stats
@@ -0,0 +1,403 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class SessionBackend:
+    """Persistent storage for serialized sessions, used by SessionStore.
+
+    ``shared`` backends are visible to every worker process and replica, so the
+    store writes each change through and re-reads a session whenever another
+    worker has bumped its version. Private backends are only spill space for
+    sessions evicted from this process's memory.
+
+    Shared backends also hold small expiring records for other per-request
+    state that any worker must be able to answer for: job status and results,
+    chart images and open chunked uploads. Interpreters, agents and the
+    execution cache stay in the process that created them - a request served
+    by another worker just starts or computes its own.
+    """
+
+    name = "base"
+    shared = False
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        """Return ``(data, version)`` or None"""
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> Optional[int]:
+        raise NotImplementedError
+
+    def store(self, session_id: str, data: Dict[str, Any], size: int, last_used: float) -> int:
+        """Write a session and return its new version"""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        raise NotImplementedError
+
+    def expire(self, older_than: float) -> int:
+        """Delete sessions last used before ``older_than``; returns how many"""
+        return 0
+
+    def existing(self, session_ids: List[str]) -> set:
+        """The subset of ``session_ids`` still stored"""
+        return {session_id for session_id in session_ids if self.version(session_id) is not None}
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Stored sessions as dicts with session_id, bytes and last_used"""
+        raise NotImplementedError
+
+    def put_record(self, kind: str, key: str, value: bytes, ttl: float):
+        """Store a shared record that expires ``ttl`` seconds from now"""
+        raise NotImplementedError
+
+    def get_record(self, kind: str, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def delete_record(self, kind: str, key: str) -> bool:
+        raise NotImplementedError
+
+    def list_records(self, kind: str) -> List[bytes]:
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.list_sessions())
+
+    def close(self):
+        pass
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in a SQLite file; safe to share between worker processes on one host.
+
+    WAL mode lets readers proceed while another process writes, and writes take
+    an immediate transaction so version bumps from concurrent workers serialize.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, shared: bool = True):
+        self.path = path
+        self.shared = shared
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            last_used REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0
+        )""")
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(sessions)")]
+        if "version" not in columns:
+            # Spill files written before sessions were versioned
+            self._db.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS records (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (kind, key)
+        )""")
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        with self._lock:
+            row = self._db.execute("SELECT data, version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def version(self, session_id: str) -> Optional[int]:
+        with self._lock:
+            row = self._db.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def store(self, session_id: str, data: Dict[str, Any], size: int, last_used: float) -> int:
+        payload = json.dumps(data, default=str)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    """INSERT INTO sessions (session_id, data, bytes, last_used, version) VALUES (?, ?, ?, ?, 1)
+                       ON CONFLICT(session_id) DO UPDATE SET
+                           data = excluded.data, bytes = excluded.bytes,
+                           last_used = excluded.last_used, version = sessions.version + 1""",
+                    (session_id, payload, size, last_used)
+                )
+                version = self._db.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()[0]
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return version
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,)).rowcount > 0
+
+    def expire(self, older_than: float) -> int:
+        with self._lock:
+            self._db.execute("DELETE FROM records WHERE expires_at < ?", (time.time(),))
+            return self._db.execute("DELETE FROM sessions WHERE last_used < ?", (older_than,)).rowcount
+
+    def existing(self, session_ids: List[str]) -> set:
+        stored = set()
+        with self._lock:
+            for start in range(0, len(session_ids), 500):
+                batch = session_ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                stored.update(row[0] for row in self._db.execute(
+                    f"SELECT session_id FROM sessions WHERE session_id IN ({placeholders})", batch))
+        return stored
+
+    def put_record(self, kind: str, key: str, value: bytes, ttl: float):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO records (kind, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                             (kind, key, value, time.time() + ttl))
+
+    def get_record(self, kind: str, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM records WHERE kind = ? AND key = ? AND expires_at >= ?",
+                                   (kind, key, time.time())).fetchone()
+        return bytes(row[0]) if row else None
+
+    def delete_record(self, kind: str, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("DELETE FROM records WHERE kind = ? AND key = ?", (kind, key)).rowcount > 0
+
+    def list_records(self, kind: str) -> List[bytes]:
+        with self._lock:
+            rows = self._db.execute("SELECT value FROM records WHERE kind = ? AND expires_at >= ?",
+                                    (kind, time.time())).fetchall()
+        return [bytes(row[0]) for row in rows]
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute("SELECT session_id, bytes, last_used FROM sessions ORDER BY last_used DESC").fetchall()
+        return [{"session_id": session_id, "bytes": size, "last_used": last_used} for session_id, size, last_used in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisError(Exception):
+    """Error reply from a Redis server"""
+
+
+class RespConnection:
+    """Minimal Redis (RESP2) client: one socket, one command at a time"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._roundtrip([("AUTH", self.password)])
+        if self.db:
+            self._roundtrip([("SELECT", self.db)])
+
+    def _close_socket(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            return RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from Redis: {line!r}")
+
+    def _roundtrip(self, commands):
+        # Pipeline: send every command, then read every reply
+        self._sock.sendall(b"".join(self._encode(command) for command in commands))
+        replies = [self._read_reply() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def pipeline(self, *commands):
+        """Send commands in one round trip; reconnects once if the connection dropped"""
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._roundtrip(commands)
+                except (ConnectionError, OSError):
+                    self._close_socket()
+                    if attempt == 2:
+                        raise
+
+    def execute(self, *args):
+        return self.pipeline(args)[0]
+
+    def close(self):
+        with self._lock:
+            self._close_socket()
+
+
+class RedisSessionBackend(SessionBackend):
+    """Sessions in Redis hashes, visible to every worker and replica.
+
+    Each session is one hash (data, bytes, last_used, version) under
+    ``{prefix}{session_id}``; writes bump the version inside MULTI/EXEC and
+    refresh the key's TTL, so Redis expires abandoned sessions by itself.
+    Shared records are plain string keys under ``{record_prefix}{kind}:{key}``.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", prefix: str = "reporting-agent:session:",
+                 ttl: int = 7 * 24 * 3600, record_prefix: str = "reporting-agent:record:"):
+        parsed = urlparse(url)
+        self.url = f"{parsed.scheme}://{parsed.hostname}:{parsed.port or 6379}{parsed.path}"
+        self.prefix = prefix
+        self.ttl = ttl
+        self.record_prefix = record_prefix
+        self.client = RespConnection(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(parsed.path.strip("/") or 0),
+            password=parsed.password
+        )
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def load(self, session_id: str) -> Optional[Tuple[Dict[str, Any], int]]:
+        data, version = self.client.execute("HMGET", self._key(session_id), "data", "version")
+        if data is None:
+            return None
+        return json.loads(data), int(version or 0)
+
+    def version(self, session_id: str) -> Optional[int]:
+        version = self.client.execute("HGET", self._key(session_id), "version")
+        return int(version) if version is not None else None
+
+    def store(self, session_id: str, data: Dict[str, Any], size: int, last_used: float) -> int:
+        key = self._key(session_id)
+        replies = self.client.pipeline(
+            ("MULTI",),
+            ("HSET", key, "data", json.dumps(data, default=str), "bytes", size, "last_used", last_used),
+            ("HINCRBY", key, "version", 1),
+            ("EXPIRE", key, self.ttl),
+            ("EXEC",)
+        )
+        return int(replies[-1][1])
+
+    def delete(self, session_id: str) -> bool:
+        return self.client.execute("DEL", self._key(session_id)) > 0
+
+    def existing(self, session_ids: List[str]) -> set:
+        if not session_ids:
+            return set()
+        replies = self.client.pipeline(*[("EXISTS", self._key(session_id)) for session_id in session_ids])
+        return {session_id for session_id, found in zip(session_ids, replies) if found}
+
+    def _keys(self, pattern: Optional[str] = None):
+        cursor = b"0"
+        while True:
+            cursor, keys = self.client.execute("SCAN", cursor, "MATCH", pattern or f"{self.prefix}*", "COUNT", 500)
+            yield from keys
+            if cursor in (b"0", 0, "0"):
+                return
+
+    def _record_key(self, kind: str, key: str) -> str:
+        return f"{self.record_prefix}{kind}:{key}"
+
+    def put_record(self, kind: str, key: str, value: bytes, ttl: float):
+        self.client.execute("SET", self._record_key(kind, key), value, "PX", max(1, int(ttl * 1000)))
+
+    def get_record(self, kind: str, key: str) -> Optional[bytes]:
+        return self.client.execute("GET", self._record_key(kind, key))
+
+    def delete_record(self, kind: str, key: str) -> bool:
+        return self.client.execute("DEL", self._record_key(kind, key)) > 0
+
+    def list_records(self, kind: str) -> List[bytes]:
+        keys = list(self._keys(f"{self.record_prefix}{kind}:*"))
+        if not keys:
+            return []
+        return [value for value in self.client.execute("MGET", *keys) if value is not None]
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        keys = list(self._keys())
+        if not keys:
+            return []
+        replies = self.client.pipeline(*[("HMGET", key, "bytes", "last_used") for key in keys])
+        sessions = [{
+            "session_id": key.decode()[len(self.prefix):],
+            "bytes": int(size or 0),
+            "last_used": float(last_used or 0)
+        } for key, (size, last_used) in zip(keys, replies)]
+        return sorted(sessions, key=lambda session: session["last_used"], reverse=True)
+
+    def count(self) -> int:
+        return sum(1 for _ in self._keys())
+
+    def close(self):
+        self.client.close()
+
+
+def create_session_backend(kind: str, **options) -> Optional[SessionBackend]:
+    """Build a backend from a SESSION_BACKEND name: memory, sqlite or redis"""
+    if kind == "memory":
+        spill_path = options.get("spill_path")
+        return SQLiteSessionBackend(spill_path, shared=False) if spill_path else None
+    if kind == "sqlite":
+        return SQLiteSessionBackend(options["sqlite_path"], shared=True)
+    if kind == "redis":
+        return RedisSessionBackend(options["redis_url"], ttl=int(options.get("ttl", 7 * 24 * 3600)))
+    raise ValueError(f"Unknown session backend '{kind}'. Expected memory, sqlite or redis")
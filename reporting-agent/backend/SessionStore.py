@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from CodeInterpreterSession import CodeInterpreterSession
+from SessionBackend import SessionBackend
+
+
+class SessionEntry:
+    """A resident session plus the accounting the store needs for eviction"""
+
+    def __init__(self, session: CodeInterpreterSession, version: int = 0):
+        self.session = session
+        self.bytes = session.estimate_bytes()
+        self.last_used = time.time()
+        self.version = version  # backend version this copy was loaded from or written as
+
+
+class SessionStore:
+    """Bounded in-memory cache of CodeInterpreterSession objects over a SessionBackend.
+
+    Sessions are kept in LRU order. A session larger than ``max_session_bytes``
+    has its oldest history trimmed; when the resident total passes ``max_bytes``
+    or ``max_sessions``, or a session sits idle longer than ``idle_ttl``, the
+    least recently used sessions are dropped from memory. ``get()`` rehydrates
+    them from the backend transparently. Stored sessions untouched for
+    ``spill_ttl`` seconds are deleted.
+
+    ``delete_listeners`` are called with the session id whenever a session is
+    gone for good: deleted, dropped from memory with no backend to spill to, or
+    spilled by this process and since expired (or deleted) in the backend. They
+    run outside the store lock and release whatever else is held per session.
+
+    With a private backend (or none) sessions are only written out when they
+    are evicted. With a shared backend every ``save()`` is written through and
+    ``get()`` reloads a session whose version another worker has bumped, so a
+    session survives a worker restart and is never served stale. Concurrent
+    writes to the same session from two workers are last-writer-wins.
+
+    Call ``save(session)`` after mutating a session.
+    """
+
+    def __init__(self,
+                 max_sessions: int = 500,
+                 max_bytes: int = 512 * 1024 * 1024,
+                 max_session_bytes: int = 64 * 1024 * 1024,
+                 idle_ttl: float = 1800,
+                 backend: Optional[SessionBackend] = None,
+                 spill_ttl: float = 7 * 24 * 3600):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.max_session_bytes = max_session_bytes
+        self.idle_ttl = idle_ttl
+        self.spill_ttl = spill_ttl
+        self.backend = backend
+        self.write_through = bool(backend and backend.shared)
+
+        self.delete_listeners = []
+        # Sessions this process spilled, checked against the backend on each reap; seeded with what is already
+        # stored so spills from before a restart are still cleaned up when they expire
+        self._spilled = set(stored["session_id"] for stored in backend.list_sessions()) if backend else set()
+        self._gone: List[str] = []
+
+        self._entries: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._reaper = None
+        self._stop_reaper = threading.Event()
+        self._stats = {"created": 0, "hits": 0, "rehydrated": 0, "reloaded": 0, "spilled": 0,
+                       "dropped": 0, "writes": 0, "trimmed_entries": 0, "expired_spills": 0}
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            if session_id in self._entries:
+                return True
+        return self.backend is not None and self.backend.version(session_id) is not None
+
+    def get(self, session_id: str) -> Optional[CodeInterpreterSession]:
+        """Return the session, rehydrating it from the backend if it isn't resident or is stale"""
+        with self._lock:
+            session = self._get_locked(session_id)
+        self._notify_gone()
+        return session
+
+    def _get_locked(self, session_id: str) -> Optional[CodeInterpreterSession]:
+        entry = self._entries.get(session_id)
+        if entry is not None:
+            # Versions differ when another worker changed or deleted it since we loaded it;
+            # version 0 means it was created here and never saved
+            if self.write_through and self.backend.version(session_id) != (entry.version or None):
+                self._remove_locked(session_id)
+                self._stats["reloaded"] += 1
+            else:
+                entry.last_used = time.time()
+                self._entries.move_to_end(session_id)
+                self._stats["hits"] += 1
+                return entry.session
+
+        loaded = self.backend.load(session_id) if self.backend is not None else None
+        if loaded is None:
+            return None
+        data, version = loaded
+        session = CodeInterpreterSession.from_dict(data)
+        self._spilled.discard(session_id)
+        if not self.write_through:
+            # Private spill space - the resident copy is authoritative again
+            self.backend.delete(session_id)
+        self._stats["rehydrated"] += 1
+        print(f"💧 Rehydrated session {session_id} from {self.backend.name} (version {version})")
+        self._insert_locked(session, version)
+        return session
+
+    def get_or_create(self, session_id: str) -> CodeInterpreterSession:
+        with self._lock:
+            session = self._get_locked(session_id)
+            if session is None:
+                session = CodeInterpreterSession(session_id)
+                self._stats["created"] += 1
+                self._insert_locked(session)
+        self._notify_gone()
+        return session
+
+    def save(self, session: CodeInterpreterSession):
+        """Re-measure a session after a mutation and enforce the byte budgets"""
+        with self._lock:
+            dropped = session.trim_to(self.max_session_bytes)
+            if dropped:
+                self._stats["trimmed_entries"] += dropped
+                print(f"✂️  Trimmed {dropped} old history entries from session {session.session_id}")
+
+            entry = self._entries.get(session.session_id)
+            if entry is None or entry.session is not session:
+                # Evicted while a request was still using it - put it back
+                if entry is not None:
+                    self._remove_locked(session.session_id)
+                entry = self._insert_locked(session)
+            else:
+                size = session.estimate_bytes()
+                self._bytes += size - entry.bytes
+                entry.bytes = size
+                entry.last_used = time.time()
+                self._entries.move_to_end(session.session_id)
+
+            if self.write_through:
+                entry.version = self.backend.store(session.session_id, session.to_dict(), entry.bytes, entry.last_used)
+                self._stats["writes"] += 1
+            self._enforce_locked(keep=session.session_id)
+        self._notify_gone()
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            removed = self._remove_locked(session_id) is not None
+            self._spilled.discard(session_id)
+            if self.backend is not None:
+                removed = self.backend.delete(session_id) or removed
+            self._gone.append(session_id)
+        self._notify_gone()
+        return removed
+
+    def evict_idle(self):
+        """Spill sessions idle longer than ``idle_ttl``, delete expired spills and notify listeners of both"""
+        now = time.time()
+        with self._lock:
+            idle = [key for key, entry in self._entries.items() if now - entry.last_used > self.idle_ttl]
+            for session_id in idle:
+                self._spill_locked(session_id)
+            if self.backend is not None:
+                self._stats["expired_spills"] += self.backend.expire(now - self.spill_ttl)
+                # Also catches sessions Redis expired by TTL and ones another worker deleted
+                spilled = list(self._spilled)
+                expired = set(spilled) - self.backend.existing(spilled)
+                self._spilled -= expired
+                self._gone.extend(expired)
+        self._notify_gone()
+
+    def _notify_gone(self):
+        """Call the delete listeners for sessions that are gone; must not be called with the lock held"""
+        with self._lock:
+            gone, self._gone = self._gone, []
+        for session_id in gone:
+            for listener in self.delete_listeners:
+                try:
+                    listener(session_id)
+                except Exception as e:
+                    print(f"⚠️  Session delete listener failed for {session_id}: {e}")
+
+    def start_reaper(self, interval: float = 60):
+        """Run evict_idle periodically on a daemon thread"""
+        if self._reaper is not None:
+            return
+
+        def reap():
+            while not self._stop_reaper.wait(interval):
+                self.evict_idle()
+
+        self._reaper = threading.Thread(target=reap, name="session-store-reaper", daemon=True)
+        self._reaper.start()
+
+    def close(self):
+        """Spill every resident session (so they survive a restart) and close the backend"""
+        self._stop_reaper.set()
+        with self._lock:
+            for session_id in list(self._entries):
+                self._spill_locked(session_id)
+            if self.backend is not None:
+                self.backend.close()
+                self.backend = None
+                self.write_through = False
+
+    def _insert_locked(self, session: CodeInterpreterSession, version: int = 0) -> SessionEntry:
+        session.trim_to(self.max_session_bytes)
+        entry = SessionEntry(session, version)
+        self._entries[session.session_id] = entry
+        self._bytes += entry.bytes
+        self._enforce_locked(keep=session.session_id)
+        return entry
+
+    def _remove_locked(self, session_id: str) -> Optional[SessionEntry]:
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.bytes
+        return entry
+
+    def _enforce_locked(self, keep: str):
+        """Spill least recently used sessions until both global budgets hold"""
+        for session_id in list(self._entries):
+            if self._bytes <= self.max_bytes and len(self._entries) <= self.max_sessions:
+                return
+            if session_id != keep:
+                self._spill_locked(session_id)
+
+    def _spill_locked(self, session_id: str):
+        entry = self._remove_locked(session_id)
+        if entry is None:
+            return
+        if self.backend is None:
+            self._stats["dropped"] += 1
+            print(f"🗑️ Dropped session {session_id} ({entry.bytes} bytes) - no spill storage configured")
+            self._gone.append(session_id)
+            return
+        if not self.write_through:
+            # Shared backends already hold the latest copy
+            self.backend.store(session_id, entry.session.to_dict(), entry.bytes, entry.last_used)
+        self._spilled.add(session_id)
+        self._stats["spilled"] += 1
+
+    def usage(self) -> List[Dict[str, Any]]:
+        """Per-session memory use: resident sessions first (most recent first), then spilled ones"""
+        with self._lock:
+            sessions = [{
+                "session_id": session_id,
+                "bytes": entry.bytes,
+                "resident": True,
+                "last_used": entry.last_used,
+                "execution_results": len(entry.session.execution_results),
+                "datasets": len(entry.session.datasets),
+                "csv_bytes": sum(len(dataset.get("content", "")) for dataset in entry.session.datasets.entries()),
+                "csv_file_bytes": sum(dataset.get("size", 0) for dataset in entry.session.datasets.entries())
+            } for session_id, entry in reversed(self._entries.items())]
+            if self.backend is not None:
+                resident = set(self._entries)
+                sessions.extend({**stored, "resident": False} for stored in self.backend.list_sessions()
+                                if stored["session_id"] not in resident)
+            return sessions
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["resident_sessions"] = len(self._entries)
+            stats["resident_bytes"] = self._bytes
+            stats["stored_sessions"] = self.backend.count() if self.backend else 0
+        stats["max_sessions"] = self.max_sessions
+        stats["max_bytes"] = self.max_bytes
+        stats["max_session_bytes"] = self.max_session_bytes
+        stats["idle_ttl"] = self.idle_ttl
+        stats["backend"] = self.backend.name if self.backend else "memory"
+        stats["shared"] = self.write_through
+        return stats
@@ -4,7 +4,7 @@ import argparse
 import json, sys
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
 from strands.models import BedrockModel
-from CodeExecutionAgent import CodeExecutionAgent
+from CodeExecutionAgent import CodeExecutionAgent, current_session_id
 from AWSCredentials import AWSCredentials
 
 app = BedrockAgentCoreApp()
@@ -40,6 +40,10 @@ def strands_agent_bedrock(payload):
 
         # code_executor_agent = codeExecutionAgent.get_agent()
         # codeExecutionAgent.execute_python_code()
+        current_session_id.set(payload.get("session_id", "default"))
+        if payload.get("stream"):
+            # Returning a generator makes the runtime answer with server-sent events, one per interpreter event
+            return codeExecutionAgent.stream_python_code(payload.get("code"), payload.get("session_files"), payload.get("session_id", "default"))
         response  = codeExecutionAgent.execute_python_code(payload.get("code"), payload.get("session_files"))
         return response
         
@@ -0,0 +1,137 @@
+"""Load test: /health latency while many /api/execute-code requests are in flight.
+
+Runs the real FastAPI app under uvicorn without AWS access. By default each
+execution goes through a stubbed executor agent (a blocking sleep standing in
+for the LLM + sandbox round trip); --engine runs code that sleeps as long on
+the fake interpreter or in real local subprocesses instead. Compare against
+the old blocking behaviour with --inline.
+
+    python load_test.py                 # 50 executions through the dispatcher
+    python load_test.py --inline        # same load, agent called on the event loop
+    python load_test.py --engine local  # direct execution in local subprocesses
+"""
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('DISPATCHER_LIMIT_EXECUTE', '64')
+os.environ.setdefault('DISPATCHER_MAX_WORKERS', '64')
+os.environ.setdefault('CODE_INTERPRETER_BACKEND', 'fake')
+os.environ.setdefault('EXECUTOR_ENGINES', 'interpreter,local')
+os.environ.setdefault('LOCAL_EXECUTOR_CONCURRENCY', '64')  # the stubbed executions sleep rather than use CPU
+
+import uvicorn
+import main
+
+
+class StubAgent:
+    """Blocking stand-in for a Strands Agent"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def __call__(self, prompt):
+        time.sleep(self.latency)
+        return type("AgentResult", (), {"message": {"content": [{"text": "```\nstub output\n```"}]}})()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=120) as response:
+        return response.read()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=120) as response:
+        return response.status
+
+
+def sample_health(base_url, stop: threading.Event):
+    latencies = []
+    while not stop.is_set():
+        started = time.time()
+        get(f"{base_url}/health")
+        latencies.append(1000 * (time.time() - started))
+        time.sleep(0.01)
+    return latencies
+
+
+def execute_request(i: int, latency: float, engine: str) -> dict:
+    if engine == "agent":
+        return {"code": "print('hello')", "session_id": f"load-{i}", "ai_commentary": True}
+    return {"code": f"import time\ntime.sleep({latency})\nprint('hello')", "session_id": f"load-{i}", "engine": engine}
+
+
+def main_load_test(executions: int, latency: float, inline: bool, engine: str = "agent"):
+    main.code_executor_agent = StubAgent(latency)
+    main.code_generator_agent = StubAgent(latency)
+    main.interpreter_pool = main.create_interpreter_pool()
+
+    if inline:
+        async def run_inline(endpoint, func, *args, **kwargs):
+            return func(*args, **kwargs)
+        main.dispatcher.run = run_inline
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, lifespan="off", log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=1) as sampler:
+        idle = sampler.submit(sample_health, base_url, stop)
+        time.sleep(1)
+        stop.set()
+        idle_latencies = idle.result()
+
+    stop = threading.Event()
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=executions + 1) as clients:
+        loaded = clients.submit(sample_health, base_url, stop)
+        futures = [clients.submit(post, f"{base_url}/api/execute-code",
+                                  execute_request(i, latency, engine))
+                   for i in range(executions)]
+        statuses = [future.result() for future in futures]
+        stop.set()
+        loaded_latencies = loaded.result()
+    elapsed = time.time() - started
+
+    server.should_exit = True
+
+    print(f"\n📊 Load test ({'inline on event loop' if inline else 'dispatcher'}): "
+          f"{executions} executions x {latency}s on {'stub agent' if engine == 'agent' else engine + ' engine'}")
+    print(f"   executions: {statuses.count(200)}/{executions} ok in {elapsed:.2f}s")
+    print(f"   /health idle   : n={len(idle_latencies):4d} p50={percentile(idle_latencies, 50):8.2f} ms  p99={percentile(idle_latencies, 99):8.2f} ms")
+    print(f"   /health loaded : n={len(loaded_latencies):4d} p50={percentile(loaded_latencies, 50):8.2f} ms  p99={percentile(loaded_latencies, 99):8.2f} ms")
+    print(f"   dispatcher: {json.dumps(main.dispatcher.stats()['endpoints'].get('execute', {}))}")
+    if engine != "agent":
+        print(f"   engine: {json.dumps(main.execution_scheduler.stats()['engines'][engine])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--executions", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds each stubbed execution blocks")
+    parser.add_argument("--inline", action="store_true", help="call the agent on the event loop (pre-dispatcher behaviour)")
+    parser.add_argument("--engine", choices=["agent", "interpreter", "local"], default="agent",
+                        help="stubbed executor agent, or direct execution on an engine")
+    args = parser.parse_args()
+    main_load_test(args.executions, args.latency, args.inline, args.engine)
@@ -1,7 +1,9 @@
 import json, sys
 import os
+import hashlib
+import io
 from typing import Dict, Any, Optional, List
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request, Response, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import asyncio
@@ -15,8 +17,32 @@ import time
 from functools import lru_cache
 import logging
 import time
+import contextvars
+import tempfile
+from CodeInterpreterPool import CodeInterpreterPool
+from AgentPool import AgentPool
+from ExecutionDispatcher import ExecutionDispatcher, DispatcherBusy
+from JobQueue import JobQueue
+from OutputStreamer import OutputStreamer
+from ImageDataScanner import ImageDataScanner, ScannedImage
+from ImageStore import ImageStore, CONTENT_TYPES
+from CodeInterpreterSession import CodeInterpreterSession
+from SessionStore import SessionStore
+from SessionBackend import create_session_backend
+from ChunkedUploadManager import ChunkedUploadManager, UploadError, UploadOffsetMismatch
+from SandboxFileSync import SandboxFileSync, file_digest
+from DatasetProfiler import DatasetProfiler
+from DatasetQuery import ENGINE as DATASET_QUERY_ENGINE
+from CodeOptimizer import CodeOptimizer
+from ColumnarConverter import ColumnarConverter
+from GenerationCache import GenerationCache, schema_key
+from ExecutionCache import ExecutionCache
+from ExecutionMetrics import ExecutionMetrics, agent_token_usage
+from PromptBuilder import PromptBuilder, Prompt, conversation_digest
+from Executor import ExecutionRequest, ExecutionScheduler, ExecutionUnavailable, InterpreterEngine, RuntimeEngine
 from LocalSandboxExecutor import LocalSandboxExecutor
-from AWSCredentials import AWSCredentials
+from ChartRenderer import ChartRenderer
+from ReportBuilder import ReportBuilder, DOCUMENT_TYPES
 
 # Load environment variables
 load_dotenv()
@@ -30,6 +56,15 @@ _model_cache = {}
 aws_session = None
 aws_region = None
 
+# Pool of warm code interpreter sessions, keyed by CodeInterpreterSession.session_id
+interpreter_pool = None
+
+# Session the current execution belongs to - lets the agent tool find its pooled interpreter
+current_session_id = contextvars.ContextVar("current_session_id", default="default")
+
+# Live output stream for the current execution (None when no client is listening)
+current_output_stream = contextvars.ContextVar("current_output_stream", default=None)
+
 def printLog(key, value= ""):
     print("Begin......:", key)
     
@@ -145,7 +180,517 @@ except ImportError:
         raise
 
 # Import AgentCore for code interpreter
-from bedrock_agentcore.tools.code_interpreter_client import code_session
+from bedrock_agentcore.tools.code_interpreter_client import code_session, CodeInterpreter
+
+def create_interpreter_pool() -> CodeInterpreterPool:
+    """Create the interpreter pool - AgentCore sessions by default, a local fake when CODE_INTERPRETER_BACKEND=fake"""
+    backend = os.getenv('CODE_INTERPRETER_BACKEND', 'agentcore')
+    max_sessions = int(os.getenv('INTERPRETER_POOL_MAX_SESSIONS', '20'))
+    idle_ttl = int(os.getenv('INTERPRETER_POOL_IDLE_TTL', '600'))  # below the 900s AgentCore session timeout
+
+    if backend == 'fake':
+        from FakeCodeInterpreter import FakeCodeInterpreter
+
+        def factory():
+            client = FakeCodeInterpreter()
+            client.start()
+            return client
+    else:
+        def factory():
+            client = CodeInterpreter(aws_region, session=aws_session)
+            # Outlive the pool's idle TTL so the pool, not AgentCore, decides when a session ends
+            client.start(session_timeout_seconds=idle_ttl + 300)
+            return client
+
+    print(f"🏊 Code interpreter pool: backend={backend}, max_sessions={max_sessions}, idle_ttl={idle_ttl}s")
+    pool = CodeInterpreterPool(factory, max_sessions=max_sessions, idle_ttl=idle_ttl)
+    # A restarted interpreter has an empty filesystem - forget what was uploaded to the old one
+    pool.evict_listeners.append(sandbox_sync.forget)
+    return pool
+
+def create_agent_pool() -> AgentPool:
+    """Per-session copies of the generator and executor agents, all on the one cached Bedrock model"""
+    max_agents = int(os.getenv('AGENT_POOL_MAX_AGENTS', '64'))
+    idle_ttl = int(os.getenv('AGENT_POOL_IDLE_TTL', '900'))
+    print(f"🤖 Agent pool: max_agents={max_agents}, idle_ttl={idle_ttl}s")
+    return AgentPool({
+        "generator": lambda: new_agent(code_generator_agent),
+        "executor": lambda: new_agent(code_executor_agent, tools=[execute_python_code])
+    }, max_agents=max_agents, idle_ttl=idle_ttl)
+
+def create_execution_dispatcher() -> ExecutionDispatcher:
+    """Thread pool for blocking agent/sandbox calls with per-endpoint concurrency limits"""
+    limits = {
+        "execute": int(os.getenv('DISPATCHER_LIMIT_EXECUTE', '16')),
+        "generate": int(os.getenv('DISPATCHER_LIMIT_GENERATE', '8')),
+        "analyze": int(os.getenv('DISPATCHER_LIMIT_ANALYZE', '8')),
+        "profile": int(os.getenv('DISPATCHER_LIMIT_PROFILE', '2')),
+        "report": int(os.getenv('DISPATCHER_LIMIT_REPORT', '2'))
+    }
+    return ExecutionDispatcher(
+        max_workers=int(os.getenv('DISPATCHER_MAX_WORKERS', '32')),
+        limits=limits,
+        max_queue=int(os.getenv('DISPATCHER_MAX_QUEUE', '100'))
+    )
+
+def create_execution_scheduler() -> ExecutionScheduler:
+    """Execution engines in the order of EXECUTOR_ENGINES: interpreter (pooled AgentCore sessions),
+    runtime (the deployed AgentCore runtime) and local (a subprocess, works offline)"""
+    engines = []
+    for name in os.getenv('EXECUTOR_ENGINES', 'interpreter').split(','):
+        name = name.strip()
+        if name == 'interpreter':
+            engines.append(InterpreterEngine(lambda: interpreter_pool, sandbox_sync))
+        elif name == 'runtime':
+            engines.append(RuntimeEngine(lambda: boto3.client('bedrock-agentcore'), os.getenv(
+                'AGENTCORE_RUNTIME_ARN',
+                'arn:aws:bedrock-agentcore:us-east-1:101494236755:runtime/strands_reporting_agent-0APBjJ9dYp'
+            ), sandbox_sync))
+        elif name == 'local':
+            engines.append(LocalSandboxExecutor(
+                root=os.getenv('LOCAL_EXECUTOR_ROOT') or None,
+                timeout=float(os.getenv('LOCAL_EXECUTOR_TIMEOUT', '300')),
+                memory_mb=int(os.getenv('LOCAL_EXECUTOR_MEMORY_MB', '2048')),
+                cpu_seconds=float(os.getenv('LOCAL_EXECUTOR_CPU_SECONDS', '120')),
+                max_workers=int(os.getenv('LOCAL_EXECUTOR_MAX_WORKERS', '8')),
+                idle_ttl=float(os.getenv('LOCAL_EXECUTOR_IDLE_TTL', '600')),
+                preload=[module for module in os.getenv('LOCAL_EXECUTOR_PRELOAD').split(',') if module]
+                if os.getenv('LOCAL_EXECUTOR_PRELOAD') is not None else None,
+                concurrency=int(os.getenv('LOCAL_EXECUTOR_CONCURRENCY', '0')),
+                max_runs=int(os.getenv('LOCAL_EXECUTOR_MAX_RUNS', '0')),
+                max_memory_growth_mb=float(os.getenv('LOCAL_EXECUTOR_MAX_MEMORY_GROWTH_MB', '1024'))
+            ))
+        elif name:
+            raise ValueError(f"Unknown execution engine in EXECUTOR_ENGINES: {name}")
+    scheduler = ExecutionScheduler(
+        engines,
+        failure_threshold=int(os.getenv('EXECUTOR_FAILURE_THRESHOLD', '3')),
+        cooldown=float(os.getenv('EXECUTOR_COOLDOWN', '30'))
+    )
+    print(f"⚙️  Execution engines: {', '.join(scheduler.order)}")
+    return scheduler
+
+def create_session_store() -> SessionStore:
+    """Bounded session store over the backend chosen by SESSION_BACKEND (memory, sqlite or redis).
+
+    memory keeps sessions in this process and spills cold ones to SESSION_SPILL_PATH
+    ('none' disables spilling). sqlite (SESSION_SQLITE_PATH) and redis (REDIS_URL) are
+    shared, so sessions outlive a worker restart, and they also carry job state, chart images and
+    open uploads so any worker can answer for them. Replicas on several hosts additionally need
+    UPLOAD_SPOOL_DIR on a shared volume.
+    """
+    backend_kind = os.getenv('SESSION_BACKEND', 'memory')
+    spill_path = os.getenv('SESSION_SPILL_PATH', os.path.join(tempfile.gettempdir(), 'reporting-agent-sessions.db'))
+    spill_ttl = int(os.getenv('SESSION_SPILL_TTL', str(7 * 24 * 3600)))
+    backend = create_session_backend(
+        backend_kind,
+        spill_path=None if spill_path.lower() == 'none' else spill_path,
+        sqlite_path=os.getenv('SESSION_SQLITE_PATH', 'sessions.db'),
+        redis_url=os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        ttl=spill_ttl
+    )
+    store = SessionStore(
+        max_sessions=int(os.getenv('SESSION_MAX_COUNT', '500')),
+        max_bytes=int(os.getenv('SESSION_MAX_MB', '512')) * 1024 * 1024,
+        max_session_bytes=int(os.getenv('SESSION_MAX_SESSION_MB', '64')) * 1024 * 1024,
+        idle_ttl=int(os.getenv('SESSION_IDLE_TTL', '1800')),
+        backend=backend,
+        spill_ttl=spill_ttl
+    )
+    print(f"🗄️  Session store: backend={backend_kind}, shared={store.write_through}, "
+          f"max_sessions={store.max_sessions}, max_bytes={store.max_bytes}")
+    return store
+
+# Keeps long executions off the event loop so /health and WebSockets stay responsive
+dispatcher = create_execution_dispatcher()
+
+# Application sessions, bounded in memory with cold sessions spilled to disk
+session_store = create_session_store()
+# Jobs, images and open uploads are shared through the session backend when other workers can see it
+shared_backend = session_store.backend if session_store.write_through else None
+
+# Uploaded CSVs are spooled to disk; sessions keep only a reference to the file
+upload_manager = ChunkedUploadManager(
+    os.getenv('UPLOAD_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'reporting-agent-uploads')),
+    max_upload_bytes=int(os.getenv('UPLOAD_MAX_MB', '1024')) * 1024 * 1024,
+    backend=shared_backend
+)
+
+# Remembers which file contents each pooled interpreter already holds so datasets are uploaded once
+sandbox_sync = SandboxFileSync(compress_threshold=int(os.getenv('SANDBOX_SYNC_COMPRESS_KB', '256')) * 1024)
+
+# Picks where code runs for each request: pooled interpreter, AgentCore runtime or local subprocess
+execution_scheduler = create_execution_scheduler()
+
+# Renders report chart specs to PNG bytes in a process pool (workers are forked at startup)
+chart_renderer = ChartRenderer(workers=int(os.getenv('CHART_RENDER_WORKERS', '0')) or None,
+                               root=os.getenv('CHART_RENDER_ROOT') or None,
+                               max_shared=int(os.getenv('CHART_RENDER_MAX_DATASETS', '16')))
+
+# Builds PPTX/PDF reports from sections, caching each rendered section so rebuilds only redo what changed
+report_builder = ReportBuilder(chart_renderer, max_bytes=int(os.getenv('REPORT_CACHE_MAX_MB', '256')) * 1024 * 1024)
+
+def dataset_files(dataset: dict) -> list:
+    """Sandbox file references of one catalog entry: the CSV and, when converted, its columnar copy"""
+    file_info = {'filename': dataset['filename'], 'sha256': dataset.get('sha256')}
+    if 'content' in dataset:
+        file_info['content'] = dataset['content']
+        file_info['size'] = len(dataset['content'])
+    else:
+        file_info['path'] = dataset['path']
+        file_info['size'] = dataset.get('size', 0)
+    files = [file_info]
+    if dataset.get('columnar'):
+        files.append(dataset['columnar'])
+    return files
+
+def query_helper_file() -> dict:
+    """DatasetQuery.py as a sandbox file, so generated code can import it next to the datasets"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "DatasetQuery.py")
+    with open(path, "rb") as f:
+        data = f.read()
+    return {'filename': 'DatasetQuery.py', 'path': path, 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}
+
+# Out-of-core query layer for datasets too large to load whole; synced only to code that imports it
+query_helper = query_helper_file()
+large_dataset_bytes = int(os.getenv('LARGE_DATASET_MB', '500')) * 1024 * 1024
+
+def delete_dataset_files(dataset: dict):
+    """Remove a dataset's spool file, its columnar copy and the chart renderer's copies"""
+    upload_manager.delete_file(dataset)
+    upload_manager.delete_file(dataset.get('columnar'))
+    if dataset.get('path'):
+        chart_renderer.forget(dataset['path'])
+
+# Schema summaries of uploaded CSVs, computed once per file content and reused by every generation
+dataset_profiler = DatasetProfiler(chunk_rows=int(os.getenv('PROFILER_CHUNK_ROWS', '200000')))
+
+# Feather copies of uploaded CSVs, so generated code can memory-map the data instead of parsing it
+columnar_converter = ColumnarConverter()
+
+# Generated code for repeated prompts against the same dataset schema and model
+generation_cache = GenerationCache(
+    max_entries=int(os.getenv('GENERATION_CACHE_MAX_ENTRIES', '500')),
+    ttl=int(os.getenv('GENERATION_CACHE_TTL', str(24 * 3600))),
+    similarity_threshold=float(os.getenv('GENERATION_CACHE_SIMILARITY', '0'))
+)
+
+# Agent prompts assembled within a per-request input token budget, with agent conversations compacted to the
+# last few turns plus a summary of the ones before
+prompt_builder = PromptBuilder(
+    budget=int(os.getenv('PROMPT_TOKEN_BUDGET', '8000')),
+    history_turns=int(os.getenv('PROMPT_HISTORY_TURNS', '2'))
+)
+
+# Each session talks to its own agents, so conversations stay separate and sessions don't queue behind each other
+agent_pool = create_agent_pool()
+
+def run_agent(agent, prompt: Prompt, purpose: str):
+    """Call a leased agent with a budgeted prompt; returns (agent result, prompt report)"""
+    agent_result, report = prompt_builder.invoke(agent, prompt, purpose)
+    print(f"🧾 {purpose} prompt: {report['input_tokens']} input tokens "
+          f"(history {report['history_tokens']}, {report['turns_compacted']} turns compacted, "
+          f"{len(report['static_deduped'])} static blocks deduped)")
+    return agent_result, report
+
+def invoke_agent(role: str, session_id: Optional[str], prompt: Prompt, purpose: str):
+    """Call the session's ``role`` agent with a budgeted prompt; returns (agent result, prompt report)"""
+    with agent_pool.lease(session_id, role) as agent:
+        return run_agent(agent, prompt, purpose)
+
+def generate_with_cache(prompt: str, agent_prompt: Prompt, cache_bucket: str, use_cache: bool = True,
+                        session_id: Optional[str] = None) -> tuple:
+    """Generated code for ``prompt``, from the cache when possible; returns (code, cache match or None, prompt report)"""
+    with agent_pool.lease(session_id, "generator") as agent:
+        # A follow-up ("make it red") means something only in its own conversation, so once the session's agent
+        # has turns the prompt only matches the same session at the same point of that conversation
+        history = conversation_digest(getattr(agent, "messages", None))
+        if history:
+            cache_bucket = f"{cache_bucket}|{session_id}|{history}"
+        cached = generation_cache.get(prompt, cache_bucket) if use_cache else None
+        if cached:
+            print(f"♻️  Generation cache {cached['match']} hit (similarity {cached['similarity']})")
+            prompt_builder.record_turn(agent, agent_prompt, cached["code"])
+            return cached["code"], cached["match"], None
+        if not use_cache:
+            generation_cache.bypass()
+        agent_result, prompt_report = run_agent(agent, agent_prompt, "generate")
+    generated_code = str(agent_result) if agent_result is not None else ""
+    generation_cache.put(prompt, cache_bucket, generated_code)
+    return generated_code, None, prompt_report
+
+# Opt-in memoized execution results for deterministic code over unchanged session files
+execution_cache = ExecutionCache(
+    max_entries=int(os.getenv('EXECUTION_CACHE_MAX_ENTRIES', '1000')),
+    max_bytes=int(os.getenv('EXECUTION_CACHE_MAX_MB', '64')) * 1024 * 1024,
+    ttl=int(os.getenv('EXECUTION_CACHE_TTL', '3600'))
+)
+
+def forget_session(session_id: str):
+    """Session store delete listener: release what this process holds for a deleted or expired session"""
+    agent_pool.evict(session_id)
+    execution_cache.invalidate_session(session_id)
+    sandbox_sync.invalidate(session_id)
+    if interpreter_pool is not None:
+        interpreter_pool.evict(session_id)
+    execution_scheduler.forget(session_id)
+    # Spool files of the session's uploads, including their columnar copies
+    upload_manager.delete_session(session_id)
+    chart_renderer.forget(upload_manager.session_dir(session_id))
+    print(f"🧹 Released resources of session {session_id}")
+
+session_store.delete_listeners.append(forget_session)
+
+def execution_failed(result: str) -> bool:
+    """Whether an execution result is an error we shouldn't memoize"""
+    return (not result or result.startswith(("Error:", "Direct execution failed", "File upload failed", "Execution failed"))
+            or "Traceback (most recent call last)" in result)
+
+# Latency and LLM tokens per execution mode (direct interpreter vs executor agent)
+execution_metrics = ExecutionMetrics()
+
+# Rewrites row-wise pandas idioms (apply with simple lambdas) into vectorized ones before code runs, and flags
+# the ones it can't rewrite; CODE_OPTIMIZER=flag only reports them, off skips the pass
+code_optimizer_mode = os.getenv('CODE_OPTIMIZER', 'rewrite')
+code_optimizer = CodeOptimizer(rewrite=code_optimizer_mode == 'rewrite')
+
+def optimize_code(code: str) -> tuple:
+    """Code about to run with slow pandas idioms rewritten, and the optimizer's report (None when disabled)"""
+    if code_optimizer_mode == 'off':
+        return code, None
+    report = code_optimizer.analyze(extract_python_code_from_prompt(code))
+    if report['rewrites'] or report['warnings']:
+        print(f"🧮 Code optimizer: {CodeOptimizer.summary(report)}")
+    return report['code'], report
+
+def optimization_summary(report: Optional[dict]) -> Optional[dict]:
+    """The optimizer's findings for API responses and history, without the code"""
+    if report is None:
+        return None
+    return {**{key: value for key, value in report.items() if key != 'code'}, "summary": CodeOptimizer.summary(report)}
+
+def cached_images_available(result: dict) -> bool:
+    """A cached result is only usable while the image store still holds its charts"""
+    return all(image_store.touch(image['hash']) for image in result['images'] if image.get('hash'))
+
+# Keeps fire-and-forget tasks referenced until they finish
+background_tasks = set()
+
+async def ensure_dataset_profile(session: CodeInterpreterSession, dataset: dict) -> dict:
+    """A dataset's profile, computed on first use and then kept in the session's catalog"""
+    if 'profile' in dataset:
+        return dataset['profile']
+    profile = await dispatcher.run("profile", dataset_profiler.profile, dataset_files(dataset)[0])
+    if session.datasets.contains(dataset):  # not removed or replaced by another upload meanwhile
+        dataset['profile'] = profile
+        session_store.save(session)
+    return profile
+
+async def ensure_columnar_copy(session: CodeInterpreterSession, dataset: dict) -> Optional[dict]:
+    """File reference of a dataset's Feather copy, converting it on first use; None if unavailable"""
+    if 'path' not in dataset or not columnar_converter.available:
+        return None
+    if 'columnar' in dataset:
+        return dataset['columnar']
+    profile = await ensure_dataset_profile(session, dataset)
+    columnar = await dispatcher.run("profile", columnar_converter.convert, dataset['path'], profile)
+    if session.datasets.contains(dataset):
+        dataset['columnar'] = columnar  # None records a failed conversion so it isn't retried
+        session_store.save(session)
+    elif columnar:
+        upload_manager.delete_file(columnar)
+    return columnar
+
+def schedule_dataset_preparation(session: CodeInterpreterSession, dataset: dict):
+    """Profile and convert a fresh upload in the background so the first generation doesn't wait for it"""
+    async def run():
+        try:
+            await ensure_columnar_copy(session, dataset)
+            await ensure_dataset_profile(session, dataset)
+        except Exception as e:
+            print(f"⚠️  Dataset preparation failed for {dataset['filename']} in {session.session_id}: {e}")
+
+    task = asyncio.get_running_loop().create_task(run())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def read_uploaded_csv(uploaded_csv: dict, limit: Optional[int] = None) -> str:
+    """CSV text for a session's upload - inline content from older sessions, else read from the spool file"""
+    if 'content' in uploaded_csv:
+        return uploaded_csv['content'][:limit] if limit else uploaded_csv['content']
+    with open(uploaded_csv['path'], 'r', encoding='utf-8', errors='replace') as f:
+        return f.read(limit) if limit else f.read()
+
+async def dataset_prompt_context(session: CodeInterpreterSession) -> tuple:
+    """Prompt text describing every cataloged dataset from its metadata, and the schema key for the generation cache"""
+    sections, schema_keys = [], []
+    for dataset in session.datasets.entries():
+        try:
+            profile = await ensure_dataset_profile(session, dataset)
+        except DispatcherBusy:
+            raise
+        except Exception as e:
+            print(f"⚠️  Profiling {dataset['filename']} failed, describing it from its header: {e}")
+            profile = None
+        if profile is not None and not profile.get('columns'):
+            # Nothing to describe or take example columns from
+            print(f"⚠️  Profile of {dataset['filename']} has no columns, describing it from its header")
+            profile = None
+
+        try:
+            columnar = await ensure_columnar_copy(session, dataset)
+        except DispatcherBusy:
+            raise
+        except Exception as e:
+            print(f"⚠️  Columnar conversion of {dataset['filename']} failed, generated code will read the CSV: {e}")
+            columnar = None
+
+        if profile:
+            schema_keys.append(schema_key(profile))
+            section = f"""- '{dataset['filename']}', schema profiled from the full file:
+
+{DatasetProfiler.to_prompt(profile)}"""
+            if dataset.get('size', 0) >= large_dataset_bytes:
+                schema_keys[-1] += ":large"
+                columns = [column['name'] for column in profile['columns']][:2]
+                section += f"""
+
+This file is {dataset['size'] / 1024 ** 3:.1f} GB - too large to load whole. Do not call pd.read_csv or
+pd.read_feather on it; aggregate it with DatasetQuery in one pass instead, for example:
+
+```python
+from DatasetQuery import Scan, Count, NUnique, ValueCounts, GroupBy
+scan = Scan('{dataset['filename']}', columns={columns!r})
+stats = scan.aggregate(rows=Count(), counts=ValueCounts({columns[0]!r}))
+```"""
+            elif columnar:
+                sep = "" if profile['delimiter'] == "," else f", sep={profile['delimiter']!r}"
+                section += f"""
+
+The same data is also available as '{columnar['filename']}' (Feather, column types already parsed), which loads
+far faster than the CSV. Load it like this, keeping the CSV as a fallback:
+
+```python
+try:
+    df = pd.read_feather('{columnar['filename']}')
+except Exception:
+    df = pd.read_csv('{dataset['filename']}'{sep})
+```"""
+        else:
+            schema_keys.append(dataset.get('sha256', 'unprofiled'))
+            header = read_uploaded_csv(dataset, 4096).split('\n', 1)[0].strip()
+            rows = f", {dataset['rows']:,} rows" if isinstance(dataset.get('rows'), int) else ""
+            section = f"- '{dataset['filename']}'{rows}, header: {header}"
+        sections.append(section)
+
+    if len(sections) == 1:
+        intro = "You have access to one CSV file:"
+    else:
+        intro = f"You have access to {len(sections)} CSV files, which can be joined on their shared columns:"
+    context = intro + "\n\n" + "\n\n".join(sections)
+    return context, hashlib.sha256("|".join(schema_keys).encode()).hexdigest()[:16]
+
+def attach_uploaded_csv(session: CodeInterpreterSession, file_ref: dict) -> dict:
+    """Add a completed upload to the session's dataset catalog and return the upload-csv response"""
+    dataset, replaced = session.datasets.add(file_ref)
+    if replaced:
+        delete_dataset_files(replaced)
+        execution_cache.invalidate_session(session.session_id)
+    session.conversation_history.append({
+        "type": "csv_upload",
+        "dataset_id": dataset['id'],
+        "filename": file_ref['filename'],
+        "size": file_ref['size'],
+        "rows": file_ref['rows'],
+        "sha256": file_ref['sha256'],
+        "replaced": bool(replaced),
+        "timestamp": time.time()
+    })
+    session_store.save(session)
+    schedule_dataset_preparation(session, dataset)
+
+    preview = read_uploaded_csv(dataset, 501)
+    return {
+        "success": True,
+        "message": f"CSV file {file_ref['filename']} {'replaced' if replaced else 'uploaded'} successfully",
+        "session_id": session.session_id,
+        "dataset_id": dataset['id'],
+        "filename": file_ref['filename'],
+        "preview": preview[:500] + "..." if len(preview) > 500 else preview,
+        "size": file_ref['size'],
+        "rows": file_ref['rows'],
+        "sha256": file_ref['sha256'],
+        "datasets": [session.datasets.describe(entry) for entry in session.datasets.entries()]
+    }
+
+# Background jobs for executions/generations that shouldn't hold an HTTP request open
+job_queue = JobQueue(workers=int(os.getenv('JOB_WORKERS', '4')),
+                     max_retained=int(os.getenv('JOB_MAX_RETAINED', '1000')),
+                     backend=shared_backend)
+
+# Open WebSocket connections per session, used to push job updates and live output
+websocket_connections: Dict[str, set] = {}
+
+# Generated charts, served by content hash from /api/images/{hash} instead of inline base64
+image_store = ImageStore(max_bytes=int(os.getenv('IMAGE_STORE_MAX_MB', '256')) * 1024 * 1024,
+                         directory=os.getenv('IMAGE_STORE_DIR') or None,
+                         backend=shared_backend)
+
+def publish_images(images: list) -> list:
+    """Put images in the image store and return URL references to them"""
+    import base64
+
+    references = []
+    for image in images or []:
+        if isinstance(image, ScannedImage):
+            data, image_format = image.data, image.format
+        else:
+            data, image_format = base64.b64decode(image['data']), image.get('format', 'png')
+        image_hash = image_store.put(data, image_format)
+        references.append({
+            'format': image_format,
+            'hash': image_hash,
+            'url': f"/api/images/{image_hash}",
+            'size': len(data),
+            'source': 'agentcore_stdout'
+        })
+    return references
+
+async def send_to_session(session_id: str, message: dict):
+    """Send a message to every WebSocket open for the session, dropping dead connections"""
+    connections = websocket_connections.get(session_id)
+    if not connections:
+        return
+    text = json.dumps(message, default=str)
+    for websocket in list(connections):
+        try:
+            await websocket.send_text(text)
+        except Exception:
+            connections.discard(websocket)
+
+def open_output_stream(session_id: str) -> Optional[OutputStreamer]:
+    """Start streaming execution output to the session's WebSockets, if any are open"""
+    if not websocket_connections.get(session_id):
+        return None
+    return OutputStreamer(
+        lambda message: send_to_session(session_id, message),
+        asyncio.get_running_loop(),
+        session_id,
+        max_pending=int(os.getenv('STREAM_MAX_PENDING', '32'))
+    ).start()
+
+def emit_output_chunk(pieces: list = (), stderr: str = ""):
+    """Forward scanned stdout pieces (text or images) and stderr to the live output stream, if there is one"""
+    streamer = current_output_stream.get()
+    if streamer is None:
+        return
+    for piece in pieces:
+        if isinstance(piece, ScannedImage):
+            streamer.emit({"type": "image", **publish_images([piece])[0]})
+        else:
+            streamer.emit({"type": "stdout_chunk", "data": piece})
+    if stderr:
+        streamer.emit({"type": "stderr_chunk", "data": stderr})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -159,8 +704,15 @@ async def lifespan(app: FastAPI):
 
     
 
-    global aws_session, aws_region
+    global aws_session, aws_region, interpreter_pool
+    # Fork the chart workers before the reapers and job workers start threads
+    chart_renderer.start()
     aws_session, aws_region = setup_aws_credentials()
+    interpreter_pool = create_interpreter_pool()
+    interpreter_pool.start_reaper()
+    agent_pool.start_reaper()
+    session_store.start_reaper()
+    await job_queue.start()
     initialize_agents()
     printLog ("1. Initialize Agents", _agents_cache)
 
@@ -185,8 +737,14 @@ async def lifespan(app: FastAPI):
     )
 
     yield
-    # Shutdown (if needed)
-    pass
+    # Shutdown - stop warm interpreter sessions so they don't linger until AgentCore times them out
+    await job_queue.stop()
+    interpreter_pool.close_all()
+    agent_pool.close_all()
+    execution_scheduler.close()
+    chart_renderer.close()
+    session_store.close()
+    dispatcher.shutdown()
 
 app = FastAPI(
     title="AgentCore Code Interpreter", 
@@ -207,6 +765,7 @@ app.add_middleware(
 class CodeGenerationRequest(BaseModel):
     prompt: str
     session_id: Optional[str] = None
+    use_cache: Optional[bool] = True  # False skips the cache lookup; the fresh result still replaces the cached one
 
 class InteractiveCodeExecutionRequest(BaseModel):
     code: str
@@ -218,131 +777,67 @@ class CodeExecutionRequest(BaseModel):
     session_id: Optional[str] = None
     interactive: Optional[bool] = False
     inputs: Optional[List[str]] = None
+    use_cache: Optional[bool] = False  # opt in to reusing the output of identical code over identical files
+    ai_commentary: Optional[bool] = False  # run through the executor agent so the model comments on the output
+    engine: Optional[str] = None  # force a configured execution engine (interpreter, runtime or local)
+    optimize: Optional[bool] = True  # rewrite row-wise pandas idioms into vectorized ones before running
 
 class FileUploadRequest(BaseModel):
     filename: str
     content: str
     session_id: Optional[str] = None
 
+class JobSubmissionRequest(BaseModel):
+    kind: str  # "execute" or "generate"
+    session_id: Optional[str] = None
+    priority: Optional[int] = 0  # higher runs first across sessions
+    code: Optional[str] = None
+    prompt: Optional[str] = None
+    interactive: Optional[bool] = False
+    inputs: Optional[List[str]] = None
+    use_cache: Optional[bool] = None  # defaults to on for generate jobs, off for execute jobs
+    ai_commentary: Optional[bool] = False
+    engine: Optional[str] = None
+
+class ReportBuildRequest(BaseModel):
+    report: Dict[str, Any]  # {"title", "subtitle", "sections": [{"id", "title", "text", "chart", "table", "caption"}]}
+    session_id: Optional[str] = None  # sections with charts or tables over data read a session dataset
+    dataset: Optional[str] = None  # id, filename or sha256 of that dataset; the latest upload by default
+    formats: Optional[List[str]] = ["pptx", "pdf"]
+
 # Session management
-class CodeInterpreterSession:
-    def __init__(self, session_id: str):
-        self.session_id = session_id
-        self.conversation_history = []
-        self.code_history = []
-        self.execution_results = []
-        self.interactive_sessions = {}  # Track interactive execution sessions
-        self.uploaded_csv = None  # Store uploaded CSV file data
-
-# Global variables for agents
+# Template agents: they hold the cached model, system prompt and tools, and requests run on per-session
+# copies of them handed out by agent_pool
 code_generator_agent = None
 code_executor_agent = None
+
+def new_agent(template: Agent, tools: Optional[list] = None) -> Agent:
+    """A fresh agent with an empty conversation, sharing ``template``'s model and system prompt"""
+    if template is None:
+        raise RuntimeError("Agents are not initialized")
+    return Agent(model=template.model, system_prompt=template.system_prompt, tools=tools)
 executor_type = "unknown"  # Track which executor type we're using
-active_sessions = {}
 
 def clean_output_for_display(output: str) -> str:
     """Clean output for display by removing image binary data while preserving analysis text"""
-    if not output:
+    if not output or 'IMAGE_DATA:' not in output:
         return output
-    
-    # If output contains IMAGE_DATA, extract everything except the binary
-    if 'IMAGE_DATA:' in output:
-        parts = output.split('IMAGE_DATA:')
-        cleaned_parts = []
-        
-        # Add the part before IMAGE_DATA
-        if parts[0].strip():
-            cleaned_parts.append(parts[0].strip())
-        
-        # Process parts after IMAGE_DATA
-        for i in range(1, len(parts)):
-            # Split on newline to separate binary from any following text
-            lines = parts[i].split('\n', 1)
-            if len(lines) > 1:
-                # Skip the binary line, keep any text after it
-                remaining_text = lines[1].strip()
-                if remaining_text and not remaining_text.startswith(('iVBOR', '/9j/', 'data:')):
-                    cleaned_parts.append(remaining_text)
-        
-        if cleaned_parts:
-            result = '\n\n'.join(cleaned_parts)
-            print(f"🧹 Cleaned output: removed image binary, kept {len(result)} chars of text")
-            return result
-        else:
-            return "Code executed successfully - chart generated"
-    
-    return output
+    return ImageDataScanner.scan(output).display_text()
 
 def extract_image_data(execution_result: str):
     """Extract base64 image data from execution results - fixed for AgentCore format"""
-    try:
-        import re
-        import base64
-        
-        images = []
-        
-        print(f"🔍 Image extraction - Input length: {len(execution_result)}")
-        print(f"🔍 Contains IMAGE_DATA: {'IMAGE_DATA:' in execution_result}")
-        
-        if 'IMAGE_DATA:' in execution_result:
-            # Find all IMAGE_DATA: patterns in the text
-            # AgentCore puts the full base64 string in stdout, so we need a greedy pattern
-            pattern = r'IMAGE_DATA:([A-Za-z0-9+/=\n\r\s]+?)(?=\n[A-Za-z]|\nBase64|\n$|$)'
-            matches = re.findall(pattern, execution_result, re.MULTILINE | re.DOTALL)
-            
-            print(f"🔍 Regex matches found: {len(matches)}")
-            
-            for i, match in enumerate(matches):
-                try:
-                    # Clean up the base64 string - remove all whitespace and newlines
-                    clean_match = re.sub(r'[\s\n\r]', '', match)
-                    
-                    print(f"🔍 Match {i+1} - Original length: {len(match)}, Clean length: {len(clean_match)}")
-                    print(f"🔍 Match {i+1} - Starts with: {clean_match[:50]}...")
-                    
-                    # Must be reasonable length for an image (at least 1KB when decoded)
-                    if len(clean_match) > 1000:
-                        # Validate it's valid base64 and can be decoded
-                        decoded = base64.b64decode(clean_match)
-                        print(f"🔍 Match {i+1} - Decoded length: {len(decoded)} bytes")
-                        
-                        # Check if it looks like a PNG (starts with PNG signature)
-                        if decoded.startswith(b'\x89PNG\r\n\x1a\n'):
-                            images.append({
-                                'format': 'png',
-                                'data': clean_match,
-                                'source': 'agentcore_stdout'
-                            })
-                            print(f"✅ Match {i+1} - Valid PNG image extracted")
-                        # Also check for JPEG signatures
-                        elif decoded.startswith(b'\xff\xd8\xff'):
-                            images.append({
-                                'format': 'jpeg',
-                                'data': clean_match,
-                                'source': 'agentcore_stdout'
-                            })
-                            print(f"✅ Match {i+1} - Valid JPEG image extracted")
-                        else:
-                            print(f"⚠️  Match {i+1} - Invalid image signature")
-                    else:
-                        print(f"⚠️  Match {i+1} - Too short to be valid image")
-                except Exception as e:
-                    print(f"❌ Match {i+1} - Extraction error: {e}")
-                    continue
-        
-        print(f"🎯 Final result: {len(images)} images extracted")
-        return images
-        
-    except Exception as e:
-        print(f"❌ Image extraction error: {e}")
+    if not execution_result or 'IMAGE_DATA:' not in execution_result:
         return []
+    scanner = ImageDataScanner.scan(execution_result)
+    print(f"🎯 Image extraction: {len(scanner.images)} images extracted, {scanner.rejected} rejected")
+    return scanner.image_dicts()
 
-def upload_files_to_agentcore_sandbox(files_data: list, aws_region: str) -> bool:
-    """Upload files to AgentCore sandbox using writeFiles tool"""
+def upload_files_to_agentcore_sandbox(files_data: list, aws_region: str, session_id: str = "default") -> bool:
+    """Upload files to the session's pooled AgentCore sandbox using writeFiles tool"""
     try:
         print(f"🔧 Uploading {len(files_data)} files to AgentCore sandbox...")
         
-        with code_session(aws_region) as code_client:
+        with interpreter_pool.lease(session_id) as code_client:
             response = code_client.invoke("writeFiles", {"content": files_data})
             
             for event in response["stream"]:
@@ -365,292 +860,31 @@ def upload_files_to_agentcore_sandbox(files_data: list, aws_region: str) -> bool
         print(f"❌ File upload failed: {str(e)}")
         return False
 
-def execute_in_bedrock_runtime(code: str, session_files: list = None) -> tuple[str, list]:
-        print("\n🎨 execute_in_bedrock_runtime===============================================")
-        aws_credentials = AWSCredentials();
-        try:
-            session = boto3.Session(
-                aws_access_key_id = aws_credentials.aws_access_key,
-                aws_secret_access_key = aws_credentials.aws_secret_key,
-                region_name = aws_credentials.aws_region
-            )
-            
-            # Initialize the Bedrock AgentCore client
-            agent_core_client = boto3.client('bedrock-agentcore')
-
-            # Prepare the payload
-            payload = json.dumps({
-                "request_type": "execute_python_code",
-                "code": code,
-                "session_files": session_files
-            }).encode()
-
-            response1 = agent_core_client.invoke_agent_runtime(
-                agentRuntimeArn="arn:aws:bedrock-agentcore:us-east-1:101494236755:runtime/strands_reporting_agent-0APBjJ9dYp",
-                payload = payload
-            )
-
-
-            print(response1)
-
-            
-
-            # Read the entire content into memory
-            print("=================response=========================")
-            print("=================response=========================")
-            streaming_body = response1['response']    
-            json_string = streaming_body.read().decode('utf-8')
-            response = json.loads(json.loads(json_string)) # Assuming text content
-
-
-            print("1. =================response=========================")
-            print(f"response::{response}, type::{type(response)}")
-
-            output_parts = []
-            full_stdout = ""
-            
-            for event in response["stream"]:
-                result = event.get("result", {})
-                
-                if result.get("isError", False):
-                    error_content = result.get("content", [{}])
-                    error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                    print(f"61. ❌ Direct execution error: {error_text}")
-                    sys.stdout.flush()
-                    return f"Error: {error_text}", []
-                
-                # Extract structured content
-                structured_content = result.get("structuredContent", {})
-                stdout = structured_content.get("stdout", "")
-                stderr = structured_content.get("stderr", "")
-                
-                if stdout:
-                    output_parts.append(stdout)
-                    full_stdout += stdout
-                    print(f"6.2 📤 Direct stdout captured: {len(stdout)} characters")
-                    sys.stdout.flush()
-                if stderr:
-                    output_parts.append(f"Errors: {stderr}")
-                    print(f"6.3 ⚠️  Direct stderr: {stderr}")
-                    sys.stdout.flush()
-            
-            # Combine output
-            final_output = "\n".join(output_parts) if output_parts else "Code executed successfully"
-            
-            # Extract images directly from full stdout
-            images = self.extract_image_data(full_stdout)
-            
-            # Clean the output for display (remove image binary but keep analysis text)
-            display_output = self.clean_output_for_display(final_output)
-            
-            print(f"✅ Direct execution completed:")
-            sys.stdout.flush()
-            print(f"   Output length: {len(final_output)}")
-            sys.stdout.flush()
-            print(f"   Display output length: {len(display_output)}")
-            sys.stdout.flush()
-            print(f"   Images extracted: {len(images)}")
-            sys.stdout.flush()
-            print("=================response=========================")
-            print("=================response=========================")
-
-            return display_output, images 
-
-        except Exception as e:
-            print(f"❌ Access key authentication failed: {e}")
-            raise Exception(f"AWS authentication failed: {e}")
-
-def execute_chart_code_direct(code: str, session_files: list = None) -> tuple[str, list]:
-    """Execute chart code directly with AgentCore to preserve full base64 output"""
-    try:
-        print(f"\n🎨 Direct AgentCore chart execution")
-        print(f"📝 Code length: {len(code)} characters")
-        
-        # Clean the code to remove any markdown formatting
-        clean_code = extract_python_code_from_prompt(code)
-        print(f"🔧 Clean code length: {len(clean_code)} characters")
-        localSandboxExecutor = LocalSandboxExecutor(clean_code, session_files)
-        localSandboxExecutor.execute_code()
-        return "", None
-        
-    except Exception as e:
-        print(f"❌ Direct AgentCore execution failed: {str(e)}")
-        import traceback
-        print(f"📋 Traceback: {traceback.format_exc()}")
-        return f"Direct execution failed: {str(e)}", []
-
-def execute_chart_code_direct2(code: str, session_files: list = None) -> tuple[str, list]:
-    """Execute chart code directly with AgentCore to preserve full base64 output"""
-    try:
-        print(f"\n🎨 Direct AgentCore chart execution")
-        print(f"📝 Code length: {len(code)} characters")
-        
-        # Clean the code to remove any markdown formatting
-        clean_code = extract_python_code_from_prompt(code)
-        print(f"🔧 Clean code length: {len(clean_code)} characters")
-
-        response =  execute_in_bedrock_runtime(code, session_files)
-
-        print(f"🔧 response: {response} characters")
-
-        # Process response directly without Strands-Agents truncation
-        output_parts = []
-        full_stdout = ""
-        
-
-
-        for event in response["stream"]:
-            result = event.get("result", {})
-            
-            if result.get("isError", False):
-                error_content = result.get("content", [{}])
-                error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                print(f"❌ Direct execution error: {error_text}")
-                return f"Error: {error_text}", []
-            
-            # Extract structured content
-            structured_content = result.get("structuredContent", {})
-            stdout = structured_content.get("stdout", "")
-            stderr = structured_content.get("stderr", "")
-            
-            if stdout:
-                output_parts.append(stdout)
-                full_stdout += stdout
-                print(f"📤 Direct stdout captured: {len(stdout)} characters")
-            if stderr:
-                output_parts.append(f"Errors: {stderr}")
-                print(f"⚠️  Direct stderr: {stderr}")
-        
-        # Combine output
-        final_output = "\n".join(output_parts) if output_parts else "Code executed successfully"
-        
-        # Extract images directly from full stdout
-        images = extract_image_data(full_stdout)
-        
-        # Clean the output for display (remove image binary but keep analysis text)
-        display_output = clean_output_for_display(final_output)
-        
-        print(f"✅ Direct execution completed:")
-        print(f"   Output length: {len(final_output)}")
-        print(f"   Display output length: {len(display_output)}")
-        print(f"   Images extracted: {len(images)}")
-        
-        return display_output, images
-        
-    except Exception as e:
-        print(f"❌ Direct AgentCore execution failed: {str(e)}")
-        import traceback
-        print(f"📋 Traceback: {traceback.format_exc()}")
-        return f"Direct execution failed: {str(e)}", []
-
-
-
-
-def execute_chart_code_direct1(code: str, session_files: list = None, local: bool = False, execute_in_run_time = True) -> tuple[str, list]:
-    """Execute chart code directly with AgentCore to preserve full base64 output"""
+def execute_code_direct(code: str, session_files: list = None, session_id: str = "default", engine: str = None) -> tuple[str, list, str]:
+    """Run code on the scheduled execution engine, streaming its output; returns (display text, images, engine)"""
+    print(f"\n🎨 Direct execution")
+    print(f"📝 Code length: {len(code)} characters")
+    
+    # Clean the code to remove any markdown formatting
+    clean_code = extract_python_code_from_prompt(code)
+    print(f"🔧 Clean code length: {len(clean_code)} characters")
+    
     try:
-        print(f"\n🎨 Direct AgentCore chart execution")
-        print(f"📝 Code length: {len(code)} characters")
-        
-        # Clean the code to remove any markdown formatting
-        clean_code = extract_python_code_from_prompt(code)
-        print(f"🔧 Clean code length: {len(clean_code)} characters")
-
-        if(local): 
-            localSandboxExecutor = LocalSandboxExecutor(clean_code, session_files)
-            localSandboxExecutor.execute_code()
-            return "", None
-        
-        if(execute_in_run_time):
-            return execute_in_bedrock_runtime(code, session_files)
-
-
-        
-        with code_session(aws_region) as code_client:
-            # Upload files to sandbox if provided
-            if session_files:
-                print(f"📁 Uploading {len(session_files)} files to sandbox...")
-                files_data = []
-                for file_info in session_files:
-                    files_data.append({
-                        "path": file_info['filename'],
-                        "text": file_info['content']
-                    })
-                
-                print("====================================")
-                print(f"📁 Uploaded files to details...{json.dumps(files_data, indent=4)}")
-                print("====================================")
-                
-                # Upload files using writeFiles tool
-                upload_response = code_client.invoke("writeFiles", {"content": files_data})
-
-                for event in upload_response["stream"]:
-                    result = event.get("result", {})
-                    if result.get("isError", False):
-                        error_content = result.get("content", [{}])
-                        error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                        print(f"❌ File upload error: {error_text}")
-                        return f"File upload failed: {error_text}", []
-                    else:
-                        content = result.get("content", [])
-                        for item in content:
-                            if item.get("type") == "text":
-                                print(f"✅ File upload: {item.get('text', '')}")
-            
-            # Execute the cleaned code
-            response = code_client.invoke("executeCode", {
-                "code": clean_code,
-                "language": "python",
-                "clearContext": False
-            })
-        
-        # Process response directly without Strands-Agents truncation
-        output_parts = []
-        full_stdout = ""
-        
-        for event in response["stream"]:
-            result = event.get("result", {})
-            
-            if result.get("isError", False):
-                error_content = result.get("content", [{}])
-                error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                print(f"❌ Direct execution error: {error_text}")
-                return f"Error: {error_text}", []
-            
-            # Extract structured content
-            structured_content = result.get("structuredContent", {})
-            stdout = structured_content.get("stdout", "")
-            stderr = structured_content.get("stderr", "")
-            
-            if stdout:
-                output_parts.append(stdout)
-                full_stdout += stdout
-                print(f"📤 Direct stdout captured: {len(stdout)} characters")
-            if stderr:
-                output_parts.append(f"Errors: {stderr}")
-                print(f"⚠️  Direct stderr: {stderr}")
-        
-        # Combine output
-        final_output = "\n".join(output_parts) if output_parts else "Code executed successfully"
-        
-        # Extract images directly from full stdout
-        images = extract_image_data(full_stdout)
-        
-        # Clean the output for display (remove image binary but keep analysis text)
-        display_output = clean_output_for_display(final_output)
-        
-        print(f"✅ Direct execution completed:")
-        print(f"   Output length: {len(final_output)}")
-        print(f"   Display output length: {len(display_output)}")
-        print(f"   Images extracted: {len(images)}")
-        
-        return display_output, images
-        
-    except Exception as e:
-        print(f"❌ Direct AgentCore execution failed: {str(e)}")
-        import traceback
-        print(f"📋 Traceback: {traceback.format_exc()}")
-        return f"Direct execution failed: {str(e)}", []
+        result = execution_scheduler.execute(ExecutionRequest(clean_code, session_id, session_files),
+                                             emit_output_chunk, engine)
+    except ExecutionUnavailable as e:
+        print(f"❌ No execution engine available: {e}")
+        return f"Execution failed: {e}", [], None
+    
+    # Images were cut out of stdout while scanning; what's left is the analysis text
+    images = publish_images(result.images)
+    display_output = result.display_text()
+    
+    print(f"✅ Direct execution completed on '{result.engine}' in {result.duration:.2f}s:")
+    print(f"   Display output length: {len(display_output)}")
+    print(f"   Images extracted: {len(images)}")
+    
+    return display_output, images, result.engine
 
 def detect_chart_code(code: str) -> bool:
     """Detect if code contains interactive elements like input() calls"""
@@ -918,75 +1152,25 @@ def execute_python_code(code: str, description: str = "", files: list = None) ->
     print(f"🔧 Files provided: {len(files) if files else 0}")
     print(f"🔧 Clean code preview: {clean_code[:200]}...")
     
+    if files:
+        files = [{'filename': file_info.get('filename', 'uploaded_file.csv'), 'content': file_info.get('content', '')}
+                 for file_info in files]
+    
     try:
-        with code_session(aws_region) as code_client:
-            # Upload files to sandbox if provided
-            if files:
-                print(f"📁 Uploading {len(files)} files to sandbox...")
-                files_data = []
-                for file_info in files:
-                    files_data.append({
-                        "path": file_info.get('filename', 'uploaded_file.csv'),
-                        "text": file_info.get('content', '')
-                    })
-                
-                # Upload files using writeFiles tool
-                upload_response = code_client.invoke("writeFiles", {"content": files_data})
-                for event in upload_response["stream"]:
-                    result = event.get("result", {})
-                    if result.get("isError", False):
-                        error_content = result.get("content", [{}])
-                        error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                        print(f"❌ File upload error: {error_text}")
-                        return f"File upload failed: {error_text}"
-                    else:
-                        content = result.get("content", [])
-                        for item in content:
-                            if item.get("type") == "text":
-                                print(f"✅ File upload: {item.get('text', '')}")
-            
-            # Execute the code
-            response = code_client.invoke("executeCode", {
-                "code": clean_code,
-                "language": "python",
-                "clearContext": False
-            })
-        
-        # Process the response stream to capture all output
-        output_parts = []
-        
-        for event in response["stream"]:
-            result = event.get("result", {})
-            
-            if result.get("isError", False):
-                error_content = result.get("content", [{}])
-                error_text = error_content[0].get("text", "Unknown error") if error_content else "Unknown error"
-                print(f"❌ AgentCore execution error: {error_text}")
-                return f"Error: {error_text}"
-            
-            # Extract structured content (stdout, stderr)
-            structured_content = result.get("structuredContent", {})
-            stdout = structured_content.get("stdout", "")
-            stderr = structured_content.get("stderr", "")
-            
-            if stdout:
-                output_parts.append(stdout)
-                print(f"📤 Stdout captured: {len(stdout)} characters")
-            if stderr:
-                output_parts.append(f"Errors: {stderr}")
-                print(f"⚠️  Stderr captured: {len(stderr)} characters")
-        
-        # Combine all output
-        final_output = "\n".join(output_parts) if output_parts else "Code executed successfully (no output)"
-        
-        print(f"✅ AgentCore execution completed - Output length: {len(final_output)}")
-        return final_output
-                
-    except Exception as e:
-        print(f"❌ AgentCore execution error: {str(e)}")
-        import traceback
-        print(f"📋 Full traceback: {traceback.format_exc()}")
-        return f"Execution failed: {str(e)}"
+        result = execution_scheduler.execute(ExecutionRequest(clean_code, current_session_id.get(), files),
+                                             emit_output_chunk)
+    except ExecutionUnavailable as e:
+        print(f"❌ No execution engine available: {e}")
+        return f"Execution failed: {e}"
+    
+    if result.error is not None:
+        print(f"❌ Execution error on '{result.engine}': {result.error}")
+        return result.raw_output()
+    
+    # Raw output keeps the IMAGE_DATA lines so images survive the agent's answer
+    final_output = result.raw_output() or "Code executed successfully (no output)"
+    print(f"✅ Execution completed on '{result.engine}' - Output length: {len(final_output)}")
+    return final_output
 
 @lru_cache(maxsize=1)
 def get_extended_botocore_config():
@@ -1114,6 +1298,15 @@ def initialize_agents():
             4. Only return executable Python code without explanations or markdown formatting
             5. Make sure the code is complete and runnable
             6. Do not include any text before or after the code
+            7. For CSV files too large to load whole, never read them with pd.read_csv; use the DatasetQuery
+               module available next to the data, which streams the file in batches and pushes column selection,
+               filters and aggregates down to each batch:
+               from DatasetQuery import Scan, Count, Sum, Min, Max, Mean, NUnique, ValueCounts, GroupBy
+               scan = Scan('file.csv', columns=['a', 'b'], dtype={{'b': str}})
+               stats = scan.aggregate(rows=Count(), counts=ValueCounts('a'), prefixes=ValueCounts(lambda df: df['a'].str[:3]),
+                                      by_b=GroupBy('b', {{'a': 'count'}}))  # all aggregates share one pass
+               rows = scan.where(lambda df: df['a'].isin(values)).collect()  # only the matching rows
+               Keys may be a column name or a vectorized function of each batch DataFrame - never use apply(lambda ...).
             
             Focus on creating practical, efficient code that solves the user's specific problem.
             Return ONLY the Python code, no explanations, no markdown, no additional text."""
@@ -1181,10 +1374,7 @@ def get_or_create_session(session_id: Optional[str] = None) -> CodeInterpreterSe
     if session_id is None:
         session_id = str(uuid.uuid4())
     
-    if session_id not in active_sessions:
-        active_sessions[session_id] = CodeInterpreterSession(session_id)
-    
-    return active_sessions[session_id]
+    return session_store.get_or_create(session_id)
 
 # Utility functions for code analysis
 def detect_chart_code(code: str) -> bool:
@@ -1229,55 +1419,11 @@ def input(prompt=''):
     
     return input_setup + code
 
-@app.post("/api/generate-code")
-async def generate_code(request: CodeGenerationRequest):
-    """Generate Python code using the strands-agents code generator agent"""
-    try:
-        session = get_or_create_session(request.session_id)
-        
-        # Check if prompt mentions files but no CSV is uploaded
-        file_keywords = ['file', 'csv', 'data', 'dataset', 'load', 'read', 'import', 'upload']
-        mentions_file = any(keyword in request.prompt.lower() for keyword in file_keywords)
-        
-        if mentions_file and not session.uploaded_csv:
-            return {
-                "success": False,
-                "requires_file": True,
-                "message": "Your request mentions working with files. Please upload a CSV file first.",
-                "session_id": session.session_id
-            }
-        
-        # Prepare prompt with CSV context if available
-        enhanced_prompt = request.prompt
-        
-        # Check if the request involves visualization/charts
-        chart_keywords = ['plot', 'chart', 'graph', 'visualiz', 'histogram', 'scatter', 'bar chart', 'line chart', 'pie chart', 'heatmap', 'matplotlib', 'seaborn', 'plotly']
-        needs_visualization = any(keyword in request.prompt.lower() for keyword in chart_keywords)
+# Fixed instruction blocks of the code generation prompt; the prompt builder sends each once per conversation
+DATASET_USAGE_INSTRUCTIONS = """When generating code, assume these files are available in the working directory and can be loaded using
+pandas.read_csv() or similar methods. Refer to each file by its exact filename in your code."""
 
-        export_keywords = ['ppt', 'pptx']
-        needs_export = any(keyword in request.prompt.lower() for keyword in chart_keywords)
-
-        
-        if session.uploaded_csv:
-            csv_info = f"""
-You have access to a CSV file named '{session.uploaded_csv['filename']}' with the following content preview:
-
-```csv
-{session.uploaded_csv['content'][:1000]}{'...' if len(session.uploaded_csv['content']) > 1000 else ''}
-```
-
-When generating code, assume this CSV data is available and can be loaded using pandas.read_csv() or similar methods. 
-Use the filename '{session.uploaded_csv['filename']}' in your code.
-
-User request: {request.prompt}
-"""
-            enhanced_prompt = csv_info
-        
-        # Add chart rendering instructions if visualization is needed
-        if needs_visualization:
-            chart_instructions = """
-
-IMPORTANT: For reliable chart rendering in the web interface, use this approach:
+CHART_INSTRUCTIONS = """IMPORTANT: For reliable chart rendering in the web interface, use this approach:
 
 ```python
 import matplotlib.pyplot as plt
@@ -1310,7 +1456,48 @@ print("Chart generated successfully!")
 This ensures your charts are properly displayed in the web interface.
 """
 
-            enhanced_prompt += chart_instructions
+@app.post("/api/generate-code")
+async def generate_code(request: CodeGenerationRequest):
+    """Generate Python code using the strands-agents code generator agent"""
+    try:
+        session = get_or_create_session(request.session_id)
+        
+        # Check if prompt mentions files but no CSV is uploaded
+        file_keywords = ['file', 'csv', 'data', 'dataset', 'load', 'read', 'import', 'upload']
+        mentions_file = any(keyword in request.prompt.lower() for keyword in file_keywords)
+        
+        if mentions_file and not len(session.datasets):
+            return {
+                "success": False,
+                "requires_file": True,
+                "message": "Your request mentions working with files. Please upload a CSV file first.",
+                "session_id": session.session_id
+            }
+        
+        # Check if the request involves visualization/charts
+        chart_keywords = ['plot', 'chart', 'graph', 'visualiz', 'histogram', 'scatter', 'bar chart', 'line chart', 'pie chart', 'heatmap', 'matplotlib', 'seaborn', 'plotly']
+        needs_visualization = any(keyword in request.prompt.lower() for keyword in chart_keywords)
+
+        export_keywords = ['ppt', 'pptx']
+        needs_export = any(keyword in request.prompt.lower() for keyword in chart_keywords)
+
+        # Assemble the prompt from sections the builder can trim or dedupe to fit the token budget
+        enhanced_prompt = prompt_builder.compose()
+        if len(session.datasets):
+            csv_context, dataset_schema = await dataset_prompt_context(session)
+            # The schema is what the code is written against, so it is the last thing trimmed
+            enhanced_prompt.static("datasets", csv_context, priority=4)
+            enhanced_prompt.static("dataset_usage", DATASET_USAGE_INSTRUCTIONS, priority=2)
+        else:
+            dataset_schema = "no-dataset"
+        enhanced_prompt.add("request", f"User request: {request.prompt}", required=True)
+        
+        # Steer the generator away from the slow idioms the optimizer keeps finding in code it wrote
+        enhanced_prompt.static("optimizer_hints", code_optimizer.prompt_hints(), priority=0)
+        
+        # Add chart rendering instructions if visualization is needed
+        if needs_visualization:
+            enhanced_prompt.static("chart_rendering", CHART_INSTRUCTIONS, priority=3)
         
         if needs_export:
             export_instruction = """
@@ -1319,34 +1506,49 @@ This ensures your charts are properly displayed in the web interface.
             Save the presentation to the current directory with name text.pptx.
             """
         
-        # Use the strands-agents agent for code generation
-        agent_result = code_generator_agent(enhanced_prompt)
-        
-        # Extract string content from AgentResult
-        generated_code = str(agent_result) if agent_result is not None else ""
+        # Use the strands-agents agent for code generation, unless the same request was answered recently
+        cache_bucket = GenerationCache.bucket(dataset_schema, globals().get('current_model_id', 'unknown'))
+        generated_code, cache_match, prompt_report = await dispatcher.run(
+            "generate", generate_with_cache, request.prompt, enhanced_prompt, cache_bucket, request.use_cache,
+            session.session_id)
         
         # Store generation in session history
         session.conversation_history.append({
             "type": "generation",
             "prompt": request.prompt,
-            "enhanced_prompt": enhanced_prompt if session.uploaded_csv else None,
+            "enhanced_prompt": (enhanced_prompt.rendered or enhanced_prompt.text()) if len(session.datasets) else None,
             "generated_code": generated_code,
+            "input_tokens": prompt_report["input_tokens"] if prompt_report else 0,
             "agent": "strands_code_generator",
-            "csv_used": session.uploaded_csv['filename'] if session.uploaded_csv else None,
+            "csv_used": ", ".join(entry['filename'] for entry in session.datasets.entries()) or None,
+            "cached": cache_match,
             "timestamp": time.time()
         })
+        session_store.save(session)
         
         return {
             "success": True,
             "code": generated_code,
             "session_id": session.session_id,
             "agent_used": "strands_code_generator",
-            "csv_file_used": session.uploaded_csv['filename'] if session.uploaded_csv else None
+            "csv_file_used": ", ".join(entry['filename'] for entry in session.datasets.entries()) or None,
+            "cached": cache_match,
+            "prompt": prompt_report
         }
         
+    except DispatcherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Code generation failed: {str(e)}")
 
+@app.post("/api/optimize-code")
+async def optimize_code_endpoint(request: CodeExecutionRequest):
+    """Report row-wise pandas idioms in code and the vectorized rewrite, without running it"""
+    optimized, report = optimize_code(request.code)
+    if report is None:
+        return {"success": True, "code": request.code, "optimization": None}
+    return {"success": True, "code": optimized, "optimization": optimization_summary(report)}
+
 @app.post("/api/analyze-code")
 async def analyze_code(request: CodeExecutionRequest):
     """Analyze code to detect interactive elements and suggest inputs - OPTIMIZED"""
@@ -1355,20 +1557,19 @@ async def analyze_code(request: CodeExecutionRequest):
         
         if is_interactive:
             # OPTIMIZATION: Faster, more focused analysis
-            analysis_prompt = f"""Analyze this Python code and identify the input() calls. Be concise:
+            analysis_prompt = prompt_builder.compose().add("code", f"""Analyze this Python code and identify the input() calls. Be concise:
 
 ```python
 {request.code}
-```
-
-Provide:
+```""", required=True).static("input_analysis", """Provide:
 1. Number of input() calls
 2. What each input should be (name, age, etc.)
 3. Example values for testing
 
-Keep response short and practical."""
+Keep response short and practical.""")
             
-            analysis_result = code_generator_agent(analysis_prompt)
+            # A one-off question - a throwaway agent keeps it out of the session's generation conversation
+            analysis_result, _ = await dispatcher.run("analyze", invoke_agent, "generator", None, analysis_prompt, "analyze")
             
             return {
                 "success": True,
@@ -1384,18 +1585,29 @@ Keep response short and practical."""
                 "suggestions": None
             }
         
+    except DispatcherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Code analysis failed: {str(e)}")
 
 @app.post("/api/execute-code")
 async def execute_code(request: CodeExecutionRequest):
     """Execute Python code using hybrid approach: direct AgentCore for charts, Strands-Agents for others"""
+    streamer = None
     try:
         session = get_or_create_session(request.session_id)
+        current_session_id.set(session.session_id)
+        
+        # Push stdout/stderr to the session's WebSocket while the code runs
+        streamer = open_output_stream(session.session_id)
+        current_output_stream.set(streamer)
         
         # Track execution start time
         execution_start_time = time.time()
         
+        if request.engine and request.engine not in execution_scheduler.engines:
+            raise HTTPException(status_code=400, detail=f"Execution engine '{request.engine}' is not configured")
+        
         # Check if code is interactive
         is_interactive = request.interactive or detect_interactive_code(request.code)
         
@@ -1435,61 +1647,110 @@ async def execute_code(request: CodeExecutionRequest):
         else:
             prepared_code = request.code
         
+        optimization = None
+        if request.optimize:
+            prepared_code, optimization = optimize_code(prepared_code)
+        
         # Check if this is chart/visualization code
         is_chart_code = detect_chart_code(prepared_code)
         
-        # Get session files for sandbox upload
-        session_files = []
-        if session.uploaded_csv:
-            session_files.append({
-                'filename': session.uploaded_csv['filename'],
-                'content': session.uploaded_csv['content']
-            })
+        # Only the datasets this code reads go to the sandbox
+        referenced = session.datasets.referenced(prepared_code)
+        session_files = [file_info for dataset in referenced for file_info in dataset_files(dataset)]
+        if len(referenced) < len(session.datasets):
+            print(f"📂 Syncing {len(referenced)} of {len(session.datasets)} datasets - the others aren't referenced by this code")
+        if 'DatasetQuery' in prepared_code:
+            session_files.append(query_helper)
+        
+        # Opt-in memoization: the same clean code and inputs over the same file contents in the same session
+        # gives the same output
+        cache_key = None
+        if request.use_cache:
+            clean_code = extract_python_code_from_prompt(prepared_code)
+            uncacheable = execution_cache.uncacheable_reason(clean_code)
+            if uncacheable:
+                print(f"🚫 Execution not cached: code {uncacheable}")
+            else:
+                cache_key = ExecutionCache.key(session.session_id, clean_code,
+                                               request.inputs if is_interactive else None,
+                                               [file_digest(file_info) for file_info in session_files])
+        cached = execution_cache.get(cache_key, cached_images_available) if cache_key else None
+        
+        commentary = None
+        engine_used = None
+        if cached:
+            print(f"♻️  Execution cache hit - returning stored output")
+            execution_result_str = cached["result"]
+            images = cached["images"]
+            agent_used = "execution_cache"
+            metrics_mode = "cache"
         
         # REVERTED: Use original logic - only force direct AgentCore for charts and files, NOT for interactive
-        if is_chart_code or session_files:
+        elif is_chart_code or session_files:
             print(f"🎨 Chart code detected - using direct AgentCore execution")
             
-            # Use direct AgentCore execution to preserve full base64 output
-            execution_result_str, images = execute_chart_code_direct(prepared_code, session_files)
+            # Direct execution preserves the full base64 output
+            execution_result_str, images, engine_used = await dispatcher.run(
+                "execute", execute_code_direct, prepared_code, session_files, session.session_id, request.engine)
             agent_used = "direct_agentcore_charts"
+            metrics_mode = "direct_files"
+        
+        elif not request.ai_commentary:
+            # Running code is mechanical - no model round trip needed to call the tool and scrape its answer
+            print(f"⚡ Regular code - executing directly, no agent")
+            execution_result_str, images, engine_used = await dispatcher.run(
+                "execute", execute_code_direct, prepared_code, None, session.session_id, request.engine)
+            agent_used = "direct_agentcore"
+            metrics_mode = "direct"
             
         else:
-            print(f"📝 Regular code - using Strands-Agents execution")
-            
-            # For regular code, if files are needed, use direct AgentCore as well
-            # since Strands-Agents tools can't easily access session files
-            if session_files:
-                print(f"📁 Files detected - switching to direct AgentCore for file access")
-                execution_result_str, images = execute_chart_code_direct(prepared_code, session_files)
-                agent_used = "direct_agentcore_with_files"
-            else:
-                # Use strands-agents with AgentCore tool for regular code without files
-                execution_prompt = f"""Execute this Python code using the execute_python_code tool:
+            print(f"📝 AI commentary requested - using Strands-Agents execution")
+            execution_prompt = prompt_builder.compose().add("code", f"""Execute this Python code using the execute_python_code tool:
 
 ```python
 {prepared_code}
 ```
 
-Use the tool to run the code and return the complete output."""
-                
-                execution_result = code_executor_agent(execution_prompt)
-                
-                # Debug the AgentResult structure
-                print(f"🔍 AgentResult type: {type(execution_result)}")
-                
-                # Extract the actual text content from AgentResult
-                execution_result_str = extract_text_from_agent_result(execution_result)
-                print(f"📊 Extracted text length: {len(execution_result_str)}")
-                
-                # Extract image data from execution results
-                images = extract_image_data(execution_result_str)
-                agent_used = "strands_agents_with_agentcore"
+Use the tool to run the code and return the complete output.""", required=True)
+            
+            execution_result, prompt_report = await dispatcher.run(
+                "execute", invoke_agent, "executor", session.session_id, execution_prompt, "execute")
+            
+            # Debug the AgentResult structure
+            print(f"🔍 AgentResult type: {type(execution_result)}")
+            
+            # Extract the actual text content from AgentResult
+            execution_result_str = extract_text_from_agent_result(execution_result)
+            commentary = str(execution_result)
+            print(f"📊 Extracted text length: {len(execution_result_str)}")
+            
+            # Extract image data from execution results
+            images = publish_images(extract_image_data(execution_result_str))
+            agent_used = "strands_agents_with_agentcore"
+            metrics_mode = "agent"
+        
+        if cache_key and not cached and not execution_failed(execution_result_str):
+            execution_cache.put(cache_key, session.session_id, {"result": execution_result_str, "images": images})
         
         # Calculate execution duration
         execution_end_time = time.time()
         execution_duration = execution_end_time - execution_start_time
         
+        if metrics_mode == "agent":
+            request_metrics = execution_metrics.record(
+                "agent", execution_duration,
+                llm_calls=getattr(getattr(execution_result, "metrics", None), "cycle_count", 0) or 0,
+                tokens_used=agent_token_usage(execution_result) or 0)
+            request_metrics["input_tokens"] = prompt_report.get("reported_input_tokens") or prompt_report["input_tokens"]
+        elif metrics_mode == "direct":
+            # What the executor agent would have spent to run this for us
+            system_prompt = getattr(code_executor_agent, "system_prompt", None) or ""
+            request_metrics = execution_metrics.record("direct", execution_duration, tokens_saved=
+                execution_metrics.estimate_agent_tokens(system_prompt, prepared_code, execution_result_str))
+        else:
+            request_metrics = execution_metrics.record(metrics_mode, execution_duration)
+        print(f"⏱️  Execution metrics: {request_metrics}")
+        
         # Store execution in session history
         session.code_history.append(request.code)
         session.execution_results.append({
@@ -1501,12 +1762,17 @@ Use the tool to run the code and return the complete output."""
             "inputs_provided": request.inputs if is_interactive else None,
             "images": images,
             "is_chart_code": is_chart_code,
+            "cached": bool(cached),
+            "engine": engine_used,
+            "metrics": request_metrics,
+            "optimization": optimization_summary(optimization),
             "timestamp": execution_end_time,
             "execution_duration": execution_duration,
             "prompt": user_prompt,
             "start_time": execution_start_time,
             "end_time": execution_end_time
         })
+        session_store.save(session)
         
         return {
             "success": True,
@@ -1517,26 +1783,45 @@ Use the tool to run the code and return the complete output."""
             "interactive": is_interactive,
             "inputs_used": request.inputs if is_interactive else None,
             "images": images,
-            "is_chart_code": is_chart_code
+            "is_chart_code": is_chart_code,
+            "cached": bool(cached),
+            "commentary": commentary,
+            "engine": engine_used,
+            "metrics": request_metrics,
+            "optimization": optimization_summary(optimization),
+            "execution_id": streamer.execution_id if streamer else None
         }
         
+    except HTTPException:
+        raise
+    except DispatcherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print(f"❌ Code execution failed: {str(e)}")
         import traceback
         print(f"📋 Full traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"Code execution failed: {str(e)}")
+    finally:
+        if streamer:
+            await streamer.aclose()
+            print(f"📡 Output stream closed: {streamer.stats()}")
 
 @app.post("/api/sessions/{session_id}/clear-csv")
 async def clear_csv_from_session(session_id: str):
-    """Clear CSV file from session and AgentCore context"""
+    """Clear every CSV file from the session and AgentCore context"""
     try:
         session = get_or_create_session(session_id)
         
-        if session.uploaded_csv:
-            filename = session.uploaded_csv['filename']
+        if len(session.datasets):
+            datasets = session.datasets.clear()
+            filename = ", ".join(dataset['filename'] for dataset in datasets)
             
-            # Clear CSV from session
-            session.uploaded_csv = None
+            # Clear every dataset from the session
+            for dataset in datasets:
+                delete_dataset_files(dataset)
+            execution_cache.invalidate_session(session_id)
+            # The agents' conversations are about the removed files - start the session's next request afresh
+            agent_pool.evict(session_id)
             
             # Add to conversation history
             session.conversation_history.append({
@@ -1544,12 +1829,13 @@ async def clear_csv_from_session(session_id: str):
                 "filename": filename,
                 "timestamp": time.time()
             })
+            session_store.save(session)
             
-            print(f"🗑️ CSV file '{filename}' cleared from session {session_id}")
+            print(f"🗑️ CSV files '{filename}' cleared from session {session_id}")
             
             return {
                 "success": True,
-                "message": f"CSV file '{filename}' removed successfully",
+                "message": f"CSV files '{filename}' removed successfully",
                 "session_id": session_id
             }
         else:
@@ -1563,6 +1849,16 @@ async def clear_csv_from_session(session_id: str):
         print(f"❌ Error clearing CSV from session: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to clear CSV: {str(e)}")
 
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Delete a session with its datasets, agent conversations, sandbox and cached results"""
+    if session_id not in session_store:
+        raise HTTPException(status_code=404, detail="Session not found")
+    # Stops workers and removes directories - keep it off the event loop
+    await dispatcher.run("sessions", session_store.delete, session_id)
+    print(f"🗑️ Session {session_id} deleted")
+    return {"success": True, "session_id": session_id}
+
 @app.post("/api/upload-csv")
 async def upload_csv_file(request: FileUploadRequest):
     """Upload and process a CSV file"""
@@ -1573,40 +1869,106 @@ async def upload_csv_file(request: FileUploadRequest):
         if not request.filename.lower().endswith('.csv'):
             raise HTTPException(status_code=400, detail="Only CSV files are allowed")
         
-        # Store CSV file in session
-        session.conversation_history.append({
-            "type": "csv_upload",
-            "filename": request.filename,
-            "content": request.content,
-            "timestamp": time.time()
-        })
-        
-        # Store CSV data for code generation
-        session.uploaded_csv = {
-            "filename": request.filename,
-            "content": request.content,
-            "timestamp": asyncio.get_event_loop().time()
-        }
+        # Spool to disk like a chunked upload; the session keeps only a reference
+        file_ref = upload_manager.store_bytes(session.session_id, request.filename, request.content.encode('utf-8'))
+        response = attach_uploaded_csv(session, file_ref)
 
-        printLog("upload_csv_file", {
-            "success": True,
-            "message": f"CSV file {request.filename} uploaded successfully",
-            "session_id": session.session_id,
-            "filename": request.filename,
-            "preview": request.content[:500] + "..." if len(request.content) > 500 else request.content
-        })
+        printLog("upload_csv_file", response)
         
-        return {
-            "success": True,
-            "message": f"CSV file {request.filename} uploaded successfully",
-            "session_id": session.session_id,
-            "filename": request.filename,
-            "preview": request.content[:500] + "..." if len(request.content) > 500 else request.content
-        }
+        return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"CSV upload failed: {str(e)}")
 
+class UploadInitRequest(BaseModel):
+    filename: str
+    session_id: Optional[str] = None
+    total_size: Optional[int] = None
+
+class UploadCompleteRequest(BaseModel):
+    sha256: Optional[str] = None
+
+def upload_http_error(e: UploadError) -> HTTPException:
+    """Map an upload failure to its HTTP status; offset mismatches tell the client where to resume"""
+    if isinstance(e, UploadOffsetMismatch):
+        return HTTPException(status_code=e.status_code, detail={"message": str(e), "offset": e.expected_offset})
+    return HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.post("/api/uploads")
+async def start_upload(request: UploadInitRequest):
+    """Open a resumable chunked CSV upload"""
+    if not request.filename.lower().endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    session = get_or_create_session(request.session_id)
+    upload_manager.expire()
+    try:
+        upload = upload_manager.create(session.session_id, request.filename, request.total_size)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return {"success": True, **upload.to_dict()}
+
+@app.put("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, offset: Optional[int] = None):
+    """Append the request body at ``offset`` (or the start of a ``Content-Range: bytes a-b/n`` header)"""
+    content_range = request.headers.get("content-range")
+    if offset is None and content_range:
+        try:
+            offset = int(content_range.split()[1].split('-')[0])
+        except (IndexError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid Content-Range: {content_range}")
+    try:
+        upload = await upload_manager.append_stream(upload_id, offset or 0, request.stream())
+    except UploadError as e:
+        raise upload_http_error(e)
+    return {"success": True, **upload.to_dict()}
+
+@app.get("/api/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Upload status; ``offset`` is where the next chunk must start"""
+    try:
+        return {"success": True, **upload_manager.get(upload_id).to_dict()}
+    except UploadError as e:
+        raise upload_http_error(e)
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: UploadCompleteRequest):
+    """Finish a chunked upload and add it to the session's datasets"""
+    try:
+        upload = upload_manager.get(upload_id)
+        file_ref = upload_manager.complete(upload_id, request.sha256)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return attach_uploaded_csv(get_or_create_session(upload.session_id), file_ref)
+
+@app.delete("/api/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Abort an open upload and delete what was received"""
+    return {"success": upload_manager.abort(upload_id)}
+
+@app.post("/api/upload-csv/multipart")
+async def upload_csv_multipart(file: UploadFile = File(...), session_id: Optional[str] = Form(None)):
+    """Upload a CSV as multipart/form-data, copied to the spool file in blocks"""
+    if not file.filename.lower().endswith('.csv'):
+        raise HTTPException(status_code=400, detail="Only CSV files are allowed")
+    session = get_or_create_session(session_id)
+
+    async def blocks():
+        while True:
+            block = await file.read(1024 * 1024)
+            if not block:
+                return
+            yield block
+
+    try:
+        upload = upload_manager.create(session.session_id, file.filename)
+        await upload_manager.append_stream(upload.id, 0, blocks())
+        file_ref = upload_manager.complete(upload.id)
+    except UploadError as e:
+        raise upload_http_error(e)
+    return attach_uploaded_csv(session, file_ref)
+
 @app.post("/api/upload-file")
 async def upload_file(request: FileUploadRequest):
     """Upload and process a Python file"""
@@ -1620,6 +1982,7 @@ async def upload_file(request: FileUploadRequest):
             "content": request.content,
             "timestamp": time.time()
         })
+        session_store.save(session)
         
         return {
             "success": True,
@@ -1631,15 +1994,66 @@ async def upload_file(request: FileUploadRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
 
+@app.get("/api/sessions/{session_id}/datasets")
+async def list_datasets(session_id: str):
+    """Catalog of the session's uploaded datasets: id, filename, hash, size and schema summary"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"success": True, "session_id": session_id,
+            "datasets": [session.datasets.describe(entry) for entry in session.datasets.entries()]}
+
+@app.delete("/api/sessions/{session_id}/datasets/{dataset_key}")
+async def delete_dataset(session_id: str, dataset_key: str):
+    """Remove one dataset, by id, filename or sha256, from the session"""
+    session = session_store.get(session_id)
+    dataset = session.datasets.remove(dataset_key) if session else None
+    if dataset is None:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    delete_dataset_files(dataset)
+    execution_cache.invalidate_session(session_id)
+    session.conversation_history.append({
+        "type": "csv_removal",
+        "dataset_id": dataset['id'],
+        "filename": dataset['filename'],
+        "timestamp": time.time()
+    })
+    session_store.save(session)
+    print(f"🗑️ Dataset '{dataset['filename']}' removed from session {session_id}")
+    return {"success": True, "session_id": session_id, "removed": session.datasets.describe(dataset)}
+
+@app.get("/api/sessions/{session_id}/dataset-profile")
+async def get_dataset_profile(session_id: str, dataset: Optional[str] = None):
+    """Schema profile of a session dataset, the latest upload by default (computed now if it isn't ready yet)"""
+    session = session_store.get(session_id)
+    entry = None
+    if session is not None:
+        entry = session.datasets.find(dataset) if dataset else session.datasets.latest()
+    if entry is None:
+        raise HTTPException(status_code=404, detail="No CSV uploaded for this session" if not dataset else "Dataset not found")
+    try:
+        return {"success": True, "session_id": session_id, "dataset_id": entry['id'],
+                "profile": await ensure_dataset_profile(session, entry)}
+    except DispatcherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/api/sessions/memory")
+async def get_sessions_memory():
+    """Report memory use of the session store, per session"""
+    return {
+        "success": True,
+        "store": session_store.stats(),
+        "sessions": session_store.usage()
+    }
+
 @app.get("/api/session/{session_id}/history")
 async def get_session_history(session_id: str):
     """Get session history"""
     try:
-        if session_id not in active_sessions:
+        session = session_store.get(session_id)
+        if session is None:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        session = active_sessions[session_id]
-        
         return {
             "success": True,
             "session_id": session_id,
@@ -1647,9 +2061,103 @@ async def get_session_history(session_id: str):
             "execution_results": session.execution_results
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get session history: {str(e)}")
 
+def parse_range_header(range_header: str, size: int) -> Optional[tuple]:
+    """Parse a single ``bytes=start-end`` range; returns (start, end) inclusive, or None to send it all"""
+    unit, _, spec = range_header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None  # multiple ranges aren't supported - the full body is a valid answer
+    start, _, end = spec.strip().partition('-')
+    if not start:
+        length = int(end)
+        return (max(0, size - length), size - 1) if length else (size, size - 1)
+    return int(start), min(int(end), size - 1) if end else size - 1
+
+@app.get("/api/images/{image_hash}")
+async def get_image(image_hash: str, request: Request):
+    """Serve a generated chart by content hash, with ETag, long-lived caching and range requests"""
+    stored = image_store.get(image_hash)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    data, image_format = stored
+
+    etag = f'"{image_hash}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes"
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        try:
+            byte_range = parse_range_header(range_header, len(data))
+        except ValueError:
+            byte_range = None
+        if byte_range is not None:
+            start, end = byte_range
+            if start >= len(data) or start > end:
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+            return Response(content=data[start:end + 1], status_code=206,
+                            media_type=CONTENT_TYPES.get(image_format), headers=headers)
+
+    return Response(content=data, media_type=CONTENT_TYPES.get(image_format), headers=headers)
+
+async def report_dataset(session: Optional[CodeInterpreterSession], key: Optional[str] = None) -> tuple:
+    """A session dataset as a source the chart renderer can share with its workers, and its digest"""
+    if session is None:
+        return None, None
+    dataset = session.datasets.find(key) if key else session.datasets.latest()
+    if dataset is None:
+        if key:
+            raise ValueError(f"Dataset '{key}' not found in this session")
+        return None, None
+    digest = file_digest(dataset_files(dataset)[0])
+    columnar = await ensure_columnar_copy(session, dataset)
+    if columnar:
+        return columnar['path'], digest
+    if 'path' in dataset:
+        return dataset['path'], digest
+    import pandas as pd
+    return pd.read_csv(io.BytesIO(dataset['content'].encode('utf-8'))), digest
+
+@app.post("/api/reports/build")
+async def build_report(request: ReportBuildRequest):
+    """Build PPTX/PDF documents from report sections; unchanged sections come from cache"""
+    session = session_store.get(request.session_id) if request.session_id else None
+    if request.session_id and session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        dataset, digest = await report_dataset(session, request.dataset)
+        result = await dispatcher.run("report", report_builder.build, request.report, dataset, digest, request.formats)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DispatcherBusy as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    for document in result["documents"].values():
+        document["url"] = f"/api/reports/{document['hash']}"
+    return {"success": True, "session_id": request.session_id, **result}
+
+@app.get("/api/reports/{document_hash}")
+async def get_report(document_hash: str):
+    """Download a built report document"""
+    stored = report_builder.document(document_hash)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    data, document_format = stored
+    return Response(content=data, media_type=DOCUMENT_TYPES[document_format], headers={
+        "ETag": f'"{document_hash}"',
+        "Content-Disposition": f'attachment; filename="report-{document_hash[:12]}.{document_format}"'
+    })
+
 @app.get("/api/agents/status")
 async def get_agents_status():
     """Get status of all agents"""
@@ -1683,36 +2191,159 @@ async def get_agents_status():
             "executor_type": executor_type,
             "current_model": current_model,
             "aws_region": aws_region,
-            "authentication": "AWS Profile" if os.getenv('AWS_PROFILE') else "Access Keys"
+            "authentication": "AWS Profile" if os.getenv('AWS_PROFILE') else "Access Keys",
+            "interpreter_pool": interpreter_pool.stats() if interpreter_pool else None,
+            "agent_pool": agent_pool.stats(),
+            "dispatcher": dispatcher.stats(),
+            "jobs": job_queue.stats(),
+            "images": image_store.stats(),
+            "sessions": session_store.stats(),
+            "uploads": upload_manager.stats(),
+            "profiler": dataset_profiler.stats(),
+            "columnar": columnar_converter.stats(),
+            "generation_cache": generation_cache.stats(),
+            "code_optimizer": code_optimizer.stats(),
+            "prompts": prompt_builder.stats(),
+            "execution_cache": execution_cache.stats(),
+            "execution_metrics": execution_metrics.stats(),
+            "execution_engines": execution_scheduler.stats(),
+            "chart_renderer": chart_renderer.stats(),
+            "reports": report_builder.stats(),
+            "dataset_query": {"engine": DATASET_QUERY_ENGINE, "large_dataset_bytes": large_dataset_bytes},
+            "sandbox_files": sandbox_sync.stats()
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get agents status: {str(e)}")
 
+# Background job API
+async def run_execute_job(job):
+    return await execute_code(CodeExecutionRequest(
+        code=job.payload["code"],
+        session_id=job.session_id,
+        interactive=job.payload.get("interactive", False),
+        inputs=job.payload.get("inputs"),
+        use_cache=bool(job.payload.get("use_cache")),
+        ai_commentary=bool(job.payload.get("ai_commentary")),
+        engine=job.payload.get("engine")
+    ))
+
+async def run_generate_job(job):
+    return await generate_code(CodeGenerationRequest(prompt=job.payload["prompt"], session_id=job.session_id,
+                                                     use_cache=job.payload.get("use_cache") is not False))
+
+job_queue.register("execute", run_execute_job)
+job_queue.register("generate", run_generate_job)
+
+async def broadcast_job_update(job):
+    """Push job state changes to the session's open WebSockets"""
+    await send_to_session(job.session_id, {"type": "job_update", "job": job.to_dict()})
+
+job_queue.add_listener(broadcast_job_update)
+
+async def submit_job(request: JobSubmissionRequest):
+    if request.kind == "execute" and not request.code:
+        raise HTTPException(status_code=400, detail="Execute jobs require 'code'")
+    if request.kind == "generate" and not request.prompt:
+        raise HTTPException(status_code=400, detail="Generate jobs require 'prompt'")
+
+    session = get_or_create_session(request.session_id)
+    payload = {
+        "code": request.code,
+        "prompt": request.prompt,
+        "interactive": request.interactive,
+        "inputs": request.inputs,
+        "use_cache": request.use_cache,
+        "ai_commentary": request.ai_commentary,
+        "engine": request.engine
+    }
+    try:
+        return await job_queue.submit(request.kind, session.session_id, payload, request.priority or 0)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/jobs")
+async def create_job(request: JobSubmissionRequest):
+    """Queue a code execution or generation and return its job id immediately"""
+    job = await submit_job(request)
+    return {
+        "success": True,
+        "job_id": job.id,
+        "session_id": job.session_id,
+        "status": job.status
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a job's status and, once finished, its result"""
+    job = await job_queue.lookup(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, **job}
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job"""
+    if await job_queue.lookup(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    cancelled = await job_queue.cancel(job_id)
+    job = await job_queue.lookup(job_id)
+    return {"success": cancelled, "job_id": job_id, "status": job["status"] if job else None}
+
+@app.get("/api/sessions/{session_id}/jobs")
+async def list_session_jobs(session_id: str):
+    """List the jobs retained for a session, without their results"""
+    return {
+        "success": True,
+        "session_id": session_id,
+        "jobs": await job_queue.lookup_session(session_id)
+    }
+
 # WebSocket endpoint for real-time communication
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     await websocket.accept()
     print(f"WebSocket connected for session {session_id}")
+    websocket_connections.setdefault(session_id, set()).add(websocket)
     
     try:
         while True:
             data = await websocket.receive_text()
             message = json.loads(data)
             
-            if message["type"] == "generate_code":
+            if message["type"] == "submit_job":
+                # Queue a job; progress arrives as job_update messages on this socket
+                try:
+                    job = await submit_job(JobSubmissionRequest(**{**message.get("job", {}), "session_id": session_id}))
+                    await websocket.send_text(json.dumps({
+                        "type": "job_submitted",
+                        "success": True,
+                        "job_id": job.id,
+                        "session_id": session_id
+                    }))
+                except Exception as e:
+                    await websocket.send_text(json.dumps({
+                        "type": "error",
+                        "success": False,
+                        "error": getattr(e, "detail", None) or str(e)
+                    }))
+            
+            elif message["type"] == "generate_code":
                 # Handle code generation via WebSocket
                 try:
-                    agent_result = code_generator_agent(message["prompt"])
-                    
-                    # Extract string content from AgentResult
-                    generated_code = str(agent_result) if agent_result is not None else ""
+                    # The raw prompt is sent without dataset context, so it has its own cache bucket
+                    cache_bucket = GenerationCache.bucket("no-dataset", globals().get('current_model_id', 'unknown'), "raw")
+                    agent_prompt = prompt_builder.compose().add("request", message["prompt"], required=True)
+                    generated_code, cache_match, _ = await dispatcher.run("generate", generate_with_cache, message["prompt"],
+                                                                          agent_prompt, cache_bucket,
+                                                                          message.get("use_cache", True), session_id)
                     
                     await websocket.send_text(json.dumps({
                         "type": "code_generated",
                         "success": True,
                         "code": generated_code,
-                        "session_id": session_id
+                        "session_id": session_id,
+                        "cached": cache_match
                     }))
                 except Exception as e:
                     await websocket.send_text(json.dumps({
@@ -1723,19 +2354,32 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
             
             elif message["type"] == "execute_code":
                 # Handle code execution via WebSocket
+                streamer = open_output_stream(session_id)
                 try:
-                    if executor_type == "agentcore":
-                        execution_result = code_executor_agent(f"Execute this code: {message['code']}")
+                    current_session_id.set(session_id)
+                    current_output_stream.set(streamer)
+                    images = []
+                    if executor_type == "agentcore" and not message.get("ai_commentary"):
+                        code = optimize_code(message['code'])[0] if message.get("optimize", True) else message['code']
+                        execution_result, images, _ = await dispatcher.run(
+                            "execute", execute_code_direct, code, None, session_id)
                     else:
-                        execution_result = code_executor_agent(f"Simulate execution of: {message['code']}")
+                        action = "Execute" if executor_type == "agentcore" else "Simulate execution of"
+                        execution_prompt = prompt_builder.compose().add("code", f"{action} this code: {message['code']}", required=True)
+                        agent_result, _ = await dispatcher.run(
+                            "execute", invoke_agent, "executor", session_id, execution_prompt, "execute")
+                        execution_result = str(agent_result)
                     
+                    await streamer.aclose()
                     await websocket.send_text(json.dumps({
                         "type": "execution_result",
                         "success": True,
                         "result": execution_result,
+                        "images": images or [],
                         "session_id": session_id
                     }))
                 except Exception as e:
+                    await streamer.aclose()
                     await websocket.send_text(json.dumps({
                         "type": "error",
                         "success": False,
@@ -1744,6 +2388,12 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
                     
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for session {session_id}")
+    finally:
+        connections = websocket_connections.get(session_id)
+        if connections is not None:
+            connections.discard(websocket)
+            if not connections:
+                websocket_connections.pop(session_id, None)
 
 @app.get("/health")
 async def health_check():
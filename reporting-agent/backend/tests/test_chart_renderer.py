@@ -0,0 +1,76 @@
+import os
+
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("matplotlib")
+
+import ChartRenderer as chart_renderer_module
+from ChartRenderer import ChartRenderer, load_columns
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    renderer = ChartRenderer(workers=0, root=str(tmp_path / "shared"))
+    yield renderer
+    renderer.close()
+
+
+@pytest.fixture
+def accounts(tmp_path):
+    path = tmp_path / "accounts.csv"
+    path.write_text("account_id,amount\n012345,1\n,2\n99,3\n")
+    return str(path)
+
+
+def test_text_transform_columns_keep_the_csv_text(renderer, accounts):
+    path = renderer.share_dataset(accounts, ["account_id"])
+    values = load_columns(path, ["account_id"])["account_id"].tolist()
+    assert values[0] == "012345" and values[2] == "99"
+
+    result = renderer.render([{"name": "lengths", "type": "bar", "column": "account_id", "transform": "length"}],
+                             accounts)
+    assert result[0]["error"] is None
+    assert result[0]["png"].startswith(b"\x89PNG")
+
+
+def test_feather_copy_is_only_used_without_text_columns(renderer, accounts, tmp_path):
+    import pandas as pd
+    pd.DataFrame({"account_id": [12345.0, None, 99.0], "amount": [1, 2, 3]}).to_feather(tmp_path / "accounts.feather")
+    assert renderer.share_dataset(accounts).endswith("accounts.feather")
+    assert renderer.share_dataset(accounts, ["account_id"]).endswith(".arrow")
+
+
+def write_csv(tmp_path, name: str) -> str:
+    path = tmp_path / name
+    path.write_text("account_id,amount\n1,1\n2,2\n")
+    return str(path)
+
+
+def test_shared_copies_are_bounded_and_forgotten(tmp_path):
+    renderer = ChartRenderer(workers=0, root=str(tmp_path / "shared"), max_shared=2)
+    try:
+        paths = [renderer.share_dataset(write_csv(tmp_path, f"{name}.csv"), ["account_id"]) for name in "abc"]
+        assert not os.path.exists(paths[0])
+        assert all(os.path.exists(path) for path in paths[1:])
+
+        renderer.forget(str(tmp_path / "b.csv"))
+        assert not os.path.exists(paths[1])
+        renderer.forget(str(tmp_path))
+        assert not os.path.exists(paths[2])
+        assert renderer.stats()["datasets_kept"] == 0
+    finally:
+        renderer.close()
+
+
+def test_workers_close_deleted_and_least_recently_used_datasets(renderer, tmp_path, monkeypatch):
+    monkeypatch.setattr(chart_renderer_module, "MAX_OPEN_DATASETS", 2)
+    monkeypatch.setattr(chart_renderer_module, "_datasets", chart_renderer_module.OrderedDict())
+    paths = [renderer.share_dataset(write_csv(tmp_path, f"{name}.csv"), ["account_id"]) for name in "abc"]
+    for path in paths:
+        load_columns(path, ["amount"])
+    assert [path for path, _ in chart_renderer_module._datasets] == paths[1:]
+
+    renderer.forget(str(tmp_path / "b.csv"))
+    load_columns(paths[0], ["amount"])
+    assert [path for path, _ in chart_renderer_module._datasets] == [paths[2], paths[0]]
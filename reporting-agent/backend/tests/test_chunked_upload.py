@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from ChunkedUploadManager import ChunkedUploadManager, UploadError, UploadNotFound, UploadOffsetMismatch
+from SessionStore import SessionStore
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return ChunkedUploadManager(str(tmp_path / "spool"))
+
+
+def test_chunks_accumulate_digest_and_rows(manager):
+    data = b"a,b\n1,2\n3,4\n"
+    upload = manager.create("s1", "data.csv", len(data))
+    manager.append(upload.id, 0, [data[:5]])
+    manager.append(upload.id, 5, [data[5:]])
+    file_ref = manager.complete(upload.id, hashlib.sha256(data).hexdigest())
+    assert file_ref["rows"] == 2
+    assert file_ref["size"] == len(data)
+    with open(file_ref["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_a_chunk_at_the_wrong_offset_is_rejected(manager):
+    upload = manager.create("s1", "data.csv")
+    manager.append(upload.id, 0, [b"a,b\n"])
+    with pytest.raises(UploadOffsetMismatch) as error:
+        manager.append(upload.id, 0, [b"a,b\n"])
+    assert error.value.expected_offset == 4
+
+
+async def blocks(*parts, gate: asyncio.Event = None):
+    for part in parts:
+        if gate is not None:
+            await gate.wait()
+        yield part
+
+
+def test_streamed_chunks_wait_for_each_other(manager):
+    async def scenario():
+        upload = manager.create("s1", "data.csv")
+        gate = asyncio.Event()
+        first = asyncio.create_task(manager.append_stream(upload.id, 0, blocks(b"a,b\n", b"1,2\n", gate=gate)))
+        second = asyncio.create_task(manager.append_stream(upload.id, 0, blocks(b"x\n")))
+        await asyncio.sleep(0.05)
+        # The first chunk holds the upload while its stream stalls; nothing can complete it meanwhile
+        with pytest.raises(UploadError):
+            manager.complete(upload.id)
+        gate.set()
+        await first
+        with pytest.raises(UploadOffsetMismatch):
+            await second
+        return manager.complete(upload.id)
+
+    file_ref = asyncio.run(scenario())
+    assert file_ref["rows"] == 1
+    with open(file_ref["path"], "rb") as f:
+        assert f.read() == b"a,b\n1,2\n"
+
+
+def test_a_streamed_chunk_cut_short_keeps_what_was_written(manager):
+    async def failing():
+        yield b"a,b\n"
+        raise ConnectionError("client went away")
+
+    async def scenario():
+        upload = manager.create("s1", "data.csv")
+        with pytest.raises(ConnectionError):
+            await manager.append_stream(upload.id, 0, failing())
+        return upload
+
+    upload = asyncio.run(scenario())
+    assert upload.offset == 4
+    assert os.path.getsize(upload.path) == 4
+
+
+def test_deleted_sessions_lose_their_spool_dir_and_open_uploads(manager):
+    store = SessionStore()
+    store.delete_listeners.append(manager.delete_session)
+    store.get_or_create("s1")
+    completed = manager.store_bytes("s1", "done.csv", b"a\n1\n")
+    upload = manager.create("s1", "open.csv")
+    other = manager.store_bytes("s2", "other.csv", b"a\n1\n")
+
+    store.delete("s1")
+    assert not os.path.exists(manager.session_dir("s1"))
+    assert not os.path.exists(completed["path"])
+    with pytest.raises(UploadNotFound):
+        manager.get(upload.id)
+    assert os.path.exists(other["path"])
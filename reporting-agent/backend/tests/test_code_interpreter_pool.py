@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from CodeInterpreterPool import CodeInterpreterPool
+
+
+class Client:
+    def __init__(self, number: int):
+        self.number = number
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+def eventually(predicate, timeout: float = 5) -> bool:
+    """Wait for something a background thread does, e.g. stopping an evicted interpreter"""
+    deadline = time.time() + timeout
+    while not predicate():
+        if time.time() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def clients():
+    return []
+
+
+@pytest.fixture
+def make_pool(clients):
+    pools = []
+
+    def make(**options):
+        def factory():
+            clients.append(Client(len(clients)))
+            return clients[-1]
+
+        pool = CodeInterpreterPool(factory, **options)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close_all()
+
+
+def test_a_session_reuses_its_warm_interpreter(make_pool, clients):
+    pool = make_pool()
+    with pool.lease("s1") as first:
+        pass
+    with pool.lease("s1") as second:
+        pass
+    with pool.lease("s2") as other:
+        pass
+    assert first is second
+    assert other is not first
+    stats = pool.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_a_failed_execution_discards_the_interpreter(make_pool, clients):
+    pool = make_pool()
+    with pytest.raises(RuntimeError):
+        with pool.lease("s1"):
+            raise RuntimeError("session expired")
+    assert clients[0].stopped
+    with pool.lease("s1") as client:
+        assert client is clients[1]
+    assert pool.stats()["evictions_error"] == 1
+
+
+def test_the_least_recently_used_idle_interpreter_makes_room(make_pool, clients):
+    pool = make_pool(max_sessions=2)
+    for session_id in ("s1", "s2", "s1", "s3"):
+        with pool.lease(session_id):
+            pass
+    assert eventually(lambda: clients[1].stopped)
+    assert not clients[0].stopped
+    assert pool.stats()["evictions_lru"] == 1
+
+
+def test_concurrent_leases_of_one_session_take_turns(make_pool):
+    pool = make_pool()
+    active, overlaps = [], []
+
+    def run():
+        with pool.lease("s1") as client:
+            active.append(client)
+            if len(active) > 1:
+                overlaps.append(True)
+            time.sleep(0.02)
+            active.remove(client)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    assert not overlaps
+    assert pool.stats()["misses"] == 1
+
+
+def test_a_full_pool_times_out_instead_of_waiting_forever(make_pool):
+    pool = make_pool(max_sessions=1, acquire_timeout=0.05)
+    with pool.lease("s1"):
+        with pytest.raises(TimeoutError):
+            with pool.lease("s2"):
+                pass
+
+
+def test_idle_interpreters_expire(make_pool, clients):
+    pool = make_pool(idle_ttl=0)
+    with pool.lease("s1"):
+        pass
+    time.sleep(0.01)
+    pool.evict_idle()
+    assert eventually(lambda: clients[0].stopped)
+    assert pool.stats()["active"] == 0
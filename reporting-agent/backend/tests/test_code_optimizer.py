@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from CodeOptimizer import CodeOptimizer
+
+
+def run(code: str):
+    """Result of ``code``'s last line over a small frame, or the type of the exception it raised"""
+    namespace = {"pd": pd, "df": pd.DataFrame({"c": ["a,b,c", "bb", "abc"], "n": [1, 2, 3]})}
+    try:
+        exec(code, namespace)
+        return namespace["result"].tolist()
+    except Exception as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("expression", [
+    "df['c'].apply(lambda x: x.upper())",
+    "df['c'].apply(lambda x: x[:2])",
+    "df['c'].apply(len)",
+    "df['c'].apply(lambda x: x.split(','))",
+    "df['c'].apply(lambda x: x.split(',', 1))",
+    "df['c'].apply(lambda x: x.startswith('b'))",
+    "df['c'].apply(lambda x: x.startswith('b', 2))",
+    "df['c'].apply(lambda x: x.endswith('c', 0, 3))",
+    "df['c'].apply(lambda x: x.replace('.', '-'))",
+    "df['c'].apply(lambda x: x.strip('a'))",
+    "df['n'].apply(lambda x: x * 2 + 1)",
+    "df['n'].apply(lambda x: x / 2)",
+    "df['n'].apply(lambda x: x / 0)",
+    "df['n'].apply(lambda x: x // 0)",
+    "df['n'].apply(lambda x: 6 / x)",
+    "df['n'].apply(lambda x: x ** -1)",
+])
+def test_rewrite_keeps_behaviour(expression):
+    code = f"result = {expression}"
+    report = CodeOptimizer().analyze(code)
+    assert run(report["code"]) == run(code)
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("df['c'].apply(lambda x: x.upper())", "df['c'].str.upper()"),
+    ("df['c'].apply(lambda x: x[:3])", "df['c'].str[:3]"),
+    ("df['c'].apply(len)", "df['c'].str.len()"),
+    ("df['n'].apply(lambda x: x * 2)", "(df['n'] * 2)"),
+])
+def test_rewrites_simple_idioms(expression, expected):
+    report = CodeOptimizer().analyze(f"result = {expression}")
+    assert report["rewritten"]
+    assert expected in report["code"]
+
+
+@pytest.mark.parametrize("expression", [
+    "df['c'].apply(lambda x: x.split(',', 1))",
+    "df['c'].apply(lambda x: x.startswith('b', 2))",
+    "df['c'].apply(lambda x: x.endswith('c', 0, 3))",
+    "df['n'].apply(lambda x: x / 0)",
+])
+def test_leaves_calls_whose_signatures_differ(expression):
+    code = f"result = {expression}"
+    report = CodeOptimizer().analyze(code)
+    assert not report["rewritten"]
+    assert report["code"] == code
+
+
+def test_replace_matches_literally():
+    report = CodeOptimizer().analyze("result = df['c'].apply(lambda x: x.replace('.', '-'))")
+    assert "regex=False" in report["code"]
+
+
+def test_flag_only_mode_reports_without_rewriting():
+    code = "result = df['c'].apply(lambda x: x.lower())"
+    optimizer = CodeOptimizer(rewrite=False)
+    report = optimizer.analyze(code)
+    assert report["code"] == code
+    assert [rewrite["pattern"] for rewrite in report["rewrites"]] == ["apply_str"]
+    assert optimizer.stats()["rewritten"] == 0
+
+
+def test_flags_iterrows_and_counts_hints():
+    optimizer = CodeOptimizer()
+    report = optimizer.analyze("for i, row in df.iterrows():\n    print(row)\n")
+    assert [warning["pattern"] for warning in report["warnings"]] == ["iterrows"]
+    assert "iterrows" in optimizer.prompt_hints()
+
+
+def test_syntax_errors_pass_through():
+    optimizer = CodeOptimizer()
+    report = optimizer.analyze("def broken(:")
+    assert report["code"] == "def broken(:"
+    assert optimizer.stats()["syntax_errors"] == 1
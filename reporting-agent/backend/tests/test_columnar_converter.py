@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+import pyarrow.feather as feather
+
+from ColumnarConverter import ColumnarConverter
+from DatasetProfiler import DatasetProfiler
+
+
+def convert(tmp_path, text: str, block_size: int = 16 * 1024 * 1024):
+    path = tmp_path / "data.csv"
+    path.write_text(text)
+    profile = DatasetProfiler().profile_file({"filename": "data.csv", "path": str(path), "size": len(text)})
+    converter = ColumnarConverter(block_size=block_size)
+    return converter, converter.convert(str(path), profile)
+
+
+def test_integer_columns_stay_integers(tmp_path):
+    _, columnar = convert(tmp_path, "id,amount\n1,10\n2,20\n")
+    table = feather.read_table(columnar["path"])
+    assert str(table.schema.field("id").type) == "int64"
+    assert table.column("amount").to_pylist() == [10, 20]
+    assert columnar["binary"]
+
+
+def test_leading_zeros_keep_the_column_as_text(tmp_path):
+    # The zero-padded value comes in a later block, after earlier ones already looked numeric
+    rows = "".join(f"{index},{index}\n" for index in range(1, 300))
+    _, columnar = convert(tmp_path, "account_id,amount\n" + rows + "012345,1\n", block_size=256)
+    table = feather.read_table(columnar["path"])
+    assert table.column("account_id").to_pylist()[-1] == "012345"
+    assert str(table.schema.field("amount").type) == "int64"
+
+
+def test_integer_columns_with_blanks_are_not_int64(tmp_path):
+    _, columnar = convert(tmp_path, "id,amount\n1,10\n,20\n99,30\n")
+    table = feather.read_table(columnar["path"])
+    assert str(table.schema.field("id").type) == "double"
+    assert table.column("id").to_pylist() == [1.0, None, 99.0]
+
+
+def test_malformed_rows_fail_the_conversion(tmp_path):
+    converter, columnar = convert(tmp_path, "id,amount\n1,10\n2\n3,30\n")
+    assert columnar is None
+    assert converter.stats()["failed"] == 1
+    assert not (tmp_path / "data.feather").exists()
@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from DatasetProfiler import DatasetProfiler
+
+
+@pytest.fixture
+def profiler():
+    return DatasetProfiler(chunk_rows=3, sketch_size=64, max_values=3)
+
+
+def csv_file(tmp_path, text: str, name: str = "data.csv") -> dict:
+    path = tmp_path / name
+    path.write_text(text)
+    return {"filename": name, "path": str(path), "size": len(text)}
+
+
+def columns(profile: dict) -> dict:
+    return {column["name"]: column for column in profile["columns"]}
+
+
+def test_columns_are_typed_across_chunks(profiler, tmp_path):
+    text = "id,price,day,region,flag\n" + "".join(
+        f"{i},{i * 1.5 if i != 4 else ''},2024-01-{i + 1:02d},{'north' if i % 2 else 'south'},{i % 2 == 0}\n"
+        for i in range(8)) + "8,2.5,2024-01-09,x7,True\n"
+    profile = profiler.profile(csv_file(tmp_path, text))
+    assert profile["rows"] == 9
+    by_name = columns(profile)
+    assert by_name["id"]["dtype"] == "int" and (by_name["id"]["min"], by_name["id"]["max"]) == (0, 8)
+    assert by_name["price"]["dtype"] == "float" and by_name["price"]["nulls"] == 1
+    assert by_name["day"]["dtype"] == "datetime" and by_name["day"]["max"] == "2024-01-09"
+    assert by_name["region"]["dtype"] == "string" and by_name["region"]["values"] == ["north", "south", "x7"]
+    assert by_name["flag"]["dtype"] == "bool"
+
+
+def test_numbers_then_text_make_a_string_column(profiler, tmp_path):
+    profile = profiler.profile(csv_file(tmp_path, "code\n1\n2\n3\nA1\n"))
+    column = columns(profile)["code"]
+    assert column["dtype"] == "string"
+    assert "min" not in column
+
+
+def test_distinct_counts_are_exact_then_estimated(tmp_path):
+    profiler = DatasetProfiler(chunk_rows=1000, sketch_size=64)
+    small = profiler.profile(csv_file(tmp_path, "v\n" + "".join(f"{i % 50}\n" for i in range(200)), "small.csv"))
+    assert (columns(small)["v"]["distinct"], columns(small)["v"]["distinct_approximate"]) == (50, False)
+    large = profiler.profile(csv_file(tmp_path, "v\n" + "".join(f"{i}\n" for i in range(5000)), "large.csv"))
+    estimate = columns(large)["v"]
+    assert estimate["distinct_approximate"]
+    assert 2500 < estimate["distinct"] < 10000
+
+
+def test_profiles_are_cached_by_content(profiler, tmp_path):
+    first = csv_file(tmp_path, "a\n1\n", "first.csv")
+    profiler.profile(first)
+    renamed = profiler.profile(csv_file(tmp_path, "a\n1\n", "second.csv"))
+    assert renamed["filename"] == "second.csv"
+    assert profiler.stats()["profiled"] == 1 and profiler.stats()["cache_hits"] == 1
+
+
+def test_concurrent_requests_for_one_file_profile_it_once(profiler, tmp_path):
+    file_info = csv_file(tmp_path, "a\n" + "1\n" * 1000)
+    threads = [threading.Thread(target=profiler.profile, args=(file_info,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert profiler.stats()["profiled"] == 1
+
+
+def test_other_delimiters_are_detected_and_prompted(profiler, tmp_path):
+    profile = profiler.profile(csv_file(tmp_path, "a;b\n1;x\n2;y\n"))
+    assert profile["delimiter"] == ";"
+    prompt = DatasetProfiler.to_prompt(profile)
+    assert "semicolon-delimited" in prompt and "sep=';'" in prompt
+    assert "- a: int; 2 distinct; 1 to 2" in prompt
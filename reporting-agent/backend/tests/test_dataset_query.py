@@ -0,0 +1,124 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc as pa_ipc
+
+import DatasetQuery
+from DatasetQuery import Count, GroupBy, Max, Mean, Min, NUnique, Scan, Sum, ValueCounts
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(3)
+    return pd.DataFrame({
+        "key": [f"k{value}" for value in rng.integers(0, 500, 5000)],
+        "amount": rng.integers(-50, 100, 5000),
+        "group": rng.choice(["a", "b", "c"], 5000),
+    })
+
+
+@pytest.fixture
+def arrow_path(frame, tmp_path):
+    """The frame as an Arrow IPC file in 500-row record batches, so scans see many batches"""
+    path = str(tmp_path / "data.arrow")
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    with pa_ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table, max_chunksize=500)
+    return path
+
+
+def test_scalar_aggregates_match_pandas(frame, arrow_path):
+    stats = Scan(arrow_path).aggregate(rows=Count(), total=Sum("amount"), low=Min("amount"), high=Max("amount"),
+                                       mean=Mean("amount"))
+    assert stats["rows"] == len(frame)
+    assert stats["total"] == frame["amount"].sum()
+    assert stats["low"] == frame["amount"].min()
+    assert stats["high"] == frame["amount"].max()
+    assert stats["mean"] == pytest.approx(frame["amount"].mean())
+
+
+def test_keyed_aggregates_match_pandas(frame, arrow_path):
+    stats = Scan(arrow_path).aggregate(counts=ValueCounts("key"), unique=NUnique("key"),
+                                       prefixes=ValueCounts(lambda df: df["key"].str[:2]))
+    assert stats["unique"] == frame["key"].nunique()
+    assert stats["counts"].sort_index().to_dict() == frame["key"].value_counts().sort_index().to_dict()
+    assert stats["counts"].is_monotonic_decreasing
+    assert stats["prefixes"].to_dict() == frame["key"].str[:2].value_counts().to_dict()
+
+
+def test_group_by_matches_pandas(frame, arrow_path):
+    result = Scan(arrow_path).group_by("group", {"amount": "mean", "key": "count"})
+    expected = frame.groupby("group").agg({"amount": "mean", "key": "count"})
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_names=False)
+
+
+def test_where_filters_each_batch(frame, arrow_path):
+    scan = Scan(arrow_path).where(lambda df: df["amount"] > 90)
+    assert scan.count() == int((frame["amount"] > 90).sum())
+    assert Scan(arrow_path).count() == len(frame)
+    rows = Scan(arrow_path).isin("key", ["k1", "k2"]).collect()
+    assert len(rows) == int(frame["key"].isin(["k1", "k2"]).sum())
+
+
+def test_csv_and_arrow_scans_agree(frame, arrow_path, tmp_path):
+    csv_path = str(tmp_path / "data.csv")
+    frame.to_csv(csv_path, index=False)
+    from_csv = Scan(csv_path, columns=["key", "amount"]).aggregate(unique=NUnique("key"), total=Sum("amount"))
+    assert from_csv == Scan(arrow_path).aggregate(unique=NUnique("key"), total=Sum("amount"))
+
+
+@pytest.fixture
+def spills(monkeypatch):
+    """Forces keyed aggregates past a handful of groups to spill, recording each spill directory"""
+    monkeypatch.setattr(DatasetQuery, "MERGE_ROWS", 50)
+    monkeypatch.setattr(DatasetQuery, "MAX_GROUPS", 100)
+    directories = []
+
+    class RecordingSpill(DatasetQuery.SpillPartitions):
+        def __init__(self):
+            super().__init__(partitions=4)
+            directories.append(self.directory)
+
+    monkeypatch.setattr(DatasetQuery, "SpillPartitions", RecordingSpill)
+    return directories
+
+
+def test_spilled_aggregates_match_in_memory(frame, arrow_path, spills):
+    stats = Scan(arrow_path).aggregate(counts=ValueCounts("key"), unique=NUnique("key"),
+                                       groups=GroupBy("key", {"amount": "sum"}))
+    assert len(spills) == 3
+    assert stats["unique"] == frame["key"].nunique()
+    assert stats["counts"].sort_index().to_dict() == frame["key"].value_counts().sort_index().to_dict()
+    expected = frame.groupby("key").agg({"amount": "sum"})
+    pd.testing.assert_frame_equal(stats["groups"], expected, check_dtype=False, check_names=False)
+    assert not any(os.path.exists(directory) for directory in spills)
+
+
+def test_spill_is_removed_when_a_scan_fails(arrow_path, spills):
+    def failing(df):
+        if failing.calls > 5:
+            raise RuntimeError("bad batch")
+        failing.calls += 1
+        return df["key"]
+    failing.calls = 0
+
+    with pytest.raises(RuntimeError):
+        Scan(arrow_path).aggregate(counts=ValueCounts(failing))
+    assert spills
+    assert not any(os.path.exists(directory) for directory in spills)
+
+
+def test_typed_columns_are_read_from_the_csv_not_the_feather_copy(tmp_path):
+    csv_path = tmp_path / "accounts.csv"
+    csv_path.write_text("account_id,amount\n012345,1\n,2\n99,3\n")
+    # A Feather copy with the upload's inferred types, as the server writes next to the CSV
+    pd.DataFrame({"account_id": [12345.0, None, 99.0], "amount": [1, 2, 3]}).to_feather(tmp_path / "accounts.feather")
+
+    typed = Scan(str(csv_path), dtype={"account_id": str}).collect()
+    assert typed["account_id"].tolist()[::2] == ["012345", "99"]
+    assert pd.isna(typed["account_id"][1])
+    assert Scan(str(csv_path)).source.endswith(".feather")
@@ -0,0 +1,42 @@
+from ExecutionCache import ExecutionCache
+
+
+def test_results_are_not_shared_between_sessions():
+    cache = ExecutionCache()
+    first = ExecutionCache.key("s1", "print(total)", None, ["abc"])
+    cache.put(first, "s1", {"result": "42", "images": []})
+    assert cache.get(first) == {"result": "42", "images": []}
+    assert cache.get(ExecutionCache.key("s2", "print(total)", None, ["abc"])) is None
+
+
+def test_key_covers_inputs_and_file_contents():
+    key = ExecutionCache.key("s1", "print(1)", None, ["a", "b"])
+    assert key == ExecutionCache.key("s1", "print(1)", [], ["b", "a"])
+    assert key != ExecutionCache.key("s1", "print(1)", ["y"], ["a", "b"])
+    assert key != ExecutionCache.key("s1", "print(1)", None, ["a", "c"])
+
+
+def test_nondeterministic_code_is_not_cached():
+    cache = ExecutionCache()
+    assert cache.uncacheable_reason("import random\nprint(random.random())") == "uses random values"
+    assert cache.uncacheable_reason("print(1)  # no-cache") == "marked '# no-cache'"
+    assert cache.uncacheable_reason("print(df.describe())") is None
+
+
+def test_invalidate_session_drops_only_that_session():
+    cache = ExecutionCache()
+    cache.put(ExecutionCache.key("s1", "a", None, []), "s1", {"result": "1"})
+    cache.put(ExecutionCache.key("s2", "a", None, []), "s2", {"result": "2"})
+    assert cache.invalidate_session("s1") == 1
+    assert cache.get(ExecutionCache.key("s1", "a", None, [])) is None
+    assert cache.get(ExecutionCache.key("s2", "a", None, [])) == {"result": "2"}
+
+
+def test_entries_evicted_lru_past_max_entries():
+    cache = ExecutionCache(max_entries=2)
+    for code in ("a", "b"):
+        cache.put(ExecutionCache.key("s", code, None, []), "s", {"result": code})
+    cache.get(ExecutionCache.key("s", "a", None, []))
+    cache.put(ExecutionCache.key("s", "c", None, []), "s", {"result": "c"})
+    assert cache.get(ExecutionCache.key("s", "b", None, [])) is None
+    assert cache.get(ExecutionCache.key("s", "a", None, [])) == {"result": "a"}
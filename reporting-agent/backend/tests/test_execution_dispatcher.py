@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+
+from ExecutionDispatcher import DispatcherBusy, ExecutionDispatcher
+
+current_session = contextvars.ContextVar("current_session", default=None)
+
+
+@pytest.fixture
+def dispatcher():
+    dispatcher = ExecutionDispatcher(max_workers=8, limits={"execute": 2, "report": 1}, max_queue=2)
+    yield dispatcher
+    dispatcher.shutdown()
+
+
+def test_calls_run_off_the_event_loop(dispatcher):
+    async def scenario():
+        loop_thread = threading.get_ident()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.005)
+
+        ticker = asyncio.create_task(tick())
+        worker_thread = await dispatcher.run("execute", lambda: time.sleep(0.1) or threading.get_ident())
+        ticker.cancel()
+        return loop_thread, worker_thread, ticks
+
+    loop_thread, worker_thread, ticks = asyncio.run(scenario())
+    assert worker_thread != loop_thread
+    assert ticks > 5
+
+
+def test_each_lane_runs_at_most_its_limit(dispatcher):
+    running, peak = {"execute": 0, "report": 0}, {"execute": 0, "report": 0}
+    lock = threading.Lock()
+
+    def work(lane):
+        with lock:
+            running[lane] += 1
+            peak[lane] = max(peak[lane], running[lane])
+        time.sleep(0.05)
+        with lock:
+            running[lane] -= 1
+
+    async def scenario():
+        await asyncio.gather(*[dispatcher.run(lane, work, lane) for lane in ("execute", "report") for _ in range(3)])
+
+    asyncio.run(scenario())
+    assert peak == {"execute": 2, "report": 1}
+    assert dispatcher.stats()["endpoints"]["execute"]["completed"] == 3
+
+
+def test_a_full_queue_rejects_with_dispatcher_busy(dispatcher):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(dispatcher.run("report", release.wait, 10))
+        await asyncio.sleep(0.05)
+        queued = [asyncio.create_task(dispatcher.run("report", lambda: None)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(DispatcherBusy):
+            await dispatcher.run("report", lambda: None)
+        # Other lanes are unaffected
+        assert await dispatcher.run("execute", lambda: "ok") == "ok"
+        release.set()
+        await asyncio.gather(running, *queued)
+
+    asyncio.run(scenario())
+    assert dispatcher.stats()["endpoints"]["report"]["rejected"] == 1
+
+
+def test_errors_and_context_reach_the_caller(dispatcher):
+    async def scenario():
+        current_session.set("s1")
+        session = await dispatcher.run("execute", current_session.get)
+        with pytest.raises(ValueError):
+            await dispatcher.run("execute", int, "not a number")
+        return session
+
+    assert asyncio.run(scenario()) == "s1"
+    assert dispatcher.stats()["endpoints"]["execute"]["failed"] == 1
+
+
+def test_a_cancelled_caller_keeps_the_lane_until_its_thread_finishes(dispatcher):
+    release = threading.Event()
+
+    async def scenario():
+        call = asyncio.create_task(dispatcher.run("report", release.wait, 10))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        await asyncio.sleep(0.01)
+        assert dispatcher.stats()["endpoints"]["report"]["running"] == 1
+        release.set()
+        for _ in range(100):
+            if dispatcher.stats()["endpoints"]["report"]["running"] == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert await dispatcher.run("report", lambda: "next") == "next"
+
+    asyncio.run(scenario())
+    assert dispatcher.stats()["endpoints"]["report"]["cancelled"] == 1
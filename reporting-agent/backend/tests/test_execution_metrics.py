@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+from ExecutionMetrics import ExecutionMetrics, agent_token_usage, estimate_tokens
+
+
+def agent_result(total_tokens):
+    return SimpleNamespace(metrics=SimpleNamespace(accumulated_usage={"totalTokens": total_tokens}))
+
+
+def test_agent_usage_is_read_from_the_result():
+    assert agent_token_usage(agent_result(1234)) == 1234
+    assert agent_token_usage(agent_result(0)) is None
+    assert agent_token_usage("plain reply") is None
+
+
+def test_savings_are_estimated_from_sizes_until_an_agent_run_is_seen():
+    metrics = ExecutionMetrics()
+    expected = 2 * estimate_tokens("system" + "prompt") + 2 * estimate_tokens("output")
+    assert metrics.estimate_agent_tokens("system", "prompt", "output") == expected
+
+    metrics.record("agent", 2.0, llm_calls=2, tokens_used=1000)
+    metrics.record("agent", 2.0, llm_calls=2, tokens_used=3000)
+    assert metrics.estimate_agent_tokens("system", "prompt", "output") == 2000
+
+
+def test_direct_runs_report_what_they_saved():
+    metrics = ExecutionMetrics()
+    first = metrics.record("direct", 0.1, tokens_saved=500)
+    assert first == {"mode": "direct", "latency_ms": 100.0, "llm_calls": 0, "tokens_used": 0,
+                     "tokens_saved_estimate": 500}
+
+    metrics.record("agent", 2.0, llm_calls=2, tokens_used=1000)
+    assert metrics.record("direct", 0.5, tokens_saved=1000)["latency_saved_ms"] == 1500.0
+
+    stats = metrics.stats()
+    assert stats["tokens_saved_estimate"] == 1500
+    assert stats["modes"]["direct"] == {"count": 2, "tokens_used": 0, "avg_latency_ms": 300.0}
+    assert stats["modes"]["agent"]["tokens_used"] == 1000
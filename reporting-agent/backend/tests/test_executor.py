@@ -0,0 +1,116 @@
+import pytest
+
+from Executor import ExecutionChunk, ExecutionEngine, ExecutionRequest, ExecutionScheduler, ExecutionUnavailable
+
+
+class FakeEngine(ExecutionEngine):
+    """Streams ``chunks``, raising ``failure`` before any of them or after the first"""
+
+    def __init__(self, name: str, chunks=(), failure: Exception = None, fail_after_output: bool = False):
+        self.name = name
+        self.chunks = list(chunks)
+        self.failure = failure
+        self.fail_after_output = fail_after_output
+        self.runs = 0
+
+    def stream(self, request):
+        self.runs += 1
+        if self.failure is not None and not self.fail_after_output:
+            raise self.failure
+        for chunk in self.chunks:
+            yield chunk
+            if self.failure is not None:
+                raise self.failure
+
+
+def run(scheduler, **kwargs):
+    return scheduler.execute(ExecutionRequest("print('hi')", "s1"), **kwargs)
+
+
+def test_runs_on_the_first_engine():
+    first, second = FakeEngine("first", [ExecutionChunk(stdout="hi\n")]), FakeEngine("second")
+    result = run(ExecutionScheduler([first, second]))
+    assert result.engine == "first"
+    assert result.display_text() == "hi\n"
+    assert second.runs == 0
+
+
+def test_falls_through_on_infrastructure_failure():
+    first = FakeEngine("first", failure=ConnectionError("sandbox unreachable"))
+    second = FakeEngine("second", [ExecutionChunk(stdout="ok")])
+    scheduler = ExecutionScheduler([first, second])
+    result = run(scheduler)
+    assert result.engine == "second"
+    assert result.error is None
+    stats = scheduler.stats()["engines"]
+    assert stats["first"]["failures"] == 1
+    assert stats["first"]["last_error"] == "sandbox unreachable"
+    assert stats["second"]["runs"] == 1
+
+
+def test_code_errors_do_not_fall_through():
+    first = FakeEngine("first", [ExecutionChunk(error="NameError: x")])
+    second = FakeEngine("second", [ExecutionChunk(stdout="ok")])
+    result = run(ExecutionScheduler([first, second]))
+    assert result.engine == "first"
+    assert result.display_text() == "Error: NameError: x"
+    assert second.runs == 0
+
+
+def test_no_retry_once_output_has_streamed():
+    first = FakeEngine("first", [ExecutionChunk(stdout="partial")], failure=ConnectionError("dropped"),
+                       fail_after_output=True)
+    second = FakeEngine("second", [ExecutionChunk(stdout="ok")])
+    seen = []
+    result = run(ExecutionScheduler([first, second]), on_output=lambda pieces, stderr: seen.extend(pieces))
+    assert result.engine == "first"
+    assert result.error == "Execution failed: dropped"
+    assert seen == ["partial"]
+    assert second.runs == 0
+
+
+def test_unhealthy_engine_is_skipped_during_cooldown():
+    first = FakeEngine("first", failure=ConnectionError("down"))
+    second = FakeEngine("second", [ExecutionChunk(stdout="ok")])
+    scheduler = ExecutionScheduler([first, second], failure_threshold=2, cooldown=60)
+    run(scheduler)
+    run(scheduler)
+    assert scheduler.candidates() == ["second", "first"]
+    assert not scheduler.stats()["engines"]["first"]["healthy"]
+    run(scheduler)
+    assert first.runs == 2
+
+
+def test_every_engine_failing_raises_unavailable():
+    scheduler = ExecutionScheduler([FakeEngine("first", failure=ConnectionError("a")),
+                                    FakeEngine("second", failure=TimeoutError("b"))])
+    with pytest.raises(ExecutionUnavailable, match="first: a; second: b"):
+        run(scheduler)
+
+
+def test_pinned_engine_does_not_fall_through():
+    first = FakeEngine("first", [ExecutionChunk(stdout="ok")])
+    second = FakeEngine("second", failure=ConnectionError("down"))
+    scheduler = ExecutionScheduler([first, second])
+    with pytest.raises(ExecutionUnavailable):
+        run(scheduler, engine="second")
+    assert first.runs == 0
+    with pytest.raises(ValueError):
+        run(scheduler, engine="missing")
+
+
+def test_runtime_payload_keeps_binary_files_intact(tmp_path):
+    from Executor import RuntimeEngine
+    from SandboxFileSync import SandboxFileSync, file_content
+
+    feather = tmp_path / "data.feather"
+    feather.write_bytes(bytes(range(256)) * 4)
+    files = [{"filename": "data.csv", "content": "a,b\n1,2\n"},
+             {"filename": "data.feather", "path": str(feather), "binary": True}]
+    engine = RuntimeEngine(lambda: None, "arn", SandboxFileSync())
+    payload = engine.session_files(files, "s1")
+
+    assert payload[0]["content"] == "a,b\n1,2\n"
+    assert payload[1]["binary"]
+    # What the runtime's own SandboxFileSync reads back from the payload
+    assert file_content(payload[1]) == feather.read_bytes()
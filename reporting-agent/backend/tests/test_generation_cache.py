@@ -0,0 +1,74 @@
+import time
+
+from GenerationCache import GenerationCache, schema_key
+
+
+def profile(*columns, filename: str = "data.csv") -> dict:
+    return {"filename": filename, "delimiter": ",",
+            "columns": [{"name": name, "dtype": dtype, "nulls": 0} for name, dtype in columns]}
+
+
+BUCKET = GenerationCache.bucket(schema_key(profile(("region", "string"), ("sales", "float"))), "gpt-4o")
+
+
+def test_prompts_that_normalize_alike_hit():
+    cache = GenerationCache()
+    cache.put("Plot sales by region.", BUCKET, "plot()")
+    assert cache.get("  plot SALES by\nregion ", BUCKET) == {"code": "plot()", "match": "exact", "similarity": 1.0}
+    assert cache.get("plot sales by month", BUCKET) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_schema_changes_and_other_models_miss():
+    cache = GenerationCache()
+    cache.put("plot sales by region", BUCKET, "plot()")
+    retyped = schema_key(profile(("region", "string"), ("sales", "int")))
+    assert cache.get("plot sales by region", GenerationCache.bucket(retyped, "gpt-4o")) is None
+    other_model = GenerationCache.bucket(schema_key(profile(("region", "string"), ("sales", "float"))), "gpt-4o-mini")
+    assert cache.get("plot sales by region", other_model) is None
+
+
+def test_schema_key_ignores_everything_but_the_schema():
+    first = profile(("a", "int"))
+    second = dict(profile(("a", "int")), rows=10)
+    second["columns"][0]["nulls"] = 3
+    assert schema_key(first) == schema_key(second)
+    assert schema_key(first) != schema_key(profile(("a", "int"), filename="other.csv"))
+
+
+def test_entries_expire():
+    cache = GenerationCache(ttl=0.01)
+    cache.put("plot sales", BUCKET, "plot()")
+    time.sleep(0.02)
+    assert cache.get("plot sales", BUCKET) is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = GenerationCache(max_entries=2)
+    cache.put("one", BUCKET, "1")
+    cache.put("two", BUCKET, "2")
+    cache.get("one", BUCKET)
+    cache.put("three", BUCKET, "3")
+    assert cache.get("two", BUCKET) is None
+    assert cache.get("one", BUCKET)["code"] == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_similar_prompts_match_only_when_enabled_and_in_the_same_bucket():
+    cache = GenerationCache(similarity_threshold=0.8)
+    cache.put("plot sales by region", BUCKET, "plot()")
+    match = cache.get("plot the sales by region", BUCKET)
+    assert match["match"] == "similar" and 0.8 <= match["similarity"] < 1.0
+    assert cache.get("count customers per country", BUCKET) is None
+    assert cache.get("plot the sales by region", GenerationCache.bucket("other", "gpt-4o")) is None
+    assert GenerationCache().get("plot the sales by region", BUCKET) is None
+
+
+def test_bypass_and_empty_code_are_not_cached():
+    cache = GenerationCache()
+    cache.bypass()
+    cache.put("plot sales", BUCKET, "")
+    stats = cache.stats()
+    assert (stats["bypassed"], stats["stores"], stats["entries"]) == (1, 0, 0)
@@ -0,0 +1,52 @@
+import base64
+import os
+
+import pytest
+
+from ImageDataScanner import CHART_ONLY_MESSAGE, ImageDataScanner, ScannedImage
+
+PNG = b"\x89PNG\r\n\x1a\n" + os.urandom(2000)
+JPEG = b"\xff\xd8\xff" + os.urandom(2000)
+
+
+def output(*parts) -> str:
+    return "\n".join(f"IMAGE_DATA:{base64.b64encode(part).decode()}" if isinstance(part, bytes) else part
+                     for part in parts) + "\n"
+
+
+def test_images_and_text_are_split():
+    scanner = ImageDataScanner.scan(output("Mean: 3.5", PNG, "Rows: 10", JPEG))
+    assert [image.format for image in scanner.images] == ["png", "jpeg"]
+    assert scanner.images[0].data == PNG
+    assert scanner.display_text() == "Mean: 3.5\n\nRows: 10"
+
+
+@pytest.mark.parametrize("size", [1, 5, 7, 64, 4096])
+def test_chunk_boundaries_do_not_matter(size):
+    text = output("Chart 1", PNG, "done")
+    scanner = ImageDataScanner()
+    events = []
+    for start in range(0, len(text), size):
+        events += scanner.feed(text[start:start + size])
+    events += scanner.finish()
+    assert [image.data for image in scanner.images] == [PNG]
+    assert [event for event in events if isinstance(event, ScannedImage)] == scanner.images
+    assert "".join(event for event in events if isinstance(event, str)) == "Chart 1\ndone\n"
+
+
+def test_short_or_unknown_payloads_are_rejected():
+    scanner = ImageDataScanner.scan(output("before", b"\x89PNG\r\n\x1a\n", os.urandom(2000), "after"))
+    assert scanner.images == []
+    assert scanner.rejected == 2
+    assert scanner.display_text() == "before\n\nafter"
+
+
+def test_chart_only_output():
+    assert ImageDataScanner.scan(output(PNG)).display_text() == CHART_ONLY_MESSAGE
+
+
+def test_output_without_images_is_untouched():
+    text = "IMAGE_DAT is not a marker\n"
+    scanner = ImageDataScanner.scan(text)
+    assert scanner.display_text() == text
+    assert scanner.images == []
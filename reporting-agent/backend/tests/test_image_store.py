@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from ImageStore import ImageStore
+
+
+def image(n: int, size: int = 100) -> bytes:
+    return b"\x89PNG\r\n\x1a\n" + bytes([n]) * size
+
+
+@pytest.fixture(params=["memory", "disk"])
+def make_store(request, tmp_path):
+    def make(**options):
+        return ImageStore(directory=str(tmp_path / "images") if request.param == "disk" else None, **options)
+    return make
+
+
+def test_the_same_bytes_are_stored_once(make_store):
+    store = make_store()
+    first = store.put(image(1))
+    second = store.put(image(1))
+    assert first == second
+    assert store.get(first) == (image(1), "png")
+    stats = store.stats()
+    assert (stats["images"], stats["dedup_hits"]) == (1, 1)
+
+
+def test_least_recently_used_images_are_evicted(make_store):
+    size = len(image(0))
+    store = make_store(max_bytes=2 * size)
+    a, b = store.put(image(1)), store.put(image(2))
+    store.get(a)
+    c = store.put(image(3))
+    assert store.get(b) is None
+    assert store.get(a) is not None and store.get(c) is not None
+    assert store.stats()["evictions"] == 1
+    assert store.stats()["bytes"] <= 2 * size
+
+
+def test_touch_keeps_an_image_and_reports_missing_ones(make_store):
+    size = len(image(0))
+    store = make_store(max_bytes=2 * size)
+    a, b = store.put(image(1)), store.put(image(2))
+    assert store.touch(a)
+    store.put(image(3))
+    assert store.touch(a)
+    assert not store.touch(b)
+
+
+def test_disk_images_survive_a_restart(tmp_path):
+    directory = str(tmp_path / "images")
+    image_hash = ImageStore(directory=directory).put(image(1), "jpeg")
+    assert os.path.exists(os.path.join(directory, f"{image_hash}.jpeg"))
+    assert ImageStore(directory=directory).get(image_hash) == (image(1), "jpeg")
+
+
+def test_a_deleted_file_is_a_miss(tmp_path):
+    directory = str(tmp_path / "images")
+    store = ImageStore(directory=directory)
+    image_hash = store.put(image(1))
+    os.remove(os.path.join(directory, f"{image_hash}.png"))
+    assert store.get(image_hash) is None
+    assert store.stats()["images"] == 0
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from JobQueue import JOB_CANCELLED, JOB_FAILED, JOB_QUEUED, JOB_SUCCEEDED, JobQueue
+
+
+def run(scenario):
+    return asyncio.run(asyncio.wait_for(scenario(), timeout=30))
+
+
+async def finished(job, timeout: float = 5):
+    for _ in range(int(timeout / 0.01)):
+        if job.status in (JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job.id} still {job.status}")
+
+
+def test_jobs_of_one_session_run_one_at_a_time_in_order():
+    async def scenario():
+        queue = JobQueue(workers=4)
+        order, running = [], set()
+
+        async def step(job):
+            assert job.session_id not in running
+            running.add(job.session_id)
+            await asyncio.sleep(0.01)
+            order.append((job.session_id, job.payload["n"]))
+            running.discard(job.session_id)
+            return job.payload["n"]
+
+        queue.register("step", step)
+        await queue.start()
+        try:
+            jobs = [await queue.submit("step", session_id, {"n": n}) for n in range(4) for session_id in ("a", "b")]
+            for job in jobs:
+                await finished(job)
+        finally:
+            await queue.stop()
+        return order, jobs
+
+    order, jobs = run(scenario)
+    assert [n for session_id, n in order if session_id == "a"] == [0, 1, 2, 3]
+    assert [n for session_id, n in order if session_id == "b"] == [0, 1, 2, 3]
+    assert all(job.status == JOB_SUCCEEDED for job in jobs)
+
+
+def test_higher_priority_sessions_go_first():
+    async def scenario():
+        queue = JobQueue(workers=1)
+        gate, order = asyncio.Event(), []
+
+        async def record(job):
+            if job.payload.get("block"):
+                await gate.wait()
+            order.append(job.session_id)
+
+        queue.register("record", record)
+        await queue.start()
+        try:
+            blocker = await queue.submit("record", "busy", {"block": True})
+            await asyncio.sleep(0.02)
+            low = await queue.submit("record", "low", {}, priority=0)
+            high = await queue.submit("record", "high", {}, priority=5)
+            gate.set()
+            for job in (blocker, low, high):
+                await finished(job)
+        finally:
+            await queue.stop()
+        return order
+
+    assert run(scenario) == ["busy", "high", "low"]
+
+
+def test_cancelling_queued_and_running_jobs():
+    async def scenario():
+        queue = JobQueue(workers=2)
+        started = asyncio.Event()
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(30)
+
+        async def quick(job):
+            return "done"
+
+        queue.register("slow", slow)
+        queue.register("quick", quick)
+        await queue.start()
+        try:
+            running = await queue.submit("slow", "s1", {})
+            queued = await queue.submit("quick", "s1", {})
+            after = await queue.submit("quick", "s1", {})
+            await started.wait()
+            assert queued.status == JOB_QUEUED
+            assert await queue.cancel(queued.id)
+            assert await queue.cancel(running.id)
+            await finished(after)
+            assert not await queue.cancel(after.id)
+        finally:
+            await queue.stop()
+        return running, queued, after
+
+    running, queued, after = run(scenario)
+    assert running.status == JOB_CANCELLED
+    assert queued.status == JOB_CANCELLED and queued.started_at is None
+    assert after.status == JOB_SUCCEEDED and after.result == "done"
+
+
+def test_failures_are_recorded_and_listeners_see_every_state():
+    async def scenario():
+        queue = JobQueue(workers=1)
+        seen = []
+
+        async def broken(job):
+            raise ValueError("bad code")
+
+        async def listener(job):
+            seen.append(job.status)
+
+        queue.register("broken", broken)
+        queue.add_listener(listener)
+        await queue.start()
+        try:
+            job = await finished(await queue.submit("broken", "s1", {}))
+            with pytest.raises(ValueError):
+                await queue.submit("unknown", "s1", {})
+        finally:
+            await queue.stop()
+        return job, seen
+
+    job, seen = run(scenario)
+    assert job.status == JOB_FAILED and job.error == "bad code"
+    assert seen == ["queued", "running", "failed"]
+
+
+def test_only_the_newest_finished_jobs_are_retained():
+    async def scenario():
+        queue = JobQueue(workers=1, max_retained=2)
+
+        async def noop(job):
+            return None
+
+        queue.register("noop", noop)
+        await queue.start()
+        try:
+            jobs = []
+            for _ in range(4):
+                jobs.append(await finished(await queue.submit("noop", "s1", {})))
+            await queue.submit("noop", "s1", {})
+        finally:
+            await queue.stop()
+        return queue, jobs
+
+    queue, jobs = run(scenario)
+    assert queue.get(jobs[0].id) is None
+    assert queue.get(jobs[3].id) is not None
@@ -0,0 +1,138 @@
+import faulthandler
+import os
+import sys
+
+import pytest
+
+from Executor import ExecutionRequest, ExecutionResult, ExecutionScheduler
+from LocalSandboxExecutor import LocalSandboxExecutor
+from SessionStore import SessionStore
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="workers rely on fork and rlimits")
+
+# Longest any test here may take; a hung worker or zygote dumps every thread's stack and fails the run
+TEST_TIMEOUT = 60
+
+
+@pytest.fixture(autouse=True)
+def hard_timeout():
+    faulthandler.dump_traceback_later(TEST_TIMEOUT, exit=True)
+    yield
+    faulthandler.cancel_dump_traceback_later()
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    engines = []
+
+    def make(**options):
+        options = {"root": str(tmp_path), "preload": [], "timeout": 10, "memory_mb": 512, "cpu_seconds": 5,
+                   **options}
+        engine = LocalSandboxExecutor(**options)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.close()
+
+
+def run(engine, code: str, session_id: str = "s1", files=None) -> ExecutionResult:
+    result = ExecutionResult(engine.name)
+    for chunk in engine.stream(ExecutionRequest(code, session_id, files)):
+        result.add(chunk)
+    result.finish()
+    return result
+
+
+def test_session_keeps_variables_and_sessions_are_isolated(make_engine):
+    engine = make_engine()
+    run(engine, "x = 41")
+    assert run(engine, "print(x + 1)").display_text().strip() == "42"
+    assert "NameError" in run(engine, "print(x)", session_id="s2").stderr
+    assert engine.stats()["warm_hits"] >= 1
+
+
+def test_session_files_are_written_once(make_engine):
+    engine = make_engine()
+    files = [{"filename": "data.csv", "content": "a,b\n1,2\n"}]
+    assert run(engine, "print(open('data.csv').read().splitlines()[1])", files=files).display_text().strip() == "1,2"
+    run(engine, "pass", files=files)
+    assert engine.stats()["files_written"] == 1
+
+
+def test_timeout_kills_the_worker_and_resets_the_session(make_engine):
+    engine = make_engine(timeout=1)
+    run(engine, "x = 1")
+    result = run(engine, "import time\ntime.sleep(30)")
+    assert result.error.startswith("Execution timed out after 1s")
+    assert engine.stats()["timeouts"] == 1
+    assert "NameError" in run(engine, "print(x)").stderr
+
+
+def test_memory_limit_raises_inside_the_code(make_engine):
+    engine = make_engine(memory_mb=256)
+    result = run(engine, "x = 1\nblock = bytearray(1024 * 1024 * 1024)")
+    assert "MemoryError" in result.stderr
+    assert run(engine, "print(x)").display_text().strip() == "1"
+    assert engine.stats()["crashes"] == 0
+
+
+def test_cpu_limit_stops_runaway_code(make_engine):
+    engine = make_engine(cpu_seconds=1, timeout=20)
+    result = run(engine, "while True:\n    pass")
+    assert result.error is None
+    assert "CPU time limit exceeded" in result.stderr
+    assert run(engine, "print('still up')").display_text().strip() == "still up"
+
+
+def test_worker_is_recycled_after_max_runs(make_engine):
+    engine = make_engine(max_runs=2)
+    run(engine, "x = 1")
+    run(engine, "x += 1")
+    result = run(engine, "print('x' in globals())")
+    assert "recycled after 2 executions" in result.stderr
+    assert result.display_text().strip().endswith("False")
+    assert engine.stats()["recycled"] == 1
+
+
+def test_forget_stops_the_worker_and_removes_its_directory(make_engine):
+    engine = make_engine()
+    run(engine, "open('out.txt', 'w').write('x')")
+    workdir = engine.workdir("s1")
+    assert os.path.exists(os.path.join(workdir, "out.txt"))
+    engine.forget("s1")
+    assert engine.stats()["workers"] == 0
+    assert not os.path.exists(os.path.join(workdir, "out.txt"))
+
+
+def test_deleted_sessions_lose_their_worker_and_directory(make_engine):
+    engine = make_engine()
+    store = SessionStore()
+    store.delete_listeners.append(ExecutionScheduler([engine]).forget)
+    store.get_or_create("s1")
+    run(engine, "open('out.txt', 'w').write('x')")
+    workdir = engine.workdir("s1")
+    store.delete("s1")
+    assert engine.stats()["workers"] == 0
+    assert not os.path.exists(workdir)
+
+
+def test_workers_fork_from_one_zygote(make_engine):
+    engine = make_engine(preload=["json"])
+    engine.warm_up()
+    pids = {run(engine, "import os\nprint(os.getpid())", session_id=f"s{index}").display_text().strip()
+            for index in range(3)}
+    assert len(pids) == 3
+    assert engine.stats()["zygote_starts"] == 1
+    assert run(engine, "import sys\nprint('json' in sys.modules)", session_id="s0").display_text().strip() == "True"
+
+
+def test_dead_zygote_is_replaced(make_engine):
+    engine = make_engine()
+    run(engine, "pass")
+    zygote = engine.zygote()
+    zygote.process.kill()
+    zygote.process.wait(timeout=10)
+    assert run(engine, "print('ok')", session_id="s2").display_text().strip() == "ok"
+    assert engine.stats()["zygote_starts"] == 2
@@ -0,0 +1,121 @@
+from PromptBuilder import (SUMMARY_MARKER, PromptBuilder, Prompt, conversation_digest, count_tokens,
+                           message_text)
+
+
+class FakeAgent:
+    def __init__(self, system_prompt: str = "You write pandas code."):
+        self.system_prompt = system_prompt
+        self.messages = []
+
+    def __call__(self, text: str):
+        answer = f"answer {len(self.messages) // 2}"
+        self.messages.append({"role": "user", "content": [{"text": text}]})
+        self.messages.append({"role": "assistant", "content": [{"text": answer}]})
+        return answer
+
+
+def lines(prefix: str, count: int) -> str:
+    return "\n".join(f"{prefix} line {index} with a few more words" for index in range(count))
+
+
+def test_fits_without_trimming():
+    prompt = Prompt().add("request", "User request: plot it", required=True).add("notes", "short notes")
+    text, report = prompt.render(budget=1000)
+    assert text == "User request: plot it\n\nshort notes"
+    assert report["trimmed_tokens"] == {}
+    assert not report["over_budget"]
+
+
+def test_trims_lowest_priority_first_and_keeps_required():
+    prompt = (Prompt()
+              .add("request", "User request: plot it", required=True)
+              .static("datasets", lines("schema", 40), priority=4)
+              .add("chart", lines("chart", 40), priority=3)
+              .add("usage", lines("usage", 40), priority=1))
+    full = count_tokens(prompt.text())
+    text, report = prompt.render(budget=full - 200)
+    assert "User request: plot it" in text
+    assert report["prompt_tokens"] <= full - 200
+    assert set(report["trimmed_tokens"]) == {"usage"}
+    assert "more lines left out to fit the prompt budget" in text
+    assert report["sections"]["datasets"] == count_tokens(prompt.sections[1]["text"])
+
+
+def test_schema_is_trimmed_last():
+    prompt = (Prompt()
+              .static("datasets", lines("schema", 40), priority=4)
+              .add("chart", lines("chart", 40), priority=3)
+              .add("usage", lines("usage", 40), priority=1))
+    _, report = prompt.render(budget=count_tokens(prompt.sections[0]["text"]) + 20)
+    assert "datasets" not in report["trimmed_tokens"]
+    assert report["sections"]["chart"] < count_tokens(prompt.sections[1]["text"])
+
+
+def test_over_budget_is_reported_when_required_sections_dont_fit():
+    prompt = Prompt().add("code", lines("code", 50), required=True).add("notes", lines("note", 5))
+    text, report = prompt.render(budget=10)
+    assert report["over_budget"]
+    assert lines("code", 50) in text
+
+
+def test_static_block_sent_once_per_conversation():
+    builder = PromptBuilder(budget=4000)
+    agent = FakeAgent()
+    schema = lines("schema", 10)
+    builder.invoke(agent, builder.compose().static("datasets", schema).add("request", "User request: a", required=True),
+                   "generate")
+    _, report = builder.invoke(
+        agent, builder.compose().static("datasets", schema).add("request", "User request: b", required=True), "generate")
+    assert report["static_deduped"] == ["datasets"]
+    assert "still applies unchanged" in message_text(agent.messages[-2])
+
+    _, report = builder.invoke(
+        agent, builder.compose().static("datasets", schema + "\nnew column").add("request", "User request: c",
+                                                                                   required=True), "generate")
+    assert report["static_deduped"] == []
+
+
+def test_old_turns_fold_into_a_summary():
+    builder = PromptBuilder(budget=4000, history_turns=2)
+    agent = FakeAgent()
+    for index in range(5):
+        builder.invoke(agent, builder.compose().add("request", f"User request: chart {index}", required=True),
+                       "generate")
+    assert message_text(agent.messages[0]).startswith(SUMMARY_MARKER)
+    summary = message_text(agent.messages[0])
+    assert "chart 0" in summary and "chart 1" in summary and "chart 2" not in summary
+    # The summary pair plus the two kept turns and the one just answered
+    assert len(agent.messages) == 2 + 3 * 2
+    assert builder.stats()["purposes"]["generate"]["turns_compacted"] == 2
+
+
+def test_history_is_summarized_entirely_when_over_budget():
+    builder = PromptBuilder(budget=300, history_turns=2)
+    agent = FakeAgent()
+    agent.messages = [
+        {"role": "user", "content": [{"text": "User request: first\n" + lines("long", 40)}]},
+        {"role": "assistant", "content": [{"text": "done"}]},
+    ]
+    _, report = builder.prepare(agent, builder.compose().add("request", "User request: second", required=True))
+    assert report["turns_compacted"] == 1
+    assert message_text(agent.messages[0]).startswith(SUMMARY_MARKER)
+    assert "first" in message_text(agent.messages[0])
+
+
+def test_tool_results_are_clipped():
+    builder = PromptBuilder(max_result_chars=10)
+    compacted, folded = builder.compact([
+        {"role": "user", "content": [{"text": "run"}]},
+        {"role": "user", "content": [{"toolResult": {"content": [{"text": "x" * 100}]}}]},
+    ])
+    assert folded == 0
+    assert message_text(compacted[1]) == "x" * 10 + "\n... (output truncated)"
+
+
+def test_recorded_turn_reaches_the_conversation():
+    builder = PromptBuilder()
+    agent = FakeAgent()
+    assert conversation_digest(agent.messages) is None
+    builder.record_turn(agent, builder.compose().add("request", "User request: cached", required=True), "code")
+    assert [message["role"] for message in agent.messages] == ["user", "assistant"]
+    assert conversation_digest(agent.messages) != conversation_digest(agent.messages[:1])
@@ -0,0 +1,99 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+pytest.importorskip("matplotlib")
+pytest.importorskip("pptx")
+pytest.importorskip("fpdf")
+
+from ChartRenderer import ChartRenderer
+from ReportBuilder import ReportBuilder
+
+
+@pytest.fixture
+def builder(tmp_path):
+    renderer = ChartRenderer(workers=0, root=str(tmp_path / "shared"))
+    yield ReportBuilder(renderer)
+    renderer.close()
+
+
+def write_dataset(tmp_path, text: str) -> str:
+    path = tmp_path / "orders.csv"
+    path.write_text(text)
+    return str(path)
+
+
+def report() -> dict:
+    return {"title": "Orders", "subtitle": "Weekly", "sections": [
+        {"id": "intro", "title": "Overview", "text": "Orders this week."},
+        {"id": "regions", "title": "By region", "chart": {"type": "bar", "column": "region"}},
+        {"id": "top", "title": "Largest", "table": {"columns": ["region", "amount"], "sort_by": "amount", "limit": 2}},
+        {"id": "split", "title": "Split", "chart": {"type": "pie", "labels": ["a", "b"], "values": [1, 2]}},
+    ]}
+
+
+def rendered(result: dict) -> list:
+    return [section["id"] for section in result["sections"] if not section["cached"]]
+
+
+def test_unchanged_reports_come_from_cache(builder, tmp_path):
+    dataset = write_dataset(tmp_path, "region,amount\nnorth,3\nsouth,1\nnorth,2\n")
+    first = builder.build(report(), dataset, "v1")
+    assert rendered(first) == ["intro", "regions", "top", "split"]
+    assert all(section["error"] is None for section in first["sections"])
+    assert builder.document(first["documents"]["pptx"]["hash"])[0].startswith(b"PK")
+    assert builder.document(first["documents"]["pdf"]["hash"])[0].startswith(b"%PDF")
+
+    second = builder.build(report(), dataset, "v1")
+    assert second["rendered"] == 0
+    assert all(document["cached"] for document in second["documents"].values())
+    assert second["documents"]["pdf"]["hash"] == first["documents"]["pdf"]["hash"]
+
+
+def test_only_edited_sections_are_rendered_again(builder, tmp_path):
+    dataset = write_dataset(tmp_path, "region,amount\nnorth,3\nsouth,1\n")
+    builder.build(report(), dataset, "v1")
+    edited = report()
+    edited["sections"][0]["text"] = "Orders this month."
+    edited["sections"][1]["chart"]["color"] = "darkorange"
+    result = builder.build(edited, dataset, "v1")
+    assert rendered(result) == ["intro", "regions"]
+    assert not result["documents"]["pptx"]["cached"]
+
+
+def test_a_new_dataset_only_invalidates_sections_that_read_it(builder, tmp_path):
+    builder.build(report(), write_dataset(tmp_path, "region,amount\nnorth,3\n"), "v1")
+    result = builder.build(report(), write_dataset(tmp_path, "region,amount\neast,5\nwest,4\n"), "v2")
+    assert rendered(result) == ["regions", "top"]
+    assert builder.stats()["sections_cached"] == 2
+
+
+def test_failed_sections_are_not_cached(builder, tmp_path):
+    dataset = write_dataset(tmp_path, "region,amount\nnorth,3\n")
+    broken = {"title": "Orders", "sections": [
+        {"id": "missing", "table": {"columns": ["no_such_column"]}}]}
+    first = builder.build(broken, dataset, "v1", formats=["pdf"])
+    assert first["sections"][0]["error"]
+    second = builder.build(broken, dataset, "v1", formats=["pdf"])
+    assert rendered(second) == ["missing"]
+    assert builder.stats()["artifacts"] == 0
+
+
+def test_eviction_keeps_the_cache_within_its_budget(tmp_path):
+    renderer = ChartRenderer(workers=0, root=str(tmp_path / "shared"))
+    builder = ReportBuilder(renderer, max_bytes=1)
+    try:
+        builder.build(report(), write_dataset(tmp_path, "region,amount\nnorth,3\n"), "v1", formats=["pdf"])
+        stats = builder.stats()
+        assert stats["evictions"] > 0
+        assert stats["artifacts"] == 1 and stats["documents"] == 0
+    finally:
+        renderer.close()
+
+
+def test_invalid_reports_are_rejected(builder):
+    with pytest.raises(ValueError, match="unique id"):
+        builder.build({"sections": [{"id": "a", "text": "x"}, {"id": "a", "text": "y"}]})
+    with pytest.raises(ValueError, match="upload a CSV"):
+        builder.build(report())
+    with pytest.raises(ValueError, match="Unknown report format"):
+        builder.build({"sections": []}, formats=["docx"])
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from FakeCodeInterpreter import FakeCodeInterpreter
+from SandboxFileSync import MissingSandboxFiles, SandboxFileSync
+
+
+@pytest.fixture
+def client():
+    client = FakeCodeInterpreter()
+    client.start()
+    return client
+
+
+def sandbox_file(client, filename: str) -> bytes:
+    with open(os.path.join(client.workdir, filename), "rb") as f:
+        return f.read()
+
+
+def test_unchanged_files_are_uploaded_once(client):
+    sync = SandboxFileSync()
+    files = [{"filename": "data.csv", "content": "a,b\n1,2\n"}]
+    assert sync.sync("s1", client, files) is None
+    calls = client.invocations
+    assert sync.sync("s1", client, files) is None
+    assert client.invocations == calls
+    assert sync.stats()["files_skipped"] == 1
+
+    assert sync.sync("s1", client, [{"filename": "data.csv", "content": "a,b\n3,4\n"}]) is None
+    assert sandbox_file(client, "data.csv") == b"a,b\n3,4\n"
+    assert sync.stats()["files_uploaded"] == 2
+
+
+def test_large_and_binary_files_arrive_byte_for_byte(client, tmp_path):
+    sync = SandboxFileSync(compress_threshold=1024)
+    large = tmp_path / "large.csv"
+    large.write_bytes(b"a,b\n" + b"1,2\n" * 1000)
+    binary = tmp_path / "model.bin"
+    binary.write_bytes(bytes(range(256)) * 4)
+    files = [{"filename": "large.csv", "path": str(large)},
+             {"filename": "model.bin", "path": str(binary), "binary": True}]
+    assert sync.sync("s1", client, files) is None
+    assert sandbox_file(client, "large.csv") == large.read_bytes()
+    assert sandbox_file(client, "model.bin") == binary.read_bytes()
+    assert not os.path.exists(os.path.join(client.workdir, "large.csv.gz.b64"))
+    assert sync.stats()["files_compressed"] == 2
+
+
+def test_a_new_interpreter_gets_the_files_again(client):
+    sync = SandboxFileSync()
+    files = [{"filename": "data.csv", "content": "a\n1\n"}]
+    sync.sync("s1", client, files)
+    restarted = FakeCodeInterpreter()
+    restarted.start()
+    sync.sync("s1", restarted, files)
+    assert sandbox_file(restarted, "data.csv") == b"a\n1\n"
+    assert sync.stats()["resets"] == 1
+
+
+def test_files_sent_by_reference_only_must_be_resent(client):
+    sync = SandboxFileSync()
+    with pytest.raises(MissingSandboxFiles) as error:
+        sync.sync("s1", client, [{"filename": "data.csv", "sha256": "0" * 64}])
+    assert error.value.filenames == ["data.csv"]
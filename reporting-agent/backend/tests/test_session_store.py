@@ -0,0 +1,149 @@
+import time
+
+import pytest
+
+from CodeInterpreterSession import CodeInterpreterSession
+from SessionBackend import SQLiteSessionBackend
+from SessionStore import SessionStore
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"), shared=False)
+    yield backend
+    backend.close()
+
+
+def listening(store: SessionStore) -> list:
+    deleted = []
+    store.delete_listeners.append(deleted.append)
+    return deleted
+
+
+def test_delete_notifies_listeners(backend):
+    store = SessionStore(backend=backend)
+    deleted = listening(store)
+    store.get_or_create("s1")
+    assert store.delete("s1")
+    assert deleted == ["s1"]
+    assert "s1" not in store
+
+
+def test_a_failing_listener_does_not_stop_the_others(backend):
+    store = SessionStore(backend=backend)
+    store.delete_listeners.append(lambda session_id: 1 / 0)
+    deleted = listening(store)
+    store.get_or_create("s1")
+    store.delete("s1")
+    assert deleted == ["s1"]
+
+
+def test_sessions_dropped_without_a_backend_notify_listeners():
+    store = SessionStore(max_sessions=1)
+    deleted = listening(store)
+    store.get_or_create("s1")
+    store.get_or_create("s2")
+    assert deleted == ["s1"]
+    assert store.get("s1") is None
+
+
+def test_spilled_sessions_notify_listeners_only_when_they_expire(backend):
+    store = SessionStore(backend=backend, idle_ttl=0, spill_ttl=3600)
+    deleted = listening(store)
+    store.get_or_create("s1")
+    time.sleep(0.01)
+    store.evict_idle()
+    assert store.stats()["spilled"] == 1
+    assert deleted == []
+
+    store.spill_ttl = 0
+    time.sleep(0.01)
+    store.evict_idle()
+    assert store.stats()["expired_spills"] == 1
+    assert deleted == ["s1"]
+    store.evict_idle()
+    assert deleted == ["s1"]
+
+
+def test_spills_from_before_a_restart_notify_listeners_when_they_expire(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(backend=SQLiteSessionBackend(path, shared=False))
+    store.get_or_create("s1")
+    store.close()
+
+    backend = SQLiteSessionBackend(path, shared=False)
+    store = SessionStore(backend=backend, spill_ttl=0)
+    deleted = listening(store)
+    time.sleep(0.01)
+    store.evict_idle()
+    assert deleted == ["s1"]
+    backend.close()
+
+
+def test_rehydrated_sessions_are_not_reported_as_expired(backend):
+    store = SessionStore(backend=backend, idle_ttl=0)
+    deleted = listening(store)
+    store.get_or_create("s1")
+    time.sleep(0.01)
+    store.evict_idle()
+    session = store.get("s1")
+    assert isinstance(session, CodeInterpreterSession)
+    store.idle_ttl = 3600
+    store.evict_idle()
+    assert deleted == []
+
+
+def session_with_history(store: SessionStore, session_id: str, entries: int, size: int = 100):
+    session = store.get_or_create(session_id)
+    session.code_history.extend("x" * size for _ in range(entries))
+    store.save(session)
+    return session
+
+
+def test_sessions_over_the_count_limit_spill_and_reload(backend):
+    store = SessionStore(max_sessions=2, backend=backend)
+    session_with_history(store, "s1", 3)
+    store.get_or_create("s2")
+    store.get_or_create("s3")
+    assert store.stats()["resident_sessions"] == 2
+    assert store.stats()["spilled"] == 1
+
+    session = store.get("s1")
+    assert session.code_history == ["x" * 100] * 3
+    stats = store.stats()
+    assert stats["rehydrated"] == 1
+    assert stats["resident_sessions"] == 2
+
+
+def test_the_byte_budget_spills_least_recently_used_first(backend):
+    store = SessionStore(max_bytes=3000, backend=backend)
+    for session_id in ("s1", "s2", "s3"):
+        session_with_history(store, session_id, 10)
+    store.get("s1")
+    session_with_history(store, "s4", 10)
+    resident = [entry["session_id"] for entry in store.usage() if entry["resident"]]
+    assert "s2" not in resident
+    assert "s1" in resident and "s4" in resident
+    assert store.stats()["resident_bytes"] <= 3000
+
+
+def test_oversized_sessions_keep_only_their_newest_history(backend):
+    store = SessionStore(max_session_bytes=1000, backend=backend)
+    session = session_with_history(store, "s1", 20)
+    assert 0 < len(session.code_history) < 20
+    assert session.estimate_bytes() <= 1000
+    assert store.stats()["trimmed_entries"] == 20 - len(session.code_history)
+
+
+def test_spilled_sessions_survive_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(backend=SQLiteSessionBackend(path, shared=False))
+    session_with_history(store, "s1", 2)
+    store.close()
+
+    backend = SQLiteSessionBackend(path, shared=False)
+    store = SessionStore(backend=backend)
+    assert "s1" in store
+    assert store.get("s1").code_history == ["x" * 100] * 2
+    backend.close()
+
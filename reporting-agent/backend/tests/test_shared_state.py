@@ -0,0 +1,129 @@
+import asyncio
+import hashlib
+import time
+
+import pytest
+
+from ChunkedUploadManager import ChunkedUploadManager, UploadNotFound
+from FakeRedisServer import FakeRedisServer
+from ImageStore import ImageStore
+from JobQueue import JOB_CANCELLED, JOB_SUCCEEDED, JobQueue
+from SessionBackend import RedisSessionBackend, SQLiteSessionBackend
+from SessionStore import SessionStore
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def workers(request, tmp_path):
+    """Two backends over one store, as two worker processes would open it"""
+    server = None
+    if request.param == "redis":
+        server = FakeRedisServer().start()
+        backends = [RedisSessionBackend(server.url) for _ in range(2)]
+    else:
+        backends = [SQLiteSessionBackend(str(tmp_path / "sessions.db")) for _ in range(2)]
+    yield backends
+    for backend in backends:
+        backend.close()
+    if server is not None:
+        server.stop()
+
+
+def test_records_expire(workers):
+    first, second = workers
+    first.put_record("job", "a", b"1", ttl=3600)
+    first.put_record("job", "b", b"2", ttl=0.001)
+    time.sleep(0.01)
+    assert second.get_record("job", "a") == b"1"
+    assert second.get_record("job", "b") is None
+    assert second.list_records("job") == [b"1"]
+    assert second.existing(["s1"]) == set()
+    assert second.delete_record("job", "a")
+    assert first.get_record("job", "a") is None
+
+
+def test_jobs_can_be_polled_and_cancelled_from_another_worker(workers):
+    async def scenario():
+        started = asyncio.Event()
+        owner = JobQueue(workers=1, backend=workers[0], cancel_poll=0.01)
+        other = JobQueue(workers=1, backend=workers[1])
+
+        async def quick(job):
+            return {"answer": 42}
+
+        async def slow(job):
+            started.set()
+            await asyncio.sleep(30)
+
+        owner.register("quick", quick)
+        owner.register("slow", slow)
+        await owner.start()
+        try:
+            done = await owner.submit("quick", "s1", {})
+            running = await owner.submit("slow", "s2", {})
+            await started.wait()
+            for _ in range(100):
+                polled = await other.lookup(done.id)
+                if polled["status"] == JOB_SUCCEEDED:
+                    break
+                await asyncio.sleep(0.01)
+            assert polled["result"] == {"answer": 42}
+            assert [job["job_id"] for job in await other.lookup_session("s1")] == [done.id]
+
+            assert await other.cancel(running.id)
+            for _ in range(300):
+                if running.status == JOB_CANCELLED:
+                    break
+                await asyncio.sleep(0.01)
+            assert running.status == JOB_CANCELLED
+            assert (await other.lookup(running.id))["status"] == JOB_CANCELLED
+            assert not await other.cancel(done.id)
+        finally:
+            await owner.stop()
+
+    asyncio.run(scenario())
+
+
+def test_images_are_served_by_any_worker(workers):
+    first = ImageStore(backend=workers[0])
+    second = ImageStore(backend=workers[1])
+    image_hash = first.put(b"\x89PNG chart", "png")
+    assert second.get(image_hash) == (b"\x89PNG chart", "png")
+    assert second.stats()["shared_hits"] == 1
+    assert second.get("0" * 64) is None
+
+
+def test_uploads_continue_on_another_worker(workers, tmp_path):
+    spool = str(tmp_path / "spool")
+    first = ChunkedUploadManager(spool, backend=workers[0])
+    second = ChunkedUploadManager(spool, backend=workers[1])
+    data = b"a,b\n1,2\n3,4\n"
+
+    upload = first.create("s1", "data.csv", len(data))
+    second.append(upload.id, 0, [data[:6]])
+    assert first.get(upload.id).offset == 6
+    first.append(upload.id, 6, [data[6:]])
+    file_ref = second.complete(upload.id)
+    assert file_ref["sha256"] == hashlib.sha256(data).hexdigest()
+    assert file_ref["rows"] == 2
+    with pytest.raises(UploadNotFound):
+        first.get(upload.id)
+
+
+def test_aborting_an_upload_opened_elsewhere(workers, tmp_path):
+    spool = str(tmp_path / "spool")
+    first = ChunkedUploadManager(spool, backend=workers[0])
+    second = ChunkedUploadManager(spool, backend=workers[1])
+    upload = first.create("s1", "data.csv")
+    assert second.abort(upload.id)
+    with pytest.raises(UploadNotFound):
+        first.get(upload.id)
+
+
+def test_shared_backends_reload_sessions_changed_by_another_worker(workers):
+    first, second = (SessionStore(backend=backend) for backend in workers)
+    for store in (first, second):
+        session = store.get_or_create("s1")
+        session.code_history.append("x = 1")
+        store.save(session)
+    assert first.get("s1").code_history == ["x = 1", "x = 1"]
+    assert first.stats()["reloaded"] == 1
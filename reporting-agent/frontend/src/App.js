@@ -23,7 +23,7 @@ import SessionHistory from './components/SessionHistory';
 import InteractiveExecutionModal from './components/InteractiveExecutionModal';
 import CsvUploadModal from './components/CsvUploadModal';
 import ExecutionTimer from './components/ExecutionTimer';
-import { generateCode, executeCode, uploadFile, uploadCsvFile, getSessionHistory, analyzeCode } from './services/api';
+import { generateCode, executeCode, uploadFile, uploadCsvChunked, getSessionHistory, analyzeCode } from './services/api';
 import { v4 as uuidv4 } from 'uuid';
 import '@cloudscape-design/global-styles/index.css';
 
@@ -298,7 +298,7 @@ function App() {
     setError(null);
     
     try {
-      const response = await uploadCsvFile(file.name, file.content, sessionId);
+      const response = await uploadCsvChunked(file, sessionId);
       
       setUploadedCsv({
         filename: response.filename,
@@ -23,9 +23,11 @@ import SessionHistory from './components/SessionHistory.jsx';
 import InteractiveExecutionModal from './components/InteractiveExecutionModal.jsx';
 import CsvUploadModal from './components/CsvUploadModal.jsx';
 import ExecutionTimer from './components/ExecutionTimer.jsx';
-import { generateCode, executeCode, uploadFile, uploadCsvFile, getSessionHistory, analyzeCode } from './services/api';
+import { generateCode, executeCode, uploadFile, uploadCsvChunked, getSessionHistory, analyzeCode } from './services/api';
 import { v4 as uuidv4 } from 'uuid';
 
+const MAX_LIVE_OUTPUT_CHARS = 200000;
+
 function App() {
   const [sessionId, setSessionId] = useState(null);
   const [prompt, setPrompt] = useState('');
@@ -46,6 +48,8 @@ function App() {
   const [uploadedCsv, setUploadedCsv] = useState(null);
   const [csvUploadLoading, setCsvUploadLoading] = useState(false);
   const [isExecuting, setIsExecuting] = useState(false);
+  const [liveOutput, setLiveOutput] = useState('');
+  const [liveImages, setLiveImages] = useState([]);
 
   // Memoized session ID initialization
   const initialSessionId = useMemo(() => uuidv4(), []);
@@ -83,6 +87,11 @@ function App() {
             timestamp: new Date().toISOString()
           });
           setActiveTab('results');
+        } else if (data.type === 'stdout_chunk' || data.type === 'stderr_chunk') {
+          // Keep only the tail of very chatty executions
+          setLiveOutput(prev => (prev + data.data).slice(-MAX_LIVE_OUTPUT_CHARS));
+        } else if (data.type === 'image') {
+          setLiveImages(prev => [...prev, { format: data.format, url: data.url, hash: data.hash }]);
         }
       };
       
@@ -174,6 +183,8 @@ function App() {
 
     setLoading(true);
     setIsExecuting(true);
+    setLiveOutput('');
+    setLiveImages([]);
     setError(null);
 
     try {
@@ -297,7 +308,7 @@ function App() {
     setError(null);
     
     try {
-      const response = await uploadCsvFile(file.name, file.content, sessionId);
+      const response = await uploadCsvChunked(file, sessionId);
       
       setUploadedCsv({
         filename: response.filename,
@@ -548,6 +559,19 @@ function App() {
                     onReset={() => setIsExecuting(false)}
                   />
                 )}
+
+                {isExecuting && (liveOutput || liveImages.length > 0) && (
+                  <Box textAlign="left">
+                    <Box variant="awsui-key-label">
+                      Live output{liveImages.length > 0 ? ` (${liveImages.length} chart${liveImages.length > 1 ? 's' : ''} so far)` : ''}
+                    </Box>
+                    <Box variant="code">
+                      <pre style={{ maxHeight: '300px', overflow: 'auto', whiteSpace: 'pre-wrap', margin: 0 }}>
+                        {liveOutput}
+                      </pre>
+                    </Box>
+                  </Box>
+                )}
                 
                 <SpaceBetween direction="horizontal" size="s" alignItems="center">
                   <Button
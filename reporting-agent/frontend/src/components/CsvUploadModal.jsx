@@ -35,23 +35,12 @@ const CsvUploadModal = ({ visible, onDismiss, onUpload, loading = false }) => {
     }
 
     try {
-      // Read file content
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        try {
-          await onUpload({
-            name: file.name,
-            content: e.target.result
-          });
-          setSelectedFiles([]);
-          setError(null);
-        } catch (err) {
-          setError(`Upload failed: ${err.message}`);
-        }
-      };
-      reader.readAsText(file);
+      // The file is streamed to the server in chunks, so it is not read into memory here
+      await onUpload(file);
+      setSelectedFiles([]);
+      setError(null);
     } catch (err) {
-      setError(`Failed to read file: ${err.message}`);
+      setError(`Upload failed: ${err.message}`);
     }
   };
 
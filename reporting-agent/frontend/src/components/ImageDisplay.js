@@ -8,20 +8,28 @@ import {
   ColumnLayout,
   Badge
 } from '@cloudscape-design/components';
+import { imageUrl } from '../services/api';
 
 const ImageDisplay = memo(({ images = [] }) => {
   if (!images || images.length === 0) {
     return null;
   }
 
-  const downloadImage = (imageData, index) => {
+  const downloadImage = async (image, index) => {
     try {
+      // The download attribute is ignored for cross-origin URLs, so fetch the (cached) bytes first
+      const href = image.url
+        ? URL.createObjectURL(await (await fetch(imageUrl(image))).blob())
+        : imageUrl(image);
       const link = document.createElement('a');
-      link.href = `data:image/png;base64,${imageData}`;
-      link.download = `chart_${index + 1}.png`;
+      link.href = href;
+      link.download = `chart_${index + 1}.${image.format === 'jpeg' ? 'jpg' : 'png'}`;
       document.body.appendChild(link);
       link.click();
       document.body.removeChild(link);
+      if (image.url) {
+        URL.revokeObjectURL(href);
+      }
     } catch (error) {
       // eslint-disable-next-line no-console
       console.error('Failed to download image:', error);
@@ -40,14 +48,14 @@ const ImageDisplay = memo(({ images = [] }) => {
                 <Button
                   variant="link"
                   iconName="download"
-                  onClick={() => downloadImage(images[0].data, 0)}
+                  onClick={() => downloadImage(images[0], 0)}
                 >
                   Download PNG
                 </Button>
               </Box>
               <Box textAlign="center">
                 <img
-                  src={`data:image/png;base64,${images[0].data}`}
+                  src={imageUrl(images[0])}
                   alt="Generated Chart 1"
                   style={{
                     maxWidth: '100%',
@@ -64,21 +72,21 @@ const ImageDisplay = memo(({ images = [] }) => {
           // Multiple images - grid layout
           <ColumnLayout columns={images.length > 2 ? 2 : images.length}>
             {images.map((image, index) => (
-              <Box key={index}>
+              <Box key={image.hash || index}>
                 <SpaceBetween direction="vertical" size="s">
                   <Box display="flex" justifyContent="space-between" alignItems="center">
                     <Badge color="blue">Chart {index + 1}</Badge>
                     <Button
                       variant="link"
                       iconName="download"
-                      onClick={() => downloadImage(image.data, index)}
+                      onClick={() => downloadImage(image, index)}
                     >
                       Download PNG
                     </Button>
                   </Box>
                   <Box textAlign="center">
                     <img
-                      src={`data:image/png;base64,${image.data}`}
+                      src={imageUrl(image)}
                       alt={`Generated Chart ${index + 1}`}
                       style={{
                         maxWidth: '100%',
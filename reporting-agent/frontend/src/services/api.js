@@ -43,11 +43,18 @@ api.interceptors.response.use(
   }
 );
 
-export const generateCode = async (prompt, sessionId = null) => {
+// Charts are served by content hash; older results may still carry inline base64
+export const imageUrl = (image) => (
+  image.url ? `${API_BASE_URL}${image.url}` : `data:image/${image.format || 'png'};base64,${image.data}`
+);
+
+// useCache = false forces a fresh generation (the result still refreshes the server's cache)
+export const generateCode = async (prompt, sessionId = null, useCache = true) => {
   try {
     const response = await api.post('/api/generate-code', {
       prompt,
-      session_id: sessionId
+      session_id: sessionId,
+      use_cache: useCache
     });
     return response;
   } catch (error) {
@@ -56,15 +63,63 @@ export const generateCode = async (prompt, sessionId = null) => {
   }
 };
 
-export const executeCode = async (code, sessionId = null, interactive = false, inputs = null) => {
+// Background jobs: submit returns immediately, results are polled (or pushed over the WebSocket)
+export const submitJob = async (kind, params = {}, sessionId = null, priority = 0) => {
   try {
-    const response = await api.post('/api/execute-code', {
-      code,
+    const response = await api.post('/api/jobs', {
+      kind,
       session_id: sessionId,
-      interactive,
-      inputs
+      priority,
+      ...params
     });
     return response;
+  } catch (error) {
+    console.error('Submit job error:', error);
+    throw error;
+  }
+};
+
+export const getJob = async (jobId) => {
+  try {
+    const response = await api.get(`/api/jobs/${jobId}`);
+    return response;
+  } catch (error) {
+    console.error('Get job error:', error);
+    throw error;
+  }
+};
+
+export const cancelJob = async (jobId) => {
+  try {
+    const response = await api.post(`/api/jobs/${jobId}/cancel`);
+    return response;
+  } catch (error) {
+    console.error('Cancel job error:', error);
+    throw error;
+  }
+};
+
+export const waitForJob = async (jobId, { interval = 500, maxInterval = 3000 } = {}) => {
+  let delay = interval;
+  for (;;) {
+    const job = await getJob(jobId);
+    if (job.status === 'succeeded') {
+      return job.result;
+    }
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, delay));
+    delay = Math.min(delay * 1.5, maxInterval);
+  }
+};
+
+// useCache = true reuses the stored output of identical code over unchanged session files;
+// aiCommentary = true runs the code through the executor agent instead of straight in the interpreter
+export const executeCode = async (code, sessionId = null, interactive = false, inputs = null, useCache = false, aiCommentary = false) => {
+  try {
+    const job = await submitJob('execute', { code, interactive, inputs, use_cache: useCache, ai_commentary: aiCommentary }, sessionId);
+    return await waitForJob(job.job_id);
   } catch (error) {
     console.error('Execute code error:', error);
     throw error;
@@ -98,6 +153,48 @@ export const uploadCsvFile = async (filename, content, sessionId = null) => {
   }
 };
 
+// Resumable upload: the file is sent in slices straight from disk, never read into one string
+export const uploadCsvChunked = async (file, sessionId = null, { chunkSize = 4 * 1024 * 1024, maxRetries = 5, onProgress } = {}) => {
+  try {
+    const upload = await api.post('/api/uploads', {
+      filename: file.name,
+      session_id: sessionId,
+      total_size: file.size
+    });
+
+    let offset = 0;
+    let retries = 0;
+    while (offset < file.size) {
+      const end = Math.min(offset + chunkSize, file.size);
+      try {
+        const status = await api.put(`/api/uploads/${upload.upload_id}`, file.slice(offset, end), {
+          headers: {
+            'Content-Type': 'application/octet-stream',
+            'Content-Range': `bytes ${offset}-${end - 1}/${file.size}`
+          }
+        });
+        offset = status.offset;
+        retries = 0;
+        if (onProgress) {
+          onProgress(offset / file.size);
+        }
+      } catch (error) {
+        if (++retries > maxRetries) {
+          throw error;
+        }
+        // Resume from whatever the server actually stored
+        await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** retries));
+        offset = (await api.get(`/api/uploads/${upload.upload_id}`)).offset;
+      }
+    }
+
+    return await api.post(`/api/uploads/${upload.upload_id}/complete`, {});
+  } catch (error) {
+    console.error('Chunked CSV upload error:', error);
+    throw error;
+  }
+};
+
 export const uploadFile = async (filename, content, sessionId = null) => {
   try {
     const response = await api.post('/api/upload-file', {
@@ -227,10 +324,19 @@ export class WebSocketService {
     }
   }
 
-  executeCode(code) {
+  executeCode(code, aiCommentary = false) {
     this.send({
       type: 'execute_code',
-      code: code
+      code: code,
+      ai_commentary: aiCommentary
+    });
+  }
+
+  submitJob(kind, params = {}, priority = 0) {
+    // Progress arrives as 'job_submitted' and 'job_update' events
+    this.send({
+      type: 'submit_job',
+      job: { kind, priority, ...params }
     });
   }
 }